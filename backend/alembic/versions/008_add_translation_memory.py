@@ -0,0 +1,40 @@
+"""add translation memory table
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'translation_memory',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('project_id', sa.Integer(), sa.ForeignKey('projects.id'), nullable=False),
+        sa.Column('source_hash', sa.String(length=64), nullable=False),
+        sa.Column('source_text', sa.Text(), nullable=False),
+        sa.Column('target_text', sa.Text(), nullable=False),
+        sa.Column('signature', sa.JSON(), nullable=True),
+        sa.Column('hit_count', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('project_id', 'source_hash', name='uq_translation_memory_source'),
+    )
+    op.create_index('ix_translation_memory_id', 'translation_memory', ['id'], unique=False)
+    op.create_index('ix_translation_memory_project_id', 'translation_memory', ['project_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_translation_memory_project_id', table_name='translation_memory')
+    op.drop_index('ix_translation_memory_id', table_name='translation_memory')
+    op.drop_table('translation_memory')
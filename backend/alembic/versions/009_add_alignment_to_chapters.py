@@ -0,0 +1,25 @@
+"""add paragraph alignment column to chapters
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Paragraph alignment between original_text and translated_text
+    op.add_column('chapters', sa.Column('alignment', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('chapters', 'alignment')
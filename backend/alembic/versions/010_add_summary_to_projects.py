@@ -0,0 +1,29 @@
+"""add persisted summary columns to projects
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Project summary used as translation context and the hash of the chapter summaries it was built from
+    op.add_column('projects', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('projects', sa.Column('summary_inputs_hash', sa.String(length=64), nullable=True))
+    op.add_column('projects', sa.Column('summary_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('projects', 'summary_updated_at')
+    op.drop_column('projects', 'summary_inputs_hash')
+    op.drop_column('projects', 'summary')
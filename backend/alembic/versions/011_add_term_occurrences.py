@@ -0,0 +1,40 @@
+"""add term occurrences inverted index
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'term_occurrences',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('project_id', sa.Integer(), sa.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('term_id', sa.Integer(), sa.ForeignKey('glossary_terms.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('chapter_id', sa.Integer(), sa.ForeignKey('chapters.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('offsets', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('term_id', 'chapter_id', name='uq_term_occurrence'),
+    )
+    op.create_index('ix_term_occurrences_id', 'term_occurrences', ['id'], unique=False)
+    op.create_index('ix_term_occurrences_chapter_id', 'term_occurrences', ['chapter_id'], unique=False)
+    op.create_index('ix_term_occurrences_project_id', 'term_occurrences', ['project_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_term_occurrences_project_id', table_name='term_occurrences')
+    op.drop_index('ix_term_occurrences_chapter_id', table_name='term_occurrences')
+    op.drop_index('ix_term_occurrences_id', table_name='term_occurrences')
+    op.drop_table('term_occurrences')
@@ -0,0 +1,44 @@
+"""add translation reviews
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'translation_reviews',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('project_id', sa.Integer(), sa.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('chapter_id', sa.Integer(), sa.ForeignKey('chapters.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('translation_hash', sa.String(length=64), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('min_score', sa.Float(), nullable=False),
+        sa.Column('issue_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('issues', sa.JSON(), nullable=True),
+        sa.Column('chunks', sa.JSON(), nullable=True),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('model', sa.String(length=100), nullable=True),
+        sa.Column('prompt_version', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('chapter_id', 'translation_hash', name='uq_translation_review'),
+    )
+    op.create_index('ix_translation_reviews_id', 'translation_reviews', ['id'], unique=False)
+    op.create_index('ix_translation_reviews_project_score', 'translation_reviews', ['project_id', 'score'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_translation_reviews_project_score', table_name='translation_reviews')
+    op.drop_index('ix_translation_reviews_id', table_name='translation_reviews')
+    op.drop_table('translation_reviews')
@@ -0,0 +1,25 @@
+"""add glossary term translations to translation memory entries
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Glossary term translations the stored paragraph translation was made with
+    op.add_column('translation_memory', sa.Column('terms', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('translation_memory', 'terms')
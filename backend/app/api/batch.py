@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from sqlalchemy.orm import Session
 from datetime import datetime
@@ -13,10 +15,16 @@ from app.models.glossary import (
 from app.core.nlp_pipeline.term_extractor import term_extractor
 from app.core.nlp_pipeline.relationship_analyzer import relationship_analyzer
 from app.core.nlp_pipeline.context_summarizer import context_summarizer
+from app.core.alignment import infer_alignment
+from app.core.config import settings
 from app.core.translation_engine import translation_engine
 from app.services.cache_service import cache_service
+from app.services.project_summary import project_summary_service
+from app.services.term_index import term_index
+from app.services.translation_review import translation_review_service
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 def process_batch_analyze_sync(batch_job_id: int, db: Session = None):
@@ -47,14 +55,20 @@ def process_batch_analyze_sync(batch_job_id: int, db: Session = None):
         total_terms = 0
         total_auto_approved = 0
         total_pending = 0
+        # Главы, где встречаются новые утвержденные термины (их переводы устарели)
+        affected_chapters = set()
         
         for job_item in job_items:
+            lease = None
             try:
                 # Обновляем статус элемента
                 job_item.status = "processing"
                 job_item.started_at = datetime.utcnow()
                 local_db.commit()
                 
+                # Та же аренда, что у эндпоинта главы: пакет и отдельный запрос не работают над главой одновременно
+                lease = cache_service.wait_for_lease("analyze", job_item.item_id, wait=settings.CACHE_LEASE_BATCH_WAIT)
+                
                 # Получаем главу и проект
                 chapter = local_db.get(Chapter, job_item.item_id)
                 if not chapter:
@@ -150,6 +164,14 @@ def process_batch_analyze_sync(batch_job_id: int, db: Session = None):
                 chapter.summary = chapter_summary
                 chapter.processed_at = datetime.utcnow()
                 
+                # Индексируем вхождения новых терминов по главам проекта
+                if saved_terms:
+                    local_db.flush()
+                    term_index.index_terms(local_db, chapter.project_id, saved_terms)
+                    affected_chapters |= term_index.chapters_for_terms(
+                        local_db, [term.id for term in saved_terms if term.status == TermStatus.APPROVED]
+                    )
+                
                 # Обновляем статистику
                 total_terms += len(saved_terms)
                 total_auto_approved += auto_approved_count
@@ -170,12 +192,26 @@ def process_batch_analyze_sync(batch_job_id: int, db: Session = None):
                 local_db.commit()
                 
             except Exception as e:
-                print(f"Error processing job item {job_item.id}: {e}")
+                logger.exception("Batch analyze job %s: item %s failed", batch_job_id, job_item.id)
                 job_item.status = "failed"
                 job_item.completed_at = datetime.utcnow()
                 job_item.error_message = str(e)
                 failed_items += 1
                 local_db.commit()
+            finally:
+                if lease is not None:
+                    cache_service.release_lease("analyze", job_item.item_id, lease)
+        
+        # Новые термины, связи и саммари: сбрасываем кэши проекта одним запросом
+        cache_service.delete_many(
+            [
+                cache_service.get_glossary_cache_key(batch_job.project_id),
+                cache_service.get_relationships_cache_key(batch_job.project_id),
+            ]
+            + [cache_service.get_summary_cache_key(item.item_id) for item in job_items]
+        )
+        if affected_chapters:
+            cache_service.invalidate_translation_caches(affected_chapters)
         
         # Обновляем статус задачи
         batch_job.status = "completed"
@@ -241,88 +277,126 @@ def process_batch_translate_sync(batch_job_id: int, db: Session = None):
         processed_items = 0
         failed_items = 0
         
+        # Утвержденные термины глоссария проекта задачи
+        project_glossary = local_db.query(GlossaryTerm).filter(
+            GlossaryTerm.project_id == batch_job.project_id,
+            GlossaryTerm.status == TermStatus.APPROVED
+        ).all()
+        # Общее саммари проекта (из БД; пересобирается, только если изменились саммари глав)
+        batch_project_summary = project_summary_service.get(local_db, batch_job.project_id)
+        # Адреса переводов в кэше (текст, встречающиеся термины, саммари, модель, промпт)
+        project_chapters_by_id = {
+            ch.id: ch for ch in local_db.query(Chapter).filter(
+                Chapter.id.in_([item.item_id for item in job_items]),
+                Chapter.project_id == batch_job.project_id
+            ).all()
+        }
+        fingerprints = {
+            chapter_id: translation_engine.cache_fingerprint(
+                ch.original_text, project_glossary, ch.summary, project_summary=batch_project_summary
+            )
+            for chapter_id, ch in project_chapters_by_id.items()
+        }
+        # Проверяем кэш переводов для всех глав задачи одним MGET
+        cached_translations = cache_service.get_cached_translations(fingerprints)
+        # Новые переводы кэшируем одним пайплайном в конце
+        new_translations = {}
+        
         for job_item in job_items:
+            lease = None
             try:
                 # Обновляем статус элемента
                 job_item.status = "processing"
                 job_item.started_at = datetime.utcnow()
                 local_db.commit()
                 
+                # Та же аренда, что у эндпоинта главы: пакет и отдельный запрос не работают над главой одновременно
+                lease = cache_service.wait_for_lease("translate", job_item.item_id, wait=settings.CACHE_LEASE_BATCH_WAIT)
+                
                 # Получаем главу
                 chapter = local_db.get(Chapter, job_item.item_id)
                 if not chapter:
                     raise Exception("Chapter not found")
                 
                 # Получаем утвержденные термины глоссария
-                glossary_terms = local_db.query(GlossaryTerm).filter(
-                    GlossaryTerm.project_id == chapter.project_id,
-                    GlossaryTerm.status == TermStatus.APPROVED
-                ).all()
+                if chapter.project_id == batch_job.project_id:
+                    glossary_terms = project_glossary
+                    project_summary = batch_project_summary
+                    cached_translation = cached_translations.get(chapter.id)
+                else:
+                    glossary_terms = local_db.query(GlossaryTerm).filter(
+                        GlossaryTerm.project_id == chapter.project_id,
+                        GlossaryTerm.status == TermStatus.APPROVED
+                    ).all()
+                    project_summary = project_summary_service.get(local_db, chapter.project_id)
+                    cached_translation = None
                 
                 if not glossary_terms:
                     raise Exception("No approved glossary terms found")
                 
-                # Получаем общее саммари проекта (если есть)
-                project_summary = None
-                project_chapters = local_db.query(Chapter).filter(
-                    Chapter.project_id == chapter.project_id,
-                    Chapter.summary.isnot(None)
-                ).order_by(Chapter.id).all()
-                
-                if len(project_chapters) > 1:
-                    from app.core.nlp_pipeline.context_summarizer import context_summarizer
-                    chapters_data = [
-                        {
-                            "title": ch.title,
-                            "summary": ch.summary,
-                            "original_text": ch.original_text
-                        }
-                        for ch in project_chapters[:5]
-                    ]
-                    project_summary = context_summarizer.create_project_summary(chapters_data)
-                
-                # Переводим текст
-                translated_text = translation_engine.translate_with_glossary(
-                    text=chapter.original_text,
-                    glossary_terms=glossary_terms,
-                    context_summary=chapter.summary,
-                    project_summary=project_summary
-                )
+                incremental = None
+                prompt_report = None
+                if cached_translation:
+                    translated_text = cached_translation
+                else:
+                    # Переводим текст (после правок оригинала – только измененные абзацы)
+                    result = translation_engine.translate_chapter(
+                        text=chapter.original_text,
+                        glossary_terms=glossary_terms,
+                        context_summary=chapter.summary,
+                        project_summary=project_summary,
+                        db=local_db,
+                        project_id=chapter.project_id,
+                        previous_translation=chapter.translated_text,
+                        previous_alignment=chapter.alignment
+                    )
+                    translated_text = result["translated_text"]
+                    chapter.alignment = result["alignment"]
+                    incremental = result["incremental"]
+                    prompt_report = result["prompt"]
+                    if chapter.project_id == batch_job.project_id:
+                        new_translations[chapter.id] = translated_text
                 
+                if cached_translation and translated_text != chapter.translated_text:
+                    # Прежнее выравнивание к кэшированному переводу не относится
+                    chapter.alignment = infer_alignment(chapter.original_text, translated_text)
+                if chapter.alignment and fingerprints.get(chapter.id):
+                    # По адресу рядом с переводом прогрев кэша понимает, что перевод актуален
+                    chapter.alignment = dict(chapter.alignment, fingerprint=fingerprints[chapter.id])
                 # Сохраняем перевод
                 chapter.translated_text = translated_text
                 
-                # Кэшируем перевод
-                glossary_hash = cache_service.generate_glossary_hash([
-                    {
-                        "source_term": term.source_term,
-                        "translated_term": term.translated_term,
-                        "category": term.category
-                    }
-                    for term in glossary_terms
-                ])
-                cache_service.cache_translation(chapter.id, glossary_hash, translated_text)
-                
                 # Обновляем элемент задачи
                 job_item.status = "completed"
                 job_item.completed_at = datetime.utcnow()
                 job_item.result = {
                     "translated": True,
+                    "cached": bool(cached_translation),
+                    # По адресу прогрев кэша понимает, что перевод соответствует текущим данным главы
+                    "fingerprint": fingerprints.get(chapter.id),
                     "glossary_terms_used": len(glossary_terms),
                     "context_used": bool(chapter.summary),
-                    "project_context_used": bool(project_summary)
+                    "project_context_used": bool(project_summary),
+                    "incremental": incremental,
+                    "prompt": prompt_report
                 }
                 
                 processed_items += 1
                 local_db.commit()
                 
             except Exception as e:
-                print(f"Error processing job item {job_item.id}: {e}")
+                logger.exception("Batch translate job %s: item %s failed", batch_job_id, job_item.id)
                 job_item.status = "failed"
                 job_item.completed_at = datetime.utcnow()
                 job_item.error_message = str(e)
                 failed_items += 1
                 local_db.commit()
+            finally:
+                if lease is not None:
+                    cache_service.release_lease("translate", job_item.item_id, lease)
+        
+        # Кэшируем новые переводы
+        cache_service.cache_translations(new_translations, fingerprints)
         
         # Обновляем статус задачи
         batch_job.status = "completed"
@@ -356,6 +430,124 @@ def process_batch_translate_sync(batch_job_id: int, db: Session = None):
             local_db.close()
 
 
+def process_batch_review_sync(batch_job_id: int, db: Session = None):
+    """Синхронное пакетное рецензирование переводов глав.
+
+    Главы идут по очереди, фрагменты каждой – параллельно через ротацию ключей
+    Gemini. Переводы, для которых рецензия уже сохранена, повторно не
+    рецензируются.
+    """
+    # Открываем новую сессию для фоновой задачи
+    from app.db import SessionLocal
+    local_db = db or SessionLocal()
+    
+    try:
+        # Получаем задачу
+        batch_job = local_db.get(BatchJob, batch_job_id)
+        if not batch_job:
+            return {"error": "Batch job not found", "batch_job_id": batch_job_id}
+        
+        # Обновляем статус
+        batch_job.status = "running"
+        batch_job.started_at = datetime.utcnow()
+        local_db.commit()
+        
+        # Получаем элементы задачи
+        job_items = local_db.query(BatchJobItem).filter(
+            BatchJobItem.batch_job_id == batch_job_id
+        ).all()
+        
+        total_items = len(job_items)
+        processed_items = 0
+        failed_items = 0
+        reused_reviews = 0
+        
+        project_glossary = local_db.query(GlossaryTerm).filter(
+            GlossaryTerm.project_id == batch_job.project_id,
+            GlossaryTerm.status == TermStatus.APPROVED
+        ).all()
+        
+        for job_item in job_items:
+            lease = None
+            try:
+                # Обновляем статус элемента
+                job_item.status = "processing"
+                job_item.started_at = datetime.utcnow()
+                local_db.commit()
+                
+                # Та же аренда, что у эндпоинта главы: пакет и отдельный запрос не работают над главой одновременно
+                lease = cache_service.wait_for_lease("review", job_item.item_id, wait=settings.CACHE_LEASE_BATCH_WAIT)
+                
+                # Получаем главу
+                chapter = local_db.get(Chapter, job_item.item_id)
+                if not chapter:
+                    raise Exception("Chapter not found")
+                if not chapter.translated_text:
+                    raise Exception("Chapter has no translation to review")
+                
+                review, reused = translation_review_service.review(local_db, chapter, project_glossary)
+                if reused:
+                    reused_reviews += 1
+                
+                job_item.status = "completed"
+                job_item.completed_at = datetime.utcnow()
+                job_item.result = {
+                    "review_id": review.id,
+                    "score": review.score,
+                    "min_score": review.min_score,
+                    "issue_count": review.issue_count,
+                    "reused": reused
+                }
+                
+                processed_items += 1
+                local_db.commit()
+                
+            except Exception as e:
+                logger.exception("Batch review job %s: item %s failed", batch_job_id, job_item.id)
+                local_db.rollback()
+                job_item.status = "failed"
+                job_item.completed_at = datetime.utcnow()
+                job_item.error_message = str(e)
+                failed_items += 1
+                local_db.commit()
+            finally:
+                if lease is not None:
+                    cache_service.release_lease("review", job_item.item_id, lease)
+        
+        # Обновляем статус задачи
+        batch_job.status = "completed"
+        batch_job.completed_at = datetime.utcnow()
+        batch_job.job_data = {
+            "total_items": total_items,
+            "processed_items": processed_items,
+            "failed_items": failed_items,
+            "reused_reviews": reused_reviews
+        }
+        local_db.commit()
+        
+        return {
+            "batch_job_id": batch_job_id,
+            "status": "completed",
+            "total_items": total_items,
+            "processed_items": processed_items,
+            "failed_items": failed_items,
+            "reused_reviews": reused_reviews
+        }
+        
+    except Exception as e:
+        if 'batch_job' in locals():
+            batch_job.status = "failed"
+            batch_job.completed_at = datetime.utcnow()
+            batch_job.error_message = str(e)
+            local_db.commit()
+        
+        return {"error": str(e), "batch_job_id": batch_job_id}
+    finally:
+        # Закрываем локальную сессию только если мы её создали
+        if not db:
+            local_db.close()
+
+
 @router.post("/analyze", status_code=status.HTTP_200_OK)
 def create_batch_analyze_job(
     chapter_ids: List[int],
@@ -462,6 +654,59 @@ def create_batch_translate_job(
     }
 
 
+@router.post("/review", status_code=status.HTTP_200_OK)
+def create_batch_review_job(
+    chapter_ids: List[int],
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+) -> dict:
+    """Создать задачу пакетного рецензирования переводов глав."""
+    if not chapter_ids:
+        raise HTTPException(status_code=400, detail="No chapter IDs provided")
+    
+    # Проверяем, что все главы существуют
+    chapters = db.query(Chapter).filter(Chapter.id.in_(chapter_ids)).all()
+    if len(chapters) != len(chapter_ids):
+        raise HTTPException(status_code=404, detail="Some chapters not found")
+    
+    # Получаем project_id из первой главы (все главы должны быть из одного проекта)
+    project_id = chapters[0].project_id
+    
+    # Создаем задачу
+    batch_job = BatchJob(
+        project_id=project_id,
+        job_type="review",
+        status="pending",
+        total_items=len(chapter_ids),
+        created_at=datetime.utcnow()
+    )
+    db.add(batch_job)
+    db.commit()
+    
+    # Создаем элементы задачи
+    for chapter_id in chapter_ids:
+        job_item = BatchJobItem(
+            project_id=project_id,
+            batch_job_id=batch_job.id,
+            item_type="chapter",
+            item_id=chapter_id,
+            status="pending"
+        )
+        db.add(job_item)
+    
+    db.commit()
+    
+    # Запускаем обработку в фоне
+    background_tasks.add_task(process_batch_review_sync, batch_job.id)
+    
+    return {
+        "batch_job_id": batch_job.id,
+        "status": "pending",
+        "total_items": len(chapter_ids),
+        "message": "Batch review job created"
+    }
+
+
 @router.get("/jobs/{job_id}")
 def get_batch_job_status(job_id: int, db: Session = Depends(get_db)) -> dict:
     """Получить статус пакетной задачи."""
@@ -7,7 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 
 from app.deps import get_db
-from app.models.glossary import GlossaryTerm, TermStatus, TermCategory, TermRelationship, GlossaryVersion
+from app.models.glossary import GlossaryTerm, TermStatus, TermCategory, TermRelationship, TermOccurrence, GlossaryVersion
 from app.schemas.glossary import (
     GlossaryTermCreate, 
     GlossaryTermRead, 
@@ -18,11 +18,42 @@ from app.schemas.glossary import (
     GlossaryVersionRead
 )
 from app.services.cache_service import cache_service
+from app.services.async_cache_service import async_cache_service
+from app.services.cache_warmer import cache_warmer
 from app.services.gemini_client import gemini_client
+from app.services.term_index import term_index
 
 router = APIRouter()
 
 
+def _load_glossary_snapshot(project_id: int) -> list:
+    """Все термины проекта (для кэша). Открывает собственную сессию: может вызываться из фонового обновителя."""
+    from app.db import SessionLocal
+    db = SessionLocal()
+    try:
+        terms = db.query(GlossaryTerm).filter(GlossaryTerm.project_id == project_id).order_by(GlossaryTerm.id.asc()).all()
+        return [GlossaryTermRead.model_validate(term).model_dump(mode="json") for term in terms]
+    finally:
+        db.close()
+
+
+def _invalidate_term_chapters(chapter_ids) -> None:
+    """Кэш переводов только тех глав, где встречается термин: остальные от него не зависят."""
+    if chapter_ids:
+        cache_service.invalidate_translation_caches(chapter_ids)
+
+
+def _load_relationships_snapshot(project_id: int) -> list:
+    """Все связи проекта (для кэша)."""
+    from app.db import SessionLocal
+    db = SessionLocal()
+    try:
+        relationships = db.query(TermRelationship).filter(TermRelationship.project_id == project_id).all()
+        return [TermRelationshipRead.model_validate(rel).model_dump(mode="json") for rel in relationships]
+    finally:
+        db.close()
+
+
 @router.get("/terms/{project_id}", response_model=List[GlossaryTermRead])
 def get_glossary_terms(
     project_id: int,
@@ -34,6 +65,9 @@ def get_glossary_terms(
     order: str = Query(default="asc")
 ) -> List[GlossaryTerm]:
     """Получить все термины глоссария для проекта с пагинацией/поиском/сортировкой."""
+    if not search and not offset and not limit and sort_by == "id" and order.lower() == "asc":
+        # Полный список без фильтров – из кэша с фоновым обновлением
+        return cache_service.get_glossary_swr(project_id, lambda: _load_glossary_snapshot(project_id))
     q = db.query(GlossaryTerm).filter(GlossaryTerm.project_id == project_id)
     if search:
         s = f"%{search}%"
@@ -99,6 +133,29 @@ def get_glossary_term_details(term_id: int, db: Session = Depends(get_db)) -> Gl
     return db_term
 
 
+@router.get("/terms/{term_id}/occurrences")
+def get_term_occurrences(
+    term_id: int,
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=20, ge=1, le=200),
+    context_chars: int | None = Query(default=None, ge=0, le=500),
+    db: Session = Depends(get_db)
+) -> dict:
+    """Конкорданс термина: главы, где он встречается, число вхождений и фрагменты контекста."""
+    db_term = db.get(GlossaryTerm, term_id)
+    if not db_term:
+        raise HTTPException(status_code=404, detail="Term not found")
+    return {"success": True, "data": term_index.concordance(db, db_term, skip, limit, context_chars)}
+
+
+@router.post("/terms/{project_id}/reindex")
+def reindex_project_terms(project_id: int, db: Session = Depends(get_db)) -> dict:
+    """Перестроить индекс вхождений терминов проекта (для данных, созданных до индекса)."""
+    result = term_index.rebuild_project(db, project_id)
+    db.commit()
+    return {"success": True, "data": result}
+
+
 @router.post("/terms", response_model=GlossaryTermRead, status_code=status.HTTP_201_CREATED)
 def create_glossary_term(term: GlossaryTermCreate, db: Session = Depends(get_db)) -> GlossaryTerm:
     """Создать новый термин в глоссарии."""
@@ -118,6 +175,11 @@ def create_glossary_term(term: GlossaryTermCreate, db: Session = Depends(get_db)
     db.add(db_term)
     db.commit()
     db.refresh(db_term)
+    affected = term_index.index_terms(db, db_term.project_id, [db_term])
+    db.commit()
+    cache_service.invalidate_glossary_cache(db_term.project_id)
+    if db_term.status == TermStatus.APPROVED:
+        _invalidate_term_chapters(affected)
     return db_term
 
 
@@ -140,11 +202,22 @@ def update_glossary_term(term_id: int, term: GlossaryTermUpdate, db: Session = D
         if conflict:
             raise HTTPException(status_code=400, detail=f"Term '{new_source}' already exists in this project")
     
+    was_approved = db_term.status == TermStatus.APPROVED
+    source_changed = bool(new_source) and new_source != db_term.source_term
     for field, value in updates.items():
         setattr(db_term, field, value)
     
+    db.flush()
+    if source_changed:
+        # Главы, где был старый или есть новый вариант термина
+        affected = term_index.index_terms(db, db_term.project_id, [db_term])
+    else:
+        affected = term_index.chapters_for_terms(db, [term_id])
     db.commit()
     db.refresh(db_term)
+    cache_service.invalidate_glossary_cache(db_term.project_id)
+    if was_approved or db_term.status == TermStatus.APPROVED:
+        _invalidate_term_chapters(affected)
     return db_term
 
 
@@ -155,8 +228,15 @@ def delete_glossary_term(term_id: int, db: Session = Depends(get_db)):
     if not db_term:
         raise HTTPException(status_code=404, detail="Term not found")
     
+    project_id = db_term.project_id
+    was_approved = db_term.status == TermStatus.APPROVED
+    affected = term_index.chapters_for_terms(db, [term_id])
+    db.query(TermOccurrence).filter(TermOccurrence.term_id == term_id).delete(synchronize_session=False)
     db.delete(db_term)
     db.commit()
+    cache_service.invalidate_glossary_cache(project_id)
+    if was_approved:
+        _invalidate_term_chapters(affected)
 
 
 @router.post("/terms/{term_id}/approve", response_model=GlossaryTermRead)
@@ -170,6 +250,8 @@ def approve_glossary_term(term_id: int, db: Session = Depends(get_db)) -> Glossa
     db_term.approved_at = datetime.utcnow()
     db.commit()
     db.refresh(db_term)
+    cache_service.invalidate_glossary_cache(db_term.project_id)
+    _invalidate_term_chapters(term_index.chapters_for_terms(db, [term_id]))
     return db_term
 
 
@@ -180,18 +262,21 @@ def reject_glossary_term(term_id: int, db: Session = Depends(get_db)) -> Glossar
     if not db_term:
         raise HTTPException(status_code=404, detail="Term not found")
     
+    was_approved = db_term.status == TermStatus.APPROVED
     db_term.status = TermStatus.REJECTED
     db_term.approved_at = datetime.utcnow()
     db.commit()
     db.refresh(db_term)
+    cache_service.invalidate_glossary_cache(db_term.project_id)
+    if was_approved:
+        _invalidate_term_chapters(term_index.chapters_for_terms(db, [term_id]))
     return db_term
 
 
 @router.get("/relationships/{project_id}", response_model=List[TermRelationshipRead])
 def get_term_relationships(project_id: int, db: Session = Depends(get_db)) -> List[TermRelationship]:
-    """Получить связи между терминами для проекта."""
-    relationships = db.query(TermRelationship).filter(TermRelationship.project_id == project_id).all()
-    return relationships
+    """Получить связи между терминами для проекта (из кэша с фоновым обновлением)."""
+    return cache_service.get_relationships_swr(project_id, lambda: _load_relationships_snapshot(project_id))
 
 
 @router.post("/relationships", response_model=TermRelationshipRead, status_code=status.HTTP_201_CREATED)
@@ -201,6 +286,7 @@ def create_term_relationship(relationship: TermRelationshipCreate, db: Session =
     db.add(db_relationship)
     db.commit()
     db.refresh(db_relationship)
+    cache_service.invalidate_relationships_cache(db_relationship.project_id)
     return db_relationship
 
 
@@ -265,7 +351,10 @@ def restore_glossary_version(version_id: int, db: Session = Depends(get_db)) ->
     if not db_version:
         raise HTTPException(status_code=404, detail="Version not found")
     
-    # Удаляем все существующие термины проекта
+    # Удаляем все существующие термины проекта (и их вхождения)
+    previous_terms = [term_id for (term_id,) in db.query(GlossaryTerm.id).filter(GlossaryTerm.project_id == db_version.project_id)]
+    affected = term_index.chapters_for_terms(db, previous_terms)
+    db.query(TermOccurrence).filter(TermOccurrence.project_id == db_version.project_id).delete(synchronize_session=False)
     db.query(GlossaryTerm).filter(GlossaryTerm.project_id == db_version.project_id).delete()
     
     # Восстанавливаем термины из версии
@@ -283,7 +372,11 @@ def restore_glossary_version(version_id: int, db: Session = Depends(get_db)) ->
         db.add(term)
         restored_terms.append(term)
     
+    db.flush()
+    affected |= term_index.index_terms(db, db_version.project_id, restored_terms)
     db.commit()
+    cache_service.invalidate_glossary_cache(db_version.project_id)
+    _invalidate_term_chapters(affected)
     return restored_terms
 
 
@@ -296,14 +389,62 @@ def get_gemini_api_usage():
 
 
 @router.get("/cache-stats")
-def get_cache_stats():
+async def get_cache_stats():
     """Получить статистику кэширования."""
     cache_info = {"cache_service_available": True, "timestamp": datetime.utcnow().isoformat()}
     test_key = "cache_ping"
-    ok_set = cache_service.set(test_key, "1", ttl=10)
+    # Асинхронный клиент: проверка не занимает поток пула на время round trip
+    ok_set = await async_cache_service.set(test_key, "1", ttl=10)
     # 'тихий' get, без логов даже при отвале
-    val = cache_service.get_quiet(test_key)
+    val = await async_cache_service.get_quiet(test_key)
     ok_get = (val == 1) or (val == "1")
-    ok_del = cache_service.delete(test_key)
+    ok_del = await async_cache_service.delete(test_key)
     cache_info["cache_working"] = bool(ok_set and ok_get and ok_del)
+    # Hit ratio отдельно для in-process L1 и Redis L2
+    cache_info["tiers"] = cache_service.get_tier_stats()
+    cache_info["codec"] = cache_service.get_codec_stats()
+    cache_info["swr"] = cache_service.get_swr_stats()
     return {"success": True, "data": cache_info}
+
+
+@router.get("/cache-metrics")
+def get_cache_metrics(namespace: str | None = Query(default=None)):
+    """Метрики кэша по пространствам: попадания, промахи, ошибки, REST → TCP, трафик, задержки."""
+    namespaces = cache_service.get_cache_metrics()
+    if namespace:
+        namespaces = {namespace: namespaces.get(namespace, {})}
+    return {
+        "success": True,
+        "data": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "transport": "rest" if cache_service.rest_client else "tcp",
+            "transports": cache_service.get_transport_stats(),
+            "breaker": cache_service.get_breaker_stats(),
+            "namespaces": namespaces,
+            "tiers": cache_service.get_tier_stats(),
+            "codec": cache_service.get_codec_stats(),
+            "swr": cache_service.get_swr_stats(),
+        },
+    }
+
+
+@router.post("/cache-warm")
+def warm_cache(
+    project_id: int | None = Query(default=None),
+    time_budget: float | None = Query(default=None, gt=0, le=300),
+    max_bytes: int | None = Query(default=None, gt=0)
+):
+    """Прогреть кэш глоссария, связей, саммари и переводов (по умолчанию – недавно активные проекты)."""
+    report = cache_warmer.warm(
+        project_ids=[project_id] if project_id is not None else None,
+        time_budget=time_budget,
+        max_bytes=max_bytes
+    )
+    return {"success": True, "data": report}
+
+
+@router.post("/cache-sweep")
+def sweep_cache(namespace: str = Query(default="translation"), max_keys: int = Query(default=10000, gt=0, le=100000)):
+    """Удалить записи устаревших поколений кэша (освобождение памяти Redis)."""
+    result = cache_service.sweep_stale_generations(namespace, max_keys=max_keys)
+    return {"success": True, "data": result}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query
 from sqlalchemy.orm import Session
 from datetime import datetime
 
@@ -8,13 +8,24 @@ from app.core.nlp_pipeline.term_extractor import term_extractor
 from app.core.nlp_pipeline.relationship_analyzer import relationship_analyzer
 from app.core.nlp_pipeline.context_summarizer import context_summarizer
 from app.models.glossary import GlossaryTerm, TermStatus, TermCategory, TermRelationship
-from app.services.cache_service import cache_service
+from app.services.cache_service import cache_service, LeaseHeldError
+from app.services.term_index import term_index
 
 router = APIRouter()
 
 
-def process_chapter_sync(chapter_id: int, db: Session = None):
-    """Синхронная обработка главы для извлечения терминов."""
+def process_chapter_sync(chapter_id: int, db: Session = None, wait: float = 0):
+    """Синхронная обработка главы для извлечения терминов.
+
+    Выполняется под арендой: параллельный анализ той же главы дублировал бы термины.
+    """
+    try:
+        return cache_service.run_exclusive("analyze", chapter_id, lambda: _process_chapter(chapter_id, db), wait=wait)
+    except LeaseHeldError as e:
+        return {"error": str(e), "chapter_id": chapter_id, "lease": e.detail()}
+
+
+def _process_chapter(chapter_id: int, db: Session = None):
     # Открываем новую сессию для фоновой задачи
     from app.db import SessionLocal
     local_db = db or SessionLocal()
@@ -122,11 +133,24 @@ def process_chapter_sync(chapter_id: int, db: Session = None):
         chapter.summary = chapter_summary
         chapter.processed_at = datetime.utcnow()
         
+        # Индексируем вхождения новых терминов по главам проекта
+        affected_chapters = set()
+        if saved_terms:
+            local_db.flush()
+            term_index.index_terms(local_db, chapter.project_id, saved_terms)
+            affected_chapters = term_index.chapters_for_terms(
+                local_db, [term.id for term in saved_terms if term.status == TermStatus.APPROVED]
+            )
+        
         # Сохраняем все изменения
         local_db.commit()
         
-        # Инвалидируем кэш глоссария для проекта
+        # Инвалидируем кэш глоссария и связей для проекта
         cache_service.invalidate_glossary_cache(chapter.project_id)
+        cache_service.invalidate_relationships_cache(chapter.project_id)
+        # и переводов глав, где встречаются новые утвержденные термины
+        if affected_chapters:
+            cache_service.invalidate_translation_caches(affected_chapters)
         
         return {
             "chapter_id": chapter_id,
@@ -151,7 +175,8 @@ def process_chapter_sync(chapter_id: int, db: Session = None):
 def analyze_chapter(
     chapter_id: int, 
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    wait: float = Query(default=0, ge=0, le=300, description="Seconds to wait for an analysis already in progress")
 ) -> dict:
     """Запустить анализ главы для извлечения терминов (синхронно)."""
     # Проверяем, что глава существует
@@ -160,8 +185,10 @@ def analyze_chapter(
         raise HTTPException(status_code=404, detail="Chapter not found")
     
     # Выполняем анализ синхронно
-    result = process_chapter_sync(chapter_id, db)
+    result = process_chapter_sync(chapter_id, db, wait=wait)
     
+    if "lease" in result:
+        raise HTTPException(status_code=409, detail=result["lease"])
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
     
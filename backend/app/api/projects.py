@@ -6,14 +6,20 @@ from sqlalchemy import func
 
 from app.deps import get_db
 from app.models.project import Project, Chapter
+from app.models.glossary import TermOccurrence
+from app.models.translation import TranslationMemoryEntry, TranslationReview
 from app.schemas.project import ProjectCreate, ProjectRead, ChapterCreate, ChapterRead, ChapterUpdate
+from app.core.alignment import infer_alignment, load_segments
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.project_summary import project_summary_service
+from app.services.term_index import term_index
 import io
 try:
     import PyPDF2
 except Exception:
     PyPDF2 = None
 
-from app.core.nlp_pipeline.context_summarizer import context_summarizer
 import re
 
 router = APIRouter()
@@ -53,9 +59,14 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Project not found")
 
     # Явно удаляем зависимые сущности, чтобы избежать обращения к отсутствующим колонкам
-    from app.models.glossary import GlossaryTerm, TermRelationship, GlossaryVersion, BatchJob, BatchJobItem
+    from app.models.glossary import GlossaryTerm, TermRelationship, TermOccurrence, GlossaryVersion, BatchJob, BatchJobItem
     from app.models.project import Chapter
 
+    chapter_ids = [chapter_id for (chapter_id,) in db.query(Chapter.id).filter(Chapter.project_id == project_id).all()]
+
+    db.query(TermOccurrence).filter(TermOccurrence.project_id == project_id).delete(synchronize_session=False)
+    db.query(TranslationReview).filter(TranslationReview.project_id == project_id).delete(synchronize_session=False)
+    db.query(TranslationMemoryEntry).filter(TranslationMemoryEntry.project_id == project_id).delete(synchronize_session=False)
     db.query(TermRelationship).filter(TermRelationship.project_id == project_id).delete(synchronize_session=False)
     db.query(GlossaryTerm).filter(GlossaryTerm.project_id == project_id).delete(synchronize_session=False)
     db.query(GlossaryVersion).filter(GlossaryVersion.project_id == project_id).delete(synchronize_session=False)
@@ -67,6 +78,18 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
     db.delete(project)
     db.commit()
 
+    # Снимки глоссария и связей (stale-while-revalidate), саммари и переводы глав
+    # иначе отдавались бы читателям до истечения TTL
+    cache_service.delete_many(
+        [
+            cache_service.get_glossary_cache_key(project_id),
+            cache_service.get_relationships_cache_key(project_id),
+        ]
+        + [cache_service.get_summary_cache_key(chapter_id) for chapter_id in chapter_ids]
+    )
+    if chapter_ids:
+        cache_service.invalidate_translation_caches(chapter_ids)
+
 
 # Главы
 @router.get("/{project_id}/chapters", response_model=List[ChapterRead])
@@ -126,6 +149,8 @@ def create_chapter(
     db.add(chapter)
     db.commit()
     db.refresh(chapter)
+    term_index.index_chapter(db, chapter)
+    db.commit()
     return chapter
 
 
@@ -178,6 +203,8 @@ def create_chapter_from_file(
     db.add(chapter)
     db.commit()
     db.refresh(chapter)
+    term_index.index_chapter(db, chapter)
+    db.commit()
     return chapter
 
 
@@ -253,6 +280,9 @@ def upload_chapters_from_file(
                 db.add(chapter)
                 created_chapters.append(chapter)
         
+        db.flush()
+        for chapter in created_chapters:
+            term_index.index_chapter(db, chapter)
         db.commit()
         
         return {
@@ -360,8 +390,12 @@ def delete_chapter(chapter_id: int, db: Session = Depends(get_db)):
     if not chapter:
         raise HTTPException(status_code=404, detail="Chapter not found")
     
+    db.query(TermOccurrence).filter(TermOccurrence.chapter_id == chapter_id).delete(synchronize_session=False)
+    db.query(TranslationReview).filter(TranslationReview.chapter_id == chapter_id).delete(synchronize_session=False)
     db.delete(chapter)
     db.commit()
+    cache_service.invalidate_summary_cache(chapter_id)
+    cache_service.invalidate_translation_cache(chapter_id)
 
 
 @router.put("/chapters/{chapter_id}", response_model=ChapterRead)
@@ -372,8 +406,20 @@ def update_chapter(chapter_id: int, payload: ChapterUpdate, db: Session = Depend
         raise HTTPException(status_code=404, detail="Chapter not found")
 
     updates = payload.dict(exclude_unset=True)
+    source_changed = "original_text" in updates and updates["original_text"] != chapter.original_text
+    target_changed = "translated_text" in updates and updates["translated_text"] != chapter.translated_text
+    if source_changed and not target_changed and chapter.translated_text:
+        # Запоминаем, каким абзацам прежнего оригинала соответствует перевод:
+        # следующий перевод главы затронет только измененные абзацы
+        if load_segments(chapter.alignment, chapter.translated_text) is None:
+            chapter.alignment = infer_alignment(chapter.original_text, chapter.translated_text, chapter.alignment)
     for field, value in updates.items():
         setattr(chapter, field, value)
+    if target_changed and load_segments(chapter.alignment, chapter.translated_text) is None:
+        # Ручная правка перевода поменяла разбивку на абзацы
+        chapter.alignment = infer_alignment(chapter.original_text, chapter.translated_text, chapter.alignment)
+    if source_changed:
+        term_index.index_chapter(db, chapter)
 
     db.commit()
     db.refresh(chapter)
@@ -382,43 +428,37 @@ def update_chapter(chapter_id: int, payload: ChapterUpdate, db: Session = Depend
 
 # API для создания общего саммари проекта
 @router.post("/{project_id}/generate-summary")
-def generate_project_summary(project_id: int, db: Session = Depends(get_db)) -> dict:
-    """Создать общее саммари проекта на основе всех глав."""
+def generate_project_summary(
+    project_id: int,
+    force: bool = Query(default=False, description="Regenerate even if chapter summaries have not changed"),
+    db: Session = Depends(get_db)
+) -> dict:
+    """Общее саммари проекта на основе саммари глав (хранится в проекте)."""
     # Проверяем, что проект существует
     project = db.get(Project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Получаем все главы проекта с саммари
-    chapters = db.query(Chapter).filter(
+    # Главы проекта с саммари
+    chapters_used = db.query(func.count(Chapter.id)).filter(
         Chapter.project_id == project_id,
         Chapter.summary.isnot(None)
-    ).order_by(Chapter.id).all()
+    ).scalar()
     
-    if not chapters:
+    if not chapters_used:
         raise HTTPException(
             status_code=400, 
             detail="No chapters with summaries found. Please analyze chapters first."
         )
     
     try:
-        # Подготавливаем данные для создания саммари
-        chapters_data = [
-            {
-                "title": chapter.title,
-                "summary": chapter.summary,
-                "original_text": chapter.original_text
-            }
-            for chapter in chapters
-        ]
-        
-        # Создаем общее саммари
-        project_summary = context_summarizer.create_project_summary(chapters_data)
+        # Пересобирается, только если изменились саммари глав (или force)
+        project_summary = project_summary_service.get(db, project_id, min_chapters=1, force=force)
         
         return {
             "project_id": project_id,
             "summary": project_summary,
-            "chapters_used": len(chapters),
+            "chapters_used": min(chapters_used, settings.PROJECT_SUMMARY_MAX_CHAPTERS),
             "message": "Project summary generated successfully"
         }
         
@@ -1,45 +1,81 @@
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 
 from app.deps import get_db
 from app.models.project import Chapter
 from app.models.glossary import GlossaryTerm, TermStatus
+from app.models.translation import TranslationReview
+from app.core.alignment import aligned_units, join_blocks, paragraph_blocks, paragraph_spans, paragraphs
+from app.core.config import settings
+from app.core.glossary_checker import glossary_checker
 from app.core.translation_engine import translation_engine
-from app.services.cache_service import cache_service
+from app.services.async_cache_service import async_cache_service
+from app.services.cache_service import cache_service, LeaseHeldError
+from app.services.project_summary import project_summary_service
+from app.services.translation_memory import translation_memory
+from app.services.translation_review import translation_hash, translation_review_service
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.post("/chapters/{chapter_id}/translate", status_code=status.HTTP_200_OK)
-def translate_chapter(
+async def translate_chapter(
     chapter_id: int,
     db: Session = Depends(get_db),
-    use_glossary: bool = Query(default=True)
+    use_glossary: bool = Query(default=True),
+    wait: float = Query(default=0, ge=0, le=300, description="Seconds to wait for a translation already in progress")
 ) -> dict:
-    """Перевести главу с использованием утвержденного глоссария и контекста."""
-    # Получаем главу
-    chapter = db.get(Chapter, chapter_id)
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    # Получаем утвержденные термины глоссария для проекта (pending не блокируют перевод)
-    glossary_terms = db.query(GlossaryTerm).filter(
-        GlossaryTerm.project_id == chapter.project_id,
-        GlossaryTerm.status == TermStatus.APPROVED
-    ).all()
-    
+    """Перевести главу с использованием утвержденного глоссария и контекста.
+
+    Асинхронная ручка: ожидание чужой аренды (wait) не занимает поток пула,
+    а запросы к БД и LLM выполняются в потоке.
+    """
+    def load() -> tuple:
+        # Получаем главу
+        chapter = db.get(Chapter, chapter_id)
+        if not chapter:
+            raise HTTPException(status_code=404, detail="Chapter not found")
+
+        # Получаем утвержденные термины глоссария для проекта (pending не блокируют перевод)
+        glossary_terms = db.query(GlossaryTerm).filter(
+            GlossaryTerm.project_id == chapter.project_id,
+            GlossaryTerm.status == TermStatus.APPROVED
+        ).all()
+        return chapter, glossary_terms
+
+    chapter, glossary_terms = await run_in_threadpool(load)
     try:
-        # Проверяем кэш перевода
-        glossary_hash = cache_service.generate_glossary_hash([
-            {
-                "source_term": term.source_term,
-                "translated_term": term.translated_term,
-                "category": term.category
-            }
-            for term in glossary_terms
-        ])
+        # Повторный клик или ретрай фронтенда не запускает второй перевод той же главы
+        return await async_cache_service.run_exclusive(
+            "translate",
+            chapter_id,
+            lambda: _translate_chapter(chapter, glossary_terms, use_glossary, db),
+            wait=wait
+        )
+    except LeaseHeldError as e:
+        raise HTTPException(status_code=409, detail=e.detail())
+
+
+def _translate_chapter(chapter: Chapter, glossary_terms: list, use_glossary: bool, db: Session) -> dict:
+    chapter_id = chapter.id
+    try:
+        # Общее саммари проекта (из БД; пересобирается, только если изменились саммари глав)
+        project_summary = project_summary_service.get(db, chapter.project_id)
+        
+        # Проверяем кэш перевода: адрес зависит только от того, что влияет на перевод этой главы
+        fingerprint = translation_engine.cache_fingerprint(
+            chapter.original_text,
+            glossary_terms if use_glossary else [],
+            chapter.summary,
+            project_summary=project_summary
+        )
         
-        cached_translation = cache_service.get_cached_translation(chapter.id, glossary_hash)
+        cached_translation = cache_service.get_cached_translation(chapter.id, fingerprint)
         if cached_translation:
             # Возвращаем кэшированный перевод
             return {
@@ -47,45 +83,32 @@ def translate_chapter(
                 "translated_text": cached_translation,
                 "glossary_terms_used": len(glossary_terms) if use_glossary else 0,
                 "context_used": bool(chapter.summary),
-                "project_context_used": False,  # Кэш не содержит project context
+                "project_context_used": bool(project_summary),
                 "message": "Translation retrieved from cache",
                 "cached": True
             }
         
-        # Получаем общее саммари проекта (если есть)
-        project_summary = None
-        project_chapters = db.query(Chapter).filter(
-            Chapter.project_id == chapter.project_id,
-            Chapter.summary.isnot(None)
-        ).order_by(Chapter.id).all()
-        
-        if len(project_chapters) > 1:  # Если есть несколько глав с саммари
-            # Создаем краткое общее саммари
-            from app.core.nlp_pipeline.context_summarizer import context_summarizer
-            chapters_data = [
-                {
-                    "title": ch.title,
-                    "summary": ch.summary,
-                    "original_text": ch.original_text
-                }
-                for ch in project_chapters[:5]  # Берем первые 5 глав
-            ]
-            project_summary = context_summarizer.create_project_summary(chapters_data)
-        
-        # Переводим текст
-        translated_text = translation_engine.translate_with_glossary(
+        # Переводим текст (после правок оригинала – только измененные абзацы)
+        result = translation_engine.translate_chapter(
             text=chapter.original_text,
             glossary_terms=glossary_terms if use_glossary else [],
             context_summary=chapter.summary,
-            project_summary=project_summary
+            project_summary=project_summary,
+            db=db,
+            project_id=chapter.project_id,
+            previous_translation=chapter.translated_text,
+            previous_alignment=chapter.alignment
         )
+        translated_text = result["translated_text"]
         
-        # Сохраняем перевод в БД
+        # Сохраняем перевод и его выравнивание по абзацам в БД
+        # (с адресом в кэше: по нему прогрев кэша понимает, что перевод актуален)
         chapter.translated_text = translated_text
+        chapter.alignment = dict(result["alignment"], fingerprint=fingerprint)
         db.commit()
         
         # Кэшируем результат перевода
-        cache_service.cache_translation(chapter.id, glossary_hash, translated_text)
+        cache_service.cache_translation(chapter.id, fingerprint, translated_text)
         
         return {
             "chapter_id": chapter_id,
@@ -94,7 +117,10 @@ def translate_chapter(
             "context_used": bool(chapter.summary),
             "project_context_used": bool(project_summary),
             "message": "Translation completed successfully",
-            "cached": False
+            "cached": False,
+            "incremental": result["incremental"],
+            # Токены промптов и что из контекста сокращено под бюджет
+            "prompt": result["prompt"]
         }
         
     except Exception as e:
@@ -109,9 +135,86 @@ def translate_chapter(
         )
 
 
+def _slice_translation(original_text: str, translated_text: str, alignment: dict | None, first: int, last: int) -> tuple:
+    """Перевод абзацев [first, last) из перевода всей главы по выравниванию.
+
+    Диапазон расширяется до границ выровненных групп абзацев.
+    Returns: (first, last, перевод отрывка)
+    """
+    units = [
+        unit for unit in aligned_units(original_text, translated_text, alignment)
+        if unit["source"][0] < last and unit["source"][1] > first
+    ]
+    if not units:
+        return first, last, ""
+    target_blocks = paragraph_blocks(translated_text)
+    return (
+        units[0]["source"][0],
+        units[-1]["source"][1],
+        join_blocks(target_blocks[units[0]["target"][0]:units[-1]["target"][1]])
+    )
+
+
+# Адреса переводов отрывков в пространстве translation (см. _preview_range)
+PREVIEW_FINGERPRINT_PREFIX = "preview:"
+
+
+def _preview_range(chapter: Chapter, glossary_terms: list, first: int, last: int, db: Session) -> dict:
+    """Перевод абзацев [first, last) главы: из сохраненного перевода, из кэша или через LLM."""
+    original_text = chapter.original_text
+    # Адрес перевода всей главы: оригинал, термины, саммари главы и проекта, модель, промпт
+    project_summary = project_summary_service.get(db, chapter.project_id)
+    full_fingerprint = translation_engine.cache_fingerprint(
+        original_text, glossary_terms, chapter.summary, project_summary=project_summary
+    )
+
+    # 1. Сохраненный перевод всей главы, полученный для тех же входных данных
+    if chapter.translated_text and (chapter.alignment or {}).get("fingerprint") == full_fingerprint:
+        first, last, translated = _slice_translation(original_text, chapter.translated_text, chapter.alignment, first, last)
+        return {"first": first, "last": last, "translated_text": translated, "source": "stored", "project_summary": None}
+
+    # 2. Кэшированный перевод всей главы (тот же адрес, что у настоящего перевода).
+    # Его выравнивания нет, поэтому отрывок вырезается только при совпадении числа
+    # абзацев (1:1) или если запрошена вся глава, иначе переводится сам отрывок
+    cached_full = cache_service.get_cached_translation(chapter.id, full_fingerprint)
+    if cached_full:
+        sliced_first, sliced_last, translated = _slice_translation(original_text, cached_full, None, first, last)
+        if (sliced_first, sliced_last) == (first, last):
+            return {"first": first, "last": last, "translated_text": translated, "source": "cache", "project_summary": None}
+
+    # 3. Только нужный отрывок: адрес в кэше от его текста и предшествующего контекста
+    blocks = paragraph_blocks(original_text)
+    excerpt = join_blocks(blocks[first:last])
+    previous_tail = ""
+    if first > 0 and settings.TRANSLATION_CHUNK_TAIL_CHARS > 0:
+        context_start = max(0, first - settings.TRANSLATION_INCREMENTAL_CONTEXT_PARAGRAPHS)
+        previous_tail = "\n".join(p for p, _ in blocks[context_start:first])[-settings.TRANSLATION_CHUNK_TAIL_CHARS:]
+    # Отрывок переводится без памяти переводов и с другим контекстом, чем глава целиком,
+    # поэтому даже для всей главы он хранится под отдельным адресом: иначе настоящий
+    # перевод главы мог бы получить из кэша результат предпросмотра
+    fingerprint = PREVIEW_FINGERPRINT_PREFIX + translation_engine.cache_fingerprint(
+        excerpt, glossary_terms, chapter.summary, previous_tail, project_summary
+    )
+    cached = cache_service.get_cached_translation(chapter.id, fingerprint)
+    if cached:
+        return {"first": first, "last": last, "translated_text": cached, "source": "cache", "project_summary": None}
+
+    translated = translation_engine.translate_excerpt(
+        excerpt, glossary_terms, chapter.summary, project_summary, previous_tail
+    )
+    cache_service.cache_translation(chapter.id, fingerprint, translated)
+    return {"first": first, "last": last, "translated_text": translated, "source": "llm", "project_summary": project_summary}
+
+
 @router.get("/chapters/{chapter_id}/translation-preview")
-def preview_translation(chapter_id: int, db: Session = Depends(get_db)) -> dict:
-    """Предварительный просмотр перевода (без сохранения)."""
+def preview_translation(
+    chapter_id: int,
+    start: int | None = Query(default=None, ge=0, description="Start of the range: paragraph index, or character offset with unit=char"),
+    end: int | None = Query(default=None, ge=0, description="End of the range (exclusive)"),
+    unit: str = Query(default="paragraph", pattern="^(paragraph|char)$"),
+    db: Session = Depends(get_db)
+) -> dict:
+    """Предварительный просмотр перевода главы или ее отрывка (без сохранения)."""
     # Получаем главу
     chapter = db.get(Chapter, chapter_id)
     if not chapter:
@@ -131,49 +234,41 @@ def preview_translation(chapter_id: int, db: Session = Depends(get_db)) -> dict:
             "glossary_terms_count": 0
         }
     
+    # Диапазон абзацев [first, last); символьный диапазон – по абзацам, которые он задевает
+    total = len(paragraphs(chapter.original_text))
+    if unit == "char":
+        spans = paragraph_spans(chapter.original_text)
+        char_end = end if end is not None else len(chapter.original_text)
+        touched = [i for i, (span_start, span_end) in enumerate(spans) if span_start < char_end and span_end > (start or 0)]
+        first, last = (touched[0], touched[-1] + 1) if touched else (0, 0)
+    else:
+        first = start or 0
+        last = min(end, total) if end is not None else total
+    if first >= last:
+        raise HTTPException(status_code=400, detail=f"Empty range (chapter has {total} paragraphs)")
+    
     try:
-        # Получаем общее саммари проекта (если есть)
-        project_summary = None
-        project_chapters = db.query(Chapter).filter(
-            Chapter.project_id == chapter.project_id,
-            Chapter.summary.isnot(None)
-        ).order_by(Chapter.id).all()
-        
-        if len(project_chapters) > 1:
-            from app.core.nlp_pipeline.context_summarizer import context_summarizer
-            chapters_data = [
-                {
-                    "title": ch.title,
-                    "summary": ch.summary,
-                    "original_text": ch.original_text
-                }
-                for ch in project_chapters[:5]
-            ]
-            project_summary = context_summarizer.create_project_summary(chapters_data)
-        
-        # Создаем предварительный перевод
-        translated_text = translation_engine.translate_with_glossary(
-            text=chapter.original_text,
-            glossary_terms=glossary_terms,
-            context_summary=chapter.summary,
-            project_summary=project_summary
-        )
+        result = _preview_range(chapter, glossary_terms, first, last, db)
+        first, last = result["first"], result["last"]
+        excerpt = join_blocks(paragraph_blocks(chapter.original_text)[first:last])
         
         return {
             "chapter_id": chapter_id,
             "preview_available": True,
-            "original_text": chapter.original_text,
-            "translated_text": translated_text,
+            "range": {"unit": unit, "start": start, "end": end, "paragraphs": [first, last], "total_paragraphs": total},
+            "original_text": excerpt,
+            "translated_text": result["translated_text"],
+            "source": result["source"],
             "glossary_terms_count": len(glossary_terms),
             "context_used": bool(chapter.summary),
-            "project_context_used": bool(project_summary),
+            "project_context_used": bool(result["project_summary"]),
             "glossary_terms": [
                 {
                     "source_term": term.source_term,
                     "translated_term": term.translated_term,
                     "category": getattr(getattr(term, "category", None), "value", getattr(term, "category", None))
                 }
-                for term in glossary_terms
+                for term in translation_engine.relevant_terms(excerpt, glossary_terms)
             ]
         }
         
@@ -186,70 +281,132 @@ def preview_translation(chapter_id: int, db: Session = Depends(get_db)) -> dict:
         }
 
 
-@router.post("/chapters/{chapter_id}/review")
-def review_translation(
-    chapter_id: int,
-    db: Session = Depends(get_db)
-) -> dict:
-    """Запросить рецензирование перевода главы у LLM."""
-    # Получаем главу
+@router.get("/chapters/{chapter_id}/glossary-check")
+def check_glossary_compliance(chapter_id: int, db: Session = Depends(get_db)) -> dict:
+    """Отчет о соблюдении глоссария в переводе главы (по абзацам)."""
     chapter = db.get(Chapter, chapter_id)
     if not chapter:
         raise HTTPException(status_code=404, detail="Chapter not found")
-    
     if not chapter.translated_text:
-        raise HTTPException(
-            status_code=400, 
-            detail="Chapter has no translation to review"
-        )
-    
-    try:
-        # Получаем утвержденные термины глоссария
+        raise HTTPException(status_code=400, detail="Chapter has no translation to check")
+
+    glossary_terms = db.query(GlossaryTerm).filter(
+        GlossaryTerm.project_id == chapter.project_id,
+        GlossaryTerm.status == TermStatus.APPROVED
+    ).all()
+    report = glossary_checker.check(chapter.original_text, chapter.translated_text, chapter.alignment, glossary_terms)
+    return {"chapter_id": chapter_id, **report}
+
+
+@router.post("/chapters/{chapter_id}/glossary-check/fix")
+async def fix_glossary_violations(
+    chapter_id: int,
+    db: Session = Depends(get_db),
+    wait: float = Query(default=0, ge=0, le=300, description="Seconds to wait for a fix already in progress")
+) -> dict:
+    """Переспросить у LLM только абзацы с нарушениями глоссария и сохранить исправленный перевод."""
+    def load() -> tuple:
+        chapter = db.get(Chapter, chapter_id)
+        if not chapter:
+            raise HTTPException(status_code=404, detail="Chapter not found")
+        if not chapter.translated_text:
+            raise HTTPException(status_code=400, detail="Chapter has no translation to check")
+
         glossary_terms = db.query(GlossaryTerm).filter(
             GlossaryTerm.project_id == chapter.project_id,
             GlossaryTerm.status == TermStatus.APPROVED
         ).all()
-        
-        # Создаем промпт для рецензирования
-        review_prompt = f"""
-        Please conduct a stylistic and grammatical review of the translation from Russian to English.
-        
-        Original text (Russian):
-        {chapter.original_text[:1000]}...
-        
-        Current translation (English):
-        {chapter.translated_text}
-        
-        Approved glossary terms:
-        {chr(10).join([f"- {term.source_term} → {term.translated_term}" for term in glossary_terms[:10]])}
-        
-        Please analyze the translation and provide:
-        1. Overall translation quality score (1-10)
-        2. List of grammatical errors with corrections
-        3. Stylistic suggestions for improvement
-        4. Recommendations for using glossary terms
-        5. General improvement comments
-        
-        The response should be structured and specific.
-        """
-        
-        # Получаем рецензию от LLM
-        from app.services.gemini_client import gemini_client
-        review_text = gemini_client.complete(review_prompt)
-        
-        # Сохраняем рецензию в кэше (не в БД, так как это временные данные)
-        review_key = f"translation_review:{chapter_id}"
-        cache_service.set_cache(review_key, review_text, ttl=3600)  # 1 час
-        
+        return chapter, glossary_terms
+
+    chapter, glossary_terms = await run_in_threadpool(load)
+
+    def fix() -> dict:
+        try:
+            result = translation_engine.fix_glossary_violations(
+                chapter.original_text,
+                chapter.translated_text,
+                chapter.alignment,
+                glossary_terms,
+                context_summary=chapter.summary,
+                db=db,
+                project_id=chapter.project_id
+            )
+            if result["fixed"]:
+                # Исправленный перевод заменяет кэшированный по тому же адресу
+                fingerprint = translation_engine.cache_fingerprint(
+                    chapter.original_text, glossary_terms, chapter.summary,
+                    project_summary=project_summary_service.current(db, chapter.project_id)
+                )
+                chapter.translated_text = result["translated_text"]
+                chapter.alignment = dict(result["alignment"], fingerprint=fingerprint)
+                db.commit()
+                cache_service.cache_translation(chapter_id, fingerprint, result["translated_text"])
+        except Exception as e:
+            try:
+                db.rollback()
+            except Exception:
+                pass
+            raise HTTPException(status_code=502, detail=f"Glossary fix failed: {str(e)}")
         return {
             "chapter_id": chapter_id,
-            "review_available": True,
-            "review_text": review_text,
-            "glossary_terms_used": len(glossary_terms),
-            "message": "Translation review completed successfully"
+            "requests": result["requests"],
+            "fixed": result["fixed"],
+            "translated_text": result["translated_text"],
+            "before": result["before"],
+            "after": result["after"]
         }
-        
+
+    try:
+        # Повторный клик не переспрашивает те же абзацы второй раз
+        return await async_cache_service.run_exclusive("glossary_fix", chapter_id, fix, wait=wait)
+    except LeaseHeldError as e:
+        raise HTTPException(status_code=409, detail=e.detail())
+
+
+@router.post("/chapters/{chapter_id}/review")
+async def review_translation(
+    chapter_id: int,
+    wait: float = Query(default=0, ge=0, le=300, description="Seconds to wait for a review already in progress"),
+    db: Session = Depends(get_db)
+) -> dict:
+    """Отрецензировать перевод главы у LLM (целиком, по фрагментам).
+
+    Рецензия сохраняется по хэшу перевода: для неизмененного перевода
+    возвращается сохраненная. Для многих глав – задача /batch/review.
+    """
+    def load() -> Chapter:
+        chapter = db.get(Chapter, chapter_id)
+        if not chapter:
+            raise HTTPException(status_code=404, detail="Chapter not found")
+
+        if not chapter.translated_text:
+            raise HTTPException(
+                status_code=400,
+                detail="Chapter has no translation to review"
+            )
+        return chapter
+
+    chapter = await run_in_threadpool(load)
+
+    def review() -> dict:
+        glossary_terms = db.query(GlossaryTerm).filter(
+            GlossaryTerm.project_id == chapter.project_id,
+            GlossaryTerm.status == TermStatus.APPROVED
+        ).all()
+        stored, reused = translation_review_service.review(db, chapter, glossary_terms)
+        return dict(
+            translation_review_service.to_dict(stored),
+            review_available=True,
+            reused=reused,
+            glossary_terms_used=len(glossary_terms),
+        )
+
+    try:
+        return await async_cache_service.run_exclusive("review", chapter_id, review, wait=wait)
+    except LeaseHeldError as e:
+        raise HTTPException(status_code=409, detail=e.detail())
     except Exception as e:
+        logger.exception("Review of chapter %s failed", chapter_id)
         return {
             "chapter_id": chapter_id,
             "review_available": False,
@@ -258,22 +415,66 @@ def review_translation(
 
 
 @router.get("/chapters/{chapter_id}/review")
-def get_translation_review(chapter_id: int) -> dict:
-    """Получить рецензию перевода главы."""
-    # Проверяем кэш на наличие рецензии
-    review_key = f"translation_review:{chapter_id}"
-    review_text = cache_service.get_cache(review_key)
-    
-    if not review_text:
+def get_translation_review(chapter_id: int, db: Session = Depends(get_db)) -> dict:
+    """Сохраненная рецензия текущего перевода главы."""
+    chapter = db.get(Chapter, chapter_id)
+    if not chapter:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+
+    stored = translation_review_service.current(db, chapter)
+    if stored is None:
         return {
             "chapter_id": chapter_id,
             "review_available": False,
-            "message": "No review found. Please generate a review first."
+            "message": "No review found for the current translation. Please generate a review first."
         }
-    
+    return dict(translation_review_service.to_dict(stored), review_available=True)
+
+
+@router.get("/projects/{project_id}/reviews")
+def list_translation_reviews(
+    project_id: int,
+    min_score: float | None = Query(None, ge=1, le=10),
+    max_score: float | None = Query(None, ge=1, le=10),
+    include_stale: bool = Query(False, description="Включать рецензии прежних версий перевода"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+) -> dict:
+    """Рецензии глав проекта, худшие сначала (для разбора проблемных переводов)."""
+    current = db.query(Chapter.id, Chapter.translated_text).filter(
+        Chapter.project_id == project_id,
+        Chapter.translated_text.isnot(None)
+    ).all()
+    query = db.query(TranslationReview).filter(TranslationReview.project_id == project_id)
+    if not include_stale:
+        # Только рецензии текущих переводов: пары (глава, хэш перевода)
+        pairs = [(chapter_id, translation_hash(text)) for chapter_id, text in current]
+        if not pairs:
+            return {"project_id": project_id, "total": 0, "reviews": []}
+        query = query.filter(tuple_(TranslationReview.chapter_id, TranslationReview.translation_hash).in_(pairs))
+    if min_score is not None:
+        query = query.filter(TranslationReview.score >= min_score)
+    if max_score is not None:
+        query = query.filter(TranslationReview.score <= max_score)
+
+    total = query.count()
+    reviews = query.order_by(TranslationReview.score, TranslationReview.min_score, TranslationReview.chapter_id)\
+        .offset(skip).limit(limit).all()
+    titles = dict(db.query(Chapter.id, Chapter.title).filter(
+        Chapter.id.in_([review.chapter_id for review in reviews])
+    ).all()) if reviews else {}
     return {
-        "chapter_id": chapter_id,
-        "review_available": True,
-        "review_text": review_text,
-        "message": "Review retrieved from cache"
+        "project_id": project_id,
+        "total": total,
+        "reviews": [
+            dict(translation_review_service.to_dict(review, include_issues=False), chapter_title=titles.get(review.chapter_id))
+            for review in reviews
+        ],
     }
+
+
+@router.get("/projects/{project_id}/translation-memory")
+def get_translation_memory_stats(project_id: int, db: Session = Depends(get_db)) -> dict:
+    """Размер памяти переводов проекта и сколько раз абзацы подставлены без LLM."""
+    return translation_memory.stats(db, project_id)
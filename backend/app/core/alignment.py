@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import difflib
+import hashlib
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.text_chunker import normalize_text
+
+
+# Выравнивание перевода главы по абзацам хранится в Chapter.alignment:
+# {"version": 1, "segments": [{"src": [ключи абзацев оригинала], "tgt": число абзацев перевода}], ...}.
+# Сегмент – группа абзацев оригинала и соответствующая ей группа абзацев перевода
+# (1:1, если модель сохранила разбивку, иначе весь фрагмент целиком).
+ALIGNMENT_VERSION = 1
+
+# Переводы строк, на которых normalize_text делит текст на строки (в отличие от str.splitlines,
+# который делит еще и по \x0b, \x0c, \x1c–\x1e, \x85, \u2028 и \u2029)
+LINE_BREAK_RE = re.compile(r"\r\n|\r|\n")
+
+
+def paragraphs(text: str | None) -> List[str]:
+    """Непустые абзацы (строки) нормализованного текста."""
+    if not text:
+        return []
+    return [line for line in normalize_text(text).split("\n") if line.strip()]
+
+
+def paragraph_blocks(text: str | None) -> List[Tuple[str, str]]:
+    """Абзацы с разделителем перед каждым: [(абзац, "\n\n" или "\n")]."""
+    blocks: List[Tuple[str, str]] = []
+    blank_before = False
+    for line in normalize_text(text or "").split("\n"):
+        if not line.strip():
+            blank_before = True
+            continue
+        blocks.append((line, "\n\n" if blank_before else "\n"))
+        blank_before = False
+    return blocks
+
+
+def paragraph_spans(text: str | None) -> List[Tuple[int, int]]:
+    """Позиции абзацев paragraphs(text) в исходном (ненормализованном) тексте."""
+    text = text or ""
+    spans: List[Tuple[int, int]] = []
+    offset = 0
+    for line_break in [*LINE_BREAK_RE.finditer(text), None]:
+        end = line_break.start() if line_break else len(text)
+        if text[offset:end].strip():
+            spans.append((offset, end))
+        offset = line_break.end() if line_break else end
+    return spans
+
+
+def join_blocks(blocks: List[Tuple[str, str]]) -> str:
+    return "".join(separator + paragraph if i else paragraph for i, (paragraph, separator) in enumerate(blocks))
+
+
+def paragraph_key(paragraph: str) -> str:
+    return hashlib.sha256(" ".join(paragraph.split()).encode()).hexdigest()[:16]
+
+
+def align_group(source_paragraphs: List[str], target_paragraphs: List[str]) -> List[Dict[str, Any]]:
+    """Сегменты для переведенной группы абзацев: 1:1 при совпадении количества, иначе один сегмент."""
+    if not source_paragraphs:
+        return []
+    keys = [paragraph_key(p) for p in source_paragraphs]
+    if len(source_paragraphs) == len(target_paragraphs):
+        return [{"src": [key], "tgt": 1} for key in keys]
+    return [{"src": keys, "tgt": len(target_paragraphs)}]
+
+
+def build_alignment(segments: List[Dict[str, Any]], context: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """Значение для Chapter.alignment. context – то, при чем перевод получен (термины, модель, промпт)."""
+    return dict(context or {}, version=ALIGNMENT_VERSION, segments=segments)
+
+
+def load_segments(alignment: Dict[str, Any] | None, translated_text: str | None) -> Optional[List[Dict[str, Any]]]:
+    """Сегменты сохраненного выравнивания, если оно соответствует текущему переводу."""
+    if not alignment or alignment.get("version") != ALIGNMENT_VERSION or not translated_text:
+        return None
+    segments = alignment.get("segments") or []
+    # Ручная правка перевода, изменившая число абзацев, делает выравнивание недействительным
+    if sum(segment["tgt"] for segment in segments) != len(paragraphs(translated_text)):
+        return None
+    return segments
+
+
+def infer_alignment(original_text: str | None, translated_text: str | None,
+                    previous: Dict[str, Any] | None = None) -> Optional[Dict[str, Any]]:
+    """Выравнивание для перевода, сохраненного без него (по количеству абзацев).
+
+    Из previous (прежнего выравнивания) переносятся условия перевода.
+    """
+    if not original_text or not translated_text:
+        return None
+    return build_alignment(align_group(paragraphs(original_text), paragraphs(translated_text)), conditions(previous))
+
+
+def conditions(alignment: Dict[str, Any] | None) -> Dict[str, Any]:
+    """Условия перевода из выравнивания (все, кроме самих сегментов)."""
+    return {key: value for key, value in (alignment or {}).items() if key not in ("version", "segments")}
+
+
+def plan_update(segments: List[Dict[str, Any]], translated_text: str, new_text: str) -> Dict[str, Any]:
+    """Сопоставляет новые абзацы оригинала со старым выравниванием (difflib по ключам абзацев).
+
+    Returns:
+        {"blocks": новые абзацы оригинала (см. paragraph_blocks),
+         "kept": {индекс нового абзаца: {"src": [...], "tgt": [блоки перевода]}} – сегменты без изменений,
+         "runs": [(начало, конец)] – диапазоны новых абзацев, которые нужно перевести}
+    """
+    targets = paragraph_blocks(translated_text)
+    new_blocks = paragraph_blocks(new_text)
+    old_keys = [key for segment in segments for key in segment["src"]]
+    new_keys = [paragraph_key(paragraph) for paragraph, _ in new_blocks]
+
+    old_to_new: Dict[int, int] = {}
+    matcher = difflib.SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for tag, i1, i2, j1, _ in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(i2 - i1):
+                old_to_new[i1 + offset] = j1 + offset
+
+    kept: Dict[int, Dict[str, Any]] = {}
+    source_pos = target_pos = 0
+    for segment in segments:
+        size = len(segment["src"])
+        mapped = [old_to_new.get(source_pos + offset) for offset in range(size)]
+        # Сегмент сохраняется, только если все его абзацы уцелели и идут подряд
+        if None not in mapped and mapped == list(range(mapped[0], mapped[0] + size)):
+            kept[mapped[0]] = {"src": segment["src"], "tgt": targets[target_pos:target_pos + segment["tgt"]]}
+        source_pos += size
+        target_pos += segment["tgt"]
+
+    runs = []
+    index = 0
+    while index < len(new_blocks):
+        if index in kept:
+            index += len(kept[index]["src"])
+            continue
+        start = index
+        while index < len(new_blocks) and index not in kept:
+            index += 1
+        runs.append((start, index))
+    return {"blocks": new_blocks, "kept": kept, "runs": runs}
+
+
+def aligned_units(original_text: str | None, translated_text: str | None,
+                  alignment: Dict[str, Any] | None) -> List[Dict[str, Tuple[int, int]]]:
+    """Соответствие абзацев: [{"source": (начало, конец), "target": (начало, конец)}].
+
+    Индексы – в paragraphs(original_text) и paragraph_blocks(translated_text).
+    Если оригинал правили после перевода, выравнивание восстанавливается по
+    количеству абзацев.
+    """
+    source_keys = [paragraph_key(p) for p in paragraphs(original_text)]
+    segments = load_segments(alignment, translated_text)
+    if segments is None or [key for segment in segments for key in segment["src"]] != source_keys:
+        inferred = infer_alignment(original_text, translated_text)
+        segments = inferred["segments"] if inferred else []
+    units = []
+    source_pos = target_pos = 0
+    for segment in segments:
+        units.append({
+            "source": (source_pos, source_pos + len(segment["src"])),
+            "target": (target_pos, target_pos + segment["tgt"]),
+        })
+        source_pos += len(segment["src"])
+        target_pos += segment["tgt"]
+    return units
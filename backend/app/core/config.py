@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List
+from typing import Dict, List
 import os
 
 from pydantic_settings import BaseSettings
@@ -12,17 +12,111 @@ class Settings(BaseSettings):
     DATABASE_URL: str = Field(..., description="PostgreSQL connection string")
 
     # Redis
-    REDIS_URL: str = Field(..., description="Redis connection string")
+    REDIS_URL: str = Field(default="", description="Redis TCP connection string (optional with Upstash REST or CACHE_BACKEND=local; L1 invalidation needs it)")
+    REDIS_POOL_MAX_CONNECTIONS: int = Field(default=20, description="Max connections in the Redis TCP pool")
+    REDIS_SOCKET_TIMEOUT: float = Field(default=3.0, description="Redis socket read/write timeout, seconds")
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = Field(default=3.0, description="Redis connect timeout, seconds")
+    REDIS_HEALTH_CHECK_INTERVAL: int = Field(default=30, description="Ping idle pooled connections older than this, seconds")
+    REDIS_RETRY_ATTEMPTS: int = Field(default=1, description="Reconnect-and-retry attempts on connection errors")
     # Upstash REST (опционально)
     UPSTASH_REDIS_REST_URL: str | None = Field(default=None, description="Upstash REST URL")
     UPSTASH_REDIS_REST_TOKEN: str | None = Field(default=None, description="Upstash REST TOKEN")
 
+    # Локальный дисковый кэш (SQLite): запасной уровень при недоступном Redis или единственный бэкенд
+    CACHE_BACKEND: str = Field(default="redis", description="Cache backend: redis (with disk fallback) or local (disk only, single node)")
+    CACHE_DISK_ENABLED: bool = Field(default=True, description="Fall through to the disk cache when Redis is unreachable")
+    CACHE_DISK_PATH: str = Field(default="data/cache.sqlite3", description="SQLite file of the disk cache")
+    CACHE_DISK_MAX_BYTES: int = Field(default=256 * 1024 * 1024, description="Disk cache size cap in bytes")
+    CACHE_DISK_MIRROR_NAMESPACES_RAW: str = Field(
+        default="translation,summary,gen",
+        description="Raw namespaces also written to disk while Redis is healthy, so they survive an outage"
+    )
+    CACHE_DISK_RECONCILE_INTERVAL: int = Field(default=10, description="Redis recovery check interval while the disk journal is non-empty, seconds")
+
+    # In-process L1 кэш перед Redis
+    CACHE_L1_ENABLED: bool = Field(default=True, description="Enable in-process L1 cache in front of Redis")
+    CACHE_L1_MAX_BYTES: int = Field(default=16 * 1024 * 1024, description="L1 cache size cap in bytes")
+    CACHE_L1_MAX_ITEM_BYTES: int = Field(default=1024 * 1024, description="Largest value stored in L1, bytes")
+    CACHE_L1_TTLS_RAW: str = Field(
+        default="translation=300,glossary=60,summary=300,relationships=60,gemini_usage=5,gemini_cooldown=30,gemini_rate=0,gen=30",
+        description="Raw per-namespace L1 TTLs (namespace=seconds, 0 disables L1 for the namespace)"
+    )
+    CACHE_L1_DEFAULT_TTL: int = Field(default=0, description="L1 TTL for namespaces missing in CACHE_L1_TTLS_RAW")
+    # Кодек значений кэша
+    CACHE_CODEC_SERIALIZER: str = Field(default="json", description="Serializer for large cache values: json or msgpack")
+    CACHE_CODEC_COMPRESSION: str = Field(default="zstd", description="Compression for large cache values: zstd, zlib or none")
+    CACHE_CODEC_COMPRESS_THRESHOLD: int = Field(default=1024, description="Compress values whose JSON exceeds this size, bytes")
+    # Stale-while-revalidate
+    CACHE_SWR_GRACE_SECONDS: int = Field(default=600, description="How long stale values are served while refreshing, seconds")
+    CACHE_SWR_LOCK_SECONDS: int = Field(default=60, description="Background refresh lock TTL, seconds")
+    # Прогрев кэша для недавно активных проектов
+    CACHE_WARM_ON_STARTUP: bool = Field(default=True, description="Warm caches of recently active projects in the background at startup")
+    CACHE_WARM_ACTIVE_DAYS: int = Field(default=7, description="Projects with batch jobs or processed chapters within this many days are warmed")
+    CACHE_WARM_MAX_PROJECTS: int = Field(default=20, description="Max projects warmed per run")
+    CACHE_WARM_TIME_BUDGET: float = Field(default=30.0, description="Warm-up time budget per run, seconds")
+    CACHE_WARM_MAX_BYTES: int = Field(default=32 * 1024 * 1024, description="Warm-up memory budget per run (uncompressed JSON), bytes")
+    CACHE_WARM_STARTUP_LEASE_TTL: int = Field(default=600, description="Startup warm-up runs once per this many seconds across all workers")
+    # Аренды на операции с главами и идемпотентность POST-запросов
+    CACHE_LEASE_TTL: int = Field(default=900, description="Lease TTL for translate/analyze of one chapter, seconds")
+    CACHE_LEASE_RESULT_TTL: int = Field(default=300, description="How long the lease owner's result is kept for waiters, seconds")
+    CACHE_LEASE_POLL_INTERVAL: float = Field(default=0.5, description="Poll interval while waiting for a busy lease, seconds")
+    CACHE_LEASE_BATCH_WAIT: float = Field(default=300.0, description="How long a batch job waits for a chapter leased by another request, seconds")
+    IDEMPOTENCY_TTL: int = Field(default=86400, description="Retention of responses stored under Idempotency-Key, seconds")
+    # Выбор транспорта (REST/TCP) по задержкам и ошибкам
+    CACHE_TRANSPORT_ADAPTIVE: bool = Field(default=True, description="Route each cache op to the fastest healthy transport instead of always REST first")
+    CACHE_TRANSPORT_EWMA_ALPHA: float = Field(default=0.2, description="Weight of the newest sample in transport latency/error averages")
+    CACHE_TRANSPORT_PROBE_INTERVAL: float = Field(default=30.0, description="How often an op is sent to the non-preferred transport to refresh its stats, seconds")
+    CACHE_TRANSPORT_MAX_ERROR_RATE: float = Field(default=0.5, description="Transports with a higher averaged error rate are used only as a fallback")
+    # Автомат: при отказе Redis операции сразу уходят на диск (или пропускаются)
+    CACHE_BREAKER_FAILURE_THRESHOLD: int = Field(default=5, description="Consecutive failed cache ops (all transports) that open the circuit")
+    CACHE_BREAKER_COOLDOWN: float = Field(default=15.0, description="Interval between background Redis probes while the circuit is open, seconds")
+    CACHE_INVALIDATION_CHANNEL: str = Field(
+        default="lightnovel:cache:invalidate",
+        description="Redis pub/sub channel for cross-worker L1 invalidation"
+    )
+
     # Gemini API - храним как строку, парсим через computed_field
     GEMINI_API_KEYS_RAW: str = Field(..., description="Raw Gemini API keys string")
     GEMINI_API_LIMIT_PER_KEY: int = Field(default=1000, description="Daily limit per API key")
     GEMINI_API_LIMIT_THRESHOLD_PERCENT: int = Field(default=95, description="Threshold percentage for key rotation")
     GEMINI_API_COOLDOWN_HOURS: int = Field(default=24, description="Cooldown hours for used keys")
     GEMINI_API_RESET_TIMEZONE: str = Field(default="America/Los_Angeles", description="Timezone for daily limit reset (Mountain View, CA)")
+    GEMINI_MODEL: str = Field(default="gemini-2.5-flash", description="Gemini model used for all completions")
+
+    # Перевод длинных глав по фрагментам
+    TRANSLATION_CHUNKING_ENABLED: bool = Field(default=True, description="Translate long chapters in paragraph-aligned chunks")
+    TRANSLATION_CHUNK_MAX_TOKENS: int = Field(default=1500, description="Source text budget per chunk, estimated tokens")
+    TRANSLATION_CHUNK_TAIL_CHARS: int = Field(default=400, description="Tail of the previous chunk passed as context, characters")
+    TRANSLATION_CHUNK_CONCURRENCY: int = Field(default=3, description="Chunks translated in parallel (capped by the number of API keys)")
+    TRANSLATION_CHUNK_RETRIES: int = Field(default=2, description="Extra attempts for chunks whose translation failed")
+    # Бюджет промпта перевода: контекст сокращается по приоритету, текст и инструкции – никогда
+    TRANSLATION_PROMPT_MAX_TOKENS: int = Field(default=6000, description="Translation prompt budget, estimated tokens (0 disables trimming)")
+    TRANSLATION_PROMPT_MIN_SECTION_TOKENS: int = Field(default=40, description="A summary or context section that would be cut shorter than this is dropped")
+    # Память переводов: повторяющиеся абзацы (системные сообщения, окна статуса, рекапы)
+    TRANSLATION_MEMORY_ENABLED: bool = Field(default=True, description="Reuse stored paragraph translations of the project")
+    TRANSLATION_MEMORY_MIN_CHARS: int = Field(default=20, description="Shorter paragraphs are neither stored nor reused (their translation depends on context)")
+    TRANSLATION_MEMORY_FUZZY_THRESHOLD: float = Field(default=0.7, description="Min character 4-gram Jaccard similarity of a fuzzy match")
+    TRANSLATION_MEMORY_MAX_REFERENCES: int = Field(default=5, description="Fuzzy matches offered as references per prompt")
+    # Повторный перевод отредактированных глав: только измененные абзацы
+    TRANSLATION_INCREMENTAL_ENABLED: bool = Field(default=True, description="Re-translate only the paragraphs changed since the stored translation")
+    TRANSLATION_INCREMENTAL_MAX_CHANGED: float = Field(default=0.5, description="Share of changed paragraphs above which the whole chapter is re-translated")
+    TRANSLATION_INCREMENTAL_CONTEXT_PARAGRAPHS: int = Field(default=2, description="Preceding source paragraphs passed as context with each changed range")
+    # Обратный индекс термин → главы (term_occurrences)
+    TERM_INDEX_MAX_OFFSETS: int = Field(default=200, description="Occurrence offsets stored per term and chapter (the count is always exact)")
+    TERM_INDEX_CONTEXT_CHARS: int = Field(default=60, description="Characters of context on each side of an occurrence in the concordance")
+    # Общее саммари проекта (хранится в projects.summary)
+    PROJECT_SUMMARY_MAX_CHAPTERS: int = Field(default=5, description="First summarized chapters the project summary is built from")
+    # Рецензирование переводов (translation_reviews)
+    TRANSLATION_REVIEW_CHUNK_MAX_TOKENS: int = Field(default=3000, description="Source plus translation budget per review request, estimated tokens")
+    # Проверка соблюдения глоссария в переводе
+    GLOSSARY_CHECK_RULE: str = Field(default="stem", description="How inflected term translations are matched: exact, stem (strip a known ending) or prefix (drop the last letters)")
+    GLOSSARY_CHECK_ENDINGS_RAW: str = Field(
+        default="ами,ями,ого,его,ому,ему,ыми,ими,ой,ей,ий,ый,ая,яя,ое,ее,ую,юю,ом,ем,ам,ям,ах,ях,ов,ев,ы,и,а,я,о,е,у,ю,ь,й",
+        description="Raw word endings stripped by the stem rule"
+    )
+    GLOSSARY_CHECK_PREFIX_TRIM: int = Field(default=2, description="Letters dropped from each word of a term by the prefix rule")
+    GLOSSARY_CHECK_MIN_STEM: int = Field(default=3, description="Words are never cut shorter than this")
+    GLOSSARY_CHECK_MAX_ENDING: int = Field(default=3, description="Longest ending allowed after a matched stem")
 
     # Environment
     ENVIRONMENT: str = Field(default="development", description="Environment (development/production)")
@@ -41,6 +135,30 @@ class Settings(BaseSettings):
             return []
         return [key.strip() for key in self.GEMINI_API_KEYS_RAW.split(',') if key.strip()]
 
+    @computed_field
+    @property
+    def CACHE_L1_TTLS(self) -> Dict[str, int]:
+        """Парсит CACHE_L1_TTLS_RAW в словарь {namespace: ttl}"""
+        ttls: Dict[str, int] = {}
+        for item in self.CACHE_L1_TTLS_RAW.split(','):
+            name, _, value = item.partition('=')
+            if name.strip() and value.strip().isdigit():
+                ttls[name.strip()] = int(value.strip())
+        return ttls
+
+    @computed_field
+    @property
+    def CACHE_DISK_MIRROR_NAMESPACES(self) -> List[str]:
+        """Парсит CACHE_DISK_MIRROR_NAMESPACES_RAW в список пространств"""
+        return [name.strip() for name in self.CACHE_DISK_MIRROR_NAMESPACES_RAW.split(',') if name.strip()]
+
+    @computed_field
+    @property
+    def GLOSSARY_CHECK_ENDINGS(self) -> List[str]:
+        """Парсит GLOSSARY_CHECK_ENDINGS_RAW в список окончаний (длинные первыми)"""
+        endings = {ending.strip().lower() for ending in self.GLOSSARY_CHECK_ENDINGS_RAW.split(',') if ending.strip()}
+        return sorted(endings, key=len, reverse=True)
+
     @computed_field
     @property
     def ALLOWED_ORIGINS(self) -> List[str]:
@@ -61,6 +179,10 @@ class Settings(BaseSettings):
     def is_development(self) -> bool:
         return self.ENVIRONMENT.lower() == "development"
 
+    @property
+    def cache_is_local(self) -> bool:
+        return self.CACHE_BACKEND.lower() == "local"
+
 
 # Создаем экземпляр настроек
 settings = Settings()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List
+
+from app.core.alignment import aligned_units, paragraph_blocks, paragraphs
+from app.core.config import settings
+from app.core.term_matcher import term_matcher_cache
+from app.models.glossary import GlossaryTerm
+
+
+WORD_RE = re.compile(r"\w+")
+
+
+def _words(text: str) -> List[str]:
+    return WORD_RE.findall(text.lower().replace("ё", "е"))
+
+
+class GlossaryChecker:
+    """Проверка перевода на соблюдение глоссария по абзацам.
+
+    Для каждой группы выровненных абзацев берутся утвержденные термины,
+    встречающиеся в оригинале, и ищутся их переводы в переводе группы.
+    Склонение допускается по правилу GLOSSARY_CHECK_RULE: stem отрезает
+    известное окончание, prefix – последние буквы каждого слова термина.
+    """
+
+    def stem(self, word: str) -> str:
+        rule = settings.GLOSSARY_CHECK_RULE.lower()
+        min_stem = settings.GLOSSARY_CHECK_MIN_STEM
+        if rule == "exact" or len(word) <= min_stem:
+            return word
+        if rule == "prefix":
+            return word[:max(min_stem, len(word) - settings.GLOSSARY_CHECK_PREFIX_TRIM)]
+        for ending in settings.GLOSSARY_CHECK_ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= min_stem:
+                return word[:-len(ending)]
+        return word
+
+    def _word_matches(self, stem: str, word: str) -> bool:
+        if settings.GLOSSARY_CHECK_RULE.lower() == "exact":
+            return word == stem
+        return word.startswith(stem) and len(word) - len(stem) <= settings.GLOSSARY_CHECK_MAX_ENDING
+
+    def term_present(self, translated_term: str, text: str) -> bool:
+        """Встречается ли перевод термина в тексте (все слова подряд, с допустимыми окончаниями)."""
+        stems = [self.stem(word) for word in _words(translated_term)]
+        if not stems:
+            return True
+        words = _words(text)
+        size = len(stems)
+        return any(
+            all(self._word_matches(stems[k], words[i + k]) for k in range(size))
+            for i in range(len(words) - size + 1)
+        )
+
+    def check(self, original_text: str | None, translated_text: str | None,
+              alignment: Dict[str, Any] | None, glossary_terms: List[GlossaryTerm]) -> Dict[str, Any]:
+        """Отчет о нарушениях глоссария.
+
+        Returns:
+            {"units": число групп абзацев, "checked": проверенных пар (группа, термин),
+             "violations": [{"unit", "source", "target" (диапазоны абзацев, см. aligned_units),
+                             "original", "translation", "missing": [термины]}],
+             "compliance": доля соблюденных пар}
+        """
+        report: Dict[str, Any] = {"units": 0, "checked": 0, "violations": [], "compliance": 1.0}
+        if not original_text or not translated_text or not glossary_terms:
+            return report
+        source_paragraphs = paragraphs(original_text)
+        target_blocks = paragraph_blocks(translated_text)
+        units = aligned_units(original_text, translated_text, alignment)
+        project_id = getattr(glossary_terms[0], "project_id", None)
+        matcher = term_matcher_cache.get(project_id, [term.source_term or "" for term in glossary_terms])
+        by_source: Dict[str, List[GlossaryTerm]] = {}
+        for term in glossary_terms:
+            if term.translated_term:
+                by_source.setdefault((term.source_term or "").strip().lower(), []).append(term)
+
+        missing_total = 0
+        for index, unit in enumerate(units):
+            source = "\n".join(source_paragraphs[unit["source"][0]:unit["source"][1]])
+            translation = "\n".join(paragraph for paragraph, _ in target_blocks[unit["target"][0]:unit["target"][1]])
+            missing = []
+            for found in sorted(matcher.find(source)):
+                for term in by_source.get(found, []):
+                    report["checked"] += 1
+                    if not self.term_present(term.translated_term, translation):
+                        missing.append({
+                            "term_id": term.id,
+                            "source_term": term.source_term,
+                            "translated_term": term.translated_term,
+                        })
+            if missing:
+                missing_total += len(missing)
+                report["violations"].append({
+                    "unit": index,
+                    "source": unit["source"],
+                    "target": unit["target"],
+                    "original": source,
+                    "translation": translation,
+                    "missing": missing,
+                })
+        report["units"] = len(units)
+        if report["checked"]:
+            report["compliance"] = round(1 - missing_total / report["checked"], 3)
+        return report
+
+
+glossary_checker = GlossaryChecker()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from app.core.config import settings
+from app.services.async_cache_service import async_cache_service
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """Повтор POST-запроса с тем же заголовком Idempotency-Key возвращает сохраненный ответ.
+
+    Первый запрос занимает ключ (SET NX) на время выполнения; параллельный
+    дубль получает 409, а после завершения – тот же ответ без повторного
+    выполнения в течение IDEMPOTENCY_TTL. Сохраняются только успешные (2xx)
+    ответы: после 409 "уже выполняется", 429 или ошибки валидации ключ
+    освобождается, и повтор с тем же ключом выполнится заново. Тот же ключ
+    с другим запросом отклоняется с 422.
+    """
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if request.method != "POST" or not idempotency_key:
+            return await call_next(request)
+
+        body = await request.body()
+
+        # Тело уже прочитано – отдаем его обработчику повторно
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+        request._receive = receive
+
+        fingerprint = hashlib.sha256(
+            b"\n".join([request.url.path.encode(), str(request.url.query).encode(), body])
+        ).hexdigest()
+        key = "lightnovel:idempotency:" + hashlib.sha256(
+            f"{request.url.path}:{idempotency_key}".encode()
+        ).hexdigest()
+
+        placeholder = json.dumps({"state": "in_progress", "fingerprint": fingerprint})
+        if not await async_cache_service.set_nx(key, placeholder, settings.CACHE_LEASE_TTL):
+            stored = await async_cache_service.get_quiet(key)
+            if not isinstance(stored, dict):
+                return await call_next(request)
+            if stored.get("fingerprint") != fingerprint:
+                return JSONResponse(
+                    status_code=422,
+                    content={"detail": f"{IDEMPOTENCY_HEADER} was already used with a different request"}
+                )
+            if stored.get("state") != "done":
+                return JSONResponse(
+                    status_code=409,
+                    content={"detail": {"message": "A request with this Idempotency-Key is in progress",
+                                        "status": "in_progress"}}
+                )
+            return Response(
+                content=stored.get("body", ""),
+                status_code=stored.get("status_code", 200),
+                media_type=stored.get("media_type"),
+                headers={"Idempotent-Replayed": "true"}
+            )
+
+        try:
+            response = await call_next(request)
+            chunks = [chunk async for chunk in response.body_iterator]
+        except Exception:
+            await async_cache_service.delete(key)
+            raise
+        content = b"".join(chunks)
+
+        if not 200 <= response.status_code < 300:
+            await async_cache_service.delete(key)
+        else:
+            await async_cache_service.set(key, {
+                "state": "done",
+                "fingerprint": fingerprint,
+                "status_code": response.status_code,
+                "media_type": response.media_type or response.headers.get("content-type"),
+                "body": content.decode("utf-8", errors="replace"),
+            }, ttl=settings.IDEMPOTENCY_TTL)
+
+        return Response(
+            content=content,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            media_type=response.media_type
+        )
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.core.text_chunker import estimate_tokens
+
+
+# Порядок категорий терминов при нехватке места: имена персонажей важнее всего
+CATEGORY_PRIORITY = {"character": 0, "location": 1, "skill": 2, "artifact": 3, "other": 4}
+
+# Границы, по которым обрезается текст раздела, от лучшей к худшей: абзац, предложение, слово
+_CUT_PATTERNS = [re.compile(r"\n"), re.compile(r"(?<=[.!?…])\s"), re.compile(r"\s")]
+
+
+def prompt_tokens(text: str) -> int:
+    """Оценка токенов с округлением вверх: сумма оценок частей не меньше оценки всего промпта."""
+    return -(-len(text) // 4) if text else 0
+
+
+def rank_terms(glossary_terms: Iterable[Any]) -> List[Any]:
+    """Термины в порядке важности: частота, категория, затем исходный термин (для детерминизма)."""
+    def key(term):
+        category = getattr(term, "category", None)
+        category = getattr(category, "value", category)
+        return (
+            -(getattr(term, "frequency", None) or 0),
+            CATEGORY_PRIORITY.get(category, len(CATEGORY_PRIORITY)),
+            (term.source_term or "").lower(),
+        )
+    return sorted(glossary_terms, key=key)
+
+
+def truncate(text: str, max_tokens: int, keep: str = "start") -> str:
+    """Обрезает текст до max_tokens по границе абзаца, предложения или слова.
+
+    keep="start" сохраняет начало (саммари), keep="end" – конец (предшествующий фрагмент).
+    Граница ищется в дальней от сохраняемого края половине, чтобы не терять много текста.
+    """
+    if prompt_tokens(text) <= max_tokens:
+        return text
+    limit = max(0, max_tokens) * 4 - 1  # место под "…"
+    if limit <= 0:
+        return ""
+    if keep == "end":
+        piece = text[-limit:]
+        for pattern in _CUT_PATTERNS:
+            match = pattern.search(piece)
+            if match and match.end() <= len(piece) // 2:
+                piece = piece[match.end():]
+                break
+        return "…" + piece.lstrip()
+    piece = text[:limit]
+    for pattern in _CUT_PATTERNS:
+        cuts = [m.start() for m in pattern.finditer(piece)]
+        if cuts and cuts[-1] >= len(piece) // 2:
+            piece = piece[:cuts[-1]]
+            break
+    return piece.rstrip() + "…"
+
+
+class PromptBudget:
+    """Распределение бюджета токенов промпта между разделами контекста.
+
+    Обязательная часть (текст для перевода и инструкции) учитывается сразу;
+    разделы контекста получают остаток строго по убыванию приоритета, поэтому
+    при нехватке места первыми сокращаются наименее важные. max_tokens <= 0 –
+    без ограничения.
+    """
+
+    def __init__(self, max_tokens: int, required_tokens: int, min_section_tokens: int = 0):
+        self.max_tokens = max_tokens
+        self.min_section_tokens = min_section_tokens
+        self.used = required_tokens
+        self.sections: Dict[str, int] = {"required": required_tokens}
+        self.trimmed: List[Dict[str, Any]] = []
+
+    def left(self) -> Optional[int]:
+        if self.max_tokens <= 0:
+            return None
+        return max(0, self.max_tokens - self.used)
+
+    def _spend(self, section: str, cost: int) -> None:
+        self.used += cost
+        self.sections[section] = self.sections.get(section, 0) + cost
+
+    def fit_items(self, section: str, items: List[Any], cost: Callable[[Any, List[Any]], int],
+                  label: Callable[[Any], str] | None = None) -> List[Any]:
+        """Берет элементы по порядку, пока они помещаются; остальные отбрасывает.
+
+        cost(элемент, уже взятые) – стоимость элемента в токенах. На первом не
+        поместившемся элементе выбор останавливается: более важный элемент
+        никогда не уступает место менее важному.
+        """
+        kept: List[Any] = []
+        for index, item in enumerate(items):
+            item_cost = cost(item, kept)
+            left = self.left()
+            if left is not None and item_cost > left:
+                dropped = items[index:]
+                decision = {"section": section, "action": "dropped_items", "kept": len(kept), "dropped": len(dropped)}
+                if label is not None:
+                    decision["items"] = [label(d) for d in dropped]
+                self.trimmed.append(decision)
+                break
+            kept.append(item)
+            self._spend(section, item_cost)
+        return kept
+
+    def fit_text(self, section: str, text: str | None, overhead: int = 0, keep: str = "start") -> str:
+        """Текст раздела целиком, обрезанный до остатка бюджета или пустая строка.
+
+        overhead – стоимость заголовка раздела. Раздел, который пришлось бы
+        обрезать короче min_section_tokens, отбрасывается целиком.
+        """
+        if not text:
+            return ""
+        full = prompt_tokens(text)
+        left = self.left()
+        if left is None or full + overhead <= left:
+            self._spend(section, full + overhead)
+            return text
+        room = left - overhead
+        if room < max(1, self.min_section_tokens):
+            self.trimmed.append({"section": section, "action": "dropped", "tokens_before": full})
+            return ""
+        cut = truncate(text, room, keep)
+        self._spend(section, prompt_tokens(cut) + overhead)
+        self.trimmed.append({"section": section, "action": "truncated", "tokens_before": full, "tokens_after": prompt_tokens(cut)})
+        return cut
+
+    def report(self, prompt: str) -> Dict[str, Any]:
+        """Итог для собранного промпта: оценка токенов, расход по разделам, что сокращено."""
+        final = estimate_tokens(prompt)
+        return {
+            "budget": self.max_tokens,
+            "tokens": final,
+            "over_budget": self.max_tokens > 0 and final > self.max_tokens,
+            "sections": dict(self.sections),
+            "trimmed": list(self.trimmed),
+        }
+
+
+def summarize_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Сводка по всем промптам перевода главы (фрагменты, измененные диапазоны)."""
+    if not reports:
+        return None
+    trimmed = [
+        dict(decision, prompt=index)
+        for index, report in enumerate(reports) for decision in report["trimmed"]
+    ]
+    return {
+        "budget": reports[0]["budget"],
+        "prompts": len(reports),
+        "total_tokens": sum(report["tokens"] for report in reports),
+        "max_tokens": max(report["tokens"] for report in reports),
+        "over_budget": sum(1 for report in reports if report["over_budget"]),
+        "trimmed_prompts": sum(1 for report in reports if report["trimmed"]),
+        "trimmed": trimmed,
+    }
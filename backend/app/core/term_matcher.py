@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Set, Tuple
+
+
+def _is_word_char(ch: str) -> bool:
+    # То же, что \w в регулярных выражениях Python
+    return ch.isalnum() or ch == "_"
+
+
+class TermMatcher:
+    """Автомат Ахо–Корасик по исходным терминам глоссария.
+
+    Один проход по тексту находит все вхождения всех терминов без учета
+    регистра; вхождение засчитывается, только если по краям нет буквы,
+    цифры или подчеркивания (как (?<!\\w)term(?!\\w)).
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = sorted({p.strip().lower() for p in patterns if p and p.strip()})
+        # Узел: переходы, ссылка неудачи, индексы терминов, заканчивающихся в узле
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][ch] = nxt
+                node = nxt
+            self._out[node].append(index)
+        self._build_failure_links()
+
+    def _build_failure_links(self) -> None:
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child].extend(self._out[self._fail[child]])
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Вхождения терминов: (начало, конец, термин в нижнем регистре).
+
+        Позиции относятся к text.lower() (для большинства текстов совпадают с исходными).
+        """
+        lowered = text.lower()
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        node = 0
+        for i, ch in enumerate(lowered):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = i + 1
+            after_ok = end == len(lowered) or not _is_word_char(lowered[end])
+            if not after_ok:
+                continue
+            for index in out[node]:
+                start = end - len(patterns[index])
+                if start == 0 or not _is_word_char(lowered[start - 1]):
+                    yield start, end, patterns[index]
+
+    def find(self, text: str) -> Set[str]:
+        """Множество терминов (в нижнем регистре), встречающихся в тексте."""
+        return {pattern for _, _, pattern in self.iter_matches(text)}
+
+
+class TermMatcherCache:
+    """Скомпилированные автоматы по проектам: пересобираются при смене набора терминов."""
+
+    def __init__(self, max_projects: int = 64):
+        self.max_projects = max_projects
+        self._lock = threading.Lock()
+        self._matchers: "OrderedDict[object, tuple]" = OrderedDict()
+        self.builds = 0
+
+    @staticmethod
+    def glossary_hash(sources: Iterable[str]) -> str:
+        normalized = sorted({s.strip().lower() for s in sources if s and s.strip()})
+        return hashlib.sha256("\n".join(normalized).encode()).hexdigest()
+
+    def get(self, project_id: object, sources: List[str]) -> TermMatcher:
+        digest = self.glossary_hash(sources)
+        with self._lock:
+            cached = self._matchers.get(project_id)
+            if cached is not None and cached[0] == digest:
+                self._matchers.move_to_end(project_id)
+                return cached[1]
+        # Сборка вне блокировки: параллельная сборка того же автомата безвредна
+        matcher = TermMatcher(sources)
+        with self._lock:
+            self._matchers[project_id] = (digest, matcher)
+            self._matchers.move_to_end(project_id)
+            self.builds += 1
+            while len(self._matchers) > self.max_projects:
+                self._matchers.popitem(last=False)
+        return matcher
+
+
+term_matcher_cache = TermMatcherCache()
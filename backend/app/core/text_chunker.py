@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import re
+from typing import List, Dict, Any
+
+
+# Строки-разделители сцен: ***, * * *, ---, ===, ◆◆◆, ~~~ и т.п.
+SCENE_BREAK_RE = re.compile(r"^\s*([*\-=~#◆◇●○■□☆★※_·•])(\s*\1){2,}\s*$")
+# Граница предложения для слишком длинных абзацев
+SENTENCE_END_RE = re.compile(r"(?<=[.!?…。！？\"”»])\s+")
+# Чем блок отделен от предыдущего: пустой строкой, переводом строки или (часть
+# разрезанного абзаца) пробелом
+JOINERS = {1: "\n\n", 0: "\n", -1: " "}
+
+
+def normalize_text(text: str) -> str:
+    """Приводит переводы строк к \\n, убирает хвостовые пробелы и оставляет
+    максимум одну пустую строку подряд."""
+    lines = [ln.rstrip() for ln in text.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    compact_lines = []
+    prev_empty = False
+    for ln in lines:
+        if ln == "":
+            if not prev_empty:
+                compact_lines.append("")
+            prev_empty = True
+        else:
+            compact_lines.append(ln)
+            prev_empty = False
+    return "\n".join(compact_lines)
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (~4 символа на токен для английского текста)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def is_scene_break(line: str) -> bool:
+    return bool(SCENE_BREAK_RE.match(line))
+
+
+def _split_long_paragraph(paragraph: str, max_tokens: int) -> List[str]:
+    """Делит абзац, не влезающий в бюджет, по предложениям (в крайнем случае – по длине).
+
+    Слишком длинное предложение режется по последнему пробелу в пределах
+    бюджета (слово без пробелов – просто по длине); накопленные до него
+    предложения уходят отдельным куском, чтобы кусок не превысил бюджет.
+    """
+    pieces: List[str] = []
+    current = ""
+    for sentence in SENTENCE_END_RE.split(paragraph):
+        while estimate_tokens(sentence) > max_tokens:
+            if current:
+                pieces.append(current)
+                current = ""
+            limit = max(1, max_tokens) * 4
+            cut = sentence.rfind(" ", limit // 2, limit + 1)
+            if cut == -1:
+                pieces.append(sentence[:limit])
+                sentence = sentence[limit:]
+            else:
+                # Пробел на месте разреза восстановит JOINERS[-1] при склейке
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut + 1:]
+        candidate = f"{current} {sentence}".strip() if current else sentence
+        if current and estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text: str, max_tokens: int, tail_chars: int = 0) -> List[Dict[str, Any]]:
+    """Делит нормализованный текст на фрагменты по абзацам до max_tokens.
+
+    Фрагмент по возможности заканчивается на разделителе сцены или пустой
+    строке, если он уже заполнен больше чем наполовину. Для каждого
+    фрагмента возвращается:
+      text – текст фрагмента;
+      separator – чем он отделялся от предыдущего (см. JOINERS), чтобы
+        переводы склеивались с той же разбивкой на абзацы;
+      tail – последние tail_chars символов предыдущего фрагмента
+        (контекст для связности, сам не переводится).
+    """
+    blocks: List[tuple] = []  # (абзац, ключ JOINERS)
+    blank_before = 0
+    for line in normalize_text(text).split("\n"):
+        if not line.strip():
+            blank_before = 1
+            continue
+        if estimate_tokens(line) > max_tokens:
+            for i, piece in enumerate(_split_long_paragraph(line, max_tokens)):
+                blocks.append((piece, blank_before if i == 0 else -1))
+        else:
+            blocks.append((line, blank_before))
+        blank_before = 0
+
+    chunks: List[Dict[str, Any]] = []
+    current: List[tuple] = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if not current:
+            return
+        body = current[0][0]
+        for paragraph, joiner in current[1:]:
+            body += JOINERS[joiner] + paragraph
+        chunks.append({"text": body, "separator": JOINERS[current[0][1]]})
+        current = []
+        current_tokens = 0
+
+    for paragraph, joiner in blocks:
+        tokens = estimate_tokens(paragraph) + 1
+        natural_break = joiner == 1 or is_scene_break(paragraph)
+        if current and (
+            current_tokens + tokens > max_tokens
+            or (natural_break and current_tokens > max_tokens // 2)
+        ):
+            flush()
+        current.append((paragraph, joiner))
+        current_tokens += tokens
+    flush()
+
+    for i, chunk in enumerate(chunks):
+        chunk["index"] = i
+        chunk["tail"] = ""
+        if i and tail_chars > 0:
+            previous = chunks[i - 1]["text"]
+            tail = previous[-tail_chars:]
+            if len(previous) > tail_chars and " " in tail:
+                # Начинаем контекст с целого слова
+                tail = tail.split(" ", 1)[1]
+            chunk["tail"] = tail
+    return chunks
+
+
+def join_chunks(chunks: List[Dict[str, Any]], translations: List[str]) -> str:
+    """Склеивает переводы фрагментов в порядке следования с исходной разбивкой."""
+    result = ""
+    for chunk, translated in zip(chunks, translations):
+        result = result + chunk["separator"] + translated if result else translated
+    return result
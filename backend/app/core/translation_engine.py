@@ -1,22 +1,50 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Any
 from sqlalchemy.orm import Session
 
-from app.services.gemini_client import gemini_client
+from app.core.config import settings
+from app.core.term_matcher import term_matcher_cache
+from app.core.alignment import (
+    align_group, aligned_units, build_alignment, conditions, join_blocks, load_segments,
+    paragraph_blocks, paragraph_key, paragraphs, plan_update
+)
+from app.core.glossary_checker import glossary_checker
+from app.core.prompt_budget import PromptBudget, prompt_tokens, rank_terms, summarize_reports
+from app.core.text_chunker import JOINERS, estimate_tokens, is_scene_break, join_chunks, normalize_text, split_into_chunks
+from app.services.gemini_client import RateLimitExceeded, gemini_client
+from app.services.translation_memory import normalize_paragraph, translation_memory
 from app.models.glossary import GlossaryTerm, TermStatus
 
 
+# Версия шаблона промпта перевода: увеличивать при любом изменении _build_translation_prompt,
+# чтобы кэшированные переводы со старым промптом больше не использовались
+PROMPT_TEMPLATE_VERSION = "5"
+
+# Маркер абзаца, перевод которого подставляется из памяти переводов
+TM_MARKER = "⟦TM{}⟧"
+TM_MARKER_RE = re.compile(r"⟦TM\d+⟧")
+
+
 class TranslationEngine:
     def __init__(self):
         self.client = gemini_client
+        self.logger = logging.getLogger("translation_engine")
 
     def translate_with_glossary(
         self, 
         text: str, 
         glossary_terms: List[GlossaryTerm],
         context_summary: str | None = None,
-        project_summary: str | None = None
+        project_summary: str | None = None,
+        db: Session | None = None,
+        project_id: int | None = None
     ) -> str:
         """
         Переводит текст с использованием утвержденного глоссария и контекста.
@@ -26,74 +54,579 @@ class TranslationEngine:
             glossary_terms: Список утвержденных терминов глоссария
             context_summary: Саммари текущей главы (опционально)
             project_summary: Общее саммари проекта (опционально)
+            db: Сессия БД для памяти переводов (опционально; фиксирует вызывающий)
+            project_id: Проект, чья память переводов используется (опционально)
             
         Returns:
             str: Переведенный текст
         """
-        prompt = self._build_translation_prompt(text, glossary_terms, context_summary, project_summary)
-        
+        return self.translate_aligned(text, glossary_terms, context_summary, project_summary, db, project_id)[0]
+
+    def translate_aligned(
+        self,
+        text: str,
+        glossary_terms: List[GlossaryTerm],
+        context_summary: str | None = None,
+        project_summary: str | None = None,
+        db: Session | None = None,
+        project_id: int | None = None
+    ) -> tuple:
+        """То же, что translate_with_glossary, но возвращает
+        (перевод, сегменты выравнивания по абзацам, сводку по бюджету промптов)."""
+        use_memory = settings.TRANSLATION_MEMORY_ENABLED and db is not None and project_id is not None
+        if not use_memory and not self._is_chunked(text):
+            prompt, report = self._build_translation_prompt(text, glossary_terms, context_summary, project_summary)
+
+            try:
+                response = self.client.complete(prompt).strip()
+            except Exception as e:
+                self.logger.error("Error translating text: %s", e)
+                raise
+            return response, align_group(paragraphs(text), paragraphs(response)), summarize_reports([report])
+
+        chunks = self._plan_chunks(text, db, project_id, use_memory, glossary_terms=glossary_terms)
+        translations = self._translate_chunks(chunks, glossary_terms, context_summary, project_summary)
+        if use_memory:
+            self._remember(db, project_id, chunks, translations, glossary_terms)
+        return join_chunks(chunks, translations), self._align_chunks(chunks, translations), self._prompt_summary(chunks)
+
+    def translate_chapter(
+        self,
+        text: str,
+        glossary_terms: List[GlossaryTerm],
+        context_summary: str | None = None,
+        project_summary: str | None = None,
+        db: Session | None = None,
+        project_id: int | None = None,
+        previous_translation: str | None = None,
+        previous_alignment: Dict[str, Any] | None = None
+    ) -> Dict[str, Any]:
+        """Переводит главу; при сохраненном выравнивании прежнего перевода – только измененные абзацы.
+
+        Returns:
+            {"translated_text": ..., "alignment": значение для Chapter.alignment,
+             "incremental": None или {"retranslated": ..., "reused": ...} (число абзацев),
+             "prompt": сводка по бюджету промптов (см. summarize_reports) или None, если LLM не вызывался}
+        """
+        if settings.TRANSLATION_INCREMENTAL_ENABLED and previous_translation and previous_alignment:
+            result = self.retranslate_changed(
+                previous_alignment, previous_translation, text, glossary_terms,
+                context_summary, project_summary, db, project_id
+            )
+            if result is not None:
+                return result
+        translated, segments, prompt = self.translate_aligned(
+            text, glossary_terms, context_summary, project_summary, db, project_id
+        )
+        return {
+            "translated_text": translated,
+            "alignment": build_alignment(segments, self.alignment_context(text, glossary_terms)),
+            "incremental": None,
+            "prompt": prompt
+        }
+
+    def retranslate_changed(
+        self,
+        alignment: Dict[str, Any],
+        translated_text: str,
+        text: str,
+        glossary_terms: List[GlossaryTerm],
+        context_summary: str | None = None,
+        project_summary: str | None = None,
+        db: Session | None = None,
+        project_id: int | None = None
+    ) -> Dict[str, Any] | None:
+        """Переводит только абзацы, изменившиеся с прежнего перевода, и вклеивает их в него.
+
+        Абзацы сопоставляются по ключам из сохраненного выравнивания; каждый
+        измененный диапазон получает предыдущие абзацы оригинала как контекст.
+        Возвращает None, если частичный перевод неприменим (выравнивание
+        устарело, поменялись переводы терминов в неизмененных абзацах или
+        изменена слишком большая часть главы) – тогда глава переводится целиком.
+        """
+        segments = load_segments(alignment, translated_text)
+        if segments is None:
+            return None
+        plan = plan_update(segments, translated_text, text)
+        blocks, kept, runs = plan["blocks"], plan["kept"], plan["runs"]
+        changed = sum(end - start for start, end in runs)
+        if not blocks or changed > len(blocks) * settings.TRANSLATION_INCREMENTAL_MAX_CHANGED:
+            return None
+        kept_text = "\n".join(
+            blocks[i][0] for start, segment in kept.items() for i in range(start, start + len(segment["src"]))
+        )
+        if not self._context_matches(alignment, kept_text, glossary_terms):
+            return None
+
+        use_memory = settings.TRANSLATION_MEMORY_ENABLED and db is not None and project_id is not None
+        planned = []
+        for start, end in runs:
+            context_start = max(0, start - settings.TRANSLATION_INCREMENTAL_CONTEXT_PARAGRAPHS)
+            context = "\n".join(paragraph for paragraph, _ in blocks[context_start:start])
+            tail_chars = settings.TRANSLATION_CHUNK_TAIL_CHARS
+            chunks = self._plan_chunks(
+                join_blocks(blocks[start:end]), db, project_id, use_memory,
+                first_tail=context[-tail_chars:] if tail_chars > 0 else "",
+                glossary_terms=glossary_terms
+            )
+            planned.append((start, end, chunks))
+        all_chunks = [chunk for _, _, chunks in planned for chunk in chunks]
+        translations = self._translate_chunks(all_chunks, glossary_terms, context_summary, project_summary) if all_chunks else []
+        if use_memory and all_chunks:
+            self._remember(db, project_id, all_chunks, translations, glossary_terms)
+
+        # Склейка: неизмененные сегменты берут прежний перевод, диапазоны – новый
+        translated_runs = {}
+        offset = 0
+        for start, end, chunks in planned:
+            run_translations = translations[offset:offset + len(chunks)]
+            offset += len(chunks)
+            translated_runs[start] = (end, paragraph_blocks(join_chunks(chunks, run_translations)),
+                                      self._align_chunks(chunks, run_translations))
+        result_blocks: List[tuple] = []
+        result_segments: List[Dict[str, Any]] = []
+        index = 0
+        while index < len(blocks):
+            group_start = index
+            if index in kept:
+                segment = kept[index]
+                target_blocks = segment["tgt"]
+                result_segments.append({"src": segment["src"], "tgt": len(target_blocks)})
+                index += len(segment["src"])
+            else:
+                index, target_blocks, run_segments = translated_runs[index]
+                result_segments.extend(run_segments)
+            if target_blocks:
+                # Разделитель перед группой берется из нового оригинала
+                result_blocks.append((target_blocks[0][0], blocks[group_start][1]))
+                result_blocks.extend(target_blocks[1:])
+        return {
+            "translated_text": join_blocks(result_blocks),
+            "alignment": build_alignment(result_segments, self.alignment_context(text, glossary_terms)),
+            "incremental": {"retranslated": changed, "reused": len(blocks) - changed},
+            "prompt": self._prompt_summary(all_chunks)
+        }
+
+    def fix_glossary_violations(
+        self,
+        original_text: str,
+        translated_text: str,
+        alignment: Dict[str, Any] | None,
+        glossary_terms: List[GlossaryTerm],
+        context_summary: str | None = None,
+        db: Session | None = None,
+        project_id: int | None = None
+    ) -> Dict[str, Any]:
+        """Переспрашивает только абзацы, где не соблюден глоссарий, и вклеивает исправления.
+
+        Исправление принимается, если в нем стало меньше пропущенных терминов.
+
+        Returns:
+            {"translated_text", "alignment", "before": отчет, "after": отчет,
+             "requests": сколько абзацев переспрошено, "fixed": сколько исправлено}
+        """
+        before = glossary_checker.check(original_text, translated_text, alignment, glossary_terms)
+        violations = before["violations"]
+        result = {
+            "translated_text": translated_text, "alignment": alignment,
+            "before": before, "after": before, "requests": len(violations), "fixed": 0
+        }
+        if not violations:
+            return result
+
+        prompts = [
+            self._build_glossary_fix_prompt(v["original"], v["translation"], v["missing"], context_summary)
+            for v in violations
+        ]
+        responses = self._complete_all(prompts)
+
+        source_paragraphs = paragraphs(original_text)
+        replacements: Dict[int, list] = {}
+        pairs = []
+        for violation, response in zip(violations, responses):
+            if not response:
+                continue
+            remaining = [
+                term for term in violation["missing"]
+                if not glossary_checker.term_present(term["translated_term"], response)
+            ]
+            if len(remaining) >= len(violation["missing"]):
+                continue
+            replacements[violation["unit"]] = paragraph_blocks(response)
+            result["fixed"] += 1
+            unit_source = source_paragraphs[violation["source"][0]:violation["source"][1]]
+            unit_target = paragraphs(response)
+            if len(unit_source) == 1 and len(unit_target) == 1:
+                pairs.append((unit_source[0], unit_target[0]))
+        if not replacements:
+            return result
+
+        target_blocks = paragraph_blocks(translated_text)
+        keys = [paragraph_key(p) for p in source_paragraphs]
+        result_blocks: List[tuple] = []
+        segments: List[Dict[str, Any]] = []
+        for index, unit in enumerate(aligned_units(original_text, translated_text, alignment)):
+            blocks = target_blocks[unit["target"][0]:unit["target"][1]]
+            fixed = replacements.get(index)
+            if fixed is not None:
+                # Разделитель перед группой остается прежним
+                blocks = [(fixed[0][0], blocks[0][1] if blocks else "\n\n")] + fixed[1:]
+            result_blocks.extend(blocks)
+            segments.append({"src": keys[unit["source"][0]:unit["source"][1]], "tgt": len(blocks)})
+
+        result["translated_text"] = join_blocks(result_blocks)
+        result["alignment"] = build_alignment(segments, conditions(alignment))
+        result["after"] = glossary_checker.check(original_text, result["translated_text"], result["alignment"], glossary_terms)
+        if pairs and settings.TRANSLATION_MEMORY_ENABLED and db is not None and project_id is not None:
+            try:
+                translation_memory.record(db, project_id, pairs, glossary_terms=glossary_terms)
+            except Exception:
+                self.logger.exception("Translation memory update failed")
+        return result
+
+    def _complete_all(self, prompts: List[str]) -> List[str | None]:
+        """Параллельные запросы к LLM; на месте неудавшихся – None."""
+        responses, errors = self._run_parallel(
+            len(prompts), lambda i, key_index: self.client.complete(prompts[i], key_index=key_index).strip()
+        )
+        for i, e in sorted(errors.items()):
+            self.logger.error("Error in request %s/%s: %s", i + 1, len(prompts), e, exc_info=e)
+        return responses
+
+    def _run_parallel(self, count: int, call, retries: int = 0) -> tuple:
+        """Выполняет call(i, key_index) для i из range(count) параллельно: (результаты, {i: ошибка}).
+
+        Каждая задача начинает со своего ключа API (по кругу), поэтому запросы
+        расходятся по ключам. Задачи, упершиеся в минутный лимит (429), ждут
+        начала следующего окна и не тратят попытку, если в раунде прошла хотя
+        бы одна задача; прочие ошибки повторяются до retries раз с паузой 2^n.
+        """
+        results: List[Any] = [None] * count
+        errors: Dict[int, Exception] = {}
+        keys = len(self.client.api_keys)
+        # Больше параллельных запросов, чем ключей, только упрется в лимиты
+        workers = max(1, min(settings.TRANSLATION_CHUNK_CONCURRENCY, keys, count))
+        pending = list(range(count))
+        attempt = 0
+        while pending:
+            errors = {}
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(call, i, i % keys): i for i in pending}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        errors[i] = e
+            if not errors:
+                break
+            rate_limited = [e for e in errors.values() if isinstance(e, RateLimitExceeded)]
+            if len(rate_limited) < len(errors) or len(errors) == len(pending):
+                attempt += 1
+                if attempt > retries:
+                    break
+            pending = sorted(errors)
+            time.sleep(self.client.rate_limit_reset_in() + 1 if rate_limited else 2 ** attempt)
+        return results, errors
+
+    def translate_excerpt(
+        self,
+        text: str,
+        glossary_terms: List[GlossaryTerm],
+        context_summary: str | None = None,
+        project_summary: str | None = None,
+        previous_tail: str = ""
+    ) -> str:
+        """Перевод отрывка главы (без памяти переводов); previous_tail – предшествующий текст для связности."""
+        chunks = self._plan_chunks(text, None, None, False, first_tail=previous_tail)
+        return join_chunks(chunks, self._translate_chunks(chunks, glossary_terms, context_summary, project_summary))
+
+    def alignment_context(self, text: str, glossary_terms: List[GlossaryTerm]) -> Dict[str, Any]:
+        """При чем получен перевод: переводы встречающихся терминов, модель, версия промпта."""
+        return {
+            "terms": {
+                (term.source_term or "").strip().lower(): term.translated_term
+                for term in self.relevant_terms(text, glossary_terms)
+            },
+            "model": self.client.model_name,
+            "prompt": PROMPT_TEMPLATE_VERSION,
+        }
+
+    def _context_matches(self, alignment: Dict[str, Any], kept_text: str, glossary_terms: List[GlossaryTerm]) -> bool:
+        """Прежний перевод неизмененных абзацев годится, если для них ничего не поменялось."""
+        if "model" not in alignment:
+            # Выравнивание восстановлено по уже существовавшему переводу – условия неизвестны, считаем их текущими
+            return True
+        current = self.alignment_context(kept_text, glossary_terms)
+        if alignment.get("model") != current["model"] or alignment.get("prompt") != current["prompt"]:
+            return False
+        stored_terms = alignment.get("terms") or {}
+        return all(stored_terms.get(source) == translated for source, translated in current["terms"].items())
+
+    def _plan_chunks(
+        self,
+        text: str,
+        db: Session | None,
+        project_id: int | None,
+        use_memory: bool,
+        first_tail: str = "",
+        glossary_terms: List[GlossaryTerm] | None = None
+    ) -> List[Dict[str, Any]]:
+        """Фрагменты для _translate_chunks: маркеры памяти переводов, хвосты, похожие абзацы."""
+        # Абзацы с точным совпадением в памяти переводов заменяются маркерами
+        markers: Dict[str, dict] = {}
+        source = text
+        if use_memory:
+            source, markers = self._mask_memory_hits(db, project_id, text, glossary_terms or [])
+        if self._is_chunked(text):
+            chunks = split_into_chunks(source, settings.TRANSLATION_CHUNK_MAX_TOKENS, settings.TRANSLATION_CHUNK_TAIL_CHARS)
+        else:
+            chunks = [{"index": 0, "text": normalize_text(source), "separator": "", "tail": ""}]
+        chunks[0]["tail"] = first_tail
+        for chunk in chunks:
+            chunk["markers"] = {marker: markers[marker] for marker in TM_MARKER_RE.findall(chunk["text"])}
+            chunk["tail"] = self._unmask(chunk["tail"], markers, "source")
+            chunk["references"] = translation_memory.similar(
+                db, project_id, self._unmask(chunk["text"], chunk["markers"], "source").split("\n")
+            ) if use_memory else []
+        return chunks
+
+    def _align_chunks(self, chunks: List[Dict[str, Any]], translations: List[str]) -> List[Dict[str, Any]]:
+        """Сегменты выравнивания по фрагментам; части разрезанного абзаца сводятся в одну группу."""
+        groups: List[List[str]] = []
+        for chunk, translated in zip(chunks, translations):
+            source = self._unmask(chunk["text"], chunk.get("markers") or {}, "source")
+            if groups and chunk["separator"] == JOINERS[-1]:
+                groups[-1][0] += JOINERS[-1] + source
+                groups[-1][1] += JOINERS[-1] + translated
+            else:
+                groups.append([source, translated])
+        return [segment for source, translated in groups for segment in align_group(paragraphs(source), paragraphs(translated))]
+
+    def _prompt_summary(self, chunks: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+        """Сводка по промптам фрагментов (фрагменты целиком из памяти переводов LLM не вызывали)."""
+        return summarize_reports([chunk["prompt_report"] for chunk in chunks if chunk.get("prompt_report")])
+
+    def _is_chunked(self, text: str) -> bool:
+        return settings.TRANSLATION_CHUNKING_ENABLED and estimate_tokens(text) > settings.TRANSLATION_CHUNK_MAX_TOKENS
+
+    def _translate_chunks(
+        self,
+        chunks: List[Dict[str, Any]],
+        glossary_terms: List[GlossaryTerm],
+        context_summary: str | None = None,
+        project_summary: str | None = None
+    ) -> List[str]:
+        """Переводит фрагменты (см. split_into_chunks) параллельно.
+
+        Каждый фрагмент получает хвост предыдущего как контекст и свой ключ
+        API. При ошибке повторяются только неудавшиеся фрагменты (см.
+        _run_parallel); переводы возвращаются в исходном порядке.
+        """
+        translations, errors = self._run_parallel(
+            len(chunks),
+            lambda i, key_index: self._translate_chunk(chunks[i], glossary_terms, context_summary, project_summary, key_index),
+            retries=settings.TRANSLATION_CHUNK_RETRIES,
+        )
+        if errors:
+            for i, e in sorted(errors.items()):
+                self.logger.error("Error translating chunk %s/%s: %s", i + 1, len(chunks), e, exc_info=e)
+            raise Exception(f"Failed to translate {len(errors)} of {len(chunks)} chunks: {errors[max(errors)]}")
+        return translations
+
+    def _translate_chunk(
+        self,
+        chunk: Dict[str, Any],
+        glossary_terms: List[GlossaryTerm],
+        context_summary: str | None,
+        project_summary: str | None,
+        key_index: int | None = None
+    ) -> str:
+        text = chunk["text"]
+        markers = chunk.get("markers") or {}
+        if markers:
+            # Фрагмент целиком из памяти переводов – LLM не нужен
+            if not TM_MARKER_RE.sub("", text).strip():
+                return self._unmask(text, markers, "target")
+            response = self._complete_chunk(chunk, text, glossary_terms, context_summary, project_summary,
+                                            with_markers=True, key_index=key_index)
+            if all(marker in response for marker in markers):
+                return self._unmask(response, markers, "target")
+            # Модель потеряла маркеры – переводим фрагмент целиком
+            self.logger.warning("Translation memory markers lost in chunk %s, retrying without them", chunk["index"] + 1)
+            text = self._unmask(text, markers, "source")
+        return self._complete_chunk(chunk, text, glossary_terms, context_summary, project_summary, key_index=key_index)
+
+    def _complete_chunk(
+        self,
+        chunk: Dict[str, Any],
+        text: str,
+        glossary_terms: List[GlossaryTerm],
+        context_summary: str | None,
+        project_summary: str | None,
+        with_markers: bool = False,
+        key_index: int | None = None
+    ) -> str:
+        prompt, chunk["prompt_report"] = self._build_translation_prompt(
+            text, glossary_terms, context_summary, project_summary,
+            previous_tail=chunk["tail"],
+            memory_references=chunk.get("references"),
+            memory_markers=with_markers
+        )
+        response = self.client.complete(prompt, key_index=key_index).strip()
+        if not response:
+            raise ValueError("empty translation")
+        return response
+
+    # Память переводов
+    def _mask_memory_hits(self, db: Session, project_id: int, text: str, glossary_terms: List[GlossaryTerm]) -> tuple:
+        """Заменяет абзацы, перевод которых уже есть в памяти, маркерами ⟦TMn⟧.
+
+        Подставляются только переводы, сделанные при текущих переводах встречающихся терминов.
+
+        Returns:
+            (текст с маркерами, {маркер: {"id", "source", "target"}})
+        """
+        lines = normalize_text(text).split("\n")
+        hits = translation_memory.lookup(db, project_id, [ln for ln in lines if ln.strip()], glossary_terms)
+        markers: Dict[str, dict] = {}
+        masked = []
+        for ln in lines:
+            hit = hits.get(normalize_paragraph(ln)) if ln.strip() else None
+            if hit is None:
+                masked.append(ln)
+                continue
+            marker = TM_MARKER.format(len(markers) + 1)
+            markers[marker] = {"id": hit["id"], "source": ln, "target": hit["target"]}
+            masked.append(marker)
+        return "\n".join(masked), markers
+
+    def _unmask(self, text: str, markers: Dict[str, dict], field: str) -> str:
+        if not markers or not text:
+            return text
+        return TM_MARKER_RE.sub(lambda m: markers[m.group(0)][field] if m.group(0) in markers else m.group(0), text)
+
+    def _remember(self, db: Session, project_id: int, chunks: List[Dict[str, Any]], translations: List[str],
+                  glossary_terms: List[GlossaryTerm]) -> None:
+        """Записывает в память пары абзацев из фрагментов, где разбивка на абзацы сохранилась."""
+        pairs = []
+        used_ids = []
+        for chunk, translated in zip(chunks, translations):
+            markers = chunk.get("markers") or {}
+            used_ids.extend({hit["id"] for hit in markers.values()})
+            reused = {normalize_paragraph(hit["source"]) for hit in markers.values()}
+            source_lines = [ln for ln in self._unmask(chunk["text"], markers, "source").split("\n") if ln.strip()]
+            target_lines = [ln for ln in translated.split("\n") if ln.strip()]
+            if len(source_lines) != len(target_lines):
+                continue
+            pairs.extend(
+                (src, tgt) for src, tgt in zip(source_lines, target_lines)
+                if normalize_paragraph(src) not in reused and not is_scene_break(src)
+            )
         try:
-            response = self.client.complete(prompt)
-            return response.strip()
-        except Exception as e:
-            print(f"Error translating text: {e}")
-            raise
+            translation_memory.record(db, project_id, pairs, used_ids, glossary_terms)
+        except Exception:
+            self.logger.exception("Translation memory update failed")
+
+    def relevant_terms(self, text: str, glossary_terms: List[GlossaryTerm]) -> List[GlossaryTerm]:
+        """Термины глоссария, встречающиеся в тексте (без учета регистра, по границам слов).
+
+        Поиск идет одним проходом автомата Ахо–Корасик, скомпилированного
+        для набора терминов проекта (см. app/core/term_matcher.py).
+        """
+        if not glossary_terms:
+            return []
+        project_id = getattr(glossary_terms[0], "project_id", None)
+        matcher = term_matcher_cache.get(project_id, [term.source_term or "" for term in glossary_terms])
+        found = matcher.find(text)
+        return [term for term in glossary_terms if (term.source_term or "").strip().lower() in found]
+
+    def cache_fingerprint(
+        self,
+        text: str,
+        glossary_terms: List[GlossaryTerm],
+        context_summary: str | None = None,
+        previous_tail: str | None = None,
+        project_summary: str | None = None
+    ) -> str:
+        """Адрес перевода в кэше: от него зависит только результат перевода этого текста.
+
+        Учитываются текст, лишь встречающиеся в нем утвержденные термины глоссария
+        (и есть ли утвержденные термины вообще – от этого зависит текст промпта),
+        саммари главы и проекта, модель, версия шаблона промпта (для отрывка – и
+        предшествующий контекст). Правки терминов, которых нет в главе, не меняют
+        адрес и не требуют нового вызова LLM.
+
+        Память переводов в адрес не входит намеренно: точные совпадения
+        подставляются, только если совпадают абзац и переводы его терминов
+        (см. TranslationMemory.lookup), а похожие абзацы лишь задают
+        формулировки. К тому же сама глава после перевода попадает в память,
+        и с ней в адресе ее перевод никогда не находился бы в кэше. Если
+        меняется то, как память используется в промпте, повышается
+        PROMPT_TEMPLATE_VERSION.
+        """
+        approved = [term for term in glossary_terms if term.status == TermStatus.APPROVED]
+        terms = sorted(
+            (term.source_term, term.translated_term, getattr(term.category, "value", term.category))
+            for term in self.relevant_terms(text, approved)
+        )
+        payload = {
+            "text": hashlib.sha256(text.encode()).hexdigest(),
+            "terms": terms,
+            "glossary": bool(glossary_terms),
+            "summary": hashlib.sha256((context_summary or "").encode()).hexdigest(),
+            "project_summary": hashlib.sha256((project_summary or "").encode()).hexdigest(),
+            "model": self.client.model_name,
+            "prompt": PROMPT_TEMPLATE_VERSION,
+            # Перевод фрагментами зависит от их границ
+            "chunk_tokens": settings.TRANSLATION_CHUNK_MAX_TOKENS if self._is_chunked(text) else 0,
+            # и от того, какой контекст поместился в промпт
+            "prompt_tokens": settings.TRANSLATION_PROMPT_MAX_TOKENS,
+        }
+        if previous_tail:
+            # Отрывок главы переводится с предшествующим текстом как контекстом
+            payload["tail"] = hashlib.sha256(previous_tail.encode()).hexdigest()
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode()).hexdigest()[:32]
 
     def _build_translation_prompt(
         self, 
         text: str, 
         glossary_terms: List[GlossaryTerm],
         context_summary: str | None = None,
-        project_summary: str | None = None
-    ) -> str:
-        """Строит промпт для перевода с учетом глоссария и контекста."""
+        project_summary: str | None = None,
+        previous_tail: str | None = None,
+        memory_references: List[dict] | None = None,
+        memory_markers: bool = False
+    ) -> tuple:
+        """Строит промпт для перевода с учетом глоссария и контекста.
+
+        Промпт укладывается в TRANSLATION_PROMPT_MAX_TOKENS: текст и инструкции
+        обязательны, контекст получает остаток по приоритету – термины текста
+        (по частоте и категории), саммари главы, предыдущий фрагмент, саммари
+        проекта, память переводов. Сокращается сначала наименее важное.
+
+        Returns:
+            (промпт, отчет PromptBudget.report: токены, расход по разделам, что сокращено)
+        """
         # Нормализуем входной текст: приводим переводы строк к \n и убираем лишние пустые
-        normalized = text.replace("\r\n", "\n")
-        lines = [ln.rstrip() for ln in normalized.split("\n")]
-        # Оставляем максимум одну пустую строку подряд
-        compact_lines = []
-        prev_empty = False
-        for ln in lines:
-            if ln == "":
-                if not prev_empty:
-                    compact_lines.append("")
-                prev_empty = True
-            else:
-                compact_lines.append(ln)
-                prev_empty = False
-        normalized_text = "\n".join(compact_lines)
+        normalized_text = normalize_text(text)
 
-        # Формируем глоссарий для промпта
-        glossary_text = self._format_glossary_for_prompt(glossary_terms) if glossary_terms else "(нет утвержденных терминов)"
-        
-        # Базовый промпт
-        prompt = f"""
+        # Маркеры памяти переводов должны вернуться в ответе на своих местах
+        marker_rule = (
+            "9. Строки вида ⟦TM1⟧ – уже переведенные абзацы: перенеси их в перевод без изменений, "
+            "отдельными строками на тех же местах\n"
+        ) if memory_markers else ""
+
+        head = """
 Ты - профессиональный переводчик ранобэ с английского на русский язык. 
 
 ВАЖНО: Ты ДОЛЖЕН строго следовать предоставленному глоссарию для перевода всех терминов.
 
 ГЛОССАРИЙ (обязательно использовать эти переводы):
-{glossary_text}
-
-"""
-        
-        # Добавляем общее саммари проекта, если есть
-        if project_summary:
-            prompt += f"""
-ОБЩИЙ КОНТЕКСТ ПРОИЗВЕДЕНИЯ:
-{project_summary}
-
-"""
-        
-        # Добавляем контекст текущей главы, если есть
-        if context_summary:
-            prompt += f"""
-КОНТЕКСТ ТЕКУЩЕЙ ГЛАВЫ:
-{context_summary}
+{glossary}
 
 """
-        
-        prompt += f"""
+        body = f"""
 ТЕКСТ ДЛЯ ПЕРЕВОДА:
 {normalized_text}
 
@@ -106,11 +639,107 @@ class TranslationEngine:
 6. Учитывай контекст произведения и главы для более точного перевода
 7. Не добавляй комментарии или пояснения в перевод
 8. Сохраняй эмоциональную окраску и тон повествования
-
+{marker_rule}
 ПЕРЕВОД:
 """
-        
-        return prompt
+        sections = {
+            "project_summary": "\nОБЩИЙ КОНТЕКСТ ПРОИЗВЕДЕНИЯ:\n{}\n\n",
+            "chapter_summary": "\nКОНТЕКСТ ТЕКУЩЕЙ ГЛАВЫ:\n{}\n\n",
+            "memory_references": "\nПАМЯТЬ ПЕРЕВОДОВ (похожие абзацы, переведенные ранее; сохраняй единообразие формулировок):\n{}\n\n",
+            "previous_tail": "\nПРЕДЫДУЩИЙ ФРАГМЕНТ (только для связности, НЕ переводить):\n{}\n\n",
+        }
+        overhead = {name: prompt_tokens(template.format("")) for name, template in sections.items()}
+        budget = PromptBudget(
+            settings.TRANSLATION_PROMPT_MAX_TOKENS,
+            prompt_tokens(head.format(glossary="")) + prompt_tokens(body),
+            settings.TRANSLATION_PROMPT_MIN_SECTION_TOKENS
+        )
+
+        # Глоссарий для промпта: только утвержденные термины, которые есть в этом тексте, важные первыми
+        relevant = [
+            term for term in self.relevant_terms(normalized_text, glossary_terms)
+            if term.status == TermStatus.APPROVED
+        ]
+
+        def term_cost(term, kept):
+            cost = prompt_tokens(f"  {term.source_term} → {term.translated_term}\n")
+            category = getattr(term.category, "value", term.category)
+            if all(getattr(k.category, "value", k.category) != category for k in kept):
+                # Заголовок категории и пустая строка после нее
+                cost += prompt_tokens(f"{self._get_category_label(category)}:\n\n")
+            return cost
+
+        kept_terms = budget.fit_items("glossary", rank_terms(relevant), term_cost, label=lambda term: term.source_term)
+        if not glossary_terms:
+            glossary_text = "(нет утвержденных терминов)"
+        elif kept_terms:
+            glossary_text = self._format_glossary_for_prompt(kept_terms)
+        elif relevant:
+            glossary_text = "(термины глоссария не поместились в промпт)"
+        else:
+            glossary_text = "(в тексте нет терминов глоссария)"
+
+        context = budget.fit_text("chapter_summary", context_summary, overhead["chapter_summary"])
+        tail = budget.fit_text("previous_tail", previous_tail, overhead["previous_tail"], keep="end")
+        project = budget.fit_text("project_summary", project_summary, overhead["project_summary"])
+        references = budget.fit_items(
+            "memory_references", list(memory_references or []),
+            lambda ref, kept: prompt_tokens(f"- {ref['source']}\n  → {ref['target']}\n")
+            + (0 if kept else overhead["memory_references"])
+        )
+
+        # Разделы идут в прежнем порядке; бюджет распределялся по приоритету
+        prompt = head.format(glossary=glossary_text)
+        if project:
+            prompt += sections["project_summary"].format(project)
+        if context:
+            prompt += sections["chapter_summary"].format(context)
+        if references:
+            # Похожие абзацы из памяти переводов – для единообразия формулировок
+            prompt += sections["memory_references"].format(
+                "\n".join(f"- {ref['source']}\n  → {ref['target']}" for ref in references)
+            )
+        if tail:
+            # Конец предыдущего фрагмента при переводе по частям
+            prompt += sections["previous_tail"].format(tail)
+        prompt += body
+        return prompt, budget.report(prompt)
+
+    def _build_glossary_fix_prompt(
+        self,
+        original: str,
+        translation: str,
+        missing: List[dict],
+        context_summary: str | None = None
+    ) -> str:
+        """Промпт исправления абзаца, в переводе которого не использованы термины глоссария."""
+        terms = "\n".join(f"  {term['source_term']} → {term['translated_term']}" for term in missing)
+        context = f"""
+КОНТЕКСТ ТЕКУЩЕЙ ГЛАВЫ:
+{context_summary}
+""" if context_summary else ""
+        return f"""
+Ты - редактор перевода ранобэ с английского на русский язык.
+
+В переводе фрагмента не использованы обязательные переводы терминов из глоссария.
+
+ТЕРМИНЫ (обязательно использовать эти переводы):
+{terms}
+{context}
+ОРИГИНАЛ:
+{normalize_text(original)}
+
+ТЕКУЩИЙ ПЕРЕВОД:
+{normalize_text(translation)}
+
+ИНСТРУКЦИИ:
+1. Замени переводы перечисленных терминов на указанные, согласовав падеж и число
+2. Остальной текст перевода оставь без изменений
+3. Сохрани разбивку на абзацы
+4. Верни только исправленный перевод, без комментариев
+
+ИСПРАВЛЕННЫЙ ПЕРЕВОД:
+"""
 
     def _format_glossary_for_prompt(self, glossary_terms: List[GlossaryTerm]) -> str:
         """Форматирует глоссарий для включения в промпт."""
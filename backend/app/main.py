@@ -11,6 +11,7 @@ try:
     from app.models import *  # Импортируем все модели для регистрации
     from app.api import projects, glossary, processing, translation, batch
     from app.core.config import settings
+    from app.core.idempotency import IdempotencyMiddleware
     
     logger.info("Configuration loaded successfully")
     logger.info(f"Environment: {settings.ENVIRONMENT}")
@@ -32,6 +33,9 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Повтор POST-запросов с заголовком Idempotency-Key (CORS добавляется позже и оборачивает его)
+app.add_middleware(IdempotencyMiddleware)
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -49,6 +53,19 @@ app.include_router(translation.router, prefix="/translation", tags=["translation
 app.include_router(batch.router, prefix="/batch", tags=["batch"])
 
 
+@app.on_event("startup")
+def warm_caches():
+    if settings.CACHE_WARM_ON_STARTUP:
+        from app.services.cache_warmer import cache_warmer
+        cache_warmer.warm_in_background()
+
+
+@app.on_event("shutdown")
+async def close_cache_connections():
+    from app.services.async_cache_service import async_cache_service
+    await async_cache_service.close()
+
+
 @app.get("/")
 def read_root():
     return {
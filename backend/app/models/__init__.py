@@ -8,10 +8,12 @@ from .project import Project, Chapter
 from .glossary import (
     GlossaryTerm, 
     TermRelationship, 
+    TermOccurrence,
     GlossaryVersion, 
     BatchJob, 
     BatchJobItem
 )
+from .translation import TranslationMemoryEntry, TranslationReview
 
 __all__ = [
     'Base',
@@ -19,7 +21,10 @@ __all__ = [
     'Chapter', 
     'GlossaryTerm',
     'TermRelationship',
+    'TermOccurrence',
     'GlossaryVersion',
     'BatchJob',
-    'BatchJobItem'
+    'BatchJobItem',
+    'TranslationMemoryEntry',
+    'TranslationReview'
 ]
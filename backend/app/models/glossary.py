@@ -42,6 +42,7 @@ class GlossaryTerm(Base):
     project = relationship("Project", back_populates="glossary_terms")
     source_relationships = relationship("TermRelationship", foreign_keys="TermRelationship.source_term_id", back_populates="source_term")
     target_relationships = relationship("TermRelationship", foreign_keys="TermRelationship.target_term_id", back_populates="target_term")
+    occurrences = relationship("TermOccurrence", back_populates="term", cascade="all, delete-orphan", passive_deletes=True)
 
     __table_args__ = (
         Index("ix_glossary_terms_project_id", "project_id"),
@@ -67,6 +68,29 @@ class TermRelationship(Base):
     target_term = relationship("GlossaryTerm", foreign_keys=[target_term_id], back_populates="target_relationships")
 
 
+class TermOccurrence(Base):
+    """Вхождения термина глоссария в оригинал главы (обратный индекс термин → главы)."""
+    __tablename__ = "term_occurrences"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    term_id = Column(Integer, ForeignKey("glossary_terms.id", ondelete="CASCADE"), nullable=False)
+    chapter_id = Column(Integer, ForeignKey("chapters.id", ondelete="CASCADE"), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    offsets = Column(JSON, nullable=True)  # [[начало, конец], ...] в original_text, не больше TERM_INDEX_MAX_OFFSETS
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Связи
+    term = relationship("GlossaryTerm", back_populates="occurrences")
+    chapter = relationship("Chapter", back_populates="term_occurrences")
+
+    __table_args__ = (
+        UniqueConstraint("term_id", "chapter_id", name="uq_term_occurrence"),
+        Index("ix_term_occurrences_chapter_id", "chapter_id"),
+        Index("ix_term_occurrences_project_id", "project_id"),
+    )
+
+
 class GlossaryVersion(Base):
     __tablename__ = "glossary_versions"
 
@@ -87,7 +111,7 @@ class BatchJob(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
-    job_type = Column(String(50), nullable=False)  # 'analyze', 'translate', 'process'
+    job_type = Column(String(50), nullable=False)  # 'analyze', 'translate', 'review', 'process'
     status = Column(String(20), default="pending")  # pending, running, completed, failed
     total_items = Column(Integer, default=0)
     processed_items = Column(Integer, default=0)
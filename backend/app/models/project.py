@@ -4,7 +4,7 @@ from datetime import datetime
 from typing import List
 from enum import Enum
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, JSON
 from sqlalchemy.orm import relationship
 
 from . import Base
@@ -29,6 +29,10 @@ class Project(Base):
     name = Column(String(255), unique=True, index=True, nullable=False)
     genre = Column(String(50), default=ProjectGenre.OTHER, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Общее саммари проекта (контекст перевода) и хэш саммари глав, из которых оно собрано
+    summary = Column(Text, nullable=True)
+    summary_inputs_hash = Column(String(64), nullable=True)
+    summary_updated_at = Column(DateTime, nullable=True)
     
     # Связи
     chapters = relationship("Chapter", back_populates="project", cascade="all, delete-orphan")
@@ -37,6 +41,8 @@ class Project(Base):
     glossary_versions = relationship("GlossaryVersion", back_populates="project", cascade="all, delete-orphan")
     batch_jobs = relationship("BatchJob", back_populates="project", cascade="all, delete-orphan")
     batch_job_items = relationship("BatchJobItem", back_populates="project", cascade="all, delete-orphan")
+    translation_memory = relationship("TranslationMemoryEntry", back_populates="project", cascade="all, delete-orphan")
+    translation_reviews = relationship("TranslationReview", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Chapter(Base):
@@ -47,6 +53,8 @@ class Chapter(Base):
     title = Column(String(255), nullable=False)
     original_text = Column(Text, nullable=False)
     translated_text = Column(Text, nullable=True)
+    # Выравнивание перевода по абзацам оригинала (см. app/core/alignment.py)
+    alignment = Column(JSON, nullable=True)
     summary = Column(Text, nullable=True)
     order = Column(Integer, default=0, nullable=False)  # Порядок главы в проекте
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -54,6 +62,8 @@ class Chapter(Base):
     
     # Связи
     project = relationship("Project", back_populates="chapters")
+    term_occurrences = relationship("TermOccurrence", back_populates="chapter", cascade="all, delete-orphan", passive_deletes=True)
+    translation_reviews = relationship("TranslationReview", back_populates="chapter", cascade="all, delete-orphan", passive_deletes=True)
 
     __table_args__ = (
         Index("ix_chapters_project_id", "project_id"),
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime, ForeignKey, JSON, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+
+from . import Base
+
+
+class TranslationMemoryEntry(Base):
+    """Пара исходный/переведенный абзац в памяти переводов проекта."""
+    __tablename__ = "translation_memory"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    source_hash = Column(String(64), nullable=False)  # sha256 нормализованного исходного абзаца
+    source_text = Column(Text, nullable=False)
+    target_text = Column(Text, nullable=False)
+    signature = Column(JSON, nullable=True)  # MinHash-сигнатура для нечеткого поиска
+    terms = Column(JSON, nullable=True)  # {термин: перевод} встречающихся терминов глоссария на момент перевода
+    hit_count = Column(Integer, default=0, server_default="0")  # Сколько раз абзац подставлен без LLM
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Связи
+    project = relationship("Project", back_populates="translation_memory")
+
+    __table_args__ = (
+        Index("ix_translation_memory_project_id", "project_id"),
+        UniqueConstraint("project_id", "source_hash", name="uq_translation_memory_source"),
+    )
+
+
+class TranslationReview(Base):
+    """Рецензия LLM на перевод главы; одна на каждую версию перевода (по хэшу текста)."""
+    __tablename__ = "translation_reviews"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    chapter_id = Column(Integer, ForeignKey("chapters.id", ondelete="CASCADE"), nullable=False)
+    translation_hash = Column(String(64), nullable=False)  # sha256 нормализованного translated_text
+    score = Column(Float, nullable=False)  # Оценка 1-10, средняя по фрагментам с весом по длине
+    min_score = Column(Float, nullable=False)  # Оценка худшего фрагмента
+    issue_count = Column(Integer, nullable=False, default=0)
+    issues = Column(JSON, nullable=True)  # [{"chunk", "type", "severity", "translation", "suggestion", "comment"}]
+    chunks = Column(JSON, nullable=True)  # [{"paragraphs": [начало, конец], "score", "summary"}]
+    summary = Column(Text, nullable=True)
+    model = Column(String(100), nullable=True)
+    prompt_version = Column(String(20), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Связи
+    project = relationship("Project", back_populates="translation_reviews")
+    chapter = relationship("Chapter", back_populates="translation_reviews")
+
+    __table_args__ = (
+        UniqueConstraint("chapter_id", "translation_hash", name="uq_translation_review"),
+        Index("ix_translation_reviews_project_score", "project_id", "score"),
+    )
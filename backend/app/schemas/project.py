@@ -18,6 +18,7 @@ class ProjectCreate(ProjectBase):
 class ProjectRead(ProjectBase):
     id: int
     created_at: datetime
+    summary: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
 
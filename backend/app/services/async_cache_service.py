@@ -0,0 +1,561 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Optional
+
+import redis.asyncio as aioredis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+
+from app.core.config import settings
+from app.services.cache_service import COMPARE_AND_DELETE, CacheService, LeaseHeldError, cache_service
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.disk_cache import DiskCache
+from app.services.local_cache import MISSING
+try:
+    from upstash_redis.asyncio import Redis as AsyncUpstashRedis
+except Exception:
+    AsyncUpstashRedis = None  # type: ignore
+
+
+class AsyncDiskClient:
+    """Асинхронная обертка над DiskCache с интерфейсом redis.asyncio (режим CACHE_BACKEND=local)."""
+
+    def __init__(self, disk: DiskCache):
+        self.disk = disk
+
+    def __getattr__(self, name: str):
+        method = getattr(self.disk, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+
+    def pipeline(self, transaction: bool = False) -> "AsyncDiskPipeline":
+        return AsyncDiskPipeline(self.disk.pipeline())
+
+    async def aclose(self) -> None:
+        pass
+
+
+class AsyncDiskPipeline:
+    def __init__(self, pipe):
+        self.pipe = pipe
+
+    def setex(self, key, ttl, value):
+        self.pipe.setex(key, ttl, value)
+
+    async def execute(self, raise_on_error: bool = True) -> list:
+        return await asyncio.to_thread(self.pipe.execute, raise_on_error)
+
+
+class AsyncCacheService:
+    """Асинхронный двойник CacheService (redis.asyncio + async-клиент Upstash).
+
+    Ключи, кодек и L1 общие с синхронным сервисом, поэтому записи одного
+    читаются другим, а межпроцессная инвалидация L1 работает для обоих.
+    """
+
+    def __init__(self, sync: CacheService):
+        self.sync = sync
+        self.codec = sync.codec
+        self.metrics = sync.metrics
+        self.default_ttl = sync.default_ttl
+        self.logger = logging.getLogger("async_cache_service")
+
+        self.rest_client = None
+        if AsyncUpstashRedis and settings.UPSTASH_REDIS_REST_URL and settings.UPSTASH_REDIS_REST_TOKEN:
+            try:
+                self.rest_client = AsyncUpstashRedis(
+                    url=settings.UPSTASH_REDIS_REST_URL,
+                    token=settings.UPSTASH_REDIS_REST_TOKEN,
+                )
+            except Exception as e:
+                self.logger.warning("Async Upstash REST init failed, falling back to TCP: %s", e)
+
+        self.tcp_pool = None
+        if sync.local_only:
+            self.redis_client = AsyncDiskClient(sync.disk)
+            return
+        if sync.redis_client is None:
+            # Только Upstash REST (см. CacheService)
+            self.redis_client = None
+            return
+
+        # Соединения создаются лениво внутри event loop
+        self.tcp_pool = aioredis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            socket_keepalive=True,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            retry_on_timeout=True,
+            retry_on_error=[aioredis.ConnectionError],
+            retry=Retry(ExponentialBackoff(cap=1.0, base=0.05), settings.REDIS_RETRY_ATTEMPTS),
+        )
+        self.redis_client = aioredis.Redis(connection_pool=self.tcp_pool)
+
+    async def close(self) -> None:
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+        if self.tcp_pool is not None:
+            await self.tcp_pool.disconnect()
+
+    # Транспорты: общий с синхронным сервисом автомат и TransportSelector
+    async def _dispatch(self, op: str, namespaces: set, rest=None, tcp=None, quiet: bool = False) -> Any:
+        """Асинхронный вариант CacheService._dispatch.
+
+        rest/tcp – функции без аргументов, возвращающие корутину. Порядок
+        транспортов, их статистика и автомат общие с синхронным сервисом,
+        поэтому отказ Redis, замеченный одним из них, сразу учитывается обоими.
+        """
+        sync = self.sync
+        if not sync.breaker.allow():
+            raise CircuitOpenError("redis circuit is open")
+        calls = {"rest": rest if self.rest_client else None, "tcp": tcp if self.redis_client is not None else None}
+        candidates = [transport for transport in sync.transport.order(op) if calls.get(transport) is not None]
+        error: Optional[Exception] = None
+        for i, transport in enumerate(candidates):
+            started = time.perf_counter()
+            try:
+                result = await calls[transport]()
+            except Exception as e:
+                sync.transport.record(transport, op, time.perf_counter() - started, False, str(e)[:200])
+                error = e
+                if i + 1 < len(candidates):
+                    sync._count_batch(namespaces, self.metrics.fallback)
+                    if not quiet:
+                        self.logger.warning(
+                            f"{transport.upper()} cache {op} error, fallback to {candidates[i + 1].upper()}: {e}"
+                        )
+                continue
+            sync.transport.record(transport, op, time.perf_counter() - started, True)
+            sync.breaker.record_success()
+            return result
+        sync.breaker.record_failure(error)
+        raise error or RuntimeError("no cache transport configured")
+
+    def _log_failure(self, op: str, error: Exception) -> None:
+        # При разомкнутом автомате отказ ожидаем – не пишем его в лог на каждом вызове
+        if not isinstance(error, CircuitOpenError):
+            self.logger.warning(f"Cache {op} error: {error}")
+
+    # L1 и инвалидация
+    async def _forget_local(self, *keys: str) -> None:
+        """См. CacheService._forget_local: вызывается после записи в Redis."""
+        # Ключи, которые не кэшируются в L1 (счетчики лимитов, блокировки), ни сбрасывать, ни рассылать незачем
+        keys = [k for k in keys if self.sync._l1_cached(k)]
+        if not keys:
+            return
+        for key in keys:
+            self.sync.l1.delete(key)
+        await self._publish_invalidation(keys)
+
+    async def _publish_invalidation(self, keys: list) -> None:
+        message = json.dumps({"origin": self.sync.instance_id, "keys": list(keys), "patterns": []})
+        channel = settings.CACHE_INVALIDATION_CHANNEL
+        try:
+            await self._dispatch(
+                "publish", self.sync._namespaces_of(keys),
+                rest=lambda: self.rest_client.publish(channel, message),
+                tcp=lambda: self.redis_client.publish(channel, message),
+            )
+        except Exception as e:
+            self._log_failure("invalidation publish", e)
+
+    # Дисковый уровень: все обращения к SQLite – в потоке, чтобы не блокировать event loop
+    async def _fall_through(self, op: str, key: str, value: Any = None, ttl: int | None = None) -> Any:
+        """Дисковый запасной уровень (SQLite), когда Redis недоступен."""
+        if self.sync._disk_fallback() is None:
+            return None
+        return await asyncio.to_thread(self.sync._fall_through, op, key, value, ttl)
+
+    async def _fall_through_many(self, op: str, items: list, ttl: int | None = None) -> list:
+        """_fall_through для пачки (ключ, значение) одним переходом в поток."""
+        if self.sync._disk_fallback() is None:
+            return [None] * len(items)
+        return await asyncio.to_thread(
+            lambda: [self.sync._fall_through(op, key, value, ttl) for key, value in items]
+        )
+
+    async def _mirror_write(self, items: list, ttl: int | None) -> None:
+        """Дублирование дорогих пространств на диск (см. CacheService._mirror_write)."""
+        mirrored = [(key, value) for key, value in items if self.sync._namespace_of(key) in self.sync.disk_mirror]
+        if mirrored:
+            await asyncio.to_thread(
+                lambda: [self.sync._mirror_write(key, value, ttl) for key, value in mirrored]
+            )
+
+    async def _mirror_delete(self, keys: list) -> None:
+        if self.sync._disk_fallback() is not None:
+            await asyncio.to_thread(self.sync._mirror_delete, keys)
+
+    # Базовые операции
+    async def _read_raw(self, key: str, quiet: bool = False) -> Any:
+        namespace = self.sync._namespace_of(key)
+        started = time.perf_counter()
+        try:
+            return await self._dispatch(
+                "get", {namespace},
+                rest=lambda: self.rest_client.get(key),
+                tcp=lambda: self.redis_client.get(key),
+                quiet=quiet,
+            )
+        except Exception as e:
+            self.metrics.error(namespace)
+            if not quiet:
+                self._log_failure("get", e)
+            return await self._fall_through("get", key)
+        finally:
+            self.metrics.observe(namespace, "get", time.perf_counter() - started)
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Получить значение из кэша (L1, затем Redis)."""
+        if self.sync._l1_ttl(key) > 0:
+            cached = self.sync.l1.get(key)
+            if cached is not MISSING:
+                self.metrics.hit(self.sync._namespace_of(key), l1=True)
+                return cached
+
+        epoch = self.sync._l1_epoch()
+        value = await self._read_raw(key)
+        if value is None:
+            self.sync.l2_misses += 1
+            self.metrics.miss(self.sync._namespace_of(key))
+            return None
+
+        self.sync.l2_hits += 1
+        self.metrics.hit(self.sync._namespace_of(key), len(value))
+        decoded = self.sync._decode_value(value, key)
+        self.sync._l1_store(key, decoded, value, epoch=epoch)
+        return decoded
+
+    async def get_quiet(self, key: str) -> Optional[Any]:
+        """Получить значение без логов (для статистики/проверок)."""
+        value = await self._read_raw(key, quiet=True)
+        if value is None:
+            return None
+        return self.sync._decode_value(value, key)
+
+    async def set(self, key: str, value: Any, ttl: int = None) -> bool:
+        """Установить значение в кэш."""
+        ttl = ttl or self.default_ttl
+        serialized_value = self.sync._serialize(value, key)
+        namespace = self.sync._namespace_of(key)
+        self.metrics.written(namespace, len(serialized_value))
+        started = time.perf_counter()
+        try:
+            ok = bool(await self._dispatch(
+                "set", {namespace},
+                rest=lambda: self.rest_client.set(key, serialized_value, ex=ttl),
+                tcp=lambda: self.redis_client.setex(key, ttl, serialized_value),
+            ))
+            await self._mirror_write([(key, serialized_value)], ttl)
+        except Exception as e:
+            self.metrics.error(namespace)
+            self._log_failure("set", e)
+            ok = bool(await self._fall_through("set", key, serialized_value, ttl))
+        finally:
+            self.metrics.observe(namespace, "set", time.perf_counter() - started)
+        await self._forget_local(key)
+        return ok
+
+    async def set_nx(self, key: str, value: str, ttl: int) -> bool:
+        """Записать строку, только если ключа нет (SET NX EX)."""
+        try:
+            return bool(await self._dispatch(
+                "set_nx", {self.sync._namespace_of(key)},
+                rest=lambda: self.rest_client.set(key, value, nx=True, ex=ttl),
+                tcp=lambda: self.redis_client.set(key, value, nx=True, ex=ttl),
+            ))
+        except Exception as e:
+            self._log_failure("lock", e)
+            # Без Redis блокировка только локальная (в пределах узла)
+            disk = self.sync._disk_fallback()
+            if disk is None:
+                return False
+            try:
+                return await asyncio.to_thread(disk.set, key, value, ex=ttl, nx=True)
+            except Exception:
+                return False
+
+    async def increment_counter(self, key: str, ttl: int = 60) -> int:
+        """Атомарно инкрементирует счетчик; TTL ставится новому окну в той же транзакции."""
+        namespace = self.sync._namespace_of(key)
+        started = time.perf_counter()
+        epoch = self.sync._l1_epoch()
+
+        async def rest_incr() -> int:
+            # SET NX EX + INCR одной транзакцией (MULTI/EXEC), один HTTPS-запрос
+            pipe = self.rest_client.multi()
+            pipe.set(key, 0, ex=ttl, nx=True)
+            pipe.incr(key)
+            return int((await pipe.exec())[1])
+
+        async def tcp_incr() -> int:
+            if self.sync.local_only:
+                return await asyncio.to_thread(self.sync._tcp_incr_with_ttl, key, ttl)
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.set(key, 0, ex=ttl, nx=True)
+            pipe.incr(key)
+            return int((await pipe.execute())[1])
+
+        try:
+            value = await self._dispatch("incr", {namespace}, rest=rest_incr, tcp=tcp_incr)
+            await self._mirror_write([(key, str(value))], ttl)
+            # См. CacheService._store_counters
+            if self.sync._l1_cached(key):
+                await self._publish_invalidation([key])
+                self.sync._l1_store(key, value, str(value), ttl, epoch)
+            return value
+        except Exception as e:
+            self.metrics.error(namespace)
+            self._log_failure("incr", e)
+            value = await self._fall_through("incr", key, ttl=ttl) or 0
+            await self._forget_local(key)
+            return value
+        finally:
+            self.metrics.observe(namespace, "incr", time.perf_counter() - started)
+
+    async def compare_and_delete(self, key: str, expected: str) -> bool:
+        """Удалить ключ, только если его значение равно expected (атомарно, Lua)."""
+        async def tcp() -> bool:
+            if self.sync.local_only:
+                return await self.redis_client.compare_and_delete(key, expected)
+            return bool(await self.redis_client.eval(COMPARE_AND_DELETE, 1, key, expected))
+
+        try:
+            return bool(await self._dispatch(
+                "eval", {self.sync._namespace_of(key)},
+                rest=lambda: self.rest_client.eval(COMPARE_AND_DELETE, keys=[key], args=[expected]),
+                tcp=tcp,
+            ))
+        except Exception as e:
+            self._log_failure("eval", e)
+            disk = self.sync._disk_fallback()
+            try:
+                return disk is not None and await asyncio.to_thread(disk.compare_and_delete, key, expected)
+            except Exception:
+                return False
+        finally:
+            await self._forget_local(key)
+
+    async def delete(self, key: str) -> bool:
+        """Удалить значение из кэша."""
+        return await self.delete_many([key]) > 0
+
+    async def get_many(self, keys: list) -> dict:
+        """Получить несколько значений (L1, затем один MGET). Промахи – None."""
+        result: dict = {}
+        missing = []
+        epoch = self.sync._l1_epoch()
+        for key in keys:
+            if self.sync._l1_ttl(key) > 0:
+                cached = self.sync.l1.get(key)
+                if cached is not MISSING:
+                    self.metrics.hit(self.sync._namespace_of(key), l1=True)
+                    result[key] = cached
+                    continue
+            missing.append(key)
+        if not missing:
+            return result
+
+        namespaces = self.sync._namespaces_of(missing)
+        started = time.perf_counter()
+        try:
+            raw_values = await self._dispatch(
+                "mget", namespaces,
+                rest=lambda: self.rest_client.mget(*missing),
+                tcp=lambda: self.redis_client.mget(missing),
+            )
+        except Exception as e:
+            self.sync._count_batch(namespaces, self.metrics.error)
+            self._log_failure("mget", e)
+            raw_values = await self._fall_through_many("get", [(key, None) for key in missing])
+        self.sync._observe_batch(namespaces, "mget", started)
+
+        for key, value in zip(missing, raw_values):
+            if value is None:
+                self.sync.l2_misses += 1
+                self.metrics.miss(self.sync._namespace_of(key))
+                result[key] = None
+                continue
+            self.sync.l2_hits += 1
+            self.metrics.hit(self.sync._namespace_of(key), len(value))
+            decoded = self.sync._decode_value(value, key)
+            self.sync._l1_store(key, decoded, value, epoch=epoch)
+            result[key] = decoded
+        return result
+
+    async def set_many(self, mapping: dict, ttl: int = None) -> bool:
+        """Записать несколько значений с общим TTL одним пайплайном."""
+        if not mapping:
+            return True
+        ttl = ttl or self.default_ttl
+        items = [(key, self.sync._serialize(value, key)) for key, value in mapping.items()]
+        for key, value in items:
+            self.metrics.written(self.sync._namespace_of(key), len(value))
+        namespaces = self.sync._namespaces_of(mapping.keys())
+
+        async def rest() -> list:
+            pipe = self.rest_client.pipeline()
+            for key, value in items:
+                pipe.set(key, value, ex=ttl)
+            return await pipe.exec()
+
+        async def tcp() -> list:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, value in items:
+                pipe.setex(key, ttl, value)
+            return await pipe.execute(raise_on_error=False)
+
+        started = time.perf_counter()
+        try:
+            results = await self._dispatch("pipeline", namespaces, rest=rest, tcp=tcp)
+            await self._mirror_write(items, ttl)
+        except Exception as e:
+            self.sync._count_batch(namespaces, self.metrics.error)
+            self._log_failure("pipeline", e)
+            results = await self._fall_through_many("set", items, ttl)
+        finally:
+            self.sync._observe_batch(namespaces, "pipeline", started)
+        await self._forget_local(*mapping.keys())
+        return all(bool(r) and not isinstance(r, Exception) for r in results)
+
+    async def delete_many(self, keys: list) -> int:
+        """Удалить несколько ключей одной командой."""
+        if not keys:
+            return 0
+        namespaces = self.sync._namespaces_of(keys)
+        started = time.perf_counter()
+        try:
+            removed = int(await self._dispatch(
+                "delete", namespaces,
+                rest=lambda: self.rest_client.delete(*keys),
+                tcp=lambda: self.redis_client.delete(*keys),
+            ) or 0)
+            await self._mirror_delete(keys)
+            return removed
+        except Exception as e:
+            self.sync._count_batch(namespaces, self.metrics.error)
+            self._log_failure("delete", e)
+            return sum(int(r or 0) for r in await self._fall_through_many("delete", [(key, None) for key in keys]))
+        finally:
+            self.sync._observe_batch(namespaces, "delete", started)
+            await self._forget_local(*keys)
+
+    # Аренда (см. CacheService.acquire_lease): ожидание чужой аренды не занимает поток пула
+    async def acquire_lease(self, operation: str, entity: Any, ttl: int | None = None) -> Optional[str]:
+        ttl = ttl or settings.CACHE_LEASE_TTL
+        lease = self.sync._new_lease(operation, entity, ttl)
+        return lease if await self.set_nx(self.sync._lease_key(operation, entity), lease, ttl) else None
+
+    async def release_lease(self, operation: str, entity: Any, lease: str) -> bool:
+        return await self.compare_and_delete(self.sync._lease_key(operation, entity), lease)
+
+    async def get_lease(self, operation: str, entity: Any) -> Optional[dict]:
+        value = await self.get_quiet(self.sync._lease_key(operation, entity))
+        return value if isinstance(value, dict) else None
+
+    async def run_exclusive(self, operation: str, entity: Any, func, wait: float = 0, ttl: int | None = None) -> Any:
+        """См. CacheService.run_exclusive. func синхронная и выполняется в потоке,
+        а опрос занятой аренды идет в event loop (asyncio.sleep), не держа поток."""
+        deadline = time.monotonic() + wait
+        observed: Optional[dict] = None
+        while True:
+            lease = await self.acquire_lease(operation, entity, ttl)
+            if lease is not None:
+                try:
+                    result = await asyncio.to_thread(func)
+                    await self.set(
+                        self.sync._lease_result_key(operation, entity),
+                        {"token": json.loads(lease)["token"], "result": result},
+                        settings.CACHE_LEASE_RESULT_TTL
+                    )
+                    return result
+                finally:
+                    await self.release_lease(operation, entity, lease)
+
+            current = await self.get_lease(operation, entity)
+            if current is not None:
+                observed = current
+            elif observed is not None:
+                # Аренда снята: владелец мог оставить результат
+                stored = await self.get_quiet(self.sync._lease_result_key(operation, entity))
+                if isinstance(stored, dict) and stored.get("token") == observed.get("token"):
+                    return stored.get("result")
+            if time.monotonic() >= deadline:
+                raise LeaseHeldError(operation, entity, current or observed)
+            await asyncio.sleep(min(settings.CACHE_LEASE_POLL_INTERVAL, max(deadline - time.monotonic(), 0.05)))
+
+    # Поколения
+    async def get_generation(self, namespace: str, entity: Any = None) -> int:
+        key = self.sync._generation_key(namespace, entity)
+        return (await self._generations([key]))[key]
+
+    async def _generations(self, keys: list) -> dict:
+        """См. CacheService._generations: несуществующее поколение в L1 не кладется."""
+        values = await self.get_many(keys)
+        return {key: values[key] if isinstance(values.get(key), int) else 0 for key in keys}
+
+    async def bump_generation(self, namespace: str, entity: Any = None) -> int:
+        return await self.increment_counter(self.sync._generation_key(namespace, entity), ttl=self.sync.generation_ttl)
+
+    async def _versioned_key(self, namespace: str, entity: Any, *args) -> str:
+        gen_keys = [self.sync._generation_key(namespace), self.sync._generation_key(namespace, entity)]
+        gens = await self._generations(gen_keys)
+        ns_gen, entity_gen = (gens[k] for k in gen_keys)
+        return self.sync._generate_key(namespace, entity, f"g{ns_gen}.{entity_gen}", *args)
+
+    # Кэширование переводов
+    async def get_cached_translation(self, chapter_id: int, fingerprint: str) -> Optional[str]:
+        """Получить кэшированный перевод."""
+        return await self.get(await self._versioned_key("translation", chapter_id, fingerprint))
+
+    async def cache_translation(self, chapter_id: int, fingerprint: str, translation: str, ttl: int = 86400) -> bool:
+        """Кэшировать перевод (TTL 24 часа)."""
+        return await self.set(await self._versioned_key("translation", chapter_id, fingerprint), translation, ttl)
+
+    async def invalidate_translation_cache(self, chapter_id: int) -> bool:
+        """Инвалидировать кэш перевода для главы."""
+        return await self.bump_generation("translation", chapter_id) > 0
+
+    # Кэширование глоссария
+    async def get_cached_glossary(self, project_id: int) -> Optional[list]:
+        return await self.get(self.sync.get_glossary_cache_key(project_id))
+
+    async def cache_glossary(self, project_id: int, glossary: list, ttl: int = 3600) -> bool:
+        return await self.set(self.sync.get_glossary_cache_key(project_id), glossary, ttl)
+
+    async def invalidate_glossary_cache(self, project_id: int) -> bool:
+        return await self.delete(self.sync.get_glossary_cache_key(project_id))
+
+    # Кэширование саммари
+    async def get_cached_summary(self, chapter_id: int) -> Optional[str]:
+        return await self.get(self.sync.get_summary_cache_key(chapter_id))
+
+    async def cache_summary(self, chapter_id: int, summary: str, ttl: int = 7200) -> bool:
+        return await self.set(self.sync.get_summary_cache_key(chapter_id), summary, ttl)
+
+    async def invalidate_summary_cache(self, chapter_id: int) -> bool:
+        return await self.delete(self.sync.get_summary_cache_key(chapter_id))
+
+    # Кэширование связей
+    async def get_cached_relationships(self, project_id: int) -> Optional[list]:
+        return await self.get(self.sync.get_relationships_cache_key(project_id))
+
+    async def cache_relationships(self, project_id: int, relationships: list, ttl: int = 3600) -> bool:
+        return await self.set(self.sync.get_relationships_cache_key(project_id), relationships, ttl)
+
+    async def invalidate_relationships_cache(self, project_id: int) -> bool:
+        return await self.delete(self.sync.get_relationships_cache_key(project_id))
+
+    def generate_glossary_hash(self, glossary_terms: list) -> str:
+        return self.sync.generate_glossary_hash(glossary_terms)
+
+
+async_cache_service = AsyncCacheService(cache_service)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import base64
+import json
+import threading
+import time
+import zlib
+from typing import Any
+
+try:
+    import orjson
+except Exception:
+    orjson = None  # type: ignore
+try:
+    import msgpack
+except Exception:
+    msgpack = None  # type: ignore
+try:
+    import zstandard
+except Exception:
+    zstandard = None  # type: ignore
+
+
+# Значения с заголовком: HEADER + код формата + base64(полезная нагрузка).
+# Значения без заголовка – прежний формат (число или JSON-текст), читаются как раньше.
+HEADER = "\x1e"
+
+# Код формата: (сериализатор, компрессор)
+FORMATS = {
+    "z": ("json", "zlib"),
+    "s": ("json", "zstd"),
+    "n": ("msgpack", "zlib"),
+    "t": ("msgpack", "zstd"),
+    "m": ("msgpack", "none"),
+}
+FORMAT_CODES = {spec: code for code, spec in FORMATS.items()}
+
+
+class CacheCodec:
+    """Сериализация значений кэша: JSON/msgpack + zlib/zstd выше порога размера.
+
+    Мелкие значения пишутся обычным JSON без заголовка, поэтому старые и новые
+    записи сосуществуют, а счетчики остаются совместимы с INCR.
+    """
+
+    def __init__(self, serializer: str = "json", compression: str = "zstd", threshold: int = 1024, level: int = 3):
+        if serializer == "msgpack" and msgpack is None:
+            serializer = "json"
+        if compression == "zstd" and zstandard is None:
+            compression = "zlib"
+        self.serializer = serializer
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+        self._zstd_c = zstandard.ZstdCompressor(level=level) if compression == "zstd" else None
+        self._zstd_d = zstandard.ZstdDecompressor() if zstandard is not None else None
+        self._lock = threading.Lock()
+        self._stats: dict = {}
+
+    # Сериализаторы
+    def _dump_json(self, value: Any) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(value, default=str)
+            except TypeError:
+                pass
+        return json.dumps(value, default=str, ensure_ascii=False).encode()
+
+    def _load_json(self, data: bytes) -> Any:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+    def _compress(self, data: bytes, compression: str) -> bytes:
+        if compression == "zstd":
+            return self._zstd_c.compress(data)
+        if compression == "zlib":
+            return zlib.compress(data, self.level)
+        return data
+
+    def _decompress(self, data: bytes, compression: str) -> bytes:
+        if compression == "zstd":
+            if self._zstd_d is None:
+                raise ValueError("zstandard is not installed")
+            return self._zstd_d.decompress(data)
+        if compression == "zlib":
+            return zlib.decompress(data)
+        return data
+
+    def encode(self, value: Any, namespace: str = "default") -> str:
+        """Кодирует значение в строку для записи в Redis."""
+        started = time.perf_counter()
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            encoded = str(value)
+            size = len(encoded)
+        else:
+            plain = self._dump_json(value)
+            size = len(plain)
+            if len(plain) < self.threshold or (self.compression == "none" and self.serializer == "json"):
+                encoded = plain.decode()
+            else:
+                serializer = self.serializer
+                payload = msgpack.packb(value, default=str) if serializer == "msgpack" else plain
+                compressed = self._compress(payload, self.compression)
+                code = FORMAT_CODES[(serializer, self.compression)]
+                encoded = HEADER + code + base64.b64encode(compressed).decode("ascii")
+                size = len(encoded)
+        self._record(namespace, "encode", size, time.perf_counter() - started)
+        return encoded
+
+    def decode(self, raw: Any, namespace: str = "default") -> Any:
+        """Декодирует значение из Redis (bytes от TCP или str от REST)."""
+        started = time.perf_counter()
+        size = len(raw)
+        if isinstance(raw, (bytes, bytearray)):
+            raw = raw.decode()
+        if raw.startswith(HEADER) and len(raw) > 1 and raw[1] in FORMATS:
+            serializer, compression = FORMATS[raw[1]]
+            payload = self._decompress(base64.b64decode(raw[2:]), compression)
+            value = msgpack.unpackb(payload, raw=False) if serializer == "msgpack" else self._load_json(payload)
+        else:
+            # Прежний формат: число или JSON, иначе строка как есть
+            try:
+                value = int(raw)
+            except (ValueError, TypeError):
+                try:
+                    value = json.loads(raw)
+                except Exception:
+                    value = raw
+        self._record(namespace, "decode", size, time.perf_counter() - started)
+        return value
+
+    def _record(self, namespace: str, op: str, size: int, seconds: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(namespace, {
+                "encoded": 0, "bytes_written": 0, "encode_seconds": 0.0,
+                "decoded": 0, "bytes_read": 0, "decode_seconds": 0.0,
+            })
+            if op == "encode":
+                stats["encoded"] += 1
+                stats["bytes_written"] += size
+                stats["encode_seconds"] += seconds
+            else:
+                stats["decoded"] += 1
+                stats["bytes_read"] += size
+                stats["decode_seconds"] += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "serializer": self.serializer,
+                "compression": self.compression,
+                "threshold": self.threshold,
+                "namespaces": {
+                    ns: dict(s, encode_seconds=round(s["encode_seconds"], 6), decode_seconds=round(s["decode_seconds"], 6))
+                    for ns, s in self._stats.items()
+                },
+            }
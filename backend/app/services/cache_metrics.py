@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+
+
+# Верхние границы корзин гистограммы задержек, мс (последняя – всё, что больше)
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class CacheMetrics:
+    """Счетчики кэша по логическим пространствам: попадания, промахи, ошибки,
+    переходы REST → TCP, объем трафика и гистограммы задержек по операциям."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._namespaces: dict = {}
+
+    def _ns(self, namespace: str) -> dict:
+        stats = self._namespaces.get(namespace)
+        if stats is None:
+            stats = {
+                "hits": 0,
+                "l1_hits": 0,
+                "misses": 0,
+                "errors": 0,
+                "fallbacks": 0,
+                "bytes_read": 0,
+                "bytes_written": 0,
+                "latency": {},
+            }
+            self._namespaces[namespace] = stats
+        return stats
+
+    def hit(self, namespace: str, size: int = 0, l1: bool = False) -> None:
+        with self._lock:
+            stats = self._ns(namespace)
+            stats["hits"] += 1
+            stats["bytes_read"] += size
+            if l1:
+                stats["l1_hits"] += 1
+
+    def miss(self, namespace: str) -> None:
+        with self._lock:
+            self._ns(namespace)["misses"] += 1
+
+    def error(self, namespace: str) -> None:
+        with self._lock:
+            self._ns(namespace)["errors"] += 1
+
+    def fallback(self, namespace: str) -> None:
+        """Операция через REST не удалась и ушла на TCP."""
+        with self._lock:
+            self._ns(namespace)["fallbacks"] += 1
+
+    def written(self, namespace: str, size: int) -> None:
+        with self._lock:
+            self._ns(namespace)["bytes_written"] += size
+
+    def observe(self, namespace: str, op: str, seconds: float) -> None:
+        """Записать задержку операции op (get/set/incr/delete/...)."""
+        ms = seconds * 1000
+        with self._lock:
+            histogram = self._ns(namespace)["latency"].setdefault(
+                op, {"count": 0, "sum_ms": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+            )
+            histogram["count"] += 1
+            histogram["sum_ms"] += ms
+            histogram["buckets"][bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for namespace, stats in self._namespaces.items():
+                lookups = stats["hits"] + stats["misses"]
+                latency = {}
+                for op, histogram in stats["latency"].items():
+                    latency[op] = {
+                        "count": histogram["count"],
+                        "avg_ms": round(histogram["sum_ms"] / histogram["count"], 3) if histogram["count"] else 0.0,
+                        "buckets": {
+                            (f"le_{bound}ms" if i < len(LATENCY_BUCKETS_MS) else "gt_2500ms"): count
+                            for i, (bound, count) in enumerate(zip(LATENCY_BUCKETS_MS + (None,), histogram["buckets"]))
+                        },
+                    }
+                result[namespace] = {
+                    "hits": stats["hits"],
+                    "l1_hits": stats["l1_hits"],
+                    "misses": stats["misses"],
+                    "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+                    "errors": stats["errors"],
+                    "fallbacks": stats["fallbacks"],
+                    "bytes_read": stats["bytes_read"],
+                    "bytes_written": stats["bytes_written"],
+                    "latency": latency,
+                }
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._namespaces.clear()
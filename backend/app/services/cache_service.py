@@ -1,25 +1,132 @@
 from __future__ import annotations
 
 import json
+import fnmatch
+import re
 import hashlib
 import logging
+import threading
+import time
+import uuid
+from itertools import islice
 from typing import Any, Optional
 from datetime import datetime, timedelta
 
 import os
 import redis
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
 from app.core.config import settings
+from app.services.cache_codec import CacheCodec, HEADER
+from app.services.cache_metrics import CacheMetrics
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.disk_cache import DiskCache
+from app.services.upstash_pipeline import UpstashPipelineClient
+from app.services.local_cache import LocalLRUCache, MISSING
+from app.services.transport_selector import TransportSelector
 try:
     from upstash_redis import Redis as UpstashRedis
 except Exception:
     UpstashRedis = None  # type: ignore
 
 
+# Удаление ключа только его владельцем (значение совпадает с ожидаемым)
+COMPARE_AND_DELETE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseHeldError(Exception):
+    """Операция над сущностью уже выполняется другим запросом (см. CacheService.run_exclusive)."""
+
+    def __init__(self, operation: str, entity: Any, lease: Optional[dict] = None):
+        self.operation = operation
+        self.entity = entity
+        self.lease = lease or {}
+        super().__init__(f"{operation} for {entity} is already in progress")
+
+    def detail(self) -> dict:
+        """Тело ответа 409: что выполняется и когда аренда истечет."""
+        return {
+            "message": str(self),
+            "operation": self.operation,
+            "entity": str(self.entity),
+            "status": "in_progress",
+            "started_at": self.lease.get("acquired_at"),
+            "expires_at": self.lease.get("expires_at"),
+        }
+
+
+class CachePipeline:
+    """Буфер команд кэша, выполняемых одним round trip (см. CacheService.pipeline)."""
+
+    def __init__(self, service: "CacheService"):
+        self.service = service
+        self.commands: list = []
+        self.results: list = []
+
+    def get(self, key: str) -> "CachePipeline":
+        self.commands.append(("get", key, None, None))
+        return self
+
+    def set(self, key: str, value: Any, ttl: int = None) -> "CachePipeline":
+        self.commands.append(("set", key, self.service._serialize(value, key), ttl or self.service.default_ttl))
+        return self
+
+    def incr(self, key: str) -> "CachePipeline":
+        self.commands.append(("incr", key, None, None))
+        return self
+
+    def expire(self, key: str, ttl: int) -> "CachePipeline":
+        self.commands.append(("expire", key, None, ttl))
+        return self
+
+    def delete(self, key: str) -> "CachePipeline":
+        self.commands.append(("delete", key, None, None))
+        return self
+
+    def execute(self) -> list:
+        raw = self.service._execute_pipeline(self.commands)
+        written = [key for op, key, _, _ in self.commands if op != "get"]
+        self.service._forget_local(*written)
+        self.results = []
+        for (op, key, _, _), value in zip(self.commands, raw):
+            if isinstance(value, Exception):
+                self.results.append(None)
+            elif op == "get":
+                self.results.append(None if value is None else self.service._decode_value(value, key))
+            elif op in ("incr", "delete"):
+                self.results.append(int(value or 0))
+            else:
+                self.results.append(bool(value))
+        self.commands = []
+        return self.results
+
+    def __enter__(self) -> "CachePipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.execute()
+
+
 class CacheService:
     def __init__(self):
+        self.logger = logging.getLogger("cache_service")
         # Инициализация REST-клиента Upstash (предпочтительно на free-tier)
         self.rest_client = None
-        if UpstashRedis and settings.UPSTASH_REDIS_REST_URL and settings.UPSTASH_REDIS_REST_TOKEN:
+        # Локальный дисковый кэш: запасной уровень или единственный бэкенд (CACHE_BACKEND=local)
+        self.disk: Optional[DiskCache] = None
+        if settings.cache_is_local or settings.CACHE_DISK_ENABLED:
+            try:
+                self.disk = DiskCache(settings.CACHE_DISK_PATH, settings.CACHE_DISK_MAX_BYTES)
+            except Exception as e:
+                self.logger.warning("Disk cache init failed: %s", e)
+        self.local_only = settings.cache_is_local and self.disk is not None
+        if not self.local_only and UpstashRedis and settings.UPSTASH_REDIS_REST_URL and settings.UPSTASH_REDIS_REST_TOKEN:
             try:
                 self.rest_client = UpstashRedis(
                     url=settings.UPSTASH_REDIS_REST_URL,
@@ -27,20 +134,94 @@ class CacheService:
                 )
             except Exception as e:
                 # Если REST недоступен, перейдем на TCP
-                print(f"Upstash REST init failed, falling back to TCP: {e}")
+                self.logger.warning("Upstash REST init failed, falling back to TCP: %s", e)
+        # Пакеты команд через /pipeline и /multi-exec: один HTTPS-запрос вместо N
+        self.rest_pipeline: Optional[UpstashPipelineClient] = None
+        if self.rest_client:
+            self.rest_pipeline = UpstashPipelineClient(
+                settings.UPSTASH_REDIS_REST_URL,
+                settings.UPSTASH_REDIS_REST_TOKEN,
+                timeout=settings.REDIS_SOCKET_TIMEOUT,
+            )
 
-        # TCP-клиент как запасной вариант
-        self.redis_client = self._make_tcp_client()
+        # TCP-клиент как запасной вариант; в режиме local его место занимает диск.
+        # Без REDIS_URL (только Upstash REST) TCP-транспорта нет
+        self.tcp_pool = None
+        if self.local_only:
+            self.redis_client = self.disk
+        else:
+            self.redis_client = self._make_tcp_client() if settings.REDIS_URL else None
+        # Каждая операция идет на самый быстрый здоровый транспорт, остальные – запасные
+        self.transport = TransportSelector(
+            [name for name, client in (("rest", self.rest_client), ("tcp", self.redis_client)) if client is not None],
+            alpha=settings.CACHE_TRANSPORT_EWMA_ALPHA,
+            probe_interval=settings.CACHE_TRANSPORT_PROBE_INTERVAL,
+            max_error_rate=settings.CACHE_TRANSPORT_MAX_ERROR_RATE,
+            adaptive=settings.CACHE_TRANSPORT_ADAPTIVE,
+        )
+        # После серии отказов Redis операции сразу уходят на диск, не дожидаясь таймаутов
+        self.breaker = CircuitBreaker(
+            "redis",
+            failure_threshold=settings.CACHE_BREAKER_FAILURE_THRESHOLD,
+            cooldown=settings.CACHE_BREAKER_COOLDOWN,
+            probe=self._redis_reachable,
+            enabled=not self.local_only,
+        )
+        # Пространства, которые дублируются на диск, пока Redis здоров
+        self.disk_mirror = set(settings.CACHE_DISK_MIRROR_NAMESPACES) if self.disk and not self.local_only else set()
+        self._reconcile_thread: Optional[threading.Thread] = None
+        self._reconcile_lock = threading.Lock()
         self.default_ttl = 3600  # 1 час по умолчанию
-        self.logger = logging.getLogger("cache_service")
+        self.codec = CacheCodec(
+            serializer=settings.CACHE_CODEC_SERIALIZER,
+            compression=settings.CACHE_CODEC_COMPRESSION,
+            threshold=settings.CACHE_CODEC_COMPRESS_THRESHOLD,
+        )
+        # Stale-while-revalidate: счетчики и ключи, обновляемые в фоне
+        self.swr_stats: dict = {}
+        self._swr_inflight: set = set()
+        self._swr_lock = threading.Lock()
+        # Счетчики поколений должны жить дольше любой версионированной записи
+        self.generation_ttl = 30 * 86400
+
+        # L1: in-process LRU перед Redis (L2)
+        self.instance_id = uuid.uuid4().hex
+        self.l1: Optional[LocalLRUCache] = None
+        self.l1_ttls = settings.CACHE_L1_TTLS
+        self.l2_hits = 0
+        self.l2_misses = 0
+        # Счетчики и задержки по пространствам ключей (см. get_cache_metrics)
+        self.metrics = CacheMetrics()
+        self._invalidation_live = False
+        if settings.CACHE_L1_ENABLED and not self.local_only:
+            if self.redis_client is not None:
+                self.l1 = LocalLRUCache(settings.CACHE_L1_MAX_BYTES, settings.CACHE_L1_MAX_ITEM_BYTES)
+                self._start_invalidation_listener()
+            else:
+                # Подписка Pub/Sub есть только по TCP, а без канала инвалидации L1 отдавал бы устаревшие данные
+                self.logger.warning("L1 cache disabled: its invalidation channel needs a TCP connection (set REDIS_URL)")
+        if self.disk_mirror and self.disk.journal_size():
+            # Журнал остался с прошлого запуска – переиграем, как только Redis ответит
+            self._schedule_reconcile()
 
     def _make_tcp_client(self):
-        return redis.from_url(
+        """TCP-клиент поверх пула соединений.
+
+        Пул сам проверяет простаивающие соединения (health_check_interval)
+        и переподключается с повтором, поэтому PING перед операциями не нужен.
+        """
+        self.tcp_pool = redis.ConnectionPool.from_url(
             settings.REDIS_URL,
-            socket_timeout=3,
-            socket_connect_timeout=3,
-            retry_on_timeout=True
+            max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            socket_keepalive=True,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            retry_on_timeout=True,
+            retry_on_error=[redis.exceptions.ConnectionError],
+            retry=Retry(ExponentialBackoff(cap=1.0, base=0.05), settings.REDIS_RETRY_ATTEMPTS),
         )
+        return redis.Redis(connection_pool=self.tcp_pool)
 
     def _generate_key(self, prefix: str, *args) -> str:
         """Генерирует ключ кэша на основе префикса и аргументов."""
@@ -52,225 +233,1040 @@ class CacheService:
         """Генерирует хеш содержимого для отслеживания изменений."""
         return hashlib.md5(content.encode()).hexdigest()
 
-    def get(self, key: str) -> Optional[Any]:
-        """Получить значение из кэша."""
-        # Сначала пробуем REST, если он доступен
+    # L1 кэш и межпроцессная инвалидация
+    def _namespace_of(self, key: str) -> str:
+        """Логическое пространство ключа: translation, glossary, gemini_usage и т.д."""
+        if key.startswith("lightnovel:"):
+            key = key[len("lightnovel:"):]
+        return key.split(":", 1)[0]
+
+    def _namespaces_of(self, keys) -> set:
+        return {self._namespace_of(key) for key in keys}
+
+    def _count_batch(self, namespaces: set, counter) -> None:
+        """Пакетная команда затрагивает все пространства своих ключей."""
+        for namespace in namespaces:
+            counter(namespace)
+
+    def _observe_batch(self, namespaces: set, op: str, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        for namespace in namespaces:
+            self.metrics.observe(namespace, op, elapsed)
+
+    def _l1_ttl(self, key: str) -> int:
+        """TTL записи в L1 для ключа (0 – не кэшировать в L1)."""
+        if self.l1 is None or not self._invalidation_live:
+            # Без живого канала инвалидации L1 мог бы отдавать устаревшие данные
+            return 0
+        return self.l1_ttls.get(self._namespace_of(key), settings.CACHE_L1_DEFAULT_TTL)
+
+    def _l1_epoch(self) -> Optional[int]:
+        """Отметка L1 перед чтением из Redis (см. LocalLRUCache.set)."""
+        return self.l1.epoch if self.l1 is not None else None
+
+    def _l1_store(self, key: str, value: Any, raw: Any, ttl: int | None = None, epoch: int | None = None) -> None:
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl > 0:
+            self.l1.set(key, value, min(l1_ttl, ttl or l1_ttl), self._l1_size(value, raw), epoch)
+
+    def _l1_size(self, value: Any, raw: Any) -> int:
+        """Оценка памяти под декодированное значение (сжатые записи занимают больше, чем в Redis)."""
+        if isinstance(value, str):
+            return len(value)
+        raw_size = len(raw)
+        prefix = raw[:1]
+        if prefix in (HEADER, HEADER.encode()):
+            # Порядок степени сжатия структур JSON
+            return raw_size * 4
+        return raw_size
+
+    def _l1_cached(self, key: str) -> bool:
+        """Может ли ключ лежать в L1 какого-либо процесса (иначе рассылать инвалидацию незачем)."""
+        return self.l1 is not None and self.l1_ttls.get(self._namespace_of(key), settings.CACHE_L1_DEFAULT_TTL) > 0
+
+    def _publish_invalidation(self, keys: list | None = None, patterns: list | None = None) -> None:
+        """Сообщить остальным воркерам, что записи L1 устарели."""
+        if self.l1 is None:
+            return
+        if keys:
+            keys = [k for k in keys if self._l1_cached(k)]
+        if not keys and not patterns:
+            return
+        if self.breaker.is_open:
+            return
+        message = json.dumps({"origin": self.instance_id, "keys": keys or [], "patterns": patterns or []})
+        channel = settings.CACHE_INVALIDATION_CHANNEL
         if self.rest_client:
             try:
-                value = self.rest_client.get(key)
+                self.rest_client.publish(channel, message)  # type: ignore[attr-defined]
+                return
             except Exception as e:
-                self.logger.warning(f"REST cache get error, fallback to TCP: {e}")
-                value = None
-        else:
-            value = None
+                if self.redis_client is None:
+                    self.logger.warning(f"Cache invalidation publish failed: {e}")
+                    return
+                self.logger.warning(f"REST cache publish error, fallback to TCP: {e}")
+        try:
+            self.redis_client.publish(channel, message)
+        except Exception as e:
+            self.logger.warning(f"Cache invalidation publish failed: {e}")
 
-        if value is None:
-            # Fallback: TCP
-            try:
-                self._reconnect_if_needed()
-                value = self.redis_client.get(key)
-            except Exception as e:
-                # Пытаемся переподключиться и повторить один раз
-                self.logger.warning(f"Cache get error (will retry): {e}")
-                self._reconnect_if_needed()
-                try:
-                    value = self.redis_client.get(key)
-                except Exception as e2:
-                    self.logger.warning(f"Cache get failed after retry: {e2}")
-                    return None
+    def _apply_invalidation(self, payload: dict) -> None:
+        if self.l1 is None or payload.get("origin") == self.instance_id:
+            return
+        for key in payload.get("keys") or []:
+            self.l1.delete(key)
+        for pattern in payload.get("patterns") or []:
+            self.l1.delete_where(lambda k, p=pattern: fnmatch.fnmatchcase(k, p))
 
-        if value is not None:
-            # Для числовых значений возвращаем как int, для остальных как JSON
-            try:
-                # TCP вернет bytes, REST вернет str
-                if isinstance(value, (bytes, bytearray)):
-                    value = value.decode()
-                return int(value)
-            except (ValueError, TypeError):
-                try:
-                    if isinstance(value, (bytes, bytearray)):
-                        value = value.decode()
-                    return json.loads(value)
-                except Exception:
-                    return value
-        return None
+    def _start_invalidation_listener(self) -> None:
+        thread = threading.Thread(target=self._invalidation_loop, name="cache-invalidation", daemon=True)
+        thread.start()
 
-    def get_quiet(self, key: str) -> Optional[Any]:
-        """Получить значение без логов (для статистики/проверок)."""
-        # REST сначала
-        if self.rest_client:
+    def _invalidation_loop(self) -> None:
+        """Фоновая подписка на канал инвалидации с переподключением."""
+        backoff = 1
+        while True:
+            pubsub = None
             try:
-                value = self.rest_client.get(key)
-                if value is None:
-                    return None
-                if isinstance(value, (bytes, bytearray)):
-                    value = value.decode()
-                # Попробуем int/JSON
-                try:
-                    return int(value)
-                except Exception:
+                # Отдельное соединение без socket_timeout: подписка простаивает подолгу
+                client = redis.from_url(
+                    settings.REDIS_URL,
+                    socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+                    socket_keepalive=True,
+                    health_check_interval=30
+                )
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+                # Пока нас не было, могли пропустить инвалидации – начинаем с чистого L1
+                self.l1.clear()
+                self._invalidation_live = True
+                backoff = 1
+                while True:
+                    message = pubsub.get_message(timeout=5.0)
+                    if not message or message.get("type") != "message":
+                        continue
                     try:
-                        return json.loads(value)
+                        data = message.get("data")
+                        if isinstance(data, (bytes, bytearray)):
+                            data = data.decode()
+                        self._apply_invalidation(json.loads(data))
+                    except Exception as e:
+                        self.logger.warning(f"Bad cache invalidation message: {e}")
+            except Exception as e:
+                self.logger.warning(f"Cache invalidation listener disconnected: {e}")
+            finally:
+                self._invalidation_live = False
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
                     except Exception:
-                        return value
-            except Exception:
-                pass
-        # TCP fallback без логирования
+                        pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _decode_value(self, value: Any, key: str = "") -> Any:
+        """Преобразует сырое значение Redis в Python-объект (см. CacheCodec)."""
         try:
-            self._reconnect_if_needed()
-            value = self.redis_client.get(key)
-            if value is None:
-                return None
-            if isinstance(value, (bytes, bytearray)):
-                value = value.decode()
-            try:
-                return int(value)
-            except Exception:
-                try:
-                    return json.loads(value)
-                except Exception:
-                    return value
-        except Exception:
+            return self.codec.decode(value, self._namespace_of(key))
+        except Exception as e:
+            self.logger.warning(f"Cache decode error for {key}: {e}")
             return None
 
-    def _reconnect_if_needed(self):
-        """Переподключиться к Redis если соединение потеряно."""
-        try:
-            self.redis_client.ping()
-        except Exception:
+    def _dispatch(self, op: str, namespaces: set, rest=None, tcp=None, quiet: bool = False) -> Any:
+        """Выполняет операцию на транспортах в порядке TransportSelector.
+
+        При ошибке операция повторяется на следующем транспорте; если не
+        удалось ни на одном, пробрасывается последняя ошибка. TCP-клиент сам
+        переподключается и повторяет команду (см. _make_tcp_client).
+        Отказ всех транспортов учитывается автоматом; пока он разомкнут,
+        сразу выбрасывается CircuitOpenError.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("redis circuit is open")
+        calls = {"rest": rest if self.rest_client else None, "tcp": tcp if self.redis_client is not None else None}
+        candidates = [transport for transport in self.transport.order(op) if calls.get(transport) is not None]
+        error: Optional[Exception] = None
+        for i, transport in enumerate(candidates):
+            started = time.perf_counter()
             try:
-                self.redis_client = self._make_tcp_client()
+                result = calls[transport]()
             except Exception as e:
-                print(f"Redis reconnection failed: {e}")
+                self.transport.record(transport, op, time.perf_counter() - started, False, str(e)[:200])
+                error = e
+                if i + 1 < len(candidates):
+                    self._count_batch(namespaces, self.metrics.fallback)
+                    if not quiet:
+                        self.logger.warning(
+                            f"{transport.upper()} cache {op} error, fallback to {candidates[i + 1].upper()}: {e}"
+                        )
+                continue
+            self.transport.record(transport, op, time.perf_counter() - started, True)
+            self.breaker.record_success()
+            return result
+        self.breaker.record_failure(error)
+        raise error or RuntimeError("no cache transport configured")
+
+    def _log_failure(self, op: str, error: Exception) -> None:
+        # При разомкнутом автомате отказ ожидаем – не пишем его в лог на каждом вызове
+        if not isinstance(error, CircuitOpenError):
+            self.logger.warning(f"Cache {op} error: {error}")
+
+    def _read_raw(self, key: str, quiet: bool = False) -> Any:
+        """Читает сырое значение из L2 через выбранный транспорт."""
+        namespace = self._namespace_of(key)
+        started = time.perf_counter()
+        try:
+            return self._dispatch(
+                "get", {namespace},
+                rest=lambda: self.rest_client.get(key),
+                tcp=lambda: self.redis_client.get(key),
+                quiet=quiet,
+            )
+        except Exception as e:
+            self.metrics.error(namespace)
+            if not quiet:
+                self._log_failure("get", e)
+            return self._fall_through("get", key)
+        finally:
+            self.metrics.observe(namespace, "get", time.perf_counter() - started)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Получить значение из кэша (L1, затем Redis)."""
+        if self._l1_ttl(key) > 0:
+            cached = self.l1.get(key)
+            if cached is not MISSING:
+                self.metrics.hit(self._namespace_of(key), l1=True)
+                return cached
+
+        epoch = self._l1_epoch()
+        value = self._read_raw(key)
+        if value is None:
+            self.l2_misses += 1
+            self.metrics.miss(self._namespace_of(key))
+            return None
+
+        self.l2_hits += 1
+        self.metrics.hit(self._namespace_of(key), len(value))
+        decoded = self._decode_value(value, key)
+        self._l1_store(key, decoded, value, epoch=epoch)
+        return decoded
+
+    def get_quiet(self, key: str) -> Optional[Any]:
+        """Получить значение без логов (для статистики/проверок)."""
+        value = self._read_raw(key, quiet=True)
+        if value is None:
+            return None
+        return self._decode_value(value, key)
+
+    def _serialize(self, value: Any, key: str = "") -> str:
+        """Подготовка значения к записи: числа как есть (для INCR), остальное – через кодек."""
+        return self.codec.encode(value, self._namespace_of(key))
 
     def set(self, key: str, value: Any, ttl: int = None) -> bool:
         """Установить значение в кэш."""
         ttl = ttl or self.default_ttl
-        # Подготовка значения
-        if isinstance(value, (int, float)):
-            serialized_value = str(value)
-        else:
-            serialized_value = json.dumps(value, default=str)
-
-        # REST приоритетно
-        if self.rest_client:
-            try:
-                # upstash-redis: ex = ttl (секунды)
-                res = self.rest_client.set(key, serialized_value, ex=ttl)
-                return bool(res)
-            except Exception as e:
-                self.logger.warning(f"REST cache set error, fallback to TCP: {e}")
+        serialized_value = self._serialize(value, key)
+        ok = self._write_raw(key, serialized_value, ttl)
+        # Собственную L1-копию сбрасываем, остальным воркерам – сообщение в канал
+        self._forget_local(key)
+        return ok
 
-        # TCP fallback
+    def _write_raw(self, key: str, serialized_value: str, ttl: int) -> bool:
+        """Записывает сериализованное значение в L2 через выбранный транспорт."""
+        namespace = self._namespace_of(key)
+        self.metrics.written(namespace, len(serialized_value))
+        started = time.perf_counter()
         try:
-            self._reconnect_if_needed()
-            return bool(self.redis_client.setex(key, ttl, serialized_value))
+            res = self._dispatch(
+                "set", {namespace},
+                # upstash-redis: ex = ttl (секунды)
+                rest=lambda: self.rest_client.set(key, serialized_value, ex=ttl),
+                tcp=lambda: self.redis_client.setex(key, ttl, serialized_value),
+            )
+            self._mirror_write(key, serialized_value, ttl)
+            return bool(res)
         except Exception as e:
-            self.logger.warning(f"Cache set error (will retry): {e}")
-            self._reconnect_if_needed()
-            try:
-                return bool(self.redis_client.setex(key, ttl, serialized_value))
-            except Exception as e2:
-                self.logger.warning(f"Cache set failed after retry: {e2}")
-                return False
+            self.metrics.error(namespace)
+            self._log_failure("set", e)
+            return bool(self._fall_through("set", key, serialized_value, ttl))
+        finally:
+            self.metrics.observe(namespace, "set", time.perf_counter() - started)
+
+    def _forget_local(self, *keys: str) -> None:
+        """Сбросить ключи из L1 текущего процесса и разослать инвалидацию.
+
+        Вызывается после записи в Redis: иначе другой воркер успел бы прочитать
+        старое значение уже после инвалидации и положить его в свой L1.
+        Ключи пространств без L1 (счетчики лимитов, блокировки) пропускаются:
+        ни сбрасывать, ни рассылать для них нечего.
+        """
+        keys = [key for key in keys if self._l1_cached(key)]
+        if not keys:
+            return
+        for key in keys:
+            self.l1.delete(key)
+        self._publish_invalidation(keys=keys)
 
     def increment_counter(self, key: str, ttl: int = 60) -> int:
         """Атомарно инкрементирует счетчик и устанавливает TTL при первом инкременте.
         Возвращает текущее значение счетчика.
-        Предпочтительно использует Upstash REST, при ошибке – TCP fallback.
+        Транспорт выбирается по задержкам; при ошибке – следующий.
         """
-        # Пытаемся через REST
-        if self.rest_client:
-            try:
-                value = int(self.rest_client.incr(key))  # type: ignore[attr-defined]
-                if value == 1:
-                    # Устанавливаем TTL только при первом инкременте окна
-                    try:
-                        _ = self.rest_client.expire(key, ttl)  # type: ignore[attr-defined]
-                    except Exception:
-                        # Если нет expire, попробуем переустановить значение с ex
-                        try:
-                            _ = self.rest_client.set(key, str(value), ex=ttl)
-                        except Exception:
-                            pass
-                return value
-            except Exception as e:
-                self.logger.warning(f"REST cache incr error, fallback to TCP: {e}")
+        namespace = self._namespace_of(key)
+        started = time.perf_counter()
+        epoch = self._l1_epoch()
 
-        # TCP fallback
         try:
-            self._reconnect_if_needed()
+            value = self._dispatch(
+                "incr", {namespace},
+                # REST: SET NX EX + INCR одной транзакцией, один HTTPS-запрос
+                rest=lambda: self.rest_pipeline.incr_with_ttl(key, ttl),
+                tcp=lambda: self._tcp_incr_with_ttl(key, ttl),
+            )
+            self._mirror_write(key, str(value), ttl)
+            self._store_counters({key: value}, ttl, epoch)
+            return value
+        except Exception as e:
+            self.metrics.error(namespace)
+            self._log_failure("incr", e)
+            value = self._fall_through("incr", key, ttl=ttl) or 0
+            self._forget_local(key)
+            return value
+        finally:
+            self.metrics.observe(namespace, "incr", time.perf_counter() - started)
+
+    def _store_counters(self, values: dict, ttl: int, epoch: Optional[int]) -> None:
+        """После INCR: разослать инвалидацию и оставить новые значения в своем L1.
+
+        Следующее чтение поколения в этом процессе обойдется без Redis. Если за
+        время INCR пришла чужая инвалидация (параллельный инкремент), значение
+        могло устареть – тогда L1 только сбрасывается (см. LocalLRUCache.set).
+        """
+        keys = [key for key in values if self._l1_cached(key)]
+        if not keys:
+            return
+        self._publish_invalidation(keys=keys)
+        for key in keys:
+            self._l1_store(key, values[key], str(values[key]), ttl, epoch)
+
+    def _tcp_incr_with_ttl(self, key: str, ttl: int) -> int:
+        """INCR с TTL на новое окно по TCP: SET NX EX + INCR в транзакции MULTI/EXEC.
+
+        В режиме local – на диске (команды выполняются под его блокировкой).
+        """
+        if self.local_only:
             value = int(self.redis_client.incr(key))
             if value == 1:
-                try:
-                    self.redis_client.expire(key, ttl)
-                except Exception:
-                    pass
+                self.redis_client.expire(key, ttl)
             return value
-        except Exception as e:
-            self.logger.warning(f"Cache incr error: {e}")
-            return 0
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.set(key, 0, ex=ttl, nx=True)
+        pipe.incr(key)
+        return int(pipe.execute()[1])
 
     def delete(self, key: str) -> bool:
         """Удалить значение из кэша."""
-        # REST сначала
-        if self.rest_client:
-            try:
-                res = self.rest_client.delete(key)
-                return bool(res)
-            except Exception as e:
-                self.logger.warning(f"REST cache delete error, fallback to TCP: {e}")
-        # TCP fallback
+        return self.delete_many([key]) > 0
+
+    # Дисковый кэш: запасной уровень и синхронизация после восстановления Redis
+    def _disk_fallback(self) -> Optional[DiskCache]:
+        """Диск как запасной уровень (в режиме local он уже основной бэкенд)."""
+        return self.disk if self.disk is not None and not self.local_only else None
+
+    def _fall_through(self, op: str, key: str, value: Any = None, ttl: int | None = None) -> Any:
+        """Выполняет команду на диске, когда Redis недоступен. Записи попадают в журнал."""
+        disk = self._disk_fallback()
+        if disk is None:
+            return None
+        try:
+            if op == "get":
+                return disk.get(key)
+            if op == "set":
+                result = disk.setex(key, ttl, value)
+                disk.journal("set", key, value, ttl=ttl)
+            elif op == "incr":
+                result = disk.incr(key)
+                if result == 1 and ttl:
+                    disk.expire(key, ttl)
+                disk.journal("incr", key, ttl=ttl, delta=1)
+            elif op == "expire":
+                result = disk.expire(key, ttl)
+                disk.journal("expire", key, ttl=ttl)
+            elif op == "delete":
+                result = disk.delete(key)
+                disk.journal("delete", key)
+            else:
+                return None
+        except Exception as e:
+            self.logger.warning(f"Disk cache {op} error: {e}")
+            return None
+        self._schedule_reconcile()
+        return result
+
+    def _mirror_write(self, key: str, value: str, ttl: int | None) -> None:
+        """Дублирует запись дорогих пространств на диск, чтобы пережить отказ Redis."""
+        if self._namespace_of(key) not in self.disk_mirror:
+            return
         try:
-            return bool(self.redis_client.delete(key))
+            self.disk.setex(key, ttl, value)
         except Exception as e:
-            self.logger.warning(f"Cache delete error (will retry): {e}")
-            self._reconnect_if_needed()
+            self.logger.warning(f"Disk cache mirror error: {e}")
+
+    def _mirror_delete(self, keys: list) -> None:
+        """Удаления применяются и к диску, иначе при следующем отказе всплывут устаревшие значения."""
+        disk = self._disk_fallback()
+        if disk is None:
+            return
+        try:
+            disk.delete(*keys)
+        except Exception as e:
+            self.logger.warning(f"Disk cache mirror error: {e}")
+
+    def _schedule_reconcile(self) -> None:
+        with self._reconcile_lock:
+            if self._reconcile_thread is not None and self._reconcile_thread.is_alive():
+                return
+            self._reconcile_thread = threading.Thread(target=self._reconcile_loop, name="cache-reconcile", daemon=True)
+            self._reconcile_thread.start()
+
+    def _reconcile_loop(self) -> None:
+        """Ждет восстановления Redis и переигрывает в него журнал дисковых записей."""
+        while True:
+            time.sleep(settings.CACHE_DISK_RECONCILE_INTERVAL)
             try:
-                return bool(self.redis_client.delete(key))
-            except Exception as e2:
-                self.logger.warning(f"Cache delete failed after retry: {e2}")
-                return False
+                if not self.disk.journal_size():
+                    return
+                if not self._redis_reachable():
+                    continue
+                replayed = self._replay_journal()
+                self.logger.info(f"Redis is back, replayed {replayed} disk cache writes")
+            except Exception as e:
+                self.logger.warning(f"Disk cache reconcile failed: {e}")
 
-    def delete_pattern(self, pattern: str) -> int:
-        """Удалить все ключи по паттерну."""
-        # REST: попробуем KEYS, но Upstash может ограничивать
-        if self.rest_client:
+    def _redis_reachable(self) -> bool:
+        for client in (self.rest_client, self.redis_client):
+            if client is None:
+                continue
             try:
-                keys = self.rest_client.keys(pattern)  # type: ignore[attr-defined]
-                if keys:
-                    return int(self.rest_client.delete(*keys) or 0)
+                if client.ping():
+                    return True
             except Exception:
-                pass
-        # TCP fallback
+                continue
+        return False
+
+    def _replay_journal(self) -> int:
+        replayed = 0
+        while True:
+            rows = self.disk.claim_journal()
+            if not rows:
+                return replayed
+            for i, row in enumerate(rows):
+                try:
+                    self._replay_command(*row[1:])
+                except Exception:
+                    self.disk.return_journal(rows[i:])
+                    raise
+                replayed += 1
+            # Значения, прочитанные воркерами с диска во время отказа, больше не актуальны
+            self._forget_local(*{row[2] for row in rows})
+
+    def _replay_command(self, op: str, key: str, value: Optional[str], expires_at: Optional[float], delta: Optional[int]) -> None:
+        """Переигрывает одну дисковую запись в Redis, не затирая более свежие данные.
+
+        Инкременты (поколения, счетчики) и удаления коммутативны и применяются
+        как есть. Запись значения пропускается, если TTL истек или поколение в
+        ключе уже сменилось (запись недостижима), и выполняется как SET NX:
+        если за время отказа ключ записал другой узел, неизвестно, чье значение
+        новее, – неверсионированный ключ тогда удаляется и пересоберется из БД.
+        """
+        ttl = int(expires_at - time.time()) if expires_at is not None else None
+        error: Optional[Exception] = None
+        for client in (self.rest_client, self.redis_client):
+            if client is None:
+                continue
+            try:
+                if op == "set":
+                    versioned = self._generation_stamp(key)
+                    expired = ttl is not None and ttl <= 0
+                    if not expired and (versioned is None or versioned[1] == self._read_stamp(client, *versioned[0])):
+                        if not client.set(key, value, ex=ttl, nx=True) and versioned is None:
+                            client.delete(key)
+                elif op == "incr":
+                    result = int(client.incrby(key, delta or 1))
+                    if ttl and ttl > 0 and result == delta:
+                        client.expire(key, ttl)
+                elif op == "expire":
+                    if ttl and ttl > 0:
+                        client.expire(key, ttl)
+                    else:
+                        client.delete(key)
+                elif op == "delete":
+                    client.delete(key)
+                return
+            except Exception as e:
+                error = e
+        if error is not None:
+            raise error
+
+    def _generation_stamp(self, key: str) -> Optional[tuple]:
+        """((пространство, сущность), штамп) для версионированного ключа, иначе None."""
+        parts = key.split(":")
+        # lightnovel:<namespace>:<entity>:g<ns>.<entity>:...
+        if len(parts) < 5 or not re.fullmatch(r"g\d+\.\d+", parts[3]):
+            return None
+        return (parts[1], parts[2]), parts[3]
+
+    def _read_stamp(self, client, namespace: str, entity: str) -> str:
+        """Текущий штамп поколений прямо из Redis (L1 во время переигрывания может отставать)."""
+        values = [client.get(self._generation_key(namespace)), client.get(self._generation_key(namespace, entity))]
+        ns_gen, entity_gen = (int(v) if v is not None else 0 for v in values)
+        return f"g{ns_gen}.{entity_gen}"
+
+    # Пакетные операции: один round trip на N ключей
+    def pipeline(self) -> "CachePipeline":
+        """Буфер команд, отправляемых одним запросом.
+
+        with cache_service.pipeline() as pipe:
+            pipe.get(key_a)
+            pipe.set(key_b, value, ttl=60)
+        pipe.results  # результаты в порядке добавления команд
+        """
+        return CachePipeline(self)
+
+    def _execute_pipeline(self, commands: list) -> list:
+        """Выполняет буфер команд (op, key, value, ttl) и возвращает сырые ответы."""
+        if not commands:
+            return []
+        namespaces = self._namespaces_of(key for _, key, _, _ in commands)
+        started = time.perf_counter()
+        try:
+            return self._run_pipeline(commands, namespaces)
+        finally:
+            self._observe_batch(namespaces, "pipeline", started)
+
+    def _run_pipeline(self, commands: list, namespaces: set) -> list:
+        def rest() -> list:
+            rest_commands = []
+            for op, key, value, ttl in commands:
+                if op == "get":
+                    rest_commands.append(["GET", key])
+                elif op == "set":
+                    rest_commands.append(["SET", key, value, "EX", ttl])
+                elif op == "incr":
+                    rest_commands.append(["INCR", key])
+                elif op == "expire":
+                    rest_commands.append(["EXPIRE", key, ttl])
+                elif op == "delete":
+                    rest_commands.append(["DEL", key])
+            return self.rest_pipeline.pipeline(rest_commands)
+
+        def tcp() -> list:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for op, key, value, ttl in commands:
+                if op == "get":
+                    pipe.get(key)
+                elif op == "set":
+                    pipe.setex(key, ttl, value)
+                elif op == "incr":
+                    pipe.incr(key)
+                elif op == "expire":
+                    pipe.expire(key, ttl)
+                elif op == "delete":
+                    pipe.delete(key)
+            return pipe.execute(raise_on_error=False)
+
+        try:
+            return self._dispatch("pipeline", namespaces, rest=rest, tcp=tcp)
+        except Exception as e:
+            self._count_batch(namespaces, self.metrics.error)
+            self._log_failure("pipeline", e)
+            if self._disk_fallback() is None:
+                return [e] * len(commands)
+            return [self._fall_through(op, key, value, ttl) for op, key, value, ttl in commands]
+
+    def get_many(self, keys: list) -> dict:
+        """Получить несколько значений (L1, затем один MGET). Промахи – None."""
+        result: dict = {}
+        missing = []
+        epoch = self._l1_epoch()
+        for key in keys:
+            if self._l1_ttl(key) > 0:
+                cached = self.l1.get(key)
+                if cached is not MISSING:
+                    self.metrics.hit(self._namespace_of(key), l1=True)
+                    result[key] = cached
+                    continue
+            missing.append(key)
+        if not missing:
+            return result
+
+        namespaces = self._namespaces_of(missing)
+        started = time.perf_counter()
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                return int(self.redis_client.delete(*keys) or 0)
+            raw_values = self._dispatch(
+                "mget", namespaces,
+                rest=lambda: self.rest_pipeline.mget(missing),
+                tcp=lambda: self.redis_client.mget(missing),
+            )
+        except Exception as e:
+            self._count_batch(namespaces, self.metrics.error)
+            self._log_failure("mget", e)
+            raw_values = [self._fall_through("get", key) for key in missing]
+        self._observe_batch(namespaces, "mget", started)
+
+        for key, value in zip(missing, raw_values):
+            if value is None:
+                self.l2_misses += 1
+                self.metrics.miss(self._namespace_of(key))
+                result[key] = None
+                continue
+            self.l2_hits += 1
+            self.metrics.hit(self._namespace_of(key), len(value))
+            decoded = self._decode_value(value, key)
+            self._l1_store(key, decoded, value, epoch=epoch)
+            result[key] = decoded
+        return result
+
+    def set_many(self, mapping: dict, ttl: int = None) -> bool:
+        """Записать несколько значений с общим TTL одним пайплайном."""
+        if not mapping:
+            return True
+        ttl = ttl or self.default_ttl
+        commands = [("set", key, self._serialize(value, key), ttl) for key, value in mapping.items()]
+        for _, key, value, _ in commands:
+            self.metrics.written(self._namespace_of(key), len(value))
+        results = self._execute_pipeline(commands)
+        for _, key, value, _ in commands:
+            self._mirror_write(key, value, ttl)
+        self._forget_local(*mapping.keys())
+        return all(bool(r) and not isinstance(r, Exception) for r in results)
+
+    def delete_many(self, keys: list) -> int:
+        """Удалить несколько ключей одной командой."""
+        if not keys:
             return 0
+        namespaces = self._namespaces_of(keys)
+        started = time.perf_counter()
+        try:
+            removed = int(self._dispatch(
+                "delete", namespaces,
+                rest=lambda: self.rest_client.delete(*keys),
+                tcp=lambda: self.redis_client.delete(*keys),
+            ) or 0)
+            self._mirror_delete(keys)
+            return removed
+        except Exception as e:
+            self._count_batch(namespaces, self.metrics.error)
+            self._log_failure("delete", e)
+            return sum(int(self._fall_through("delete", key) or 0) for key in keys)
+        finally:
+            self._observe_batch(namespaces, "delete", started)
+            self._forget_local(*keys)
+
+    def incr_many(self, keys: list, ttl: int = 60) -> dict:
+        """Инкрементировать несколько счетчиков; TTL ставится новым окнам."""
+        if not keys:
+            return {}
+        namespaces = self._namespaces_of(keys)
+        epoch = self._l1_epoch()
+
+        def tcp() -> list:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.incr(key)
+            values = [int(value) for value in pipe.execute()]
+            fresh = [key for key, value in zip(keys, values) if value == 1]
+            if fresh:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key in fresh:
+                    pipe.expire(key, ttl)
+                pipe.execute()
+            return values
+
+        started = time.perf_counter()
+        try:
+            values = self._dispatch(
+                "incr_many", namespaces,
+                rest=lambda: self.rest_pipeline.incr_many_with_ttl(keys, ttl),
+                tcp=tcp,
+            )
         except Exception as e:
-            print(f"Cache delete pattern error: {e}")
+            self._count_batch(namespaces, self.metrics.error)
+            self._log_failure("incr", e)
+            values = [int(self._fall_through("incr", key, ttl=ttl) or 0) for key in keys]
+        finally:
+            self._observe_batch(namespaces, "incr", started)
+        self._store_counters(dict(zip(keys, values)), ttl, epoch)
+        return dict(zip(keys, values))
+
+    def _scan_keys(self, pattern: str, count: int = 500):
+        """Итерирует ключи по паттерну через SCAN (не блокирует Redis, в отличие от KEYS)."""
+        if self.rest_client:
+            try:
+                cursor = 0
+                while True:
+                    cursor, keys = self.rest_client.scan(cursor, match=pattern, count=count)  # type: ignore[attr-defined]
+                    for key in keys:
+                        yield key
+                    if int(cursor) == 0:
+                        return
+            except Exception as e:
+                if self.redis_client is None:
+                    raise
+                self.logger.warning(f"REST cache scan error, fallback to TCP: {e}")
+        for key in self.redis_client.scan_iter(match=pattern, count=count):
+            yield key.decode() if isinstance(key, (bytes, bytearray)) else key
+
+    def _unlink(self, keys: list) -> int:
+        """Неблокирующее удаление пачки ключей (UNLINK освобождает память в фоне)."""
+        if not keys:
             return 0
+        if self.rest_client:
+            try:
+                return int(self.rest_client.unlink(*keys) or 0)  # type: ignore[attr-defined]
+            except Exception as e:
+                if self.redis_client is None:
+                    raise
+                self.logger.warning(f"REST cache unlink error, fallback to TCP: {e}")
+        return int(self.redis_client.unlink(*keys) or 0)
+
+    def delete_pattern(self, pattern: str, batch_size: int = 500) -> int:
+        """Удалить все ключи по паттерну (SCAN + UNLINK пачками).
+
+        Обходит всё пространство ключей, поэтому годится только для фоновой
+        уборки. Для инвалидации используйте bump_generation.
+        """
+        if self.l1 is not None:
+            self.l1.delete_where(lambda k: fnmatch.fnmatchcase(k, pattern))
+            self._publish_invalidation(patterns=[pattern])
+        deleted = 0
+        try:
+            batch = []
+            for key in self._scan_keys(pattern, batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += self._unlink(batch)
+                    batch = []
+            deleted += self._unlink(batch)
+        except Exception as e:
+            self.logger.warning("Cache delete pattern error: %s", e)
+        return deleted
+
+    # Поколения (generation counters): инвалидация за один INCR
+    def _generation_key(self, namespace: str, entity: Any = None) -> str:
+        if entity is None:
+            return self._generate_key("gen", namespace)
+        return self._generate_key("gen", namespace, entity)
+
+    def get_generation(self, namespace: str, entity: Any = None) -> int:
+        """Текущее поколение пространства (или сущности в нём). 0 – ещё не инвалидировалось."""
+        key = self._generation_key(namespace, entity)
+        return self._generations([key])[key]
+
+    def _generations(self, keys: list) -> dict:
+        """Поколения по ключам: L1, затем один MGET.
+
+        Несуществующее поколение (0) в L1 не кладется: промах не отличить от
+        ключа, который в этот момент создает INCR другого воркера.
+        """
+        values = self.get_many(keys)
+        return {key: values[key] if isinstance(values.get(key), int) else 0 for key in keys}
+
+    def bump_generation(self, namespace: str, entity: Any = None) -> int:
+        """Инвалидирует все ключи пространства/сущности: старые записи становятся
+        недостижимыми и доживают до своего TTL."""
+        return self.increment_counter(self._generation_key(namespace, entity), ttl=self.generation_ttl)
+
+    def _versioned_key(self, namespace: str, entity: Any, *args) -> str:
+        """Ключ со штампом поколений пространства и сущности."""
+        return self._versioned_keys(namespace, [entity], *args)[entity]
+
+    def _versioned_keys(self, namespace: str, entities: list, *args) -> dict:
+        """Версионированные ключи для многих сущностей: поколения – из L1 или одним MGET."""
+        ns_key = self._generation_key(namespace)
+        gens = self._generations([ns_key] + [self._generation_key(namespace, e) for e in entities])
+        return {
+            entity: self._generate_key(namespace, entity, f"g{gens[ns_key]}.{gens[self._generation_key(namespace, entity)]}", *args)
+            for entity in entities
+        }
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        """Инвалидировать всё пространство (например, все переводы)."""
+        return self.bump_generation(namespace)
+
+    def _current_stamps(self, namespace: str, entities: list) -> dict:
+        """Штампы поколений сущностей прямо из Redis одним MGET (L1 может отставать)."""
+        keys = [self._generation_key(namespace)] + [self._generation_key(namespace, e) for e in entities]
+        values = self._dispatch(
+            "mget", {"gen"},
+            rest=lambda: self.rest_pipeline.mget(keys),
+            tcp=lambda: self.redis_client.mget(keys),
+        )
+        ns_gen, *entity_gens = (int(v) if v is not None else 0 for v in values)
+        return {entity: f"g{ns_gen}.{gen}" for entity, gen in zip(entities, entity_gens)}
+
+    def sweep_stale_generations(self, namespace: str, max_keys: int = 10000, batch_size: int = 500) -> dict:
+        """Удаляет записи устаревших поколений для освобождения памяти.
+
+        Не нужен для корректности (старые записи и так недостижимы),
+        только для экономии памяти Redis до истечения TTL. Ключи обходятся
+        через SCAN, поколения каждой пачки читаются одним MGET, устаревшие
+        записи удаляются UNLINK.
+        """
+        keys = list(islice(self._scan_keys(self._generate_key(namespace, "*"), batch_size), max_keys))
+        removed = 0
+        for i in range(0, len(keys), batch_size):
+            stamps = {}
+            for key in keys[i:i + batch_size]:
+                stamp = self._generation_stamp(key)
+                if stamp is not None:
+                    stamps[key] = (stamp[0][1], stamp[1])
+            current = self._current_stamps(namespace, sorted({entity for entity, _ in stamps.values()}))
+            removed += self._unlink([key for key, (entity, stamp) in stamps.items() if stamp != current[entity]])
+        return {"namespace": namespace, "scanned": len(keys), "removed": removed}
 
     # Кэширование переводов
-    def get_translation_cache_key(self, chapter_id: int, glossary_hash: str) -> str:
-        """Генерирует ключ кэша для перевода главы."""
-        return self._generate_key("translation", chapter_id, glossary_hash)
+    # fingerprint – адрес содержимого (см. TranslationEngine.cache_fingerprint): хеш текста главы,
+    # встречающихся в ней терминов, саммари, модели и версии промпта
+    def get_translation_cache_key(self, chapter_id: int, fingerprint: str) -> str:
+        """Генерирует ключ кэша для перевода главы (со штампом поколения)."""
+        return self._versioned_key("translation", chapter_id, fingerprint)
 
-    def get_cached_translation(self, chapter_id: int, glossary_hash: str) -> Optional[str]:
+    def get_cached_translation(self, chapter_id: int, fingerprint: str) -> Optional[str]:
         """Получить кэшированный перевод."""
-        key = self.get_translation_cache_key(chapter_id, glossary_hash)
+        key = self.get_translation_cache_key(chapter_id, fingerprint)
         return self.get(key)
 
-    def cache_translation(self, chapter_id: int, glossary_hash: str, translation: str, ttl: int = 86400) -> bool:
+    def cache_translation(self, chapter_id: int, fingerprint: str, translation: str, ttl: int = 86400) -> bool:
         """Кэшировать перевод (TTL 24 часа)."""
-        key = self.get_translation_cache_key(chapter_id, glossary_hash)
+        key = self.get_translation_cache_key(chapter_id, fingerprint)
         return self.set(key, translation, ttl)
 
+    def _translation_keys(self, fingerprints: dict) -> dict:
+        prefixes = self._versioned_keys("translation", list(fingerprints.keys()))
+        return {chapter_id: f"{prefixes[chapter_id]}:{fp}" for chapter_id, fp in fingerprints.items()}
+
+    def get_cached_translations(self, fingerprints: dict) -> dict:
+        """Кэшированные переводы для набора глав {chapter_id: fingerprint} -> {chapter_id: перевод или None}."""
+        keys = self._translation_keys(fingerprints)
+        values = self.get_many(list(keys.values()))
+        return {chapter_id: values.get(key) for chapter_id, key in keys.items()}
+
+    def cache_translations(self, translations: dict, fingerprints: dict, ttl: int = 86400) -> bool:
+        """Кэшировать переводы нескольких глав одним пайплайном."""
+        keys = self._translation_keys({chapter_id: fingerprints[chapter_id] for chapter_id in translations})
+        return self.set_many({keys[chapter_id]: text for chapter_id, text in translations.items()}, ttl)
+
     def invalidate_translation_cache(self, chapter_id: int) -> bool:
-        """Инвалидировать кэш перевода для главы."""
-        pattern = self._generate_key("translation", chapter_id, "*")
-        return self.delete_pattern(pattern) > 0
+        """Инвалидировать кэш перевода для главы (один INCR вместо KEYS + DELETE)."""
+        return self.bump_generation("translation", chapter_id) > 0
+
+    def invalidate_translation_caches(self, chapter_ids) -> int:
+        """Инвалидировать кэш переводов нескольких глав: INCR их поколений одним пайплайном."""
+        keys = [self._generation_key("translation", chapter_id) for chapter_id in sorted(set(chapter_ids))]
+        return sum(1 for value in self.incr_many(keys, ttl=self.generation_ttl).values() if value > 0)
+
+    # Блокировки: SET NX EX и удаление только владельцем
+    def set_nx(self, key: str, value: str, ttl: int) -> bool:
+        """Записать строку, только если ключа нет (SET NX EX)."""
+        try:
+            return bool(self._dispatch(
+                "set_nx", {self._namespace_of(key)},
+                rest=lambda: self.rest_client.set(key, value, nx=True, ex=ttl),
+                tcp=lambda: self.redis_client.set(key, value, nx=True, ex=ttl),
+            ))
+        except Exception as e:
+            self._log_failure("lock", e)
+            # Без Redis блокировка только локальная (в пределах узла)
+            disk = self._disk_fallback()
+            try:
+                return disk is not None and disk.set(key, value, nx=True, ex=ttl)
+            except Exception:
+                return False
+
+    def compare_and_delete(self, key: str, expected: str) -> bool:
+        """Удалить ключ, только если его значение равно expected (атомарно, Lua)."""
+        self._forget_local(key)
+
+        def tcp() -> bool:
+            if isinstance(self.redis_client, DiskCache):
+                return self.redis_client.compare_and_delete(key, expected)
+            return bool(self.redis_client.eval(COMPARE_AND_DELETE, 1, key, expected))
+
+        try:
+            return bool(self._dispatch(
+                "eval", {self._namespace_of(key)},
+                rest=lambda: self.rest_client.eval(COMPARE_AND_DELETE, keys=[key], args=[expected]),  # type: ignore[attr-defined]
+                tcp=tcp,
+            ))
+        except Exception as e:
+            self._log_failure("eval", e)
+            disk = self._disk_fallback()
+            try:
+                return disk is not None and disk.compare_and_delete(key, expected)
+            except Exception:
+                return False
+
+    def _try_lock(self, key: str, ttl: int) -> Optional[str]:
+        """Короткая блокировка SET NX EX. Возвращает токен владельца или None."""
+        token = uuid.uuid4().hex
+        return token if self.set_nx(key, token, ttl) else None
+
+    # Аренда (lease) на операцию с сущностью: один исполнитель на весь кластер
+    def _lease_key(self, operation: str, entity: Any) -> str:
+        return self._generate_key("lease", operation, entity)
+
+    def _lease_result_key(self, operation: str, entity: Any) -> str:
+        return self._generate_key("lease_result", operation, entity)
+
+    def _new_lease(self, operation: str, entity: Any, ttl: int) -> str:
+        now = time.time()
+        return json.dumps({
+            "token": uuid.uuid4().hex,
+            "operation": operation,
+            "entity": str(entity),
+            "owner": self.instance_id,
+            "acquired_at": datetime.utcfromtimestamp(now).isoformat(),
+            "expires_at": datetime.utcfromtimestamp(now + ttl).isoformat(),
+        })
+
+    def acquire_lease(self, operation: str, entity: Any, ttl: int | None = None) -> Optional[str]:
+        """Взять аренду. Возвращает значение аренды (нужно для release_lease) или None, если занята."""
+        ttl = ttl or settings.CACHE_LEASE_TTL
+        lease = self._new_lease(operation, entity, ttl)
+        return lease if self.set_nx(self._lease_key(operation, entity), lease, ttl) else None
+
+    def release_lease(self, operation: str, entity: Any, lease: str) -> bool:
+        """Освободить аренду, если она все еще наша (истекшую мог перехватить другой исполнитель)."""
+        return self.compare_and_delete(self._lease_key(operation, entity), lease)
+
+    def get_lease(self, operation: str, entity: Any) -> Optional[dict]:
+        """Текущая аренда (кто и с какого времени выполняет операцию) или None."""
+        value = self.get_quiet(self._lease_key(operation, entity))
+        return value if isinstance(value, dict) else None
+
+    def wait_for_lease(self, operation: str, entity: Any, wait: float = 0, ttl: int | None = None) -> str:
+        """Взять аренду, ожидая ее освобождения до wait секунд; затем LeaseHeldError.
+
+        В отличие от run_exclusive результат владельца не переиспользуется:
+        вызывающий сам выполняет операцию и освобождает аренду (release_lease).
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            lease = self.acquire_lease(operation, entity, ttl)
+            if lease is not None:
+                return lease
+            if time.monotonic() >= deadline:
+                raise LeaseHeldError(operation, entity, self.get_lease(operation, entity))
+            time.sleep(min(settings.CACHE_LEASE_POLL_INTERVAL, max(deadline - time.monotonic(), 0.05)))
+
+    def run_exclusive(self, operation: str, entity: Any, func, wait: float = 0, ttl: int | None = None) -> Any:
+        """Выполнить func под арендой operation/entity.
+
+        Если аренда занята, ждем до wait секунд: когда владелец закончит, возвращаем
+        его результат (он хранится CACHE_LEASE_RESULT_TTL секунд). Если владелец
+        упал без результата – пробуем взять аренду сами. По истечении ожидания
+        бросаем LeaseHeldError с описанием текущей аренды.
+        """
+        deadline = time.monotonic() + wait
+        observed: Optional[dict] = None
+        while True:
+            lease = self.acquire_lease(operation, entity, ttl)
+            if lease is not None:
+                try:
+                    result = func()
+                    self.set(
+                        self._lease_result_key(operation, entity),
+                        {"token": json.loads(lease)["token"], "result": result},
+                        settings.CACHE_LEASE_RESULT_TTL
+                    )
+                    return result
+                finally:
+                    self.release_lease(operation, entity, lease)
+
+            current = self.get_lease(operation, entity)
+            if current is not None:
+                observed = current
+            elif observed is not None:
+                # Аренда снята: владелец мог оставить результат
+                stored = self.get_quiet(self._lease_result_key(operation, entity))
+                if isinstance(stored, dict) and stored.get("token") == observed.get("token"):
+                    return stored.get("result")
+            if time.monotonic() >= deadline:
+                raise LeaseHeldError(operation, entity, current or observed)
+            time.sleep(min(settings.CACHE_LEASE_POLL_INTERVAL, max(deadline - time.monotonic(), 0.05)))
+
+    # Stale-while-revalidate для дорогих артефактов
+
+    def get_or_refresh(self, key: str, loader, ttl: int = 3600, grace: int | None = None) -> Any:
+        """Значение с мягким истечением (stale-while-revalidate).
+
+        Запись живет ttl + grace секунд. После ttl читатели сразу получают
+        устаревшее значение, а пересчет выполняет один фоновый обновитель
+        (под короткой блокировкой). Полный промах считается синхронно.
+        loader не принимает аргументов и должен сам открывать сессию БД.
+        """
+        grace = settings.CACHE_SWR_GRACE_SECONDS if grace is None else grace
+        envelope = self.get(key)
+        if isinstance(envelope, dict) and envelope.get("__swr__"):
+            if time.time() < envelope.get("soft", 0):
+                self._count_swr("fresh")
+                return envelope.get("v")
+            self._count_swr("stale_served")
+            self._refresh_in_background(key, loader, ttl, grace)
+            return envelope.get("v")
+
+        self._count_swr("misses")
+        value = loader()
+        self._store_swr(key, value, ttl, grace)
+        return value
+
+    def _swr_envelope(self, value: Any, ttl: int) -> dict:
+        return {"__swr__": 1, "soft": time.time() + ttl, "v": value}
+
+    def _store_swr(self, key: str, value: Any, ttl: int, grace: int) -> bool:
+        return self.set(key, self._swr_envelope(value, ttl), ttl + grace)
+
+    def store_swr_many(self, values: dict, ttl: int = 3600, grace: int | None = None) -> bool:
+        """Записать несколько значений в формате get_or_refresh одним пайплайном (прогрев кэша)."""
+        grace = settings.CACHE_SWR_GRACE_SECONDS if grace is None else grace
+        return self.set_many({key: self._swr_envelope(value, ttl) for key, value in values.items()}, ttl + grace)
+
+    def _count_swr(self, name: str) -> None:
+        with self._swr_lock:
+            self.swr_stats[name] = self.swr_stats.get(name, 0) + 1
+
+    def _refresh_in_background(self, key: str, loader, ttl: int, grace: int) -> None:
+        with self._swr_lock:
+            if key in self._swr_inflight:
+                return
+            self._swr_inflight.add(key)
+
+        def refresh():
+            lock_key = f"{key}:refresh_lock"
+            locked = False
+            try:
+                # Между воркерами пересчет выполняет только владелец блокировки
+                locked = self._try_lock(lock_key, settings.CACHE_SWR_LOCK_SECONDS)
+                if not locked:
+                    self._count_swr("refresh_skipped_locked")
+                    return
+                self._store_swr(key, loader(), ttl, grace)
+                self._count_swr("refreshes")
+            except Exception as e:
+                self._count_swr("refresh_failures")
+                self.logger.warning(f"Background refresh of {key} failed: {e}")
+            finally:
+                if locked:
+                    self.compare_and_delete(lock_key, locked)
+                with self._swr_lock:
+                    self._swr_inflight.discard(key)
+
+        threading.Thread(target=refresh, name="cache-refresh", daemon=True).start()
+
+    def get_swr_stats(self) -> dict:
+        with self._swr_lock:
+            return dict(self.swr_stats)
 
     # Кэширование глоссария
     def get_glossary_cache_key(self, project_id: int) -> str:
@@ -287,6 +1283,10 @@ class CacheService:
         key = self.get_glossary_cache_key(project_id)
         return self.set(key, glossary, ttl)
 
+    def get_glossary_swr(self, project_id: int, loader, ttl: int = 3600) -> list:
+        """Глоссарий проекта с фоновым обновлением после мягкого истечения."""
+        return self.get_or_refresh(self.get_glossary_cache_key(project_id), loader, ttl)
+
     def invalidate_glossary_cache(self, project_id: int) -> bool:
         """Инвалидировать кэш глоссария."""
         key = self.get_glossary_cache_key(project_id)
@@ -327,6 +1327,10 @@ class CacheService:
         key = self.get_relationships_cache_key(project_id)
         return self.set(key, relationships, ttl)
 
+    def get_relationships_swr(self, project_id: int, loader, ttl: int = 3600) -> list:
+        """Связи проекта с фоновым обновлением после мягкого истечения."""
+        return self.get_or_refresh(self.get_relationships_cache_key(project_id), loader, ttl)
+
     def invalidate_relationships_cache(self, project_id: int) -> bool:
         """Инвалидировать кэш связей."""
         key = self.get_relationships_cache_key(project_id)
@@ -340,6 +1344,50 @@ class CacheService:
         terms_string = json.dumps(sorted_terms, sort_keys=True)
         return self._generate_content_hash(terms_string)
 
+    def get_tier_stats(self) -> dict:
+        """Hit ratio по уровням: L1 (in-process) и L2 (Redis)."""
+        l2_total = self.l2_hits + self.l2_misses
+        return {
+            "l1": dict(self.l1.stats(), enabled=True, invalidation_live=self._invalidation_live)
+            if self.l1 is not None else {"enabled": False},
+            "l2": {
+                "hits": self.l2_hits,
+                "misses": self.l2_misses,
+                "hit_ratio": round(self.l2_hits / l2_total, 4) if l2_total else 0.0,
+            },
+        }
+
+    def get_cache_metrics(self) -> dict:
+        """Попадания, промахи, ошибки, переходы REST → TCP, трафик и задержки по пространствам."""
+        return self.metrics.snapshot()
+
+    def get_transport_stats(self) -> dict:
+        """Задержки и доли ошибок REST/TCP по операциям и транспорт, выбранный для каждой."""
+        return {
+            "adaptive": self.transport.adaptive,
+            "transports": self.transport.transports,
+            "operations": self.transport.snapshot(),
+        }
+
+    def get_breaker_stats(self) -> dict:
+        """Состояние автомата Redis: открыт ли, сколько раз срабатывал и сколько вызовов пропущено."""
+        return self.breaker.snapshot()
+
+    def get_codec_stats(self) -> dict:
+        """Объем записанных/прочитанных байт и время (де)сериализации по пространствам."""
+        return self.codec.stats()
+
+    def get_disk_stats(self) -> dict:
+        """Состояние дискового кэша: режим, размер, вытеснения, длина журнала."""
+        if self.disk is None:
+            return {"enabled": False}
+        try:
+            info = self.disk.info()
+        except Exception as e:
+            return {"enabled": True, "error": str(e)}
+        return dict(info, enabled=True, mode="primary" if self.local_only else "fallback",
+                    mirror=sorted(self.disk_mirror))
+
     def get_cache_stats(self) -> dict:
         """Получить статистику кэша."""
         # REST не поддерживает INFO. Вернем минимальную информацию
@@ -347,10 +1395,16 @@ class CacheService:
             return {
                 "rest_client": True,
                 "connected": True,
-                "note": "Using Upstash REST (no INFO available)"
+                "note": "Using Upstash REST (no INFO available)",
+                "tiers": self.get_tier_stats(),
+                "namespaces": self.get_cache_metrics(),
+                "disk": self.get_disk_stats(),
+                "breaker": self.get_breaker_stats()
             }
         # TCP INFO
         try:
+            if not self.breaker.allow():
+                raise CircuitOpenError("redis circuit is open")
             info = self.redis_client.info()
             return {
                 "rest_client": False,
@@ -358,11 +1412,16 @@ class CacheService:
                 "connected_clients": info.get("connected_clients", 0),
                 "total_commands_processed": info.get("total_commands_processed", 0),
                 "keyspace_hits": info.get("keyspace_hits", 0),
-                "keyspace_misses": info.get("keyspace_misses", 0)
+                "keyspace_misses": info.get("keyspace_misses", 0),
+                "tiers": self.get_tier_stats(),
+                "namespaces": self.get_cache_metrics(),
+                "disk": self.get_disk_stats(),
+                "breaker": self.get_breaker_stats()
             }
         except Exception as e:
-            print(f"Cache stats error: {e}")
-            return {"rest_client": False, "connected": False}
+            self.logger.warning("Cache stats error: %s", e)
+            return {"rest_client": False, "connected": False, "tiers": self.get_tier_stats(),
+                    "disk": self.get_disk_stats(), "breaker": self.get_breaker_stats()}
 
 
 cache_service = CacheService()
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+from sqlalchemy import func
+
+from app.core.config import settings
+from app.core.translation_engine import translation_engine
+from app.models.glossary import BatchJob, BatchJobItem, GlossaryTerm, TermRelationship, TermStatus
+from app.models.project import Chapter
+from app.schemas.glossary import GlossaryTermRead, TermRelationshipRead
+from app.services.cache_service import CacheService, cache_service
+from app.services.project_summary import project_summary_service
+
+
+class CacheWarmer:
+    """Прогрев кэша для недавно активных проектов (после деплоя или очистки Redis).
+
+    Глоссарий, связи, саммари глав и сохраненные переводы пишутся пакетами
+    (set_many – один пайплайн на группу), пока не исчерпан бюджет времени
+    или памяти. Проекты обходятся от самого недавно активного.
+
+    Глоссарий прогревается целиком, со всеми статусами: это тот же снимок,
+    что отдает GET /glossary/terms. Перевод использует только утвержденные
+    термины, и только они входят в адреса прогреваемых переводов.
+    """
+
+    def __init__(self, cache: CacheService):
+        self.cache = cache
+        self.logger = logging.getLogger("cache_warmer")
+        self._lock = threading.Lock()
+        self.last_report: Optional[dict] = None
+
+    def find_active_projects(self, db, days: int | None = None, limit: int | None = None) -> List[int]:
+        """Проекты с задачами или обработанными главами за последние days дней, по убыванию активности."""
+        since = datetime.utcnow() - timedelta(days=days or settings.CACHE_WARM_ACTIVE_DAYS)
+        last_seen: dict = {}
+        activity = [
+            db.query(BatchJob.project_id, func.max(BatchJob.created_at))
+            .filter(BatchJob.created_at >= since).group_by(BatchJob.project_id).all(),
+            db.query(Chapter.project_id, func.max(Chapter.processed_at))
+            .filter(Chapter.processed_at >= since).group_by(Chapter.project_id).all(),
+        ]
+        for rows in activity:
+            for project_id, seen_at in rows:
+                if seen_at and (project_id not in last_seen or seen_at > last_seen[project_id]):
+                    last_seen[project_id] = seen_at
+        ordered = sorted(last_seen, key=last_seen.get, reverse=True)
+        return ordered[:limit or settings.CACHE_WARM_MAX_PROJECTS]
+
+    def warm(self, project_ids: List[int] | None = None, time_budget: float | None = None,
+             max_bytes: int | None = None) -> dict:
+        """Прогреть кэш. Без project_ids берутся недавно активные проекты.
+
+        Одновременно идет только один прогрев на все процессы (аренда в кэше).
+        """
+        time_budget = time_budget or settings.CACHE_WARM_TIME_BUDGET
+        if not self._lock.acquire(blocking=False):
+            return {"skipped": True, "reason": "warm-up already running"}
+        try:
+            # Аренда переживает бюджет времени с запасом на последнюю запись
+            lease = self.cache.acquire_lease("cache_warm", "run", ttl=int(time_budget) + 60)
+            if lease is None:
+                return {"skipped": True, "reason": "warm-up already running", "lease": self.cache.get_lease("cache_warm", "run")}
+            try:
+                return self._warm(project_ids, time_budget, max_bytes or settings.CACHE_WARM_MAX_BYTES)
+            finally:
+                self.cache.release_lease("cache_warm", "run", lease)
+        finally:
+            self._lock.release()
+
+    def _warm(self, project_ids: List[int] | None, time_budget: float, max_bytes: int) -> dict:
+        from app.db import SessionLocal
+
+        started = time.monotonic()
+        report = {
+            "started_at": datetime.utcnow().isoformat(),
+            "projects": [],
+            "keys": 0,
+            "bytes": 0,
+            "stopped": None,
+        }
+        db = SessionLocal()
+        try:
+            if project_ids is None:
+                project_ids = self.find_active_projects(db)
+            for project_id in project_ids:
+                if time.monotonic() - started > time_budget:
+                    report["stopped"] = "time_budget"
+                    break
+                if report["bytes"] >= max_bytes:
+                    report["stopped"] = "memory_budget"
+                    break
+                budget = {"bytes": max_bytes - report["bytes"], "deadline": started + time_budget}
+                project_report = self._warm_project(db, project_id, budget)
+                report["projects"].append(project_report)
+                report["keys"] += project_report["keys"]
+                report["bytes"] += project_report["bytes"]
+                if project_report.get("truncated"):
+                    report["stopped"] = project_report["truncated"]
+                    break
+        finally:
+            db.close()
+        report["seconds"] = round(time.monotonic() - started, 3)
+        self.last_report = report
+        self.logger.info(f"Cache warm-up: {report['keys']} keys, {report['bytes']} bytes, "
+                         f"{len(report['projects'])} projects in {report['seconds']}s")
+        return report
+
+    def _warm_project(self, db, project_id: int, budget: dict) -> dict:
+        result = {"project_id": project_id, "keys": 0, "bytes": 0}
+
+        def take(value: Any) -> bool:
+            """Учитывает значение в бюджете; False – бюджет исчерпан."""
+            if time.monotonic() > budget["deadline"]:
+                result["truncated"] = "time_budget"
+                return False
+            size = len(json.dumps(value, default=str, ensure_ascii=False).encode())
+            if size > budget["bytes"]:
+                result["truncated"] = "memory_budget"
+                return False
+            budget["bytes"] -= size
+            result["bytes"] += size
+            result["keys"] += 1
+            return True
+
+        # Глоссарий и связи – в формате stale-while-revalidate, как их читает API
+        terms = db.query(GlossaryTerm).filter(GlossaryTerm.project_id == project_id).order_by(GlossaryTerm.id.asc()).all()
+        snapshots = {}
+        glossary = [GlossaryTermRead.model_validate(term).model_dump(mode="json") for term in terms]
+        if take(glossary):
+            snapshots[self.cache.get_glossary_cache_key(project_id)] = glossary
+        if "truncated" not in result:
+            relationships = [
+                TermRelationshipRead.model_validate(rel).model_dump(mode="json")
+                for rel in db.query(TermRelationship).filter(TermRelationship.project_id == project_id).all()
+            ]
+            if take(relationships):
+                snapshots[self.cache.get_relationships_cache_key(project_id)] = relationships
+        self.cache.store_swr_many(snapshots)
+        if "truncated" in result:
+            return result
+
+        # Саммари глав
+        summaries = {}
+        chapters = db.query(Chapter.id, Chapter.summary).filter(
+            Chapter.project_id == project_id,
+            Chapter.summary.isnot(None)
+        ).order_by(Chapter.order, Chapter.id).all()
+        for chapter_id, summary in chapters:
+            if not take(summary):
+                break
+            summaries[self.cache.get_summary_cache_key(chapter_id)] = summary
+        self.cache.set_many(summaries, ttl=7200)
+        if "truncated" in result:
+            return result
+
+        # Переводы: только те, чей адрес при переводе совпадает с адресом для текущих данных главы
+        approved = [term for term in terms if term.status == TermStatus.APPROVED]
+        project_summary = project_summary_service.current(db, project_id)
+        batch_fingerprints = self._latest_translation_fingerprints(db, project_id)
+        translations = {}
+        fingerprints = {}
+        chapters = db.query(Chapter).filter(
+            Chapter.project_id == project_id,
+            Chapter.translated_text.isnot(None)
+        ).order_by(Chapter.processed_at.desc().nullslast(), Chapter.id).all()
+        for chapter in chapters:
+            stored = (chapter.alignment or {}).get("fingerprint") or batch_fingerprints.get(chapter.id)
+            if not stored or not chapter.translated_text:
+                continue
+            fingerprint = translation_engine.cache_fingerprint(
+                chapter.original_text, approved, chapter.summary, project_summary=project_summary
+            )
+            if fingerprint != stored:
+                continue
+            if not take(chapter.translated_text):
+                break
+            translations[chapter.id] = chapter.translated_text
+            fingerprints[chapter.id] = fingerprint
+        if translations:
+            self.cache.cache_translations(translations, fingerprints)
+        return result
+
+    def _latest_translation_fingerprints(self, db, project_id: int) -> dict:
+        """Адреса последних пакетных переводов глав проекта: {chapter_id: fingerprint}.
+
+        Нужны для переводов, сохраненных до того, как адрес стал храниться
+        в выравнивании главы (Chapter.alignment["fingerprint"]).
+        """
+        items = db.query(BatchJobItem.item_id, BatchJobItem.result).join(
+            BatchJob, BatchJob.id == BatchJobItem.batch_job_id
+        ).filter(
+            BatchJobItem.project_id == project_id,
+            BatchJob.job_type == "translate",
+            BatchJobItem.status == "completed"
+        ).order_by(BatchJobItem.completed_at.desc()).all()
+        latest: dict = {}
+        for chapter_id, result in items:
+            if chapter_id not in latest:
+                latest[chapter_id] = (result or {}).get("fingerprint")
+        return {chapter_id: fp for chapter_id, fp in latest.items() if fp}
+
+    def warm_in_background(self) -> None:
+        """Прогрев при старте: один на деплой, а не на каждый рабочий процесс.
+
+        Аренда startup не освобождается и истекает через
+        CACHE_WARM_STARTUP_LEASE_TTL: процессы, стартующие в этом окне,
+        прогрев пропускают.
+        """
+        if self.cache.acquire_lease("cache_warm", "startup", ttl=settings.CACHE_WARM_STARTUP_LEASE_TTL) is None:
+            self.logger.info("Cache warm-up skipped: already done by another worker")
+            return
+        threading.Thread(target=self._warm_safely, name="cache-warmer", daemon=True).start()
+
+    def _warm_safely(self) -> None:
+        try:
+            self.warm()
+        except Exception as e:
+            self.logger.warning(f"Cache warm-up failed: {e}")
+
+
+cache_warmer = CacheWarmer(cache_service)
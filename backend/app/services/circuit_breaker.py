@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+
+class CircuitOpenError(Exception):
+    """Операция не выполнялась: автомат разомкнут после серии отказов."""
+
+
+class CircuitBreaker:
+    """Автомат для внешней зависимости (Redis): после failure_threshold отказов
+    подряд размыкается, и вызовы сразу уходят в запасной путь, не тратя
+    таймауты на заведомо недоступный сервер.
+
+    Пока автомат разомкнут, фоновый поток раз в cooldown секунд вызывает
+    probe(); первый успешный ответ замыкает автомат. Живой трафик к серверу
+    не пропускается вовсе, поэтому полуоткрытого состояния нет.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 30.0,
+                 probe: Optional[Callable[[], bool]] = None, enabled: bool = True):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.probe = probe
+        self.enabled = enabled
+        self.logger = logging.getLogger("circuit_breaker")
+        self._lock = threading.Lock()
+        self._open = False
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_thread: Optional[threading.Thread] = None
+        self.trips = 0
+        self.short_circuited = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    def allow(self) -> bool:
+        """Можно ли обращаться к зависимости. Отказ учитывается как short-circuit."""
+        if not self._open:
+            return True
+        with self._lock:
+            self.short_circuited += 1
+        return False
+
+    def record_success(self) -> None:
+        if self._failures:
+            with self._lock:
+                self._failures = 0
+
+    def record_failure(self, error: Exception | str | None = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._failures += 1
+            self.last_error = str(error)[:200] if error is not None else None
+            if self._open or self._failures < self.failure_threshold:
+                return
+            self._open = True
+            self._opened_at = time.time()
+            self.trips += 1
+        self.logger.warning(f"{self.name} circuit opened after {self.failure_threshold} consecutive failures: {error}")
+        self._start_probe()
+
+    def close(self) -> None:
+        with self._lock:
+            was_open = self._open
+            self._open = False
+            self._failures = 0
+            self._opened_at = None
+        if was_open:
+            self.logger.info(f"{self.name} circuit closed")
+
+    def _start_probe(self) -> None:
+        if self.probe is None:
+            return
+        with self._lock:
+            if self._probe_thread is not None and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(
+                target=self._probe_loop, name=f"{self.name}-breaker-probe", daemon=True
+            )
+            self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        while self._open:
+            time.sleep(self.cooldown)
+            try:
+                if self.probe():
+                    self.close()
+                    return
+            except Exception as e:
+                self.last_error = str(e)[:200]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "state": "open" if self._open else "closed",
+                "opened_at": datetime.utcfromtimestamp(self._opened_at).isoformat() if self._opened_at else None,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "cooldown": self.cooldown,
+                "trips": self.trips,
+                "short_circuited": self.short_circuited,
+                "last_error": self.last_error,
+            }
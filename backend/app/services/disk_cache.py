@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import fnmatch
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+
+class DiskCache:
+    """Локальный персистентный кэш на SQLite с TTL и ограничением размера.
+
+    Повторяет подмножество команд redis-py (get/set/setex/incr/expire/delete/
+    mget/scan_iter/pipeline), поэтому CacheService использует его и как
+    единственный бэкенд (CACHE_BACKEND=local), и как запасной уровень, когда
+    Redis недоступен. Записи, сделанные в обход Redis, попадают в журнал и
+    переигрываются в Redis после восстановления (см. CacheService._reconcile_loop).
+    """
+
+    # Время последнего доступа обновляется не чаще раза в минуту, чтобы чтения не превращались в записи
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path: str, max_bytes: int):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_accessed ON entries (accessed_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, key TEXT NOT NULL, "
+            "value TEXT, expires_at REAL, delta INTEGER)"
+        )
+        self.evictions = 0
+        self._approx_size = self._total_size()
+
+    # Служебное
+    def _total_size(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return int(row[0])
+
+    @staticmethod
+    def _expires_at(ttl: Optional[int]) -> Optional[float]:
+        return time.time() + ttl if ttl else None
+
+    def _live_row(self, key: str) -> Optional[tuple]:
+        row = self._conn.execute(
+            "SELECT value, expires_at, accessed_at, size FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] is not None and row[1] <= now:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._approx_size -= row[3]
+            return None
+        if now - row[2] > self.TOUCH_INTERVAL:
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return row
+
+    def _put(self, key: str, value: str, expires_at: Optional[float]) -> None:
+        size = len(key) + len(value)
+        # При замене учитываем только разницу, иначе оценка растет и вытеснение начинается раньше времени
+        previous = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value, size, expires_at, time.time()),
+        )
+        self._approx_size += size - (previous[0] if previous else 0)
+
+    def _evict(self) -> None:
+        """Удаляет просроченные записи, затем самые давно читавшиеся до 90% лимита."""
+        if self._approx_size <= self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+            total = int(self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0])
+            target = int(self.max_bytes * 0.9)
+            while total > target:
+                rows = self._conn.execute(
+                    "SELECT key, size FROM entries ORDER BY accessed_at LIMIT 200"
+                ).fetchall()
+                if not rows:
+                    break
+                for key, size in rows:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    total -= size
+                    self.evictions += 1
+                    if total <= target:
+                        break
+            self._approx_size = total
+
+    # Команды в стиле redis-py
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._live_row(key)
+        return row[0] if row else None
+
+    def mget(self, keys: list) -> list:
+        with self._lock:
+            return [(row[0] if row else None) for row in (self._live_row(key) for key in keys)]
+
+    def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> bool:
+        value = str(value)
+        with self._lock:
+            if nx and self._live_row(key) is not None:
+                return False
+            self._put(key, value, self._expires_at(ex))
+        self._evict()
+        return True
+
+    def setex(self, key: str, ttl: int, value: Any) -> bool:
+        return self.set(key, value, ex=ttl)
+
+    def incrby(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            row = self._live_row(key)
+            try:
+                current = int(row[0]) if row else 0
+            except ValueError:
+                raise ValueError("value is not an integer")
+            value = current + amount
+            # Как и INCR в Redis, инкремент сохраняет TTL ключа
+            self._put(key, str(value), row[1] if row else None)
+        return value
+
+    def incr(self, key: str) -> int:
+        return self.incrby(key, 1)
+
+    def expire(self, key: str, ttl: int) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE entries SET expires_at = ? WHERE key = ?", (self._expires_at(ttl), key)
+            )
+        return cursor.rowcount > 0
+
+    def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        removed = 0
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    removed += 1
+                    self._approx_size -= row[0]
+        return removed
+
+    unlink = delete
+
+    def compare_and_delete(self, key: str, expected: str) -> bool:
+        with self._lock:
+            row = self._live_row(key)
+            if row is None or row[0] != expected:
+                return False
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._approx_size -= row[3]
+        return True
+
+    def scan_iter(self, match: str = "*", count: int = 500) -> Iterator[str]:
+        # Префикс до первого спецсимвола сужает выборку, остальное проверяет fnmatch
+        prefix = ""
+        for ch in match:
+            if ch in "*?[\\":
+                break
+            prefix += ch
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute(
+                "SELECT key FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )]
+        for key in keys:
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    def publish(self, channel: str, message: str) -> int:
+        # Один узел: подписчиков нет
+        return 0
+
+    def ping(self) -> bool:
+        return True
+
+    def pipeline(self, transaction: bool = False) -> "DiskPipeline":
+        return DiskPipeline(self)
+
+    def info(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            journal = self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": entries[0],
+            "used_memory": entries[1],
+            "used_memory_human": f"{entries[1] / (1024 * 1024):.2f}M",
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "journal": journal,
+        }
+
+    # Журнал записей, сделанных в обход Redis
+    def journal(self, op: str, key: str, value: Optional[str] = None,
+                ttl: Optional[int] = None, delta: Optional[int] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO journal (op, key, value, expires_at, delta) VALUES (?, ?, ?, ?, ?)",
+                (op, key, value, self._expires_at(ttl), delta),
+            )
+
+    def journal_size(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0])
+
+    def claim_journal(self, limit: int = 500) -> list:
+        """Забирает пачку записей журнала (seq, op, key, value, expires_at, delta) и удаляет их.
+
+        Удаление в той же транзакции не дает двум воркерам переиграть одну запись дважды.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT seq, op, key, value, expires_at, delta FROM journal ORDER BY seq LIMIT ?", (limit,)
+                ).fetchall()
+                if rows:
+                    self._conn.execute("DELETE FROM journal WHERE seq <= ?", (rows[-1][0],))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def return_journal(self, rows: list) -> None:
+        """Возвращает непереигранные записи с исходными номерами (порядок сохраняется)."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO journal (seq, op, key, value, expires_at, delta) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+class DiskPipeline:
+    """Пайплайн в стиле redis-py: команды копятся и выполняются по execute()."""
+
+    def __init__(self, cache: DiskCache):
+        self.cache = cache
+        self.commands: list = []
+
+    def get(self, key):
+        self.commands.append((self.cache.get, (key,)))
+
+    def setex(self, key, ttl, value):
+        self.commands.append((self.cache.setex, (key, ttl, value)))
+
+    def incr(self, key):
+        self.commands.append((self.cache.incr, (key,)))
+
+    def expire(self, key, ttl):
+        self.commands.append((self.cache.expire, (key, ttl)))
+
+    def delete(self, *keys):
+        self.commands.append((self.cache.delete, keys))
+
+    def execute(self, raise_on_error: bool = True) -> list:
+        results = []
+        for func, args in self.commands:
+            try:
+                results.append(func(*args))
+            except Exception as e:
+                if raise_on_error:
+                    raise
+                results.append(e)
+        self.commands = []
+        return results
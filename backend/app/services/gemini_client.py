@@ -1,16 +1,33 @@
 from __future__ import annotations
 
 import json
+import logging
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 
+import google.ai.generativelanguage as glm
 import google.generativeai as genai
 import pytz
+from fastapi import HTTPException
 
 from app.core.config import settings
 from app.services.cache_service import cache_service
 
 
+class RateLimitExceeded(HTTPException):
+    """Исчерпан глобальный минутный лимит запросов (HTTP 429)."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(
+            status_code=429,
+            detail="Rate limit exceeded: 10 req/min. Please retry shortly.",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
+
+
 class GeminiClient:
     def __init__(self):
         self.api_keys = settings.GEMINI_API_KEYS
@@ -19,21 +36,36 @@ class GeminiClient:
         self.cooldown_hours = settings.GEMINI_API_COOLDOWN_HOURS
         self.reset_timezone = pytz.timezone(settings.GEMINI_API_RESET_TIMEZONE)
         self.current_key_index = 0
+        self.model_name = settings.GEMINI_MODEL
         # Глобальный минутный лимит (10 запросов/мин по всем ключам)
         self.per_minute_limit = 10
+        self.logger = logging.getLogger("gemini_client")
 
         if not self.api_keys:
             raise ValueError("No Gemini API keys provided")
 
-        # Инициализируем первый ключ
-        self._set_current_key()
-
-    def _set_current_key(self):
-        """Устанавливает текущий API ключ."""
-        if not self.api_keys:
-            raise ValueError("No API keys available")
-
-        genai.configure(api_key=self.api_keys[self.current_key_index])
+        # У каждого ключа свой клиент: genai.configure глобален для процесса,
+        # и параллельные запросы с разными ключами переключали бы его друг у друга
+        self._clients: Dict[str, glm.GenerativeServiceClient] = {}
+        self._lock = threading.Lock()
+
+    def _client_for(self, key: str) -> glm.GenerativeServiceClient:
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = glm.GenerativeServiceClient(client_options={"api_key": key})
+                self._clients[key] = client
+            return client
+
+    def _generate(self, key: str, prompt: str) -> str:
+        """Один запрос generateContent с заданным ключом."""
+        model = self.model_name if "/" in self.model_name else f"models/{self.model_name}"
+        request = glm.GenerateContentRequest(
+            model=model,
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])],
+        )
+        response = self._client_for(key).generate_content(request)
+        return genai.types.GenerateContentResponse.from_response(response).text
 
     def _get_reset_date(self) -> str:
         """Получает дату сброса лимитов в формате YYYY-MM-DD по времени Mountain View."""
@@ -52,8 +84,10 @@ class GeminiClient:
     def _is_key_in_cooldown(self, key: str) -> bool:
         """Проверяет, находится ли ключ в кулдауне."""
         cooldown_key = self._get_key_cooldown_key(key)
-        cooldown_until = cache_service.get(cooldown_key)
+        return self._cooldown_active(cache_service.get(cooldown_key))
 
+    def _cooldown_active(self, cooldown_until) -> bool:
+        """Проверяет, не истекло ли сохраненное время кулдауна."""
         if not cooldown_until:
             return False
 
@@ -73,16 +107,15 @@ class GeminiClient:
         return cache_service.get(usage_key) or 0
 
     def _increment_key_usage(self, key: str):
-        """Увеличивает счетчик использований ключа."""
+        """Увеличивает счетчик использований ключа (атомарный INCR: параллельные запросы не теряют инкременты)."""
         usage_key = self._get_key_usage_key(key)
-        current_usage = self._get_key_usage(key)
-        
+
         # Рассчитываем TTL до следующего сброса
         now_mv = datetime.now(self.reset_timezone)
         tomorrow_mv = now_mv.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
         ttl_seconds = int((tomorrow_mv - now_mv).total_seconds())
-        
-        cache_service.set(usage_key, current_usage + 1, ttl=ttl_seconds)
+
+        cache_service.increment_counter(usage_key, ttl=ttl_seconds)
 
     def _put_key_in_cooldown(self, key: str):
         """Помещает ключ в кулдаун до следующего сброса лимитов."""
@@ -98,90 +131,71 @@ class GeminiClient:
         
         cache_service.set(cooldown_key, cooldown_until, ttl=ttl_seconds)
 
-    def _find_available_key(self) -> str | None:
-        """Находит доступный ключ для использования."""
-        for i, key in enumerate(self.api_keys):
-            if not self._is_key_in_cooldown(key):
-                usage = self._get_key_usage(key)
-                threshold = int(self.limit_per_key * self.threshold_percent / 100)
-
-                if usage < threshold:
-                    self.current_key_index = i
-                    return key
-
+    def _find_available_key(self, start: int = 0) -> int | None:
+        """Индекс первого доступного ключа, начиная со start (по кругу).
+
+        Ключ, дошедший до порога использования, переводится в кулдаун.
+        """
+        threshold = int(self.limit_per_key * self.threshold_percent / 100)
+        for offset in range(len(self.api_keys)):
+            i = (start + offset) % len(self.api_keys)
+            key = self.api_keys[i]
+            if self._is_key_in_cooldown(key):
+                continue
+            if self._get_key_usage(key) >= threshold:
+                self._put_key_in_cooldown(key)
+                continue
+            return i
         return None
 
-    def _rotate_key(self):
-        """Переключается на следующий доступный ключ."""
-        available_key = self._find_available_key()
+    def rate_limit_reset_in(self) -> float:
+        """Секунды до начала следующего минутного окна глобального лимита."""
+        return 60 - time.time() % 60
 
-        if not available_key:
-            raise Exception("No available API keys. All keys are either in cooldown or at limit.")
+    def _check_rate_limit(self) -> None:
+        """Глобальный троттлинг по минутному окну: RateLimitExceeded (429) сверх лимита."""
+        minute_key = f"gemini_rate:minute:{datetime.utcnow().strftime('%Y%m%d%H%M')}"
+        if cache_service.increment_counter(minute_key, ttl=65) > self.per_minute_limit:
+            raise RateLimitExceeded(self.rate_limit_reset_in())
 
-        self._set_current_key()
+    def complete(self, prompt: str, max_tokens: int = 4000, key_index: int | None = None) -> str:
+        """Выполняет запрос к Gemini API с автоматической ротацией ключей.
 
-    def complete(self, prompt: str, max_tokens: int = 4000) -> str:
-        """Выполняет запрос к Gemini API с автоматической ротацией ключей."""
+        key_index – ключ, с которого начать: параллельные запросы передают
+        разные ключи и не делят текущий. Без него используется текущий ключ,
+        а удачный ключ становится текущим.
+        """
         max_retries = len(self.api_keys)
+        index = self.current_key_index if key_index is None else key_index % len(self.api_keys)
 
         for attempt in range(max_retries):
-            try:
-                # Глобальный троттлинг по минутному окну
-                minute_key = f"gemini_rate:minute:{datetime.utcnow().strftime('%Y%m%d%H%M')}"
-                current_minute_count = cache_service.increment_counter(minute_key, ttl=65)
-                if current_minute_count > self.per_minute_limit:
-                    # Превышен лимит – возвращаем HTTP 429
-                    from fastapi import HTTPException
-                    raise HTTPException(
-                        status_code=429,
-                        detail="Rate limit exceeded: 10 req/min. Please retry shortly."
-                    )
-
-                # Проверяем доступность текущего ключа
-                current_key = self.api_keys[self.current_key_index]
-
-                if self._is_key_in_cooldown(current_key):
-                    self._rotate_key()
-                    continue
-
-                usage = self._get_key_usage(current_key)
-                threshold = int(self.limit_per_key * self.threshold_percent / 100)
-
-                if usage >= threshold:
-                    self._put_key_in_cooldown(current_key)
-                    self._rotate_key()
-                    continue
-
-                # Выполняем запрос с повтором при временных ошибках
-                model = genai.GenerativeModel('gemini-2.5-flash')
-                # Добавим краткий повтор при внутренних ошибках сервиса
-                try:
-                    response = model.generate_content(prompt)
-                except Exception as inner_e:
-                    # Одна повторная попытка через этот же ключ
-                    response = model.generate_content(prompt)
+            self._check_rate_limit()
 
-                # Увеличиваем счетчик использований
-                self._increment_key_usage(current_key)
+            found = self._find_available_key(index)
+            if found is None:
+                raise Exception("No available API keys. All keys are either in cooldown or at limit.")
+            index = found
+            key = self.api_keys[index]
 
-                return response.text
-
-            except HTTPException:
-                # Пробрасываем HTTPException как есть
-                raise
+            try:
+                try:
+                    text = self._generate(key, prompt)
+                except Exception:
+                    # Одна повторная попытка через этот же ключ при внутренних ошибках сервиса
+                    text = self._generate(key, prompt)
             except Exception as e:
-                # Логируем, переводим ключ в кулдаун и пробуем следующий
-                print(f"Error with key {self.current_key_index}: {e}")
-
-                # Помещаем текущий ключ в кулдаун при ошибке
-                current_key = self.api_keys[self.current_key_index]
-                self._put_key_in_cooldown(current_key)
-
-                # Переключаемся на следующий ключ
-                self._rotate_key()
-
+                # Переводим ключ в кулдаун и пробуем следующий
+                self.logger.warning("Error with key %s: %s", index, e)
+                self._put_key_in_cooldown(key)
                 if attempt == max_retries - 1:
                     raise Exception(f"All API keys failed after {max_retries} attempts: {e}")
+                index = (index + 1) % len(self.api_keys)
+                continue
+
+            self._increment_key_usage(key)
+            if key_index is None:
+                self.current_key_index = index
+            return text
 
         raise Exception("Failed to complete request with any available key")
 
@@ -196,13 +210,18 @@ class GeminiClient:
             "keys": []
         }
 
+        # Счетчики и кулдауны всех ключей читаем одним MGET
+        usage_keys = [self._get_key_usage_key(key) for key in self.api_keys]
+        cooldown_keys = [self._get_key_cooldown_key(key) for key in self.api_keys]
+        values = cache_service.get_many(usage_keys + cooldown_keys)
+
         for i, key in enumerate(self.api_keys):
             key_stats = {
                 "index": i,
-                "usage_today": self._get_key_usage(key),
+                "usage_today": values.get(usage_keys[i]) or 0,
                 "limit": self.limit_per_key,
                 "threshold": int(self.limit_per_key * self.threshold_percent / 100),
-                "in_cooldown": self._is_key_in_cooldown(key),
+                "in_cooldown": self._cooldown_active(values.get(cooldown_keys[i])),
                 "is_current": i == self.current_key_index
             }
             stats["keys"].append(key_stats)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Tuple
+
+
+# Маркер промаха: None – допустимое закэшированное значение
+MISSING = object()
+
+
+class LocalLRUCache:
+    """In-process LRU-кэш (L1) с TTL на запись и ограничением суммарного размера в байтах."""
+
+    def __init__(self, max_bytes: int, max_item_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes or max_bytes
+        # key -> (value, expires_at, size)
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Растет при каждом удалении: запись, прочитанная из Redis до инвалидации,
+        # не должна попасть в L1 после нее (см. set(epoch=...))
+        self.epoch = 0
+
+    def get(self, key: str) -> Any:
+        """Вернуть значение или MISSING, если записи нет или она истекла."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: float, size: int, epoch: int | None = None) -> bool:
+        """Положить значение на ttl секунд. Слишком крупные значения не кэшируются.
+
+        epoch – значение self.epoch до чтения value из Redis: если с тех пор
+        что-то инвалидировалось, значение могло устареть и не кэшируется.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if ttl <= 0 or size > self.max_item_bytes or (epoch is not None and epoch != self.epoch):
+                return False
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self.epoch += 1
+            if key in self._entries:
+                self._drop(key)
+
+    def delete_where(self, predicate) -> int:
+        """Удалить все записи, ключ которых удовлетворяет predicate."""
+        with self._lock:
+            self.epoch += 1
+            keys = [k for k in self._entries if predicate(k)]
+            for k in keys:
+                self._drop(k)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+            self._size = 0
+
+    def _drop(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
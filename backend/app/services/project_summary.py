@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.project import Chapter, Project
+from app.services.cache_service import LeaseHeldError, cache_service
+
+
+class ProjectSummaryService:
+    """Общее саммари проекта, хранимое в projects.summary.
+
+    Саммари собирается из саммари первых PROJECT_SUMMARY_MAX_CHAPTERS глав;
+    рядом хранится хэш этих входных данных. Пока он совпадает, саммари
+    отдается из БД без обращения к LLM; при изменении саммари глав оно
+    пересобирается (одним процессом – под арендой).
+    """
+
+    def _contributing_chapters(self, db: Session, project_id: int) -> List[tuple]:
+        # Только нужные колонки: тексты глав для саммари проекта не нужны
+        return db.query(Chapter.id, Chapter.title, Chapter.summary).filter(
+            Chapter.project_id == project_id,
+            Chapter.summary.isnot(None)
+        ).order_by(Chapter.id).limit(settings.PROJECT_SUMMARY_MAX_CHAPTERS).all()
+
+    @staticmethod
+    def inputs_hash(chapters: List[tuple]) -> str:
+        payload = [[chapter_id, title, summary] for chapter_id, title, summary in chapters]
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode()).hexdigest()
+
+    def current(self, db: Session, project_id: int, min_chapters: int = 2) -> Optional[str]:
+        """Сохраненное саммари проекта, если оно актуально, без обращения к LLM.
+
+        Возвращает то же, что get() без пересборки; None, если саммари устарело
+        (тогда get() собрал бы новое). Нужно там, где саммари только входит в
+        адрес кэша (см. TranslationEngine.cache_fingerprint).
+        """
+        chapters = self._contributing_chapters(db, project_id)
+        if len(chapters) < max(1, min_chapters):
+            return None
+        project = db.get(Project, project_id)
+        if project is None or project.summary_inputs_hash != self.inputs_hash(chapters):
+            return None
+        return project.summary or None
+
+    def get(self, db: Session, project_id: int, min_chapters: int = 2, force: bool = False) -> Optional[str]:
+        """Актуальное саммари проекта или None, если глав с саммари меньше min_chapters.
+
+        Пересобирает и сохраняет саммари (с фиксацией сессии), только если
+        изменились саммари глав или передан force. Если пересборка уже идет в
+        другом запросе или не удалась, возвращает прежнее сохраненное саммари.
+        """
+        chapters = self._contributing_chapters(db, project_id)
+        if len(chapters) < max(1, min_chapters):
+            return None
+        project = db.get(Project, project_id)
+        if project is None:
+            return None
+        digest = self.inputs_hash(chapters)
+        if project.summary and project.summary_inputs_hash == digest and not force:
+            return project.summary
+
+        try:
+            summary = cache_service.run_exclusive(
+                "project_summary", project_id, lambda: self._regenerate(db, project, chapters, digest)
+            )
+        except LeaseHeldError:
+            return project.summary
+        return summary or project.summary
+
+    def _regenerate(self, db: Session, project: Project, chapters: List[tuple], digest: str) -> str:
+        from app.core.nlp_pipeline.context_summarizer import context_summarizer
+        summary = context_summarizer.create_project_summary([
+            {"title": title, "summary": chapter_summary} for _, title, chapter_summary in chapters
+        ])
+        if not summary:
+            return ""  # Ошибка LLM: хэш не обновляем, пересоберем при следующем запросе
+        project.summary = summary
+        project.summary_inputs_hash = digest
+        project.summary_updated_at = datetime.utcnow()
+        db.commit()
+        return summary
+
+
+project_summary_service = ProjectSummaryService()
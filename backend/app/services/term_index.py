@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.term_matcher import TermMatcher, term_matcher_cache
+from app.models.glossary import GlossaryTerm, TermOccurrence
+from app.models.project import Chapter
+
+
+class TermIndex:
+    """Обратный индекс термин → главы в таблице term_occurrences.
+
+    Для каждой пары (термин, глава) хранится число вхождений и их позиции в
+    original_text. Индекс обновляется при создании/правке глав (один проход
+    автомата по главе со всеми терминами проекта) и терминов (один проход по
+    главам проекта с автоматом только из измененных терминов). Изменения
+    пишутся в сессию вызывающего; фиксирует вызывающий.
+    """
+
+    def _spans(self, matcher: TermMatcher, text: str | None) -> Dict[str, List[List[int]]]:
+        spans: Dict[str, List[List[int]]] = defaultdict(list)
+        for start, end, pattern in matcher.iter_matches(text or ""):
+            spans[pattern].append([start, end])
+        return spans
+
+    def _occurrence(self, project_id: int, term_id: int, chapter_id: int, spans: List[List[int]]) -> TermOccurrence:
+        return TermOccurrence(
+            project_id=project_id,
+            term_id=term_id,
+            chapter_id=chapter_id,
+            count=len(spans),
+            offsets=spans[:settings.TERM_INDEX_MAX_OFFSETS],
+        )
+
+    @staticmethod
+    def _ids_by_pattern(terms: Iterable[tuple]) -> Dict[str, List[int]]:
+        ids: Dict[str, List[int]] = defaultdict(list)
+        for term_id, source in terms:
+            if source and source.strip():
+                ids[source.strip().lower()].append(term_id)
+        return ids
+
+    def index_chapter(self, db: Session, chapter: Chapter) -> Set[int]:
+        """Переиндексировать главу. Возвращает термины, чьи вхождения могли измениться."""
+        terms = db.query(GlossaryTerm.id, GlossaryTerm.source_term).filter(
+            GlossaryTerm.project_id == chapter.project_id
+        ).all()
+        # Отдельный ключ кэша: у перевода свой автомат только из утвержденных терминов
+        matcher = term_matcher_cache.get(("index", chapter.project_id), [source for _, source in terms])
+        ids_by_pattern = self._ids_by_pattern(terms)
+
+        affected = {term_id for (term_id,) in db.query(TermOccurrence.term_id).filter(TermOccurrence.chapter_id == chapter.id)}
+        db.query(TermOccurrence).filter(TermOccurrence.chapter_id == chapter.id).delete(synchronize_session=False)
+        for pattern, spans in self._spans(matcher, chapter.original_text).items():
+            for term_id in ids_by_pattern.get(pattern, []):
+                db.add(self._occurrence(chapter.project_id, term_id, chapter.id, spans))
+                affected.add(term_id)
+        return affected
+
+    def index_terms(self, db: Session, project_id: int, terms: List[GlossaryTerm]) -> Set[int]:
+        """Переиндексировать термины по всем главам проекта. Возвращает главы, где они были или есть."""
+        terms = [term for term in terms if term.id is not None]
+        if not terms:
+            return set()
+        term_ids = [term.id for term in terms]
+        ids_by_pattern = self._ids_by_pattern((term.id, term.source_term) for term in terms)
+        matcher = TermMatcher(ids_by_pattern)
+
+        affected = {chapter_id for (chapter_id,) in db.query(TermOccurrence.chapter_id).filter(
+            TermOccurrence.term_id.in_(term_ids)
+        ).distinct()}
+        db.query(TermOccurrence).filter(TermOccurrence.term_id.in_(term_ids)).delete(synchronize_session=False)
+        if not ids_by_pattern:
+            return affected
+        chapters = db.query(Chapter.id, Chapter.original_text).filter(Chapter.project_id == project_id).yield_per(50)
+        for chapter_id, text in chapters:
+            for pattern, spans in self._spans(matcher, text).items():
+                for term_id in ids_by_pattern[pattern]:
+                    db.add(self._occurrence(project_id, term_id, chapter_id, spans))
+                    affected.add(chapter_id)
+        return affected
+
+    def rebuild_project(self, db: Session, project_id: int) -> dict:
+        """Построить индекс проекта заново (для глав и терминов, созданных до индекса)."""
+        terms = db.query(GlossaryTerm.id, GlossaryTerm.source_term).filter(GlossaryTerm.project_id == project_id).all()
+        ids_by_pattern = self._ids_by_pattern(terms)
+        matcher = TermMatcher(ids_by_pattern)
+        db.query(TermOccurrence).filter(TermOccurrence.project_id == project_id).delete(synchronize_session=False)
+        chapters = occurrences = 0
+        for chapter_id, text in db.query(Chapter.id, Chapter.original_text).filter(
+            Chapter.project_id == project_id
+        ).yield_per(50):
+            chapters += 1
+            for pattern, spans in self._spans(matcher, text).items():
+                for term_id in ids_by_pattern[pattern]:
+                    db.add(self._occurrence(project_id, term_id, chapter_id, spans))
+                    occurrences += 1
+        return {"project_id": project_id, "terms": len(terms), "chapters": chapters, "indexed_pairs": occurrences}
+
+    def chapters_for_terms(self, db: Session, term_ids: Iterable[int]) -> Set[int]:
+        term_ids = list(term_ids)
+        if not term_ids:
+            return set()
+        return {chapter_id for (chapter_id,) in db.query(TermOccurrence.chapter_id).filter(
+            TermOccurrence.term_id.in_(term_ids)
+        ).distinct()}
+
+    def concordance(self, db: Session, term: GlossaryTerm, skip: int = 0, limit: int = 20,
+                    context_chars: int | None = None) -> dict:
+        """Вхождения термина по главам с фрагментами контекста (главы – по порядку в проекте)."""
+        context_chars = settings.TERM_INDEX_CONTEXT_CHARS if context_chars is None else context_chars
+        query = db.query(TermOccurrence, Chapter.title, Chapter.order).join(
+            Chapter, Chapter.id == TermOccurrence.chapter_id
+        ).filter(TermOccurrence.term_id == term.id)
+        totals = db.query(TermOccurrence.count).filter(TermOccurrence.term_id == term.id).all()
+        rows = query.order_by(Chapter.order, Chapter.id).offset(skip).limit(limit).all()
+
+        texts = dict(db.query(Chapter.id, Chapter.original_text).filter(
+            Chapter.id.in_([occurrence.chapter_id for occurrence, _, _ in rows])
+        ).all()) if rows else {}
+        chapters = []
+        for occurrence, title, order in rows:
+            text = texts.get(occurrence.chapter_id) or ""
+            chapters.append({
+                "chapter_id": occurrence.chapter_id,
+                "title": title,
+                "order": order,
+                "count": occurrence.count,
+                "occurrences": [
+                    {
+                        "start": start,
+                        "end": end,
+                        "left": text[max(0, start - context_chars):start],
+                        "match": text[start:end],
+                        "right": text[end:end + context_chars],
+                    }
+                    for start, end in occurrence.offsets or []
+                ],
+            })
+        return {
+            "term_id": term.id,
+            "source_term": term.source_term,
+            "translated_term": term.translated_term,
+            "total_chapters": len(totals),
+            "total_occurrences": sum(count for (count,) in totals),
+            "chapters": chapters,
+        }
+
+
+term_index = TermIndex()
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import random
+import threading
+import unicodedata
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.glossary_checker import glossary_checker
+from app.core.term_matcher import term_matcher_cache
+from app.models.translation import TranslationMemoryEntry
+
+
+# MinHash: 32 перестановки, LSH из 8 полос по 4 строки.
+# При сходстве 0.7 пара становится кандидатом с вероятностью ~0.9, при 0.4 – ~0.2
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+_PRIME = (1 << 61) - 1
+# Фиксированное зерно: сигнатуры хранятся в БД и должны совпадать между процессами
+_rng = random.Random(20241019)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def normalize_paragraph(text: str) -> str:
+    """NFKC и схлопнутые пробелы: один и тот же абзац из разных глав дает один ключ."""
+    return unicodedata.normalize("NFKC", " ".join(text.split()))
+
+
+def paragraph_hash(text: str) -> str:
+    return hashlib.sha256(normalize_paragraph(text).encode()).hexdigest()
+
+
+def shingles(text: str) -> set:
+    """Символьные 4-граммы нормализованного текста без учета регистра."""
+    normalized = normalize_paragraph(text).lower()
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set: set) -> List[int]:
+    if not shingle_set:
+        return []
+    base = [zlib.crc32(sh.encode()) for sh in shingle_set]
+    return [min((a * x + b) % _PRIME for x in base) for a, b in _PERMUTATIONS]
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _bands(signature: List[int]) -> List[tuple]:
+    return [(band, tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+class _ProjectIndex:
+    """LSH-индекс сигнатур одного проекта (в памяти процесса)."""
+
+    def __init__(self):
+        self.count = 0
+        self.max_id = 0
+        self.buckets: Dict[tuple, set] = {}
+
+    def add(self, entry_id: int, signature: List[int]) -> None:
+        if len(signature) != NUM_PERM:
+            return
+        for band in _bands(signature):
+            self.buckets.setdefault(band, set()).add(entry_id)
+
+    def candidates(self, signature: List[int]) -> set:
+        found: set = set()
+        if len(signature) != NUM_PERM:
+            return found
+        for band in _bands(signature):
+            found |= self.buckets.get(band, set())
+        return found
+
+
+class TranslationMemory:
+    """Память переводов: пары исходный/переведенный абзац по проектам.
+
+    Точное совпадение ищется по sha256 нормализованного абзаца; нечеткое –
+    по MinHash-сигнатурам символьных 4-грамм через LSH-индекс, который
+    строится лениво и дополняется новыми записями. Кандидаты проверяются
+    точным коэффициентом Жаккара.
+
+    С каждой записью хранятся переводы терминов глоссария, встречающихся в
+    абзаце. Точное совпадение подставляется без LLM, только если они не
+    изменились, – иначе абзац переводится заново с текущим глоссарием.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes: Dict[int, _ProjectIndex] = {}
+        self.logger = logging.getLogger("translation_memory")
+
+    def _eligible(self, text: str) -> bool:
+        return len(normalize_paragraph(text)) >= settings.TRANSLATION_MEMORY_MIN_CHARS
+
+    @staticmethod
+    def term_pairs(text: str, glossary_terms: List[Any] | None) -> Dict[str, str]:
+        """Переводы терминов глоссария, встречающихся в абзаце: {термин в нижнем регистре: перевод}."""
+        if not glossary_terms:
+            return {}
+        project_id = getattr(glossary_terms[0], "project_id", None)
+        found = term_matcher_cache.get(project_id, [term.source_term or "" for term in glossary_terms]).find(text)
+        return {
+            (term.source_term or "").strip().lower(): term.translated_term
+            for term in glossary_terms if (term.source_term or "").strip().lower() in found
+        }
+
+    def _hit_valid(self, source: str, target: str, stored_terms: Dict[str, str] | None,
+                   glossary_terms: List[Any]) -> bool:
+        """Перевод из памяти соответствует текущему глоссарию."""
+        current = self.term_pairs(source, glossary_terms)
+        if stored_terms is not None:
+            return stored_terms == current
+        # Записи, сохраненные без терминов: текущий перевод каждого термина должен быть в тексте
+        return all(glossary_checker.term_present(translated, target) for translated in current.values())
+
+    def lookup(self, db: Session, project_id: int, paragraphs: Iterable[str],
+               glossary_terms: List[Any] | None = None) -> Dict[str, dict]:
+        """Точные совпадения: {нормализованный абзац: {"id": ..., "target": ...}}.
+
+        Если передан glossary_terms, совпадения, переведенные при других
+        переводах встречающихся терминов, отбрасываются.
+        """
+        by_hash = {paragraph_hash(p): normalize_paragraph(p) for p in paragraphs if self._eligible(p)}
+        if not by_hash:
+            return {}
+        rows = db.query(
+            TranslationMemoryEntry.id, TranslationMemoryEntry.source_hash,
+            TranslationMemoryEntry.target_text, TranslationMemoryEntry.terms
+        ).filter(
+            TranslationMemoryEntry.project_id == project_id,
+            TranslationMemoryEntry.source_hash.in_(list(by_hash))
+        ).all()
+        return {
+            by_hash[source_hash]: {"id": entry_id, "target": target}
+            for entry_id, source_hash, target, terms in rows
+            if glossary_terms is None or self._hit_valid(by_hash[source_hash], target, terms, glossary_terms)
+        }
+
+    def _index(self, db: Session, project_id: int) -> _ProjectIndex:
+        """Индекс проекта; догружает новые записи, при удалениях перестраивается."""
+        count, max_id = db.query(
+            func.count(TranslationMemoryEntry.id), func.max(TranslationMemoryEntry.id)
+        ).filter(TranslationMemoryEntry.project_id == project_id).one()
+        max_id = max_id or 0
+        with self._lock:
+            index = self._indexes.get(project_id)
+            if index is not None and index.count == count and index.max_id == max_id:
+                return index
+            if index is None or max_id < index.max_id or count < index.count:
+                index = _ProjectIndex()
+            rows = db.query(TranslationMemoryEntry.id, TranslationMemoryEntry.signature).filter(
+                TranslationMemoryEntry.project_id == project_id,
+                TranslationMemoryEntry.id > index.max_id
+            ).all()
+            for entry_id, signature in rows:
+                index.add(entry_id, signature or [])
+            # Удаленные записи могут остаться в корзинах – при выборке по id они просто не найдутся
+            index.count = count
+            index.max_id = max_id
+            self._indexes[project_id] = index
+            return index
+
+    def similar(self, db: Session, project_id: int, paragraphs: Iterable[str],
+                limit: int | None = None, threshold: float | None = None) -> List[dict]:
+        """Похожие (но не совпадающие) абзацы из памяти, лучшие сначала:
+        [{"source": ..., "target": ..., "score": ...}]."""
+        limit = settings.TRANSLATION_MEMORY_MAX_REFERENCES if limit is None else limit
+        threshold = settings.TRANSLATION_MEMORY_FUZZY_THRESHOLD if threshold is None else threshold
+        queries = [(normalize_paragraph(p), shingles(p)) for p in paragraphs if self._eligible(p)]
+        if not queries or limit <= 0:
+            return []
+        index = self._index(db, project_id)
+        candidates: Dict[int, List[set]] = {}
+        for _, query_shingles in queries:
+            for entry_id in index.candidates(minhash(query_shingles)):
+                candidates.setdefault(entry_id, []).append(query_shingles)
+        if not candidates:
+            return []
+        rows = db.query(
+            TranslationMemoryEntry.id, TranslationMemoryEntry.source_text, TranslationMemoryEntry.target_text
+        ).filter(TranslationMemoryEntry.id.in_(list(candidates))).all()
+        sources = {normalized for normalized, _ in queries}
+        matches = []
+        for entry_id, source, target in rows:
+            if normalize_paragraph(source) in sources:
+                continue  # Точные совпадения подставляются без LLM, ссылками не нужны
+            entry_shingles = shingles(source)
+            score = max(jaccard(entry_shingles, q) for q in candidates[entry_id])
+            if score >= threshold:
+                matches.append({"source": source, "target": target, "score": round(score, 3)})
+        matches.sort(key=lambda m: m["score"], reverse=True)
+        return matches[:limit]
+
+    def record(self, db: Session, project_id: int, pairs: List[Tuple[str, str]],
+               used_ids: Optional[List[int]] = None, glossary_terms: List[Any] | None = None) -> int:
+        """Сохранить пары (исходный абзац, перевод) и учесть подстановки used_ids.
+
+        glossary_terms – глоссарий, с которым получены переводы: переводы
+        встречающихся терминов сохраняются для проверки в lookup.
+
+        Пишет в сессию вызывающего в точке сохранения: конфликт с параллельной
+        записью того же абзаца не ломает его транзакцию. Фиксирует вызывающий.
+        """
+        fresh: Dict[str, Tuple[str, str]] = {}
+        for source, target in pairs:
+            if self._eligible(source) and target.strip():
+                fresh[paragraph_hash(source)] = (source.strip(), target.strip())
+        stored = 0
+        try:
+            with db.begin_nested():
+                if used_ids:
+                    db.query(TranslationMemoryEntry).filter(TranslationMemoryEntry.id.in_(used_ids)).update(
+                        {TranslationMemoryEntry.hit_count: TranslationMemoryEntry.hit_count + 1},
+                        synchronize_session=False
+                    )
+                if fresh:
+                    existing = {
+                        entry.source_hash: entry for entry in db.query(TranslationMemoryEntry).filter(
+                            TranslationMemoryEntry.project_id == project_id,
+                            TranslationMemoryEntry.source_hash.in_(list(fresh))
+                        ).all()
+                    }
+                    for source_hash, (source, target) in fresh.items():
+                        entry = existing.get(source_hash)
+                        terms = self.term_pairs(source, glossary_terms) if glossary_terms is not None else None
+                        if entry is not None:
+                            # Последний перевод абзаца считается лучшим
+                            if entry.target_text != target or entry.terms != terms:
+                                entry.target_text = target
+                                entry.terms = terms
+                                entry.updated_at = datetime.utcnow()
+                            continue
+                        db.add(TranslationMemoryEntry(
+                            project_id=project_id,
+                            source_hash=source_hash,
+                            source_text=source,
+                            target_text=target,
+                            signature=minhash(shingles(source)),
+                            terms=terms,
+                        ))
+                        stored += 1
+        except IntegrityError as e:
+            self.logger.warning("Translation memory write skipped: %s", e)
+            return 0
+        return stored
+
+    def stats(self, db: Session, project_id: int) -> dict:
+        count, hits = db.query(
+            func.count(TranslationMemoryEntry.id), func.coalesce(func.sum(TranslationMemoryEntry.hit_count), 0)
+        ).filter(TranslationMemoryEntry.project_id == project_id).one()
+        return {"project_id": project_id, "entries": count, "reused": int(hits)}
+
+
+translation_memory = TranslationMemory()
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.alignment import aligned_units, join_blocks, paragraph_blocks
+from app.core.config import settings
+from app.core.term_matcher import term_matcher_cache
+from app.core.text_chunker import estimate_tokens, normalize_text
+from app.core.translation_engine import translation_engine
+from app.models.glossary import GlossaryTerm
+from app.models.project import Chapter
+from app.models.translation import TranslationReview
+
+
+# Версия промпта рецензии (сохраняется вместе с результатом)
+REVIEW_PROMPT_VERSION = "1"
+
+ISSUE_TYPES = ("accuracy", "omission", "grammar", "style", "glossary")
+ISSUE_SEVERITIES = ("minor", "major", "critical")
+
+
+def translation_hash(translated_text: str) -> str:
+    """Ключ версии перевода: правки только пробелов и пустых строк рецензию не сбрасывают."""
+    return hashlib.sha256(normalize_text(translated_text).strip().encode()).hexdigest()
+
+
+class TranslationReviewService:
+    """Рецензии переводов глав, сохраняемые в translation_reviews.
+
+    Глава целиком делится на фрагменты по выравниванию абзацев так, чтобы
+    оригинал и перевод фрагмента укладывались в TRANSLATION_REVIEW_CHUNK_MAX_TOKENS;
+    фрагменты рецензируются параллельно, оценка главы – средняя с весом по
+    длине оригинала. Результат хранится по хэшу перевода: неизмененный
+    перевод повторно не рецензируется.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("translation_review")
+
+    def current(self, db: Session, chapter: Chapter) -> Optional[TranslationReview]:
+        """Рецензия текущей версии перевода главы, если она уже есть."""
+        if not chapter.translated_text:
+            return None
+        return db.query(TranslationReview).filter(
+            TranslationReview.chapter_id == chapter.id,
+            TranslationReview.translation_hash == translation_hash(chapter.translated_text)
+        ).first()
+
+    def review(self, db: Session, chapter: Chapter, glossary_terms: List[GlossaryTerm]) -> Tuple[TranslationReview, bool]:
+        """Рецензия перевода главы: (рецензия, взята ли она из сохраненных).
+
+        Сохраняет новую рецензию с фиксацией сессии. Если хотя бы один фрагмент
+        не удалось отрецензировать, ничего не сохраняет и бросает ValueError –
+        иначе неполная оценка закрепилась бы за версией перевода.
+        """
+        existing = self.current(db, chapter)
+        if existing is not None:
+            return existing, True
+
+        chunks = self.plan_chunks(chapter.original_text, chapter.translated_text, chapter.alignment)
+        if not chunks:
+            raise ValueError("Chapter has no translation to review")
+        matcher = term_matcher_cache.get(chapter.project_id, [term.source_term or "" for term in glossary_terms])
+        terms_by_source = {(term.source_term or "").strip().lower(): term for term in glossary_terms}
+        prompts = []
+        for index, chunk in enumerate(chunks):
+            found = matcher.find(chunk["source"])
+            chunk_terms = [term for source, term in terms_by_source.items() if source in found]
+            prompts.append(self._build_review_prompt(chunk, index, len(chunks), chunk_terms))
+
+        results = [self._parse_response(response) for response in translation_engine._complete_all(prompts)]
+        failed = sum(1 for result in results if result is None)
+        if failed:
+            raise ValueError(f"Review failed for {failed} of {len(chunks)} chunks")
+
+        weights = [max(1, len(chunk["source"])) for chunk in chunks]
+        issues = [
+            dict(issue, chunk=index)
+            for index, result in enumerate(results) for issue in result["issues"]
+        ]
+        review = TranslationReview(
+            project_id=chapter.project_id,
+            chapter_id=chapter.id,
+            translation_hash=translation_hash(chapter.translated_text),
+            score=round(sum(w * r["score"] for w, r in zip(weights, results)) / sum(weights), 2),
+            min_score=min(result["score"] for result in results),
+            issue_count=len(issues),
+            issues=issues,
+            chunks=[
+                {"paragraphs": list(chunk["paragraphs"]), "score": result["score"], "summary": result["summary"]}
+                for chunk, result in zip(chunks, results)
+            ],
+            summary="\n".join(result["summary"] for result in results if result["summary"]) or None,
+            model=settings.GEMINI_MODEL,
+            prompt_version=REVIEW_PROMPT_VERSION,
+        )
+        db.add(review)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Ту же версию перевода параллельно отрецензировал другой запрос
+            db.rollback()
+            stored = self.current(db, chapter)
+            if stored is None:
+                raise
+            return stored, True
+        return review, False
+
+    def plan_chunks(self, original_text: str | None, translated_text: str | None,
+                    alignment: Dict[str, Any] | None) -> List[Dict[str, Any]]:
+        """Фрагменты рецензии: [{"paragraphs": (начало, конец), "source": ..., "translation": ...}].
+
+        Границы проходят по выровненным группам абзацев; группа больше бюджета
+        (например, вся глава, если число абзацев в переводе не совпало) делится
+        пропорционально длине оригинала и перевода.
+        """
+        source_blocks = paragraph_blocks(original_text)
+        target_blocks = paragraph_blocks(translated_text)
+        budget = settings.TRANSLATION_REVIEW_CHUNK_MAX_TOKENS
+        pieces = []
+        for unit in aligned_units(original_text, translated_text, alignment):
+            (s1, s2), (t1, t2) = unit["source"], unit["target"]
+            pieces.extend(self._split_unit(source_blocks, target_blocks, s1, s2, t1, t2, budget))
+
+        chunks: List[Dict[str, Any]] = []
+        group: List[tuple] = []
+        size = 0
+
+        def flush():
+            if group:
+                first, last = group[0], group[-1]
+                chunks.append({
+                    "paragraphs": (first[0], last[1]),
+                    "source": join_blocks(source_blocks[first[0]:last[1]]),
+                    "translation": join_blocks(target_blocks[first[2]:last[3]]),
+                })
+
+        for piece in pieces:
+            s1, s2, t1, t2 = piece
+            tokens = (estimate_tokens(join_blocks(source_blocks[s1:s2]))
+                      + estimate_tokens(join_blocks(target_blocks[t1:t2])))
+            if group and size + tokens > budget:
+                flush()
+                group, size = [], 0
+            group.append(piece)
+            size += tokens
+        flush()
+        return chunks
+
+    @staticmethod
+    def _split_unit(source_blocks: List[tuple], target_blocks: List[tuple],
+                    s1: int, s2: int, t1: int, t2: int, budget: int) -> List[tuple]:
+        """Делит группу абзацев больше бюджета на части с равной долей оригинала и перевода."""
+        tokens = (estimate_tokens(join_blocks(source_blocks[s1:s2]))
+                  + estimate_tokens(join_blocks(target_blocks[t1:t2])))
+        parts = min(math.ceil(tokens / max(1, budget)), s2 - s1, max(1, t2 - t1))
+        if parts <= 1:
+            return [(s1, s2, t1, t2)]
+
+        def cuts(blocks: List[tuple], start: int, end: int) -> List[int]:
+            lengths = [len(paragraph) for paragraph, _ in blocks[start:end]]
+            total = sum(lengths) or 1
+            result, passed = [start], 0
+            for i, length in enumerate(lengths[:-1]):
+                passed += length
+                # Граница после абзаца, на котором накопленная доля перешла очередной порог
+                if passed / total >= len(result) / parts and len(result) < parts:
+                    result.append(start + i + 1)
+            while len(result) < parts:
+                result.append(result[-1])
+            return result + [end]
+
+        source_cuts = cuts(source_blocks, s1, s2)
+        target_cuts = cuts(target_blocks, t1, t2)
+        return [
+            (source_cuts[i], source_cuts[i + 1], target_cuts[i], target_cuts[i + 1])
+            for i in range(parts) if source_cuts[i] < source_cuts[i + 1]
+        ]
+
+    def _build_review_prompt(self, chunk: Dict[str, Any], index: int, total: int,
+                             glossary_terms: List[GlossaryTerm]) -> str:
+        """Промпт рецензии фрагмента главы с ответом в JSON."""
+        glossary = "\n".join(
+            f"  {term.source_term} → {term.translated_term}" for term in glossary_terms
+        ) or "  (терминов глоссария во фрагменте нет)"
+        return f"""
+Ты - редактор перевода ранобэ с английского на русский язык.
+
+Оцени качество перевода фрагмента {index + 1} из {total} главы.
+
+ГЛОССАРИЙ (утвержденные переводы терминов):
+{glossary}
+
+ОРИГИНАЛ:
+{chunk["source"]}
+
+ПЕРЕВОД:
+{chunk["translation"]}
+
+ИНСТРУКЦИИ:
+1. Оцени перевод по шкале от 1 до 10 (точность, полнота, грамматика, стиль, соблюдение глоссария)
+2. Перечисли конкретные ошибки: искажения смысла, пропуски, грамматические и стилистические ошибки, неверные переводы терминов
+3. Для каждой ошибки приведи фрагмент перевода и исправленный вариант
+4. Верни только JSON без комментариев в формате:
+{{"score": 7, "summary": "общая оценка в 1-2 предложениях", "issues": [{{"type": "{'|'.join(ISSUE_TYPES)}", "severity": "{'|'.join(ISSUE_SEVERITIES)}", "translation": "фрагмент перевода", "suggestion": "исправление", "comment": "пояснение"}}]}}
+"""
+
+    def _parse_response(self, response: str | None) -> Optional[Dict[str, Any]]:
+        """Разбирает JSON-ответ рецензии; None, если ответа нет или в нем нет оценки."""
+        if not response:
+            return None
+        try:
+            start = response.find("{")
+            end = response.rfind("}") + 1
+            if start == -1 or end == 0:
+                raise ValueError("no JSON object in response")
+            data = json.loads(response[start:end])
+            score = min(10.0, max(1.0, float(data["score"])))
+        except (ValueError, TypeError, KeyError) as e:
+            self.logger.warning("Error parsing review response: %s", e)
+            return None
+        issues = []
+        for issue in data.get("issues") or []:
+            if not isinstance(issue, dict):
+                continue
+            issues.append({
+                "type": issue.get("type") if issue.get("type") in ISSUE_TYPES else "style",
+                "severity": issue.get("severity") if issue.get("severity") in ISSUE_SEVERITIES else "minor",
+                "translation": str(issue.get("translation") or ""),
+                "suggestion": str(issue.get("suggestion") or ""),
+                "comment": str(issue.get("comment") or ""),
+            })
+        return {"score": score, "summary": str(data.get("summary") or "").strip(), "issues": issues}
+
+    @staticmethod
+    def to_dict(review: TranslationReview, include_issues: bool = True) -> Dict[str, Any]:
+        data = {
+            "review_id": review.id,
+            "chapter_id": review.chapter_id,
+            "translation_hash": review.translation_hash,
+            "score": review.score,
+            "min_score": review.min_score,
+            "issue_count": review.issue_count,
+            "summary": review.summary,
+            "model": review.model,
+            "created_at": review.created_at,
+        }
+        if include_issues:
+            data["issues"] = review.issues or []
+            data["chunks"] = review.chunks or []
+        return data
+
+
+translation_review_service = TranslationReviewService()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import List
+
+
+class TransportSelector:
+    """Выбор транспорта кэша (REST или TCP) по скользящим задержкам и ошибкам.
+
+    Для каждой пары (транспорт, операция) хранится EWMA задержки и доли
+    ошибок. Операция уходит на самый быстрый здоровый транспорт; остальные
+    остаются запасными в порядке качества. Раз в probe_interval операция
+    отправляется на непредпочтенный транспорт первой, чтобы его статистика
+    не устаревала (иначе однажды медленный транспорт не получил бы шанса).
+    """
+
+    def __init__(self, transports: List[str], alpha: float = 0.2, probe_interval: float = 30.0,
+                 max_error_rate: float = 0.5, adaptive: bool = True):
+        # Порядок transports – предпочтение, пока статистики нет
+        self.transports = list(transports)
+        self.alpha = alpha
+        self.probe_interval = probe_interval
+        self.max_error_rate = max_error_rate
+        self.adaptive = adaptive and len(self.transports) > 1
+        self._lock = threading.Lock()
+        self._stats: dict = {}
+        self._last_probe: dict = {}
+
+    def _entry(self, transport: str, op: str) -> dict:
+        key = (transport, op)
+        entry = self._stats.get(key)
+        if entry is None:
+            entry = {"latency_ms": None, "error_rate": 0.0, "calls": 0, "errors": 0, "last_error": None}
+            self._stats[key] = entry
+        return entry
+
+    def _healthy(self, entry: dict) -> bool:
+        return entry["error_rate"] <= self.max_error_rate
+
+    def _rank(self, op: str, stats: dict) -> List[str]:
+        """Здоровые раньше больных; среди них – по задержке; без замеров – по исходному порядку."""
+        def key(transport: str):
+            entry = stats.get((transport, op))
+            latency = entry["latency_ms"] if entry else None
+            return (
+                entry is not None and not self._healthy(entry),
+                latency is None,
+                latency or 0.0,
+                self.transports.index(transport),
+            )
+        return sorted(self.transports, key=key)
+
+    def order(self, op: str) -> List[str]:
+        """Транспорты в порядке попыток для операции op."""
+        if not self.adaptive:
+            return list(self.transports)
+        with self._lock:
+            ranked = self._rank(op, self._stats)
+            now = time.monotonic()
+            for transport in ranked[1:]:
+                # Транспорт без замеров пробуется сразу, дальше – раз в probe_interval
+                last = self._last_probe.get((transport, op))
+                if last is None or now - last >= self.probe_interval:
+                    self._last_probe[(transport, op)] = now
+                    ranked.remove(transport)
+                    ranked.insert(0, transport)
+                    break
+            return ranked
+
+    def record(self, transport: str, op: str, seconds: float, ok: bool, error: str | None = None) -> None:
+        """Учесть результат вызова. Задержка неудачного вызова не усредняется (таймауты исказили бы EWMA)."""
+        with self._lock:
+            entry = self._entry(transport, op)
+            entry["calls"] += 1
+            entry["error_rate"] += self.alpha * ((0.0 if ok else 1.0) - entry["error_rate"])
+            if ok:
+                ms = seconds * 1000
+                entry["latency_ms"] = ms if entry["latency_ms"] is None else (
+                    entry["latency_ms"] + self.alpha * (ms - entry["latency_ms"])
+                )
+            else:
+                entry["errors"] += 1
+                entry["last_error"] = error
+
+    def snapshot(self) -> dict:
+        """Статистика и текущий выбор по операциям: {op: {"preferred": ..., "transports": {...}}}."""
+        with self._lock:
+            ops = sorted({op for _, op in self._stats})
+            stats = {key: dict(entry) for key, entry in self._stats.items()}
+        result = {}
+        for op in ops:
+            transports = {}
+            for transport in self.transports:
+                entry = stats.get((transport, op))
+                if entry is None:
+                    continue
+                transports[transport] = {
+                    "latency_ms": round(entry["latency_ms"], 3) if entry["latency_ms"] is not None else None,
+                    "error_rate": round(entry["error_rate"], 4),
+                    "healthy": self._healthy(entry),
+                    "calls": entry["calls"],
+                    "errors": entry["errors"],
+                    "last_error": entry["last_error"],
+                }
+            preferred = self._rank(op, stats)[0] if self.adaptive else self.transports[0]
+            result[op] = {"preferred": preferred, "transports": transports}
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._last_probe.clear()
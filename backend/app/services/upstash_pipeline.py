@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from typing import Any, List
+
+import requests
+
+
+class UpstashPipelineError(Exception):
+    """Ошибка отдельной команды или всей транзакции Upstash REST."""
+
+
+class UpstashPipelineClient:
+    """Пакетная отправка команд в Upstash REST: N команд – один HTTPS-запрос.
+
+    /pipeline выполняет команды по порядку без атомарности и возвращает
+    результат каждой; /multi-exec выполняет их как транзакцию MULTI/EXEC.
+    Соединение переиспользуется (keep-alive через requests.Session).
+    """
+
+    def __init__(self, url: str, token: str, timeout: float = 3.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+
+    def _post(self, endpoint: str, commands: List[list]) -> Any:
+        payload = [[str(part) for part in command] for command in commands]
+        response = self.session.post(f"{self.url}/{endpoint}", json=payload, timeout=self.timeout)
+        if response.status_code >= 400:
+            raise UpstashPipelineError(f"{endpoint} failed with HTTP {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    def pipeline(self, commands: List[list]) -> list:
+        """Выполнить команды одним запросом. Ошибки отдельных команд возвращаются
+        экземплярами UpstashPipelineError на их местах (как raise_on_error=False в redis-py)."""
+        if not commands:
+            return []
+        return [
+            UpstashPipelineError(item["error"]) if "error" in item else item.get("result")
+            for item in self._post("pipeline", commands)
+        ]
+
+    def multi_exec(self, commands: List[list]) -> list:
+        """Выполнить команды атомарно (MULTI/EXEC). Ошибка любой команды – исключение."""
+        if not commands:
+            return []
+        data = self._post("multi-exec", commands)
+        if isinstance(data, dict) and "error" in data:
+            raise UpstashPipelineError(data["error"])
+        results = []
+        for item in data:
+            if "error" in item:
+                raise UpstashPipelineError(item["error"])
+            results.append(item.get("result"))
+        return results
+
+    # Составные операции
+    def incr_with_ttl(self, key: str, ttl: int) -> int:
+        """INCR с TTL на новое окно за один запрос.
+
+        SET NX EX создает ключ с TTL, только если его нет; INCR сохраняет TTL.
+        В транзакции ключ не может истечь между командами.
+        """
+        return int(self.multi_exec([["SET", key, 0, "EX", ttl, "NX"], ["INCR", key]])[1])
+
+    def incr_many_with_ttl(self, keys: List[str], ttl: int) -> List[int]:
+        commands = []
+        for key in keys:
+            commands.append(["SET", key, 0, "EX", ttl, "NX"])
+            commands.append(["INCR", key])
+        results = self.multi_exec(commands)
+        return [int(value) for value in results[1::2]]
+
+    def mget(self, keys: List[str]) -> list:
+        if not keys:
+            return []
+        result = self.pipeline([["MGET", *keys]])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,29 @@
+import os
+import tempfile
+
+# Настройки до импорта app: без внешнего Redis и базы, кэш – только на диске
+_tmp = tempfile.mkdtemp(prefix="lnnlp-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/test.db")
+os.environ.setdefault("GEMINI_API_KEYS_RAW", "test-key")
+os.environ.setdefault("CACHE_BACKEND", "local")
+os.environ.setdefault("CACHE_DISK_PATH", f"{_tmp}/cache.sqlite3")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Отдельная SQLite-база со схемой моделей на каждый тест."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.models import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
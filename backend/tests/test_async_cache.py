@@ -0,0 +1,156 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.services.async_cache_service import AsyncCacheService
+from app.services.cache_service import CacheService, LeaseHeldError
+
+
+class FakeRestTransaction:
+    """MULTI/EXEC async-клиента Upstash над словарем."""
+
+    def __init__(self, store: dict, calls: list):
+        self.store = store
+        self.calls = calls
+        self.commands = []
+
+    def set(self, key, value, ex=None, nx=False):
+        self.commands.append(("set", key, value, ex, nx))
+        return self
+
+    def incr(self, key):
+        self.commands.append(("incr", key))
+        return self
+
+    async def exec(self):
+        self.calls.append((threading.get_ident(), self.commands))
+        results = []
+        for command in self.commands:
+            if command[0] == "set":
+                if command[4] and command[1] in self.store:
+                    results.append(None)
+                    continue
+                self.store[command[1]] = int(command[2])
+                results.append(True)
+            else:
+                self.store[command[1]] += 1
+                results.append(self.store[command[1]])
+        return results
+
+
+class FakeAsyncRest:
+    def __init__(self):
+        self.store = {}
+        self.calls = []
+
+    def multi(self):
+        return FakeRestTransaction(self.store, self.calls)
+
+    async def publish(self, channel, message):
+        return 0
+
+
+@pytest.fixture
+def rest_only(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(settings, "CACHE_DISK_ENABLED", False)
+    monkeypatch.setattr(settings, "REDIS_URL", "")
+    monkeypatch.setattr(settings, "UPSTASH_REDIS_REST_URL", "https://example.invalid")
+    monkeypatch.setattr(settings, "UPSTASH_REDIS_REST_TOKEN", "token")
+    service = AsyncCacheService(CacheService())
+    service.rest_client = FakeAsyncRest()
+
+    def blocking_incr(*args, **kwargs):
+        raise AssertionError("REST incr must not go through the blocking client")
+    monkeypatch.setattr(service.sync.rest_pipeline, "incr_with_ttl", blocking_incr)
+    return service
+
+
+def test_rest_increment_is_one_transaction_on_the_event_loop(rest_only):
+    async def run():
+        loop_thread = threading.get_ident()
+        values = [await rest_only.increment_counter("gemini_usage:k", ttl=60) for _ in range(3)]
+        return loop_thread, values
+
+    loop_thread, values = asyncio.run(run())
+
+    assert values == [1, 2, 3]
+    thread, commands = rest_only.rest_client.calls[0]
+    assert thread == loop_thread
+    assert commands == [("set", "gemini_usage:k", 0, 60, True), ("incr", "gemini_usage:k")]
+
+
+@pytest.fixture
+def local_async(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DISK_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(settings, "CACHE_LEASE_POLL_INTERVAL", 0.01)
+    return AsyncCacheService(CacheService())
+
+
+def test_waiting_request_does_not_hold_a_thread_while_the_lease_is_busy(local_async):
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(threading.get_ident())
+        started.set()
+        release.wait(2)
+        return {"translated_text": "done"}
+
+    async def run():
+        owner = asyncio.create_task(local_async.run_exclusive("translate", 1, work))
+        await asyncio.to_thread(started.wait, 2)
+        waiter = asyncio.create_task(local_async.run_exclusive("translate", 1, lambda: runs.append("waiter"), wait=2))
+        # Пока вторая ручка ждет аренду, event loop свободен, а работа не запущена повторно
+        ticks = 0
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        runs_while_busy = list(runs)
+        release.set()
+        return runs_while_busy, ticks, await owner, await waiter
+
+    runs_while_busy, ticks, owner_result, _ = asyncio.run(run())
+
+    assert ticks == 5
+    assert len(runs_while_busy) == 1 and runs_while_busy[0] != threading.get_ident()
+    assert owner_result == {"translated_text": "done"}
+
+
+def test_busy_lease_without_wait_raises_with_lease_details(local_async):
+    async def run():
+        lease = await local_async.acquire_lease("review", 2)
+        try:
+            with pytest.raises(LeaseHeldError) as error:
+                await local_async.run_exclusive("review", 2, lambda: "never")
+            return lease, error.value
+        finally:
+            assert await local_async.release_lease("review", 2, lease)
+
+    lease, error = asyncio.run(run())
+
+    assert error.detail()["status"] == "in_progress"
+    assert error.lease["token"] in lease
+    assert local_async.sync.acquire_lease("review", 2) is not None
+
+
+def test_async_helpers_share_keys_and_generations_with_the_sync_service(local_async):
+    sync = local_async.sync
+
+    async def run():
+        await local_async.cache_translation(3, "fp", "async")
+        await local_async.cache_glossary(1, [{"term": "Sword"}])
+        from_sync = sync.get_cached_translation(3, "fp"), sync.get_cached_glossary(1)
+        sync.invalidate_translation_cache(3)
+        after_bump = await local_async.get_cached_translation(3, "fp")
+        sync.cache_summary(5, "summary")
+        return from_sync, after_bump, await local_async.get_cached_summary(5)
+
+    from_sync, after_bump, summary = asyncio.run(run())
+
+    assert from_sync == ("async", [{"term": "Sword"}])
+    assert after_bump is None
+    assert summary == "summary"
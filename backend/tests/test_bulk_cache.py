@@ -0,0 +1,105 @@
+import pytest
+
+from app.core.config import settings
+from app.services import cache_service as cache_module
+from app.services.cache_service import CacheService
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """FakeRedis, считающий обращения к серверу: команды и выполненные пайплайны."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.round_trips = []
+
+    def execute_command(self, *args, **kwargs):
+        self.round_trips.append(args[0])
+        return super().execute_command(*args, **kwargs)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = super().pipeline(transaction, shard_hint)
+        execute = pipe.execute
+
+        def counted(*args, **kwargs):
+            self.round_trips.append("PIPELINE")
+            return execute(*args, **kwargs)
+        pipe.execute = counted
+        return pipe
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(settings, "CACHE_DISK_ENABLED", False)
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://fake")
+    monkeypatch.setattr(settings, "UPSTASH_REDIS_REST_URL", None)
+    monkeypatch.setattr(CacheService, "_make_tcp_client", lambda self: CountingRedis(server=server))
+    monkeypatch.setattr(cache_module.redis, "from_url", lambda *args, **kwargs: fakeredis.FakeRedis(server=server))
+    service = CacheService()
+    service.redis_client.round_trips.clear()
+    return service
+
+
+def data_round_trips(cache) -> list:
+    # PUBLISH – рассылка инвалидации L1 после записи, к данным не относится
+    return [command for command in cache.redis_client.round_trips if command != "PUBLISH"]
+
+
+def test_set_many_and_get_many_take_one_round_trip_each(cache):
+    keys = [cache.get_summary_cache_key(i) for i in range(3)]
+
+    assert cache.set_many({keys[0]: "a", keys[1]: ["b"]}, ttl=60)
+    assert data_round_trips(cache) == ["PIPELINE"]
+    cache.redis_client.round_trips.clear()
+    cache.l1.clear()
+
+    assert cache.get_many(keys) == {keys[0]: "a", keys[1]: ["b"], keys[2]: None}
+    assert data_round_trips(cache) == ["MGET"]
+
+
+def test_get_many_reads_only_l1_misses_from_redis(cache):
+    cached, missing = cache.get_summary_cache_key(1), cache.get_summary_cache_key(2)
+    cache.set_many({cached: "warm", missing: "cold"}, ttl=60)
+    cache.l1.clear()
+    cache.get(cached)
+    cache.redis_client.round_trips.clear()
+
+    assert cache.get_many([cached, missing]) == {cached: "warm", missing: "cold"}
+    assert data_round_trips(cache) == ["MGET"]
+
+
+def test_incr_many_sets_ttl_only_for_new_windows(cache):
+    old, new = "gemini_usage:old", "gemini_usage:new"
+    cache.redis_client.set(old, 5, ex=600)
+
+    assert cache.incr_many([old, new], ttl=60) == {old: 6, new: 1}
+    assert cache.redis_client.ttl(old) > 60
+    assert 0 < cache.redis_client.ttl(new) <= 60
+
+
+def test_pipeline_returns_decoded_results_in_command_order(cache):
+    key, counter = cache.get_summary_cache_key(9), "gemini_usage:k"
+    cache.set(key, "old")
+    cache.redis_client.round_trips.clear()
+
+    with cache.pipeline() as pipe:
+        pipe.get(key)
+        pipe.set(key, {"v": 2}, ttl=60)
+        pipe.incr(counter)
+        pipe.expire(counter, 30)
+        pipe.delete("missing")
+
+    assert pipe.results == ["old", True, 1, True, 0]
+    assert data_round_trips(cache) == ["PIPELINE"]
+    assert cache.get(key) == {"v": 2}
+
+
+def test_delete_many_counts_removed_keys(cache):
+    keys = [cache.get_summary_cache_key(i) for i in range(3)]
+    cache.set_many({keys[0]: "a", keys[1]: "b"}, ttl=60)
+
+    assert cache.delete_many(keys) == 2
+    assert cache.get_many(keys) == {key: None for key in keys}
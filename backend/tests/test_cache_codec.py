@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services import cache_codec
+from app.services.cache_codec import HEADER, CacheCodec
+from app.services.cache_service import CacheService
+
+LARGE = {"text": "Глава первая. " * 500, "terms": [{"source": "Sword Saint", "id": i} for i in range(50)]}
+
+
+@pytest.mark.parametrize("serializer,compression", [
+    ("json", "zlib"),
+    ("json", "zstd"),
+    ("msgpack", "zlib"),
+    ("msgpack", "zstd"),
+    ("msgpack", "none"),
+])
+def test_roundtrip_large_values(serializer, compression):
+    codec = CacheCodec(serializer=serializer, compression=compression, threshold=256)
+
+    encoded = codec.encode(LARGE, "translation")
+
+    assert encoded.startswith(HEADER)
+    assert codec.decode(encoded, "translation") == LARGE
+    # TCP-клиент возвращает bytes
+    assert codec.decode(encoded.encode(), "translation") == LARGE
+
+
+def test_small_values_stay_plain_json():
+    codec = CacheCodec(threshold=1024)
+
+    encoded = codec.encode({"a": [1, 2]})
+
+    assert not encoded.startswith(HEADER)
+    assert codec.decode(encoded) == {"a": [1, 2]}
+
+
+def test_numbers_stay_compatible_with_incr():
+    codec = CacheCodec()
+
+    assert codec.encode(42) == "42"
+    assert codec.decode(b"43") == 43
+
+
+def test_legacy_values_are_readable():
+    codec = CacheCodec()
+
+    assert codec.decode('{"x": 1}') == {"x": 1}
+    assert codec.decode("plain text") == "plain text"
+
+
+def test_codec_reads_values_written_with_other_settings():
+    writer = CacheCodec(serializer="msgpack", compression="zlib", threshold=16)
+    reader = CacheCodec(serializer="json", compression="zstd", threshold=16)
+
+    assert reader.decode(writer.encode(LARGE)) == LARGE
+
+
+def test_missing_zstd_falls_back_to_zlib(monkeypatch):
+    monkeypatch.setattr(cache_codec, "zstandard", None)
+    codec = CacheCodec(compression="zstd", threshold=16)
+
+    assert codec.compression == "zlib"
+    assert codec.decode(codec.encode(LARGE)) == LARGE
+
+
+def test_stats_per_namespace():
+    codec = CacheCodec(threshold=16)
+    codec.decode(codec.encode(LARGE, "glossary"), "glossary")
+
+    stats = codec.stats()["namespaces"]["glossary"]
+    assert stats["encoded"] == 1
+    assert stats["decoded"] == 1
+    assert stats["bytes_written"] > 0
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DISK_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(settings, "CACHE_CODEC_COMPRESS_THRESHOLD", 256)
+    return CacheService()
+
+
+def test_cache_service_stores_large_values_compressed(cache):
+    key = cache.get_glossary_cache_key(1)
+    cache.set(key, LARGE)
+
+    stored = cache.redis_client.get(key)
+    stored = stored.decode() if isinstance(stored, bytes) else stored
+    assert stored.startswith(HEADER)
+    assert len(stored) < len(json.dumps(LARGE, ensure_ascii=False).encode()) / 4
+    assert cache.get(key) == LARGE
+    assert cache.get_many([key]) == {key: LARGE}
+
+
+def test_corrupt_compressed_value_reads_as_a_miss(cache):
+    key = cache.get_glossary_cache_key(2)
+    cache.redis_client.set(key, HEADER + "s" + "not base64 zstd")
+
+    assert cache.get(key) is None
@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import glossary as glossary_api
+from app.core.config import settings
+from app.main import app
+from app.services.cache_metrics import CacheMetrics
+from app.services.cache_service import CacheService
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DISK_PATH", str(tmp_path / "cache.sqlite3"))
+    return CacheService()
+
+
+def test_lookups_are_counted_per_namespace(cache):
+    glossary_key, summary_key = cache.get_glossary_cache_key(1), cache.get_summary_cache_key(1)
+    cache.set(glossary_key, ["term"])
+    cache.get(glossary_key)
+    cache.get(summary_key)
+    cache.get_many([glossary_key, summary_key])
+
+    metrics = cache.get_cache_metrics()
+    assert (metrics["glossary"]["hits"], metrics["glossary"]["misses"], metrics["glossary"]["hit_ratio"]) == (2, 0, 1.0)
+    assert (metrics["summary"]["hits"], metrics["summary"]["misses"], metrics["summary"]["hit_ratio"]) == (0, 2, 0.0)
+    assert metrics["glossary"]["bytes_written"] == metrics["glossary"]["bytes_read"] // 2 > 0
+    assert metrics["glossary"]["latency"]["set"]["count"] == 1
+    assert metrics["glossary"]["latency"]["get"]["count"] == 1
+    assert metrics["glossary"]["latency"]["mget"]["count"] == 1
+
+
+def test_backend_errors_are_counted(cache, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ConnectionError("redis is down")
+    monkeypatch.setattr(cache.redis_client, "get", broken)
+
+    assert cache.get(cache.get_summary_cache_key(7)) is None
+    assert cache.get_cache_metrics()["summary"]["errors"] == 1
+
+
+def test_latency_histogram_buckets():
+    metrics = CacheMetrics()
+    for seconds in (0.0005, 0.003, 0.003, 3.0):
+        metrics.observe("translation", "get", seconds)
+
+    latency = metrics.snapshot()["translation"]["latency"]["get"]
+    assert latency["count"] == 4
+    assert (latency["buckets"]["le_1ms"], latency["buckets"]["le_5ms"], latency["buckets"]["gt_2500ms"]) == (1, 2, 1)
+    assert latency["avg_ms"] == pytest.approx(751.625)
+
+
+def test_metrics_endpoint_filters_by_namespace(cache, monkeypatch):
+    monkeypatch.setattr(glossary_api, "cache_service", cache)
+    cache.get(cache.get_summary_cache_key(1))
+    cache.get(cache.get_glossary_cache_key(1))
+
+    data = TestClient(app).get("/glossary/cache-metrics", params={"namespace": "summary"}).json()["data"]
+
+    assert list(data["namespaces"]) == ["summary"]
+    assert data["namespaces"]["summary"]["misses"] == 1
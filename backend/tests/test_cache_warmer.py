@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.translation_engine import translation_engine
+from app.models.glossary import BatchJob, GlossaryTerm, TermStatus
+from app.models.project import Chapter, Project
+from app.services.cache_service import CacheService
+from app.services.cache_warmer import CacheWarmer
+
+
+@pytest.fixture
+def warmer(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DISK_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr("app.db.SessionLocal", lambda: Session(bind=db.get_bind()))
+    return CacheWarmer(CacheService())
+
+
+def add_project(db, name: str, processed_days_ago: int | None = None) -> Project:
+    project = Project(name=name)
+    db.add(project)
+    db.commit()
+    if processed_days_ago is not None:
+        db.add(Chapter(
+            project_id=project.id, title="0", original_text="Text.",
+            processed_at=datetime.utcnow() - timedelta(days=processed_days_ago)
+        ))
+        db.commit()
+    return project
+
+
+def test_active_projects_are_ordered_by_latest_activity(db, warmer):
+    old = add_project(db, "old", processed_days_ago=30)
+    recent = add_project(db, "recent", processed_days_ago=1)
+    busy = add_project(db, "busy")
+    db.add(BatchJob(project_id=busy.id, job_type="translate", created_at=datetime.utcnow()))
+    db.commit()
+
+    assert warmer.find_active_projects(db) == [busy.id, recent.id]
+    assert old.id not in warmer.find_active_projects(db)
+
+
+def test_warm_loads_glossary_summaries_and_current_translations(db, warmer):
+    project = add_project(db, "novel")
+    term = GlossaryTerm(project_id=project.id, source_term="Sword", translated_term="Меч",
+                        category="item", status=TermStatus.APPROVED)
+    db.add(term)
+    db.commit()
+    current = Chapter(project_id=project.id, title="1", original_text="The Sword.", summary="s1",
+                      translated_text="Меч.")
+    outdated = Chapter(project_id=project.id, title="2", original_text="Other.", translated_text="Другое.",
+                       alignment={"fingerprint": "written-for-an-older-glossary"})
+    db.add_all([current, outdated])
+    db.commit()
+    fingerprint = translation_engine.cache_fingerprint(current.original_text, [term], "s1")
+    current.alignment = {"fingerprint": fingerprint}
+    db.commit()
+
+    report = warmer.warm([project.id])
+
+    cache = warmer.cache
+    assert report["stopped"] is None and report["keys"] == 4
+    assert cache.get(cache.get_glossary_cache_key(project.id))["v"][0]["source_term"] == "Sword"
+    assert cache.get_cached_summary(current.id) == "s1"
+    assert cache.get_cached_translation(current.id, fingerprint) == "Меч."
+    assert cache.get_cached_translations({outdated.id: "written-for-an-older-glossary"}) == {outdated.id: None}
+
+
+def test_warm_stops_at_the_memory_budget(db, warmer):
+    project = add_project(db, "big")
+    db.add_all([Chapter(project_id=project.id, title=str(i), original_text="x", summary="s" * 100) for i in range(5)])
+    db.commit()
+
+    report = warmer.warm([project.id], max_bytes=250)
+
+    assert report["stopped"] == "memory_budget"
+    assert report["bytes"] <= 250 and report["keys"] == 4
+
+
+def test_concurrent_warm_up_is_skipped(db, warmer):
+    lease = warmer.cache.acquire_lease("cache_warm", "run")
+
+    assert warmer.warm([])["skipped"] is True
+
+    warmer.cache.release_lease("cache_warm", "run", lease)
+    assert "skipped" not in warmer.warm([])
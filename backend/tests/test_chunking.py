@@ -0,0 +1,72 @@
+from app.core.alignment import build_alignment
+from app.core.config import settings
+from app.core.text_chunker import estimate_tokens, join_chunks, normalize_text, split_into_chunks
+from app.services.translation_review import translation_review_service
+
+TEXT = "\n\n".join(f"Paragraph {i}. " + "Some words in a sentence. " * (i % 4 + 1) for i in range(30))
+
+
+def test_chunks_respect_token_budget_and_rejoin():
+    chunks = split_into_chunks(TEXT, 60)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk["text"]) <= 60 for chunk in chunks)
+    assert [chunk["index"] for chunk in chunks] == list(range(len(chunks)))
+    assert join_chunks(chunks, [chunk["text"] for chunk in chunks]) == normalize_text(TEXT)
+
+
+def test_long_paragraph_is_split_by_sentences():
+    text = "Short intro.\n" + " ".join(f"Sentence number {i} is here." for i in range(60))
+
+    chunks = split_into_chunks(text, 40)
+
+    assert all(estimate_tokens(chunk["text"]) <= 40 for chunk in chunks)
+    assert join_chunks(chunks, [chunk["text"] for chunk in chunks]) == normalize_text(text)
+
+
+def test_tail_starts_with_whole_word():
+    chunks = split_into_chunks(TEXT, 60, tail_chars=30)
+
+    assert chunks[0]["tail"] == ""
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous["text"].endswith(chunk["tail"])
+        assert len(chunk["tail"]) <= 30
+
+
+def test_review_plan_chunks_fit_budget(monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_REVIEW_CHUNK_MAX_TOKENS", 120)
+    original = "\n\n".join(f"Source paragraph {i}. " + "Text " * 20 for i in range(12))
+    translated = "\n\n".join(f"Абзац перевода {i}. " + "Текст " * 20 for i in range(12))
+
+    chunks = translation_review_service.plan_chunks(original, translated, None)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert estimate_tokens(chunk["source"]) + estimate_tokens(chunk["translation"]) <= 120
+    # Фрагменты покрывают все абзацы по порядку без пропусков
+    bounds = [chunk["paragraphs"] for chunk in chunks]
+    assert bounds[0][0] == 0 and bounds[-1][1] == 12
+    assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+
+
+def test_review_plan_splits_unaligned_chapter_proportionally(monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_REVIEW_CHUNK_MAX_TOKENS", 100)
+    original = "\n\n".join(f"Source {i}. " + "Text " * 20 for i in range(10))
+    # Число абзацев не совпадает – выравнивания нет, глава делится пропорционально
+    translated = "\n\n".join(f"Перевод {i}. " + "Текст " * 40 for i in range(5))
+
+    chunks = translation_review_service.plan_chunks(original, translated, None)
+
+    assert len(chunks) > 1
+    assert "".join(chunk["translation"] for chunk in chunks).count("Перевод") == 5
+    assert "".join(chunk["source"] for chunk in chunks).count("Source") == 10
+
+
+def test_overlong_sentence_is_cut_after_flushing_earlier_sentences():
+    text = "A short opening sentence. " + " ".join(f"word{i}" for i in range(200))
+
+    chunks = split_into_chunks(text, 40)
+
+    assert all(estimate_tokens(chunk["text"]) <= 40 for chunk in chunks)
+    assert chunks[0]["text"] == "A short opening sentence."
+    assert join_chunks(chunks, [chunk["text"] for chunk in chunks]) == normalize_text(text)
@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.cache_service import CacheService
+from app.services.circuit_breaker import CircuitBreaker
+
+
+def test_opens_after_threshold_consecutive_failures():
+    breaker = CircuitBreaker("redis", failure_threshold=3)
+
+    breaker.record_failure("timeout")
+    breaker.record_failure("timeout")
+    assert breaker.allow()
+    breaker.record_failure("timeout")
+
+    assert breaker.is_open
+    assert not breaker.allow()
+    snapshot = breaker.snapshot()
+    assert snapshot["state"] == "open"
+    assert snapshot["trips"] == 1
+    assert snapshot["short_circuited"] == 1
+    assert snapshot["last_error"] == "timeout"
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("redis", failure_threshold=3)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert not breaker.is_open
+    assert breaker.snapshot()["consecutive_failures"] == 2
+
+
+def test_close_resets_state():
+    breaker = CircuitBreaker("redis", failure_threshold=1)
+    breaker.record_failure()
+
+    breaker.close()
+
+    assert breaker.allow()
+    assert breaker.snapshot()["state"] == "closed"
+    assert breaker.snapshot()["opened_at"] is None
+
+
+def test_disabled_breaker_never_opens():
+    breaker = CircuitBreaker("redis", failure_threshold=1, enabled=False)
+
+    for _ in range(5):
+        breaker.record_failure()
+
+    assert breaker.allow()
+    assert breaker.snapshot()["trips"] == 0
+
+
+def test_probe_closes_breaker_when_dependency_recovers():
+    recovered = threading.Event()
+    calls = []
+
+    def probe():
+        calls.append(1)
+        return recovered.is_set()
+
+    breaker = CircuitBreaker("redis", failure_threshold=1, cooldown=0.01, probe=probe)
+    breaker.record_failure()
+    time.sleep(0.05)
+    assert breaker.is_open
+    assert calls
+
+    recovered.set()
+    deadline = time.time() + 2
+    while breaker.is_open and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert not breaker.is_open
+    assert breaker.allow()
+
+
+def test_probe_errors_keep_breaker_open():
+    def probe():
+        raise ConnectionError("still down")
+
+    breaker = CircuitBreaker("redis", failure_threshold=1, cooldown=0.01, probe=probe)
+    breaker.record_failure()
+    time.sleep(0.05)
+
+    assert breaker.is_open
+    assert breaker.snapshot()["last_error"] == "still down"
+    breaker.close()
+
+
+@pytest.fixture
+def redis_outage(tmp_path, monkeypatch):
+    """CacheService поверх фейкового Redis; считает обращения к нему."""
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    calls = []
+
+    class CountingRedis(fakeredis.FakeRedis):
+        def execute_command(self, *args, **kwargs):
+            calls.append(args[0])
+            return super().execute_command(*args, **kwargs)
+
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(settings, "CACHE_DISK_PATH", str(tmp_path / "fallback.sqlite3"))
+    monkeypatch.setattr(settings, "CACHE_DISK_RECONCILE_INTERVAL", 3600)
+    monkeypatch.setattr(settings, "CACHE_L1_ENABLED", False)
+    monkeypatch.setattr(settings, "CACHE_BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "CACHE_BREAKER_COOLDOWN", 0.05)
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://fake")
+    monkeypatch.setattr(settings, "UPSTASH_REDIS_REST_URL", None)
+    monkeypatch.setattr(CacheService, "_make_tcp_client", lambda self: CountingRedis(server=server))
+    service = CacheService()
+    service.server, service.calls = server, calls
+    return service
+
+
+def test_open_circuit_sends_cache_ops_to_disk_without_touching_redis(redis_outage):
+    cache = redis_outage
+    cache.server.connected = False
+    for chapter_id in range(3):
+        cache.get_cached_summary(chapter_id)
+    assert cache.breaker.is_open
+
+    cache.calls.clear()
+    assert cache.cache_summary(9, "offline")
+    assert cache.get_cached_summary(9) == "offline"
+    assert cache.calls == []
+    assert cache.get_breaker_stats()["short_circuited"] >= 2
+
+
+def test_probe_closes_the_circuit_when_redis_returns(redis_outage):
+    cache = redis_outage
+    cache.server.connected = False
+    for chapter_id in range(3):
+        cache.get_cached_summary(chapter_id)
+    assert cache.breaker.is_open
+
+    cache.server.connected = True
+
+    deadline = time.monotonic() + 2
+    while cache.breaker.is_open:
+        assert time.monotonic() < deadline, "breaker did not close"
+        time.sleep(0.01)
+    assert cache.cache_summary(10, "online")
+    assert "SETEX" in cache.calls
@@ -0,0 +1,108 @@
+import pytest
+
+from app.core.config import settings
+from app.services.cache_service import CacheService
+from app.services.disk_cache import DiskCache
+
+
+def test_approx_size_tracks_replacements_and_deletes(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=10_000)
+
+    disk.set("key", "a" * 100)
+    disk.set("key", "b" * 100)
+    disk.set("key", "c" * 10)
+    assert disk._approx_size == disk._total_size() == len("key") + 10
+
+    disk.incr("counter")
+    disk.incr("counter")
+    assert disk._approx_size == disk._total_size()
+
+    disk.delete("key", "missing")
+    assert disk.compare_and_delete("counter", "2")
+    assert disk._approx_size == disk._total_size() == 0
+
+
+def test_replacing_values_does_not_trigger_eviction(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=1000)
+
+    for i in range(5):
+        disk.set(f"key{i}", "x" * 100)
+    for _ in range(50):
+        disk.set("key0", "y" * 100)
+
+    assert disk.evictions == 0
+    assert all(disk.get(f"key{i}") is not None for i in range(5))
+
+
+def test_eviction_keeps_size_under_limit(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=1000)
+
+    for i in range(30):
+        disk.set(f"key{i}", "x" * 100)
+
+    assert disk.evictions > 0
+    assert disk._total_size() <= 1000
+    assert disk.get("key29") is not None
+
+
+@pytest.fixture
+def outage(tmp_path, monkeypatch):
+    """CacheService поверх фейкового Redis с диском; server.connected = False – отказ Redis."""
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(settings, "CACHE_DISK_PATH", str(tmp_path / "fallback.sqlite3"))
+    monkeypatch.setattr(settings, "CACHE_DISK_RECONCILE_INTERVAL", 3600)
+    monkeypatch.setattr(settings, "CACHE_L1_ENABLED", False)
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://fake")
+    monkeypatch.setattr(settings, "UPSTASH_REDIS_REST_URL", None)
+    monkeypatch.setattr(CacheService, "_make_tcp_client", lambda self: fakeredis.FakeRedis(server=server))
+    service = CacheService()
+    service.server = server
+    service.redis = fakeredis.FakeRedis(server=server)
+    return service
+
+
+def test_writes_during_an_outage_are_served_from_disk_and_replayed(outage):
+    key = outage.get_glossary_cache_key(1)
+    outage.server.connected = False
+
+    assert outage.set(key, ["term"], ttl=600)
+    assert outage.get(key) == ["term"]
+
+    outage.server.connected = True
+    assert outage._replay_journal() == 1
+    assert outage.disk.journal_size() == 0
+    assert 0 < outage.redis.ttl(key) <= 600
+    assert outage.get(key) == ["term"]
+
+
+def test_mirrored_namespaces_survive_an_outage(outage):
+    outage.cache_translation(5, "fp", "перевод")
+    outage.server.connected = False
+
+    assert outage.get_cached_translation(5, "fp") == "перевод"
+
+
+def test_replay_does_not_clobber_a_value_written_elsewhere(outage):
+    key = outage.get_glossary_cache_key(2)
+    outage.server.connected = False
+    outage.set(key, ["offline"], ttl=600)
+    outage.server.connected = True
+    outage.redis.set(key, '["fresh"]')
+
+    outage._replay_journal()
+
+    # Чье значение новее – неизвестно, неверсионированный ключ удаляется и пересоберется из БД
+    assert outage.redis.get(key) is None
+
+
+def test_replay_skips_translations_of_a_superseded_generation(outage):
+    outage.server.connected = False
+    outage.cache_translation(7, "fp", "old")
+    outage.server.connected = True
+    outage.invalidate_translation_cache(7)
+
+    outage._replay_journal()
+
+    assert not [key for key in outage.redis.scan_iter(match="lightnovel:translation:7:*")]
@@ -0,0 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.gemini_client import gemini_client
+
+
+def test_parallel_requests_do_not_lose_usage_increments():
+    key = gemini_client.api_keys[0]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: gemini_client._increment_key_usage(key), range(40)))
+
+    assert gemini_client._get_key_usage(key) == 40
+    assert gemini_client.get_usage_stats()["keys"][0]["usage_today"] == 40
@@ -0,0 +1,53 @@
+import pytest
+
+from app.core.config import settings
+from app.services.cache_service import CacheService
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DISK_PATH", str(tmp_path / "cache.sqlite3"))
+    return CacheService()
+
+
+def test_bump_generation_makes_old_entries_unreachable(cache):
+    cache.cache_translation(1, "fp", "old")
+    cache.cache_translation(2, "fp", "other")
+
+    assert cache.invalidate_translation_cache(1)
+
+    assert cache.get_cached_translation(1, "fp") is None
+    assert cache.get_cached_translation(2, "fp") == "other"
+    cache.cache_translation(1, "fp", "new")
+    assert cache.get_cached_translation(1, "fp") == "new"
+
+
+def test_invalidate_namespace_drops_every_entity(cache):
+    cache.cache_translations({1: "a", 2: "b"}, {1: "fp1", 2: "fp2"})
+
+    cache.invalidate_namespace("translation")
+
+    assert cache.get_cached_translations({1: "fp1", 2: "fp2"}) == {1: None, 2: None}
+
+
+def test_sweep_removes_only_superseded_generations(cache):
+    cache.cache_translation(1, "fp", "old")
+    cache.cache_translation(2, "fp", "kept")
+    cache.invalidate_translation_cache(1)
+    cache.cache_translation(1, "fp", "new")
+
+    result = cache.sweep_stale_generations("translation", batch_size=1)
+
+    assert result == {"namespace": "translation", "scanned": 3, "removed": 1}
+    assert cache.get_cached_translation(1, "fp") == "new"
+    assert cache.get_cached_translation(2, "fp") == "kept"
+    assert len(list(cache._scan_keys(cache._generate_key("translation", "*")))) == 2
+
+
+def test_sweep_respects_max_keys(cache):
+    for chapter_id in range(5):
+        cache.cache_translation(chapter_id, "fp", "text")
+    cache.invalidate_namespace("translation")
+
+    assert cache.sweep_stale_generations("translation", max_keys=2)["removed"] == 2
+    assert cache.sweep_stale_generations("translation")["removed"] == 3
@@ -0,0 +1,83 @@
+import pytest
+
+from app.core.config import settings
+from app.core.glossary_checker import glossary_checker
+from app.core.translation_engine import translation_engine
+from app.models.glossary import GlossaryTerm, TermStatus
+
+ORIGINAL = "The Sword Saint drew his blade.\nA dragon roared above the Sword Saint."
+TRANSLATION = "Святой Меча обнажил клинок.\nНад мастером взревел ящер."
+
+
+class ScriptedClient:
+    """LLM с заранее заданным ответом; запоминает промпты."""
+
+    api_keys = ["key0"]
+    model_name = "test-model"
+
+    def __init__(self, response: str):
+        self.response = response
+        self.prompts = []
+
+    def complete(self, prompt: str, max_tokens: int = 4000, key_index: int | None = None) -> str:
+        self.prompts.append(prompt)
+        return self.response
+
+    def rate_limit_reset_in(self) -> float:
+        return 0.0
+
+
+def terms():
+    return [
+        GlossaryTerm(id=1, project_id=45, source_term="Sword Saint", translated_term="Святой Меча",
+                     category="character", status=TermStatus.APPROVED),
+        GlossaryTerm(id=2, project_id=45, source_term="dragon", translated_term="Дракон",
+                     category="creature", status=TermStatus.APPROVED),
+    ]
+
+
+def test_inflected_translations_count_as_used():
+    assert glossary_checker.term_present("Дракон", "Он сразился с драконом.")
+    assert glossary_checker.term_present("Святой Меча", "Поклонились Святому Мечу.")
+    assert not glossary_checker.term_present("Святой Меча", "Святой поднял меч.")
+
+
+@pytest.mark.parametrize("rule, inflected, found", [
+    ("exact", "драконом", False),
+    ("prefix", "дракону", True),
+    ("prefix", "драконовед", False),
+])
+def test_matching_rule_is_configurable(monkeypatch, rule, inflected, found):
+    monkeypatch.setattr(settings, "GLOSSARY_CHECK_RULE", rule)
+
+    assert glossary_checker.term_present("Дракон", f"Он сразился с {inflected}.") is found
+
+
+def test_report_lists_missing_terms_per_paragraph():
+    report = glossary_checker.check(ORIGINAL, TRANSLATION, None, terms())
+
+    assert (report["units"], report["checked"], report["compliance"]) == (2, 3, pytest.approx(0.333))
+    [violation] = report["violations"]
+    assert violation["unit"] == 1 and violation["translation"] == "Над мастером взревел ящер."
+    assert [term["source_term"] for term in violation["missing"]] == ["dragon", "Sword Saint"]
+
+
+def test_only_violating_paragraphs_are_re_requested(monkeypatch):
+    client = ScriptedClient("Над Святым Мечом взревел дракон.")
+    monkeypatch.setattr(translation_engine, "client", client)
+
+    result = translation_engine.fix_glossary_violations(ORIGINAL, TRANSLATION, None, terms())
+
+    assert (result["requests"], result["fixed"], result["after"]["compliance"]) == (1, 1, 1.0)
+    assert result["translated_text"] == "Святой Меча обнажил клинок.\nНад Святым Мечом взревел дракон."
+    assert "The Sword Saint drew his blade." not in client.prompts[0]
+    assert "A dragon roared above the Sword Saint." in client.prompts[0]
+
+
+def test_a_response_that_does_not_help_is_discarded(monkeypatch):
+    monkeypatch.setattr(translation_engine, "client", ScriptedClient("Над мастером взревел зверь."))
+
+    result = translation_engine.fix_glossary_violations(ORIGINAL, TRANSLATION, None, terms())
+
+    assert result["fixed"] == 0
+    assert result["translated_text"] == TRANSLATION
@@ -0,0 +1,108 @@
+import json
+import threading
+import uuid
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.idempotency import IdempotencyMiddleware
+from app.services.cache_service import CacheService, LeaseHeldError
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware)
+    app.state.calls = []
+
+    @app.post("/jobs")
+    def create_job(payload: dict):
+        app.state.calls.append(payload)
+        if payload.get("fail"):
+            raise HTTPException(status_code=503, detail="busy")
+        return {"job": len(app.state.calls)}
+
+    test_client = TestClient(app)
+    test_client.calls = app.state.calls
+    return test_client
+
+
+def test_retry_with_the_same_key_replays_the_stored_response(client):
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    first = client.post("/jobs", json={"chapter": 1}, headers=headers)
+    retry = client.post("/jobs", json={"chapter": 1}, headers=headers)
+
+    assert first.json() == retry.json() == {"job": 1}
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(client.calls) == 1
+
+
+def test_same_key_with_another_request_is_rejected(client):
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    client.post("/jobs", json={"chapter": 1}, headers=headers)
+
+    response = client.post("/jobs", json={"chapter": 2}, headers=headers)
+
+    assert response.status_code == 422
+    assert len(client.calls) == 1
+
+
+def test_failed_response_is_not_stored_and_can_be_retried(client):
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    assert client.post("/jobs", json={"fail": True}, headers=headers).status_code == 503
+    assert client.post("/jobs", json={"fail": True}, headers=headers).status_code == 503
+    assert len(client.calls) == 2
+
+
+def test_requests_without_a_key_are_not_deduplicated(client):
+    client.post("/jobs", json={"chapter": 1})
+    client.post("/jobs", json={"chapter": 1})
+
+    assert len(client.calls) == 2
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DISK_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(settings, "CACHE_LEASE_POLL_INTERVAL", 0.01)
+    return CacheService()
+
+
+def test_second_request_gets_lease_details_while_the_owner_runs_once(cache):
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        started.set()
+        release.wait(2)
+        return {"translated_text": "done"}
+
+    owner_result = []
+    owner = threading.Thread(target=lambda: owner_result.append(cache.run_exclusive("translate", 1, work)))
+    owner.start()
+    started.wait(2)
+
+    with pytest.raises(LeaseHeldError) as error:
+        cache.run_exclusive("translate", 1, work)
+    assert error.value.detail()["status"] == "in_progress"
+    assert error.value.detail()["started_at"] is not None
+
+    release.set()
+    owner.join(2)
+    assert owner_result == [{"translated_text": "done"}]
+    assert len(runs) == 1
+
+
+def test_lease_is_released_only_by_its_owner(cache):
+    lease = cache.acquire_lease("analyze", 4)
+
+    assert cache.acquire_lease("analyze", 4) is None
+    assert not cache.release_lease("analyze", 4, json.dumps(dict(json.loads(lease), token="other")))
+    assert cache.get_lease("analyze", 4) is not None
+    assert cache.release_lease("analyze", 4, lease)
+    assert cache.acquire_lease("analyze", 4) is not None
@@ -0,0 +1,97 @@
+import pytest
+
+from app.core.translation_engine import translation_engine
+
+SOURCE = ["First line.", "Second line.", "Third line.", "Fourth line.", "Fifth line."]
+TARGET = ["Первая строка.", "Вторая строка.", "Третья строка.", "Четвертая строка.", "Пятая строка."]
+
+
+class ScriptedClient:
+    """LLM, который отвечает по очереди заданными ответами; запоминает промпты."""
+
+    api_keys = ["key0"]
+    model_name = "test-model"
+
+    def __init__(self):
+        self.responses = []
+        self.prompts = []
+
+    def complete(self, prompt: str, max_tokens: int = 4000, key_index: int | None = None) -> str:
+        self.prompts.append(prompt)
+        return self.responses.pop(0)
+
+    def rate_limit_reset_in(self) -> float:
+        return 0.0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = ScriptedClient()
+    monkeypatch.setattr(translation_engine, "client", client)
+    return client
+
+
+@pytest.fixture
+def translated(client):
+    client.responses.append("\n".join(TARGET))
+    result = translation_engine.translate_chapter("\n".join(SOURCE), [])
+    client.prompts.clear()
+    return result
+
+
+def text_to_translate(prompt: str) -> str:
+    return prompt.split("ТЕКСТ ДЛЯ ПЕРЕВОДА:\n", 1)[1].split("\n\nИНСТРУКЦИИ:", 1)[0]
+
+
+def retranslate(source, previous):
+    return translation_engine.translate_chapter(
+        "\n".join(source), [],
+        previous_translation=previous["translated_text"], previous_alignment=previous["alignment"]
+    )
+
+
+def test_only_the_edited_paragraph_is_sent_and_spliced_back(client, translated):
+    edited = SOURCE[:2] + ["Third line, fixed."] + SOURCE[3:]
+    client.responses.append("Третья строка, исправленная.")
+
+    result = retranslate(edited, translated)
+
+    assert result["incremental"] == {"retranslated": 1, "reused": 4}
+    assert result["translated_text"].split("\n") == TARGET[:2] + ["Третья строка, исправленная."] + TARGET[3:]
+    assert text_to_translate(client.prompts[0]) == "Third line, fixed."
+    # Предыдущие абзацы оригинала идут в промпт как контекст
+    assert "ПРЕДЫДУЩИЙ ФРАГМЕНТ" in client.prompts[0] and "Second line." in client.prompts[0]
+
+
+def test_alignment_survives_successive_edits(client, translated):
+    client.responses.append("Третья строка, исправленная.")
+    first_edit = SOURCE[:2] + ["Third line, fixed."] + SOURCE[3:]
+    after_first = retranslate(first_edit, translated)
+
+    client.responses.append("Новая строка.")
+    second_edit = first_edit + ["A new line."]
+    after_second = retranslate(second_edit, after_first)
+
+    assert after_second["incremental"] == {"retranslated": 1, "reused": 5}
+    assert after_second["translated_text"].split("\n") == (
+        TARGET[:2] + ["Третья строка, исправленная."] + TARGET[3:] + ["Новая строка."]
+    )
+    assert text_to_translate(client.prompts[-1]) == "A new line."
+
+
+def test_unchanged_chapter_makes_no_llm_call(client, translated):
+    result = retranslate(SOURCE, translated)
+
+    assert result["translated_text"] == translated["translated_text"]
+    assert result["incremental"] == {"retranslated": 0, "reused": 5}
+    assert client.prompts == []
+
+
+def test_large_rewrite_falls_back_to_a_full_translation(client, translated):
+    rewritten = ["Brand new."] * 3 + SOURCE[3:]
+    client.responses.append("\n".join(["Совсем новое."] * 3 + TARGET[3:]))
+
+    result = retranslate(rewritten, translated)
+
+    assert result["incremental"] is None
+    assert text_to_translate(client.prompts[0]) == "\n".join(rewritten)
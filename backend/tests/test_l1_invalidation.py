@@ -0,0 +1,116 @@
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import cache_service as cache_module
+from app.services.cache_service import CacheService
+from app.services.local_cache import LocalLRUCache
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def make_service(monkeypatch):
+    """Воркеры с общим (фейковым) Redis и живым каналом инвалидации L1."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(settings, "CACHE_DISK_ENABLED", False)
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://fake")
+    monkeypatch.setattr(settings, "UPSTASH_REDIS_REST_URL", None)
+    monkeypatch.setattr(CacheService, "_make_tcp_client", lambda self: fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(cache_module.redis, "from_url", lambda *args, **kwargs: fakeredis.FakeRedis(server=server))
+
+    def make() -> CacheService:
+        service = CacheService()
+        wait_until(lambda: service._invalidation_live)
+        return service
+    return make
+
+
+def wait_until(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_write_in_one_worker_invalidates_l1_of_another(make_service):
+    a, b = make_service(), make_service()
+    key = a.get_glossary_cache_key(1)
+    a.set(key, ["old"])
+    assert b.get(key) == ["old"]
+    assert key in b.l1._entries
+
+    a.set(key, ["new"])
+
+    wait_until(lambda: key not in b.l1._entries)
+    assert b.get(key) == ["new"]
+
+
+def test_bumped_generation_reaches_other_workers(make_service):
+    a, b = make_service(), make_service()
+    a.invalidate_translation_cache(7)
+    a.cache_translation(7, "fp", "old")
+    assert b.get_cached_translation(7, "fp") == "old"
+
+    a.invalidate_translation_cache(7)
+    a.cache_translation(7, "fp", "new")
+
+    wait_until(lambda: b.get_generation("translation", 7) == 2)
+    assert b.get_cached_translation(7, "fp") == "new"
+
+
+def test_missing_generation_is_not_cached_as_zero(make_service):
+    a, b = make_service(), make_service()
+    assert b.get_generation("translation", 3) == 0
+    assert b._generation_key("translation", 3) not in b.l1._entries
+
+    # Сообщение об инвалидации b не получит, но закэшированного 0 у него нет
+    a.redis_client.incr(a._generation_key("translation", 3))
+    assert b.get_generation("translation", 3) == 1
+
+
+def test_increment_publishes_after_the_write(make_service, monkeypatch):
+    a = make_service()
+    key = a._generation_key("translation", 5)
+    seen = []
+    publish = a._publish_invalidation
+
+    def spy(keys=None, patterns=None):
+        seen.append(a.redis_client.get(key))
+        publish(keys=keys, patterns=patterns)
+    monkeypatch.setattr(a, "_publish_invalidation", spy)
+
+    a.bump_generation("translation", 5)
+
+    assert seen == [b"1"]
+    assert a.l1.get(key) == 1
+
+
+def test_l1_skips_values_read_before_an_invalidation():
+    l1 = LocalLRUCache(1024)
+    epoch = l1.epoch
+    l1.set("k", "cached", ttl=60, size=6)
+    # Инвалидация пришла, пока значение читалось из Redis
+    l1.delete("other")
+
+    assert not l1.set("k", "stale", ttl=60, size=5, epoch=epoch)
+    assert "k" not in l1._entries
+    assert l1.set("k", "fresh", ttl=60, size=5, epoch=l1.epoch)
+
+
+def test_rest_only_deployment_disables_l1_with_a_warning(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(settings, "CACHE_DISK_ENABLED", False)
+    monkeypatch.setattr(settings, "REDIS_URL", "")
+    monkeypatch.setattr(settings, "UPSTASH_REDIS_REST_URL", "https://example.invalid")
+    monkeypatch.setattr(settings, "UPSTASH_REDIS_REST_TOKEN", "token")
+
+    with caplog.at_level("WARNING", logger="cache_service"):
+        service = CacheService()
+
+    assert service.redis_client is None
+    assert service.transport.transports == ["rest"]
+    assert service.get_tier_stats()["l1"] == {"enabled": False}
+    assert "needs a TCP connection" in caplog.text
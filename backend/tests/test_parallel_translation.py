@@ -0,0 +1,117 @@
+import threading
+
+import pytest
+
+from app.core import translation_engine as engine_module
+from app.core.config import settings
+from app.core.translation_engine import translation_engine
+from app.services import gemini_client as gemini_module
+from app.services.gemini_client import GeminiClient, RateLimitExceeded
+
+
+class FakeClient:
+    """Клиент LLM с минутным лимитом: per_window запросов, дальше 429 до reset()."""
+
+    def __init__(self, keys: int = 3, per_window: int = 10):
+        self.api_keys = [f"key{i}" for i in range(keys)]
+        self.per_window = per_window
+        self.used = 0
+        self.keys_used = []
+        self._lock = threading.Lock()
+
+    def complete(self, prompt: str, max_tokens: int = 4000, key_index: int | None = None) -> str:
+        with self._lock:
+            if self.used >= self.per_window:
+                raise RateLimitExceeded(1.0)
+            self.used += 1
+            self.keys_used.append(key_index)
+        return f"translated {prompt}"
+
+    def rate_limit_reset_in(self) -> float:
+        return 0.0
+
+    def reset(self) -> None:
+        self.used = 0
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeClient()
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        client.reset()
+    monkeypatch.setattr(translation_engine, "client", client)
+    monkeypatch.setattr(engine_module.time, "sleep", sleep)
+    client.sleeps = sleeps
+    return client
+
+
+def test_more_requests_than_the_minute_limit_wait_for_the_next_window(fake_client):
+    responses = translation_engine._complete_all([str(i) for i in range(25)])
+
+    assert responses == [f"translated {i}" for i in range(25)]
+    # 25 запросов при лимите 10/мин: два ожидания окна, попытки на 429 не тратятся
+    assert len(fake_client.sleeps) == 2
+
+
+def test_requests_start_from_different_keys(fake_client):
+    translation_engine._complete_all([str(i) for i in range(6)])
+
+    assert sorted(fake_client.keys_used) == [0, 0, 1, 1, 2, 2]
+
+
+def test_window_without_progress_uses_up_retries(fake_client, monkeypatch):
+    monkeypatch.setattr(fake_client, "reset", lambda: None)
+    fake_client.used = fake_client.per_window
+
+    results, errors = translation_engine._run_parallel(
+        3, lambda i, key_index: fake_client.complete(str(i), key_index=key_index), retries=2
+    )
+
+    assert results == [None, None, None]
+    assert set(errors) == {0, 1, 2}
+    assert len(fake_client.sleeps) == 2
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_API_KEYS_RAW", "k0,k1,k2")
+    client = GeminiClient()
+    calls = []
+    monkeypatch.setattr(client, "_generate", lambda key, prompt: calls.append(key) or f"{key}:{prompt}")
+    monkeypatch.setattr(client, "_check_rate_limit", lambda: None)
+    client.calls = calls
+    yield client
+    gemini_module.cache_service.delete_many([client._get_key_cooldown_key(key) for key in client.api_keys])
+
+
+def test_explicit_key_does_not_move_the_current_key(gemini):
+    assert gemini.complete("a", key_index=2) == "k2:a"
+    assert gemini.current_key_index == 0
+    assert gemini.complete("b") == "k0:b"
+
+
+def test_failed_key_goes_to_cooldown_and_next_key_is_used(gemini, monkeypatch):
+    def generate(key, prompt):
+        if key == "k1":
+            raise RuntimeError("quota")
+        return key
+    monkeypatch.setattr(gemini, "_generate", generate)
+
+    assert gemini.complete("x", key_index=1) == "k2"
+    assert gemini._is_key_in_cooldown("k1")
+    assert gemini.complete("y", key_index=1) == "k2"
+
+
+def test_minute_limit_raises_rate_limit_with_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_API_KEYS_RAW", "k0")
+    client = GeminiClient()
+    client.per_minute_limit = 0
+    monkeypatch.setattr(gemini_module.cache_service, "increment_counter", lambda key, ttl=60: 1)
+
+    with pytest.raises(RateLimitExceeded) as error:
+        client.complete("x")
+    assert error.value.status_code == 429
+    assert 1 <= int(error.value.headers["Retry-After"]) <= 60
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.api import translation as translation_api
+from app.core.alignment import align_group, build_alignment, paragraph_spans, paragraphs
+from app.core.translation_engine import translation_engine
+
+ORIGINAL = "Первый.\nВторой.\nТретий."
+
+
+@pytest.fixture
+def preview(monkeypatch):
+    """_preview_range с фиктивным саммари проекта и LLM, которая помечает отрывок."""
+    summary = {"value": "project v1"}
+    excerpts = []
+    monkeypatch.setattr(translation_api.project_summary_service, "get", lambda db, project_id: summary["value"])
+
+    def translate_excerpt(excerpt, *args, **kwargs):
+        excerpts.append(excerpt)
+        return f"llm[{excerpt}]"
+    monkeypatch.setattr(translation_engine, "translate_excerpt", translate_excerpt)
+
+    def run(chapter, first, last):
+        return translation_api._preview_range(chapter, [], first, last, db=None)
+    run.summary = summary
+    run.excerpts = excerpts
+    return run
+
+
+def make_chapter(chapter_id, translated_text=None, fingerprint=None):
+    alignment = None
+    if translated_text is not None:
+        alignment = build_alignment(align_group(paragraphs(ORIGINAL), paragraphs(translated_text)))
+        alignment["fingerprint"] = fingerprint
+    return SimpleNamespace(
+        id=chapter_id, project_id=1, original_text=ORIGINAL, summary="chapter",
+        translated_text=translated_text, alignment=alignment
+    )
+
+
+def full_fingerprint(project_summary):
+    return translation_engine.cache_fingerprint(ORIGINAL, [], "chapter", project_summary=project_summary)
+
+
+def test_stored_translation_is_sliced_for_the_current_fingerprint(preview):
+    chapter = make_chapter(101, "First.\nSecond.\nThird.", full_fingerprint("project v1"))
+
+    result = preview(chapter, 1, 2)
+
+    assert (result["source"], result["translated_text"]) == ("stored", "Second.")
+    assert preview.excerpts == []
+
+
+def test_stored_translation_is_ignored_after_the_project_summary_changes(preview):
+    chapter = make_chapter(102, "First.\nSecond.\nThird.", full_fingerprint("project v1"))
+    preview.summary["value"] = "project v2"
+
+    result = preview(chapter, 1, 2)
+
+    assert result["source"] == "llm"
+    assert preview.excerpts == ["Второй."]
+
+
+def test_cached_full_translation_is_sliced_when_paragraphs_match(preview):
+    chapter = make_chapter(103)
+    translation_api.cache_service.cache_translation(103, full_fingerprint("project v1"), "First.\nSecond.\nThird.")
+
+    result = preview(chapter, 2, 3)
+
+    assert (result["first"], result["last"], result["translated_text"]) == (2, 3, "Third.")
+    assert result["source"] == "cache"
+
+
+def test_cached_full_translation_with_other_paragraph_count_is_not_returned_whole(preview):
+    chapter = make_chapter(104)
+    translation_api.cache_service.cache_translation(104, full_fingerprint("project v1"), "First and second.\nThird.")
+
+    result = preview(chapter, 1, 2)
+
+    assert (result["first"], result["last"], result["source"]) == (1, 2, "llm")
+    assert preview.excerpts == ["Второй."]
+
+
+def test_paragraph_spans_match_paragraphs_on_unicode_line_separators():
+    text = "Один\x0cвсё ещё один и тут\r\nДва\x85два\rТри"
+
+    spans = paragraph_spans(text)
+
+    assert len(spans) == len(paragraphs(text)) == 3
+    assert [text[start:end] for start, end in spans] == ["Один\x0cвсё ещё один и тут", "Два\x85два", "Три"]
@@ -0,0 +1,97 @@
+import pytest
+
+from app.core.config import settings
+from app.core.nlp_pipeline.context_summarizer import context_summarizer
+from app.models.project import Chapter, Project
+from app.services.cache_service import cache_service
+from app.services.project_summary import project_summary_service
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    calls = []
+
+    def create_project_summary(chapters):
+        calls.append(chapters)
+        return f"summary #{len(calls)}"
+    monkeypatch.setattr(context_summarizer, "create_project_summary", create_project_summary)
+    return calls
+
+
+@pytest.fixture
+def project(db):
+    project = Project(name="Novel")
+    db.add(project)
+    db.commit()
+    db.add_all([
+        Chapter(project_id=project.id, title=str(i), original_text="Text.", summary=f"s{i}")
+        for i in range(1, 4)
+    ])
+    db.commit()
+    return project
+
+
+def chapter(db, project, title: str) -> Chapter:
+    return db.query(Chapter).filter_by(project_id=project.id, title=title).one()
+
+
+def test_summary_is_built_once_and_then_served_from_the_project(db, project, summarizer):
+    assert project_summary_service.current(db, project.id) is None
+
+    assert project_summary_service.get(db, project.id) == "summary #1"
+    assert project_summary_service.get(db, project.id) == "summary #1"
+    assert project_summary_service.current(db, project.id) == "summary #1"
+
+    assert len(summarizer) == 1
+    assert [c["summary"] for c in summarizer[0]] == ["s1", "s2", "s3"]
+    db.refresh(project)
+    assert project.summary == "summary #1" and project.summary_inputs_hash
+
+
+def test_changed_chapter_summary_triggers_a_rebuild(db, project, summarizer):
+    project_summary_service.get(db, project.id)
+    chapter(db, project, "2").summary = "s2, edited"
+    db.commit()
+
+    assert project_summary_service.current(db, project.id) is None
+    assert project_summary_service.get(db, project.id) == "summary #2"
+
+
+def test_chapters_outside_the_summary_window_do_not_trigger_a_rebuild(db, project, summarizer, monkeypatch):
+    monkeypatch.setattr(settings, "PROJECT_SUMMARY_MAX_CHAPTERS", 2)
+    project_summary_service.get(db, project.id)
+    chapter(db, project, "3").summary = "s3, edited"
+    db.commit()
+
+    assert project_summary_service.get(db, project.id) == "summary #1"
+    assert len(summarizer) == 1
+
+
+def test_too_few_summarized_chapters_make_no_summary(db, summarizer):
+    project = Project(name="Short")
+    db.add(project)
+    db.commit()
+    db.add(Chapter(project_id=project.id, title="1", original_text="Text.", summary="s1"))
+    db.commit()
+
+    assert project_summary_service.get(db, project.id) is None
+    assert summarizer == []
+
+
+def test_failed_or_concurrent_rebuild_keeps_the_stored_summary(db, project, summarizer, monkeypatch):
+    project_summary_service.get(db, project.id)
+    chapter(db, project, "1").summary = "s1, edited"
+    db.commit()
+
+    monkeypatch.setattr(context_summarizer, "create_project_summary", lambda chapters: "")
+    assert project_summary_service.get(db, project.id) == "summary #1"
+    assert project_summary_service.current(db, project.id) is None
+
+    def must_not_run(chapters):
+        raise AssertionError("another request is rebuilding the summary")
+    monkeypatch.setattr(context_summarizer, "create_project_summary", must_not_run)
+    lease = cache_service.acquire_lease("project_summary", project.id)
+    try:
+        assert project_summary_service.get(db, project.id) == "summary #1"
+    finally:
+        cache_service.release_lease("project_summary", project.id, lease)
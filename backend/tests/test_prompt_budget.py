@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.core.prompt_budget import PromptBudget, prompt_tokens, rank_terms, summarize_reports, truncate
+from app.core.translation_engine import translation_engine
+from app.models.glossary import GlossaryTerm, TermStatus
+
+
+def term(source, frequency=0, category="other"):
+    return SimpleNamespace(source_term=source, frequency=frequency, category=category)
+
+
+def test_rank_terms_by_frequency_then_category():
+    terms = [term("b", 1, "other"), term("a", 1, "character"), term("c", 5, "skill")]
+
+    assert [t.source_term for t in rank_terms(terms)] == ["c", "a", "b"]
+
+
+def test_truncate_keeps_start_on_sentence_boundary():
+    text = "First sentence here. Second sentence is longer. Third one ends it."
+
+    cut = truncate(text, 8)
+
+    assert cut.endswith("…")
+    assert text.startswith(cut[:-1])
+    assert prompt_tokens(cut) <= 8
+
+
+def test_truncate_keeps_end():
+    text = "Opening line.\nMiddle line goes on.\nClosing line."
+
+    cut = truncate(text, 6, keep="end")
+
+    assert cut.startswith("…")
+    assert text.endswith(cut[1:])
+
+
+def test_unlimited_budget_keeps_everything():
+    budget = PromptBudget(0, 100)
+
+    assert budget.fit_text("summary", "x" * 10000) == "x" * 10000
+    assert budget.fit_items("terms", [1, 2, 3], lambda item, kept: 1000) == [1, 2, 3]
+    assert budget.trimmed == []
+
+
+def test_items_stop_at_first_that_does_not_fit():
+    budget = PromptBudget(100, 60)
+
+    kept = budget.fit_items("glossary", ["a", "b", "c", "d"], lambda item, kept: {"a": 10, "b": 35, "c": 2, "d": 2}[item],
+                            label=str)
+
+    # "c" поместился бы, но менее важный элемент не обходит более важный
+    assert kept == ["a"]
+    assert budget.trimmed == [{"section": "glossary", "action": "dropped_items", "kept": 1, "dropped": 3,
+                               "items": ["b", "c", "d"]}]
+    assert budget.sections == {"required": 60, "glossary": 10}
+
+
+def test_sections_are_trimmed_in_priority_order():
+    budget = PromptBudget(100, 50, min_section_tokens=10)
+    summary = "Summary sentence number one. " * 10  # ~73 токена
+
+    first = budget.fit_text("chapter_summary", "short context", overhead=2)
+    second = budget.fit_text("project_summary", summary, overhead=2)
+    third = budget.fit_text("previous_text", "more text " * 20, overhead=2)
+
+    assert first == "short context"
+    assert second.endswith("…") and prompt_tokens(second) < prompt_tokens(summary)
+    assert third == ""
+    actions = [(d["section"], d["action"]) for d in budget.trimmed]
+    assert actions == [("project_summary", "truncated"), ("previous_text", "dropped")]
+    assert budget.used <= 100
+
+
+def test_section_below_minimum_is_dropped():
+    budget = PromptBudget(100, 95, min_section_tokens=10)
+
+    assert budget.fit_text("summary", "word " * 40) == ""
+    assert budget.trimmed[0]["action"] == "dropped"
+
+
+def test_report_and_summary():
+    budget = PromptBudget(50, 40)
+    budget.fit_text("summary", "word " * 40)
+    prompt = "p" * 400
+
+    report = budget.report(prompt)
+
+    assert report["budget"] == 50
+    assert report["over_budget"] is True
+    summary = summarize_reports([report, PromptBudget(50, 10).report("p" * 40)])
+    assert summary["prompts"] == 2
+    assert summary["over_budget"] == 1
+    assert summary["trimmed_prompts"] == 1
+    assert summary["trimmed"][0]["prompt"] == 0
+    assert summarize_reports([]) is None
+
+
+TEXT = "Ren followed the Sword Saint into the hall."
+CHAPTER_SUMMARY = "Ren arrives at the sect."
+PROJECT_SUMMARY = "A long saga about sword cultivators and their sects. " * 20
+
+
+def glossary():
+    return [
+        GlossaryTerm(project_id=50, source_term="Ren", translated_term="Рен", category="character",
+                     frequency=2, status=TermStatus.APPROVED),
+        GlossaryTerm(project_id=50, source_term="Sword Saint", translated_term="Святой Меча", category="character",
+                     frequency=9, status=TermStatus.APPROVED),
+    ]
+
+
+def build(terms, budget, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_PROMPT_MAX_TOKENS", budget)
+    return translation_engine._build_translation_prompt(TEXT, terms, CHAPTER_SUMMARY, PROJECT_SUMMARY)
+
+
+def test_project_summary_is_trimmed_before_the_chapter_summary_and_terms(monkeypatch):
+    _, full = build(glossary(), 0, monkeypatch)
+    needed = full["sections"]["required"] + full["sections"]["glossary"] + full["sections"]["chapter_summary"]
+
+    prompt, report = build(glossary(), needed + 10, monkeypatch)
+
+    assert "Святой Меча" in prompt and "Рен" in prompt and CHAPTER_SUMMARY in prompt
+    assert "ОБЩИЙ КОНТЕКСТ ПРОИЗВЕДЕНИЯ" not in prompt
+    assert report["trimmed"] == [{"section": "project_summary", "action": "dropped",
+                                  "tokens_before": prompt_tokens(PROJECT_SUMMARY)}]
+    assert report["tokens"] <= report["budget"]
+
+
+def test_less_frequent_terms_are_dropped_first(monkeypatch):
+    _, top_only = build(glossary()[1:], 0, monkeypatch)
+
+    prompt, report = build(glossary(), top_only["sections"]["required"] + top_only["sections"]["glossary"], monkeypatch)
+
+    assert "Святой Меча" in prompt and "Рен" not in prompt
+    assert report["trimmed"][0] == {"section": "glossary", "action": "dropped_items", "kept": 1, "dropped": 1,
+                                    "items": ["Ren"]}
+    assert [d["section"] for d in report["trimmed"][1:]] == ["chapter_summary", "project_summary"]
+
+
+class EchoClient:
+    api_keys = ["key0"]
+    model_name = "test-model"
+
+    def complete(self, prompt: str, max_tokens: int = 4000, key_index: int | None = None) -> str:
+        return "Рен последовал за Святым Мечом в зал."
+
+    def rate_limit_reset_in(self) -> float:
+        return 0.0
+
+
+@pytest.mark.parametrize("budget, trimmed", [(0, 0), (400, 1)])
+def test_translation_result_reports_the_prompt_budget(monkeypatch, budget, trimmed):
+    monkeypatch.setattr(translation_engine, "client", EchoClient())
+    monkeypatch.setattr(settings, "TRANSLATION_PROMPT_MAX_TOKENS", budget)
+
+    result = translation_engine.translate_chapter(TEXT, glossary(), CHAPTER_SUMMARY, PROJECT_SUMMARY)
+
+    assert result["prompt"]["prompts"] == 1
+    assert result["prompt"]["budget"] == budget
+    assert result["prompt"]["trimmed_prompts"] == trimmed
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.cache_service import CacheService
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DISK_PATH", str(tmp_path / "cache.sqlite3"))
+    return CacheService()
+
+
+def wait_until(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def expire_softly(cache, key: str) -> None:
+    """Сдвигает мягкое истечение записи в прошлое, не трогая TTL в Redis."""
+    envelope = cache.get(key)
+    envelope["soft"] = time.time() - 1
+    cache.set(key, envelope, 600)
+
+
+def test_miss_loads_synchronously_and_fresh_value_is_not_reloaded(cache):
+    loads = []
+    key = cache.get_glossary_cache_key(1)
+
+    assert cache.get_or_refresh(key, lambda: loads.append(1) or ["v1"], ttl=60) == ["v1"]
+    assert cache.get_or_refresh(key, lambda: loads.append(1) or ["v2"], ttl=60) == ["v1"]
+
+    assert len(loads) == 1
+    assert cache.get_swr_stats() == {"misses": 1, "fresh": 1}
+
+
+def test_stale_value_is_served_while_one_refresh_runs_in_background(cache):
+    key = cache.get_glossary_cache_key(2)
+    cache.get_or_refresh(key, lambda: ["old"], ttl=60)
+    expire_softly(cache, key)
+    release = threading.Event()
+    loads = []
+
+    def slow_loader():
+        loads.append(1)
+        release.wait(2)
+        return ["new"]
+
+    # Читатели не ждут пересчета, а пересчет запускается один раз
+    assert [cache.get_or_refresh(key, slow_loader, ttl=60) for _ in range(3)] == [["old"]] * 3
+    release.set()
+
+    wait_until(lambda: cache.get_swr_stats().get("refreshes") == 1)
+    assert cache.get_or_refresh(key, slow_loader, ttl=60) == ["new"]
+    assert len(loads) == 1
+    assert cache.get_swr_stats()["stale_served"] == 3
+
+
+def test_refresh_is_skipped_while_another_worker_holds_the_lock(cache):
+    key = cache.get_glossary_cache_key(3)
+    cache.get_or_refresh(key, lambda: ["old"], ttl=60)
+    expire_softly(cache, key)
+    assert cache.set_nx(f"{key}:refresh_lock", "other-worker", 60)
+
+    assert cache.get_or_refresh(key, lambda: ["new"], ttl=60) == ["old"]
+
+    wait_until(lambda: cache.get_swr_stats().get("refresh_skipped_locked") == 1)
+    assert cache.get(key)["v"] == ["old"]
+
+
+def test_failed_refresh_keeps_serving_the_stale_value(cache):
+    key = cache.get_glossary_cache_key(4)
+    cache.get_or_refresh(key, lambda: ["old"], ttl=60)
+    expire_softly(cache, key)
+
+    def broken():
+        raise RuntimeError("db is down")
+
+    assert cache.get_or_refresh(key, broken, ttl=60) == ["old"]
+    wait_until(lambda: cache.get_swr_stats().get("refresh_failures") == 1)
+    assert cache.get_or_refresh(key, broken, ttl=60) == ["old"]
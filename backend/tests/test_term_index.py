@@ -0,0 +1,108 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import glossary as glossary_api
+from app.deps import get_db
+from app.main import app
+from app.models.glossary import GlossaryTerm, TermOccurrence, TermStatus
+from app.models.project import Chapter, Project
+from app.services.term_index import term_index
+
+
+@pytest.fixture
+def project(db):
+    project = Project(name="Novel")
+    db.add(project)
+    db.commit()
+    return project
+
+
+def add_chapter(db, project, order: int, text: str) -> Chapter:
+    chapter = Chapter(project_id=project.id, title=f"Chapter {order}", order=order, original_text=text)
+    db.add(chapter)
+    db.commit()
+    term_index.index_chapter(db, chapter)
+    db.commit()
+    return chapter
+
+
+def add_term(db, project, source: str, translated: str) -> GlossaryTerm:
+    term = GlossaryTerm(project_id=project.id, source_term=source, translated_term=translated,
+                        category="other", status=TermStatus.APPROVED)
+    db.add(term)
+    db.commit()
+    term_index.index_terms(db, project.id, [term])
+    db.commit()
+    return term
+
+
+def test_new_term_is_indexed_with_counts_and_offsets(db, project):
+    first = add_chapter(db, project, 1, "Ren met the Sword Saint. The sword saint smiled.")
+    add_chapter(db, project, 2, "Nothing happens here.")
+
+    term = add_term(db, project, "Sword Saint", "Святой Меча")
+
+    [occurrence] = db.query(TermOccurrence).filter_by(term_id=term.id).all()
+    assert (occurrence.chapter_id, occurrence.count) == (first.id, 2)
+    assert occurrence.offsets == [[12, 23], [29, 40]]
+
+
+def test_chapter_edit_updates_its_occurrences(db, project):
+    term = add_term(db, project, "Ren", "Рен")
+    chapter = add_chapter(db, project, 1, "Ren waited.")
+
+    chapter.original_text = "Ren and Ren waited."
+    assert term_index.index_chapter(db, chapter) == {term.id}
+    db.commit()
+    assert db.query(TermOccurrence).filter_by(term_id=term.id).one().count == 2
+
+    chapter.original_text = "Nobody waited."
+    assert term_index.index_chapter(db, chapter) == {term.id}
+    db.commit()
+    assert term_index.chapters_for_terms(db, [term.id]) == set()
+
+
+def test_concordance_lists_chapters_in_order_with_context(db, project):
+    later = add_chapter(db, project, 2, "Then Ren left.")
+    earlier = add_chapter(db, project, 1, "Ren arrived. Ren sat.")
+    term = add_term(db, project, "Ren", "Рен")
+
+    result = term_index.concordance(db, term, context_chars=5)
+
+    assert (result["total_chapters"], result["total_occurrences"]) == (2, 3)
+    assert [chapter["chapter_id"] for chapter in result["chapters"]] == [earlier.id, later.id]
+    assert result["chapters"][1]["occurrences"] == [{"start": 5, "end": 8, "left": "Then ", "match": "Ren", "right": " left"}]
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(glossary_api.cache_service, "invalidate_translation_caches",
+                        lambda chapter_ids: invalidated.append(set(chapter_ids)))
+    monkeypatch.setattr(glossary_api.cache_service, "invalidate_glossary_cache", lambda project_id: None)
+    app.dependency_overrides[get_db] = lambda: db
+    client = TestClient(app)
+    client.invalidated = invalidated
+    yield client
+    app.dependency_overrides.pop(get_db, None)
+
+
+def test_term_edit_invalidates_only_chapters_that_contain_it(db, project, client):
+    with_term = add_chapter(db, project, 1, "The Sword Saint bowed.")
+    add_chapter(db, project, 2, "Ren bowed.")
+    term = add_term(db, project, "Sword Saint", "Святой Меча")
+
+    response = client.put(f"/glossary/terms/{term.id}", json={"translated_term": "Мастер Меча"})
+
+    assert response.status_code == 200
+    assert client.invalidated == [{with_term.id}]
+
+
+def test_occurrences_endpoint(db, project, client):
+    chapter = add_chapter(db, project, 1, "Ren arrived.")
+    term = add_term(db, project, "Ren", "Рен")
+
+    data = client.get(f"/glossary/terms/{term.id}/occurrences").json()["data"]
+
+    assert data["total_occurrences"] == 1 and data["chapters"][0]["chapter_id"] == chapter.id
+    assert client.get("/glossary/terms/999/occurrences").status_code == 404
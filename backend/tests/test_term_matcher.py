@@ -0,0 +1,94 @@
+import re
+
+from app.core.term_matcher import TermMatcher, TermMatcherCache
+
+
+def test_finds_terms_case_insensitively():
+    matcher = TermMatcher(["Sword Saint", "Aria", "Blue Dragon"])
+
+    found = matcher.find("The sword saint met ARIA near the blue dragon.")
+
+    assert found == {"sword saint", "aria", "blue dragon"}
+
+
+def test_respects_word_boundaries():
+    matcher = TermMatcher(["Ari", "cat"])
+
+    assert matcher.find("Aria scattered the cats") == set()
+    assert matcher.find("Ari's cat_ and cat.") == {"ari", "cat"}
+
+
+def test_overlapping_and_nested_terms():
+    matcher = TermMatcher(["he", "she", "his", "hers", "Dragon King", "King"])
+
+    matches = list(matcher.iter_matches("ushers: she, hers. The Dragon King"))
+
+    assert {term for _, _, term in matches} == {"she", "hers", "dragon king", "king"}
+    text = "ushers: she, hers. The Dragon King".lower()
+    for start, end, term in matches:
+        assert text[start:end] == term
+
+
+def test_matches_regex_reference():
+    terms = ["mana", "Mana Core", "core", "a", "Elf", "elven"]
+    text = "A mana core, an Elf's elven mana-core; elfish mana cores."
+    matcher = TermMatcher(terms)
+
+    expected = {
+        term.lower() for term in terms
+        if re.search(rf"(?<!\w){re.escape(term.lower())}(?!\w)", text.lower())
+    }
+    assert matcher.find(text) == expected
+
+
+def test_ignores_blank_patterns():
+    matcher = TermMatcher(["", "  ", None, " Aria "])
+
+    assert matcher.patterns == ["aria"]
+    assert matcher.find("aria") == {"aria"}
+
+
+def test_cache_rebuilds_only_when_terms_change():
+    cache = TermMatcherCache(max_projects=2)
+
+    first = cache.get(1, ["Aria", "Sword Saint"])
+    assert cache.get(1, ["sword saint", "ARIA "]) is first
+    assert cache.builds == 1
+
+    changed = cache.get(1, ["Aria"])
+    assert changed is not first
+    assert cache.builds == 2
+
+
+def test_cache_evicts_least_recent_project():
+    cache = TermMatcherCache(max_projects=2)
+    first = cache.get(1, ["a"])
+    cache.get(2, ["b"])
+    cache.get(1, ["a"])
+    cache.get(3, ["c"])
+
+    assert cache.get(1, ["a"]) is first
+    builds = cache.builds
+    cache.get(2, ["b"])
+    assert cache.builds == builds + 1
+
+
+def test_prompt_glossary_keeps_only_approved_terms_found_in_the_text():
+    from app.core.translation_engine import translation_engine
+    from app.models.glossary import GlossaryTerm, TermStatus
+
+    terms = [
+        GlossaryTerm(project_id=42, source_term="Sword Saint", translated_term="Святой Меча", category="title",
+                     status=TermStatus.APPROVED),
+        GlossaryTerm(project_id=42, source_term="Dragon", translated_term="Дракон", category="creature",
+                     status=TermStatus.APPROVED),
+        GlossaryTerm(project_id=42, source_term="Ren", translated_term="Рен", category="character",
+                     status=TermStatus.PENDING),
+    ]
+
+    prompt, _ = translation_engine._build_translation_prompt("Ren met the sword saint.", terms)
+
+    assert "Sword Saint → Святой Меча" in prompt
+    assert "Дракон" not in prompt
+    assert "Рен" not in prompt
+    assert [term.source_term for term in translation_engine.relevant_terms("A DRAGON!", terms)] == ["Dragon"]
@@ -0,0 +1,34 @@
+from app.core.translation_engine import translation_engine
+from app.models.glossary import GlossaryTerm, TermStatus
+
+TEXT = "Ren drew the Sword Saint's blade."
+
+
+def term(source: str, translated: str, status: TermStatus = TermStatus.APPROVED) -> GlossaryTerm:
+    return GlossaryTerm(project_id=36, source_term=source, translated_term=translated, category="item", status=status)
+
+
+def fingerprint(terms, summary="s", project_summary="p", tail=None) -> str:
+    return translation_engine.cache_fingerprint(TEXT, terms, summary, tail, project_summary)
+
+
+def test_terms_absent_from_the_text_do_not_change_the_address():
+    base = [term("Sword Saint", "Святой Меча")]
+
+    assert fingerprint(base) == fingerprint(base + [term("Dragon", "Дракон")])
+    assert fingerprint(base) == fingerprint(base + [term("Ren", "Рен", TermStatus.PENDING)])
+    assert fingerprint(base + [term("Ren", "Рен")]) == fingerprint([term("Ren", "Рен")] + base)
+
+
+def test_relevant_term_edits_and_context_change_the_address():
+    base = fingerprint([term("Sword Saint", "Святой Меча")])
+
+    assert base != fingerprint([term("Sword Saint", "Мечник")])
+    assert base != fingerprint([term("Sword Saint", "Святой Меча")], summary="other")
+    assert base != fingerprint([term("Sword Saint", "Святой Меча")], project_summary="other")
+    assert base != fingerprint([term("Sword Saint", "Святой Меча")], tail="Previous paragraph.")
+
+
+def test_having_any_approved_glossary_changes_the_prompt_and_the_address():
+    # Пустой глоссарий и глоссарий без терминов главы дают разные промпты
+    assert fingerprint([]) != fingerprint([term("Dragon", "Дракон")])
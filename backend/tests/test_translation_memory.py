@@ -0,0 +1,103 @@
+import pytest
+
+from app.core.translation_engine import translation_engine
+from app.models.glossary import GlossaryTerm, TermStatus
+from app.models.project import Project
+from app.services.translation_memory import translation_memory
+
+STATUS = "[System] Your level has increased by one."
+STATUS_RU = "[Система] Ваш уровень повышен на один."
+
+
+class ScriptedClient:
+    """LLM с заранее заданным ответом; запоминает промпты."""
+
+    api_keys = ["key0"]
+
+    def __init__(self, response: str = ""):
+        self.response = response
+        self.prompts = []
+
+    def complete(self, prompt: str, max_tokens: int = 4000, key_index: int | None = None) -> str:
+        self.prompts.append(prompt)
+        return self.response
+
+    def rate_limit_reset_in(self) -> float:
+        return 0.0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = ScriptedClient()
+    monkeypatch.setattr(translation_engine, "client", client)
+    return client
+
+
+@pytest.fixture
+def project(db):
+    project = Project(name="Novel")
+    db.add(project)
+    db.commit()
+    return project
+
+
+def term(project: Project, source: str, translated: str) -> GlossaryTerm:
+    return GlossaryTerm(project_id=project.id, source_term=source, translated_term=translated,
+                        category="other", status=TermStatus.APPROVED)
+
+
+def test_exact_hit_is_substituted_without_an_llm_call(db, project, client):
+    translation_memory.record(db, project.id, [(STATUS, STATUS_RU)], glossary_terms=[])
+    db.commit()
+
+    # Лишние пробелы не мешают совпадению: ключ – хэш нормализованного абзаца
+    translated = translation_engine.translate_with_glossary(f"  {STATUS}  ", [], db=db, project_id=project.id)
+
+    assert translated == STATUS_RU
+    assert client.prompts == []
+    assert translation_memory.stats(db, project.id)["reused"] == 1
+
+
+def test_only_new_paragraphs_reach_the_model_and_are_remembered(db, project, client):
+    translation_memory.record(db, project.id, [(STATUS, STATUS_RU)], glossary_terms=[])
+    db.commit()
+    client.response = "⟦TM1⟧\nРен молча убрал меч в ножны."
+
+    translated = translation_engine.translate_with_glossary(
+        f"{STATUS}\nRen silently sheathed his sword.", [], db=db, project_id=project.id
+    )
+    db.commit()
+
+    assert translated == f"{STATUS_RU}\nРен молча убрал меч в ножны."
+    assert STATUS not in client.prompts[0] and "⟦TM1⟧" in client.prompts[0]
+    assert translation_memory.stats(db, project.id)["entries"] == 2
+
+
+def test_fuzzy_match_is_offered_as_a_reference(db, project, client):
+    translation_memory.record(db, project.id, [(STATUS, STATUS_RU)], glossary_terms=[])
+    db.commit()
+    client.response = "[Система] Ваш уровень повышен на два."
+
+    translation_engine.translate_with_glossary(
+        "[System] Your level has increased by two.", [], db=db, project_id=project.id
+    )
+
+    assert "ПАМЯТЬ ПЕРЕВОДОВ" in client.prompts[0] and STATUS_RU in client.prompts[0]
+    assert translation_memory.similar(db, project.id, ["Something entirely different happened."]) == []
+
+
+def test_hit_made_with_another_term_translation_is_not_reused(db, project, client):
+    line = "The Sword Saint bowed to the crowd of disciples."
+    translation_memory.record(
+        db, project.id, [(line, "Святой Меча поклонился толпе учеников.")],
+        glossary_terms=[term(project, "Sword Saint", "Святой Меча")]
+    )
+    db.commit()
+    client.response = "Мастер Меча поклонился толпе учеников."
+
+    translated = translation_engine.translate_with_glossary(
+        line, [term(project, "Sword Saint", "Мастер Меча")], db=db, project_id=project.id
+    )
+
+    assert translated == "Мастер Меча поклонился толпе учеников."
+    assert len(client.prompts) == 1
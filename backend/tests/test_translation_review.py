@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+from app.api import batch as batch_api
+from app.api import translation as translation_api
+from app.core.translation_engine import translation_engine
+from app.models.glossary import BatchJob, BatchJobItem
+from app.models.project import Chapter, Project
+from app.models.translation import TranslationReview
+from app.services.translation_review import translation_review_service
+
+
+class ReviewClient:
+    """LLM-рецензент с заданными ответами; считает запросы."""
+
+    api_keys = ["key0"]
+
+    def __init__(self, response: str):
+        self.response = response
+        self.requests = 0
+
+    def complete(self, prompt: str, max_tokens: int = 4000, key_index: int | None = None) -> str:
+        self.requests += 1
+        return self.response
+
+    def rate_limit_reset_in(self) -> float:
+        return 0.0
+
+
+@pytest.fixture
+def reviewer(monkeypatch):
+    client = ReviewClient(json.dumps({"score": 8, "summary": "Хорошо", "issues": [
+        {"type": "terminology", "severity": "major", "translation": "меч", "suggestion": "клинок", "comment": ""},
+        {"type": "nonsense", "severity": "fatal", "translation": "x", "suggestion": "y", "comment": ""},
+    ]}))
+    monkeypatch.setattr(translation_engine, "client", client)
+    return client
+
+
+@pytest.fixture
+def chapter(db):
+    project = Project(name="Novel")
+    db.add(project)
+    db.commit()
+    chapter = Chapter(
+        project_id=project.id, title="1", original_text="The sword.\nThe end.",
+        translated_text="Меч.\nКонец."
+    )
+    db.add(chapter)
+    db.commit()
+    return chapter
+
+
+def test_review_is_stored_and_reused_for_the_same_translation(db, chapter, reviewer):
+    review, reused = translation_review_service.review(db, chapter, [])
+
+    assert not reused
+    assert (review.score, review.min_score, review.issue_count) == (8.0, 8.0, 2)
+    # Неизвестные тип и серьезность приводятся к допустимым
+    assert (review.issues[1]["type"], review.issues[1]["severity"]) == ("style", "minor")
+
+    again, reused = translation_review_service.review(db, chapter, [])
+    assert reused and again.id == review.id
+    assert reviewer.requests == 1
+
+    chapter.translated_text = "Клинок.\nКонец."
+    db.commit()
+    assert translation_review_service.current(db, chapter) is None
+
+
+def test_unparsable_chunk_stores_nothing(db, chapter, reviewer):
+    reviewer.response = "sorry, no JSON"
+
+    with pytest.raises(ValueError):
+        translation_review_service.review(db, chapter, [])
+    assert db.query(TranslationReview).count() == 0
+
+
+def test_review_endpoint_logs_the_failure_with_a_traceback(db, chapter, monkeypatch, caplog):
+    def fail(db, chapter, glossary_terms):
+        raise RuntimeError("LLM is down")
+    monkeypatch.setattr(translation_review_service, "review", fail)
+
+    with caplog.at_level(logging.ERROR, logger=translation_api.logger.name):
+        result = asyncio.run(translation_api.review_translation(chapter.id, wait=0, db=db))
+
+    assert result["review_available"] is False
+    assert "LLM is down" in result["message"]
+    record = next(r for r in caplog.records if r.name == translation_api.logger.name)
+    assert record.exc_info and f"chapter {chapter.id}" in record.getMessage()
+
+
+def test_failed_batch_review_item_is_logged_and_marked_failed(db, chapter, caplog):
+    chapter.translated_text = None
+    job = BatchJob(project_id=chapter.project_id, job_type="review", total_items=1)
+    db.add(job)
+    db.commit()
+    item = BatchJobItem(project_id=chapter.project_id, batch_job_id=job.id, item_type="chapter", item_id=chapter.id)
+    db.add(item)
+    db.commit()
+
+    with caplog.at_level(logging.ERROR, logger=batch_api.logger.name):
+        batch_api.process_batch_review_sync(job.id, db=db)
+
+    db.refresh(item)
+    assert (item.status, item.error_message) == ("failed", "Chapter has no translation to review")
+    record = next(r for r in caplog.records if r.name == batch_api.logger.name)
+    assert record.exc_info and f"item {item.id}" in record.getMessage()
@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from app.services.upstash_pipeline import UpstashPipelineClient, UpstashPipelineError
+
+
+class FakeUpstash:
+    """Локальная замена Upstash REST: /pipeline и /multi-exec поверх словаря."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.requests = []
+
+    def _alive(self, key):
+        if key in self.expires and self.expires[key] <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def run(self, command):
+        name, args = command[0].upper(), command[1:]
+        if name == "SET":
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            if "NX" in options and self._alive(key):
+                return None
+            self.data[key] = value
+            self.expires.pop(key, None)
+            if "EX" in options:
+                self.expires[key] = time.time() + int(args[2 + options.index("EX") + 1])
+            return "OK"
+        if name == "GET":
+            return self.data[args[0]] if self._alive(args[0]) else None
+        if name == "MGET":
+            return [self.data[key] if self._alive(key) else None for key in args]
+        if name == "INCR":
+            key = args[0]
+            current = self.data[key] if self._alive(key) else "0"
+            if not current.lstrip("-").isdigit():
+                raise ValueError("ERR value is not an integer or out of range")
+            self.data[key] = str(int(current) + 1)
+            return int(self.data[key])
+        if name == "TTL":
+            if not self._alive(args[0]):
+                return -2
+            return int(self.expires[args[0]] - time.time() + 0.5) if args[0] in self.expires else -1
+        raise ValueError(f"ERR unknown command '{name}'")
+
+    def handle(self, endpoint, commands):
+        results = []
+        for command in commands:
+            try:
+                results.append({"result": self.run(command)})
+            except ValueError as e:
+                results.append({"error": str(e)})
+        return results
+
+
+@pytest.fixture
+def upstash():
+    fake = FakeUpstash()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            fake.requests.append((self.path, self.headers.get("Authorization"), body))
+            if self.headers.get("Authorization") != "Bearer secret":
+                status, payload = 401, {"error": "Unauthorized"}
+            elif self.path in ("/pipeline", "/multi-exec"):
+                status, payload = 200, fake.handle(self.path, body)
+            else:
+                status, payload = 404, {"error": "Not found"}
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield fake, f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_pipeline_sends_all_commands_in_one_request(upstash):
+    fake, url = upstash
+    client = UpstashPipelineClient(url, "secret")
+
+    results = client.pipeline([["SET", "a", 1], ["GET", "a"], ["GET", "missing"]])
+
+    assert results == ["OK", "1", None]
+    assert len(fake.requests) == 1
+    path, auth, body = fake.requests[0]
+    assert path == "/pipeline"
+    assert auth == "Bearer secret"
+    # Все аргументы уходят строками
+    assert body[0] == ["SET", "a", "1"]
+
+
+def test_pipeline_returns_command_errors_in_place(upstash):
+    fake, url = upstash
+    client = UpstashPipelineClient(url, "secret")
+
+    results = client.pipeline([["SET", "a", "text"], ["INCR", "a"], ["GET", "a"]])
+
+    assert results[0] == "OK"
+    assert isinstance(results[1], UpstashPipelineError)
+    assert results[2] == "text"
+
+
+def test_empty_pipeline_makes_no_request(upstash):
+    fake, url = upstash
+    client = UpstashPipelineClient(url, "secret")
+
+    assert client.pipeline([]) == []
+    assert client.multi_exec([]) == []
+    assert fake.requests == []
+
+
+def test_multi_exec_raises_on_command_error(upstash):
+    fake, url = upstash
+    client = UpstashPipelineClient(url, "secret")
+    client.pipeline([["SET", "a", "text"]])
+
+    with pytest.raises(UpstashPipelineError):
+        client.multi_exec([["GET", "a"], ["INCR", "a"]])
+    assert fake.requests[-1][0] == "/multi-exec"
+
+
+def test_http_error_raises(upstash):
+    fake, url = upstash
+    client = UpstashPipelineClient(url, "wrong")
+
+    with pytest.raises(UpstashPipelineError, match="HTTP 401"):
+        client.pipeline([["GET", "a"]])
+
+
+def test_incr_with_ttl_sets_ttl_only_for_new_window(upstash):
+    fake, url = upstash
+    client = UpstashPipelineClient(url, "secret")
+
+    assert client.incr_with_ttl("rate:x", 60) == 1
+    assert client.incr_with_ttl("rate:x", 60) == 2
+    # Один запрос /multi-exec на инкремент
+    assert [path for path, _, _ in fake.requests] == ["/multi-exec", "/multi-exec"]
+    ttl = client.pipeline([["TTL", "rate:x"]])[0]
+    assert 0 < ttl <= 60
+
+    fake.expires["rate:x"] = time.time() + 5
+    assert client.incr_with_ttl("rate:x", 60) == 3
+    # Повторный SET NX не продлевает окно
+    assert client.pipeline([["TTL", "rate:x"]])[0] <= 5
+
+
+def test_incr_many_with_ttl_and_mget(upstash):
+    fake, url = upstash
+    client = UpstashPipelineClient(url, "secret")
+
+    assert client.incr_many_with_ttl(["a", "b", "a"], 30) == [1, 1, 2]
+    assert client.mget(["a", "b", "c"]) == ["2", "1", None]
+    assert client.mget([]) == []